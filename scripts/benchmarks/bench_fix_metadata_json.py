@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Benchmark für fix_metadata_json: synthetische Planetiler-Metadaten
+(vector_layers + tilestats) mit rohen Zeilenumbrüchen und ungültigen
+Backslashes in String-Werten.
+
+Usage: bench_fix_metadata_json.py [--sizes-mb 1 8 32] [--workdir /tmp]
+"""
+import argparse
+import json
+import random
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fix_metadata_json import fix_json, load_metadata  # noqa: E402
+
+
+def legacy_fix_json(value: str) -> str:
+    """Vorherige Implementierung (Regex + Zeichen-Schleife) als Referenz."""
+    value = re.sub(r"\\(?![\"\\/bfnrtu])", r"\\\\", value)
+    out = []
+    in_str = False
+    esc = False
+    for char in value:
+        if not in_str:
+            if char == '"':
+                in_str = True
+            out.append(char)
+            continue
+        if esc:
+            out.append(char)
+            esc = False
+            continue
+        if char == "\\":
+            out.append(char)
+            esc = True
+            continue
+        if char == '"':
+            out.append(char)
+            in_str = False
+            continue
+        if char == "\n":
+            out.append("\\n")
+        elif char == "\r":
+            out.append("\\r")
+        elif char == "\t":
+            out.append("\\t")
+        else:
+            out.append(char)
+    return "".join(out)
+
+
+def synthetic_metadata(target_bytes, broken, seed=42):
+    """Erzeugt Metadaten-Text ~target_bytes groß; broken=True fügt Fehler ein."""
+    rnd = random.Random(seed)
+    layers = []
+    attributes = []
+    size = 0
+    i = 0
+    while size < target_bytes:
+        values = []
+        for j in range(50):
+            text = f"Wert {i}-{j} Straße Nr. {rnd.randint(1, 999)}"
+            if broken and j % 7 == 0:
+                text += "\nzweite Zeile\tmit Tab"
+            if broken and j % 11 == 0:
+                text += " C:\\daten\\karte"
+            values.append(text)
+        attributes.append({"attribute": f"name_{i}", "count": len(values), "type": "string", "values": values})
+        layers.append({"id": f"layer_{i}", "fields": {f"name_{i}": "String", "class": "String"}, "minzoom": 0, "maxzoom": 14})
+        size += sum(len(v) for v in values) + 200
+        i += 1
+
+    doc = {
+        "name": "OSM at",
+        "format": "pbf",
+        "json": json.dumps({"vector_layers": layers, "tilestats": {"layerCount": len(layers), "layers": attributes}}),
+    }
+    text = json.dumps(doc, ensure_ascii=False)
+    if broken:
+        # Escapes wieder "kaputt machen", wie sie in fehlerhaften Metadaten auftauchen
+        text = text.replace("\\\\n", "\n").replace("\\\\t", "\t").replace("\\\\\\\\", "\\")
+    return text
+
+
+def measure(fn, *args):
+    """Zeit und Peak-Speicher in getrennten Läufen (tracemalloc verfälscht die Zeit)."""
+    t0 = time.perf_counter()
+    result = fn(*args)
+    elapsed = time.perf_counter() - t0
+    del result
+    tracemalloc.start()
+    result = fn(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes-mb", type=float, nargs="+", default=[1, 8])
+    parser.add_argument("--workdir", default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.workdir) as tmp:
+        tmp = Path(tmp)
+        print(f"{'Größe':>8} {'Variante':<22} {'Zeit':>9} {'Peak-RAM':>10}")
+        for size_mb in args.sizes_mb:
+            for broken in (False, True):
+                text = synthetic_metadata(int(size_mb * 1e6), broken)
+                src = tmp / "metadata.json"
+                src.write_text(text, encoding="utf-8")
+                label = "kaputt" if broken else "gültig"
+                mb = f"{len(text) / 1e6:.1f}MB"
+
+                legacy, t_legacy, m_legacy = measure(legacy_fix_json, text)
+                fixed, t_new, m_new = measure(fix_json, text)
+                (obj, repaired), t_file, m_file = measure(load_metadata, src, tmp / "scratch.json")
+                json.loads(fixed)  # muss gültig sein
+
+                print(f"{mb:>8} {'legacy fix_json ' + label:<22} {t_legacy:>8.3f}s {m_legacy / 1e6:>8.1f}MB")
+                print(f"{mb:>8} {'fix_json ' + label:<22} {t_new:>8.3f}s {m_new / 1e6:>8.1f}MB")
+                mode = "repair" if repaired else "fast-path"
+                print(f"{mb:>8} {'load_metadata ' + mode:<22} {t_file:>8.3f}s {m_file / 1e6:>8.1f}MB")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,488 @@
+#!/usr/bin/env python3
+"""
+Viewport-Replay: Was kostet eine typische Kartensitzung an Range-Requests
+und Bytes gegen ein PMTiles-Archiv?
+
+1. Trace erzeugen: Sitzungen aus Pan-, Zoom-, Scroll- und Sprung-Schritten
+   über den Bounds des (ersten) Archivs, reproduzierbar per --seed.
+   Mit --save-trace/--trace wird derselbe Trace für alle Builds verwendet.
+2. Replay wie der pmtiles-JS-Client: pro Sitzung ein frischer Client
+   (erster Request: 16 KiB Header + Root, dann Metadaten), Leaf-Directories
+   über einen LRU-Directory-Cache (--dir-cache, gleichzeitige Anfragen auf
+   dasselbe Directory werden zusammengelegt), bereits geladene Tiles aus
+   einem Tile-Cache (--tile-cache, entspricht dem MapLibre-Tile-Cache).
+3. Quelle: die lokale Datei oder - mit --http - ein lokaler Range-Server mit
+   künstlicher Latenz (--latency-ms) und --parallel Verbindungen
+   (Browser: 6 pro Host bei HTTP/1.1). Nur dann ist die Wandzeit pro
+   Viewport aussagekräftig.
+
+Ausgabe pro Archiv: Requests pro Viewport (Mittel/p95), Bytes pro Viewport,
+Directory-Overhead (Requests und Bytes für Header, Root und Leafs) und
+bei --http die Zeit pro Viewport.
+
+Ohne Archive wird ein synthetisches Archiv gebaut (z.B. zum Testen).
+
+Usage: bench_pmtiles_viewports.py [archiv.pmtiles ...] [--sessions 20] [--steps 30]
+                                  [--dir-cache 100] [--tile-cache 512]
+                                  [--http --latency-ms 40 --parallel 6]
+                                  [--save-trace trace.json | --trace trace.json] [--json report.json]
+"""
+import argparse
+import concurrent.futures
+import http.client
+import http.server
+import json
+import math
+import mmap
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from pmtiles_reader import (  # noqa: E402
+    PMTilesError,
+    decompress,
+    deserialize_directory,
+    parse_header,
+    zxy_to_tileid,
+)
+
+# pmtiles-JS liest beim ersten Zugriff die ersten 16 KiB (Header + Root)
+INITIAL_FETCH = 16384
+TILE_SIZE = 512
+VIEWPORT = (1280, 800)
+MAX_LAT = 85.0511
+
+
+# --- TRACE ---
+
+def lonlat_to_world(lon, lat):
+    """Lon/Lat -> normierte Web-Mercator-Koordinaten [0, 1]."""
+    lat = max(-MAX_LAT, min(MAX_LAT, lat))
+    x = (lon + 180.0) / 360.0
+    y = (1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0
+    return x, y
+
+
+def world_to_lonlat(x, y):
+    return x * 360.0 - 180.0, math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y))))
+
+
+def generate_trace(bounds, minzoom, maxzoom, sessions, steps, seed, viewport=VIEWPORT):
+    """
+    Sitzungen: Start irgendwo in den Bounds auf mittlerem Zoom, dann
+    50% Pan, 25% Zoom-Stufe (eher hinein), 15% Scroll-Zoom (+-0.5),
+    10% Sprung (Suche/Lesezeichen). Overzoom bis maxzoom+2 ist erlaubt.
+    """
+    rnd = random.Random(seed)
+    west, south, east, north = bounds
+    x0, y1 = lonlat_to_world(west, south)
+    x1, y0 = lonlat_to_world(east, north)
+    top = maxzoom + 2
+    low = max(minzoom, maxzoom - 8)
+
+    def random_start():
+        return rnd.uniform(x0, x1), rnd.uniform(y0, y1), rnd.uniform(low, max(low, maxzoom - 2))
+
+    trace = []
+    for session in range(sessions):
+        x, y, z = random_start()
+        for _ in range(steps):
+            trace.append({"session": session, "x": round(x, 9), "y": round(y, 9), "zoom": round(z, 2)})
+            r = rnd.random()
+            if r < 0.5:
+                # Pan um 20-70% der Viewport-Breite/Höhe
+                world_px = TILE_SIZE * 2 ** z
+                x += rnd.choice((-1, 1)) * rnd.uniform(0.2, 0.7) * viewport[0] / world_px
+                y += rnd.choice((-1, 1)) * rnd.uniform(0.2, 0.7) * viewport[1] / world_px
+            elif r < 0.75:
+                z += 1 if rnd.random() < 0.6 else -1
+            elif r < 0.9:
+                z += rnd.choice((-0.5, 0.5))
+            else:
+                x, y, z = random_start()
+            x = min(max(x, x0), x1)
+            y = min(max(y, y0), y1)
+            z = min(max(z, minzoom), top)
+    return trace
+
+
+def viewport_tiles(x, y, zoom, minzoom, maxzoom, viewport=VIEWPORT):
+    """Tiles (z, x, y), die einen Viewport mit Mittelpunkt (x, y) auf `zoom` abdecken."""
+    tz = min(max(int(math.floor(zoom)), minzoom), maxzoom)
+    n = 1 << tz
+    # Tile-Größe in Pixeln bei gebrochenem Zoom bzw. Overzoom
+    tile_px = TILE_SIZE * 2 ** (zoom - tz)
+    half_w = viewport[0] / 2 / tile_px
+    half_h = viewport[1] / 2 / tile_px
+    cx, cy = x * n, y * n
+    xs = range(max(0, int(cx - half_w)), min(n - 1, int(cx + half_w)) + 1)
+    ys = range(max(0, int(cy - half_h)), min(n - 1, int(cy + half_h)) + 1)
+    # Von der Mitte nach außen, wie MapLibre lädt
+    return sorted(((tz, tx, ty) for tx in xs for ty in ys), key=lambda t: (t[1] + 0.5 - cx) ** 2 + (t[2] + 0.5 - cy) ** 2)
+
+
+# --- QUELLEN ---
+
+class FileSource:
+    """Range-Reads direkt aus der Datei (mmap)."""
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def read(self, offset, length):
+        return self.mm[offset:offset + length]
+
+    def close(self):
+        self.mm.close()
+        self.file.close()
+
+
+class HttpSource:
+    """Range-Requests an den lokalen Stand-in, eine Keep-Alive-Verbindung pro Thread."""
+
+    def __init__(self, host, port, name):
+        self.host = host
+        self.port = port
+        self.name = name
+        self.local = threading.local()
+
+    def read(self, offset, length):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self.local.conn = http.client.HTTPConnection(self.host, self.port)
+        conn.request("GET", f"/{self.name}", headers={"Range": f"bytes={offset}-{offset + length - 1}"})
+        response = conn.getresponse()
+        body = response.read()
+        if response.status != 206:
+            raise PMTilesError(f"Range-Request fehlgeschlagen: HTTP {response.status}")
+        return body
+
+    def close(self):
+        pass
+
+
+def start_range_server(root, latency_s):
+    """Lokaler Range-Server (HTTP/1.1, Keep-Alive) mit künstlicher Latenz pro Request."""
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            path = Path(root) / self.path.lstrip("/")
+            spec = self.headers.get("Range", "")
+            if not spec.startswith("bytes=") or not path.is_file():
+                self.send_error(416 if path.is_file() else 404)
+                return
+            start, _, end = spec[6:].partition("-")
+            size = path.stat().st_size
+            start, end = int(start), min(int(end), size - 1)
+            with open(path, "rb") as f:
+                f.seek(start)
+                body = f.read(end - start + 1)
+            time.sleep(latency_s)
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# --- CLIENT ---
+
+class Counter:
+    """Requests und Bytes pro Kategorie (header, metadata, leaf, tile)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = {}
+        self.bytes = {}
+
+    def add(self, kind, length):
+        with self.lock:
+            self.requests[kind] = self.requests.get(kind, 0) + 1
+            self.bytes[kind] = self.bytes.get(kind, 0) + length
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.requests), dict(self.bytes)
+
+
+class SimClient:
+    """Verhält sich wie der pmtiles-JS-Client plus Tile-Cache der Karte."""
+
+    def __init__(self, source, counter, dir_cache=100, tile_cache=512):
+        self.source = source
+        self.counter = counter
+        self.dir_cache_size = dir_cache
+        self.tile_cache_size = tile_cache
+        self.dirs = OrderedDict()
+        self.tiles = OrderedDict()
+        self.pending = {}
+        self.lock = threading.Lock()
+
+        head = self._fetch("header", 0, INITIAL_FETCH)
+        self.header = parse_header(head)
+        start, length = self.header["root_offset"], self.header["root_length"]
+        raw = head[start:start + length] if start + length <= len(head) else self._fetch("header", start, length)
+        self.root = deserialize_directory(decompress(raw, self.header["internal_compression"]))
+        if self.header["metadata_length"]:
+            self._fetch("metadata", self.header["metadata_offset"], self.header["metadata_length"])
+
+    def _fetch(self, kind, offset, length):
+        data = self.source.read(offset, length)
+        self.counter.add(kind, len(data))
+        return data
+
+    def _leaf(self, offset, length):
+        """LRU-Directory-Cache; parallele Anfragen auf dasselbe Leaf teilen sich einen Fetch."""
+        key = (offset, length)
+        with self.lock:
+            entries = self.dirs.get(key)
+            if entries is not None:
+                self.dirs.move_to_end(key)
+                return entries
+            event = self.pending.get(key)
+            owner = event is None
+            if owner:
+                event = self.pending[key] = threading.Event()
+        if not owner:
+            event.wait()
+            with self.lock:
+                entries = self.dirs.get(key)
+            return entries if entries is not None else self._leaf(offset, length)
+
+        try:
+            raw = self._fetch("leaf", self.header["leaf_dirs_offset"] + offset, length)
+            entries = deserialize_directory(decompress(raw, self.header["internal_compression"]))
+            with self.lock:
+                self.dirs[key] = entries
+                while len(self.dirs) > self.dir_cache_size:
+                    self.dirs.popitem(last=False)
+        finally:
+            with self.lock:
+                self.pending.pop(key, None)
+            event.set()
+        return entries
+
+    def get_tile(self, z, x, y):
+        tile_id = zxy_to_tileid(z, x, y)
+        entries = self.root
+        for _ in range(4):
+            lo, hi = 0, len(entries) - 1
+            found = None
+            while lo <= hi:
+                mid = (lo + hi) // 2
+                if entries[mid][0] <= tile_id:
+                    found = entries[mid]
+                    lo = mid + 1
+                else:
+                    hi = mid - 1
+            if found is None:
+                return 0
+            entry_id, offset, length, run_length = found
+            if run_length == 0:
+                entries = self._leaf(offset, length)
+                continue
+            if tile_id >= entry_id + run_length:
+                return 0
+            self._fetch("tile", self.header["tile_data_offset"] + offset, length)
+            return length
+        raise PMTilesError("Directory-Tiefe > 4")
+
+    def view(self, tiles, pool):
+        """Lädt die noch nicht gecachten Tiles eines Viewports. Rückgabe: (geladen, leer)."""
+        missing = [t for t in tiles if t not in self.tiles]
+        for t in tiles:
+            if t in self.tiles:
+                self.tiles.move_to_end(t)
+        results = list(pool.map(lambda t: self.get_tile(*t), missing)) if pool else [self.get_tile(*t) for t in missing]
+        for t in missing:
+            self.tiles[t] = True
+        while len(self.tiles) > self.tile_cache_size:
+            self.tiles.popitem(last=False)
+        return sum(1 for r in results if r), sum(1 for r in results if not r)
+
+
+# --- REPLAY ---
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0
+
+
+def replay(path, trace, args, source_factory):
+    counter = Counter()
+    header = None
+    per_view = []
+    pool = concurrent.futures.ThreadPoolExecutor(args.parallel) if args.parallel > 1 else None
+    source = source_factory(path)
+    try:
+        client = None
+        session = None
+        for step in trace:
+            before_req, before_bytes = counter.snapshot()
+            t0 = time.perf_counter()
+            if step["session"] != session:
+                session = step["session"]
+                client = SimClient(source, counter, args.dir_cache, args.tile_cache)
+                header = client.header
+            tiles = viewport_tiles(step["x"], step["y"], step["zoom"], header["minzoom"], header["maxzoom"])
+            loaded, empty = client.view(tiles, pool)
+            elapsed = time.perf_counter() - t0
+            after_req, after_bytes = counter.snapshot()
+            per_view.append({
+                "requests": sum(after_req.values()) - sum(before_req.values()),
+                "bytes": sum(after_bytes.values()) - sum(before_bytes.values()),
+                "tiles": loaded,
+                "empty": empty,
+                "seconds": elapsed,
+            })
+    finally:
+        if pool:
+            pool.shutdown()
+        source.close()
+
+    requests, sizes = counter.snapshot()
+    total_requests = sum(requests.values())
+    total_bytes = sum(sizes.values())
+    dir_requests = sum(requests.get(k, 0) for k in ("header", "leaf"))
+    dir_bytes = sum(sizes.get(k, 0) for k in ("header", "leaf"))
+    views = len(per_view)
+    return {
+        "archive": str(path),
+        "viewports": views,
+        "sessions": len({s["session"] for s in trace}),
+        "requests": requests,
+        "bytes": sizes,
+        "requests_per_viewport": round(total_requests / views, 2) if views else 0,
+        "requests_per_viewport_p95": percentile([v["requests"] for v in per_view], 0.95),
+        "bytes_per_viewport": round(total_bytes / views) if views else 0,
+        "tiles_per_viewport": round(sum(v["tiles"] for v in per_view) / views, 2) if views else 0,
+        "empty_tiles": sum(v["empty"] for v in per_view),
+        "directory_requests_share": round(dir_requests / total_requests, 4) if total_requests else 0,
+        "directory_bytes_share": round(dir_bytes / total_bytes, 4) if total_bytes else 0,
+        "leaf_requests": requests.get("leaf", 0),
+        "seconds_per_viewport_p50": round(percentile([v["seconds"] for v in per_view], 0.5), 4),
+        "seconds_per_viewport_p95": round(percentile([v["seconds"] for v in per_view], 0.95), 4),
+    }
+
+
+def read_header(path):
+    with open(path, "rb") as f:
+        return parse_header(f.read(INITIAL_FETCH))
+
+
+def build_synthetic(path, maxzoom=12):
+    """Kleines Testarchiv (Österreich-Ausschnitt), nutzt den Builder aus bench_tile_server."""
+    from bench_tile_server import build_archive
+    build_archive(path, maxzoom)
+
+
+def _fmt_bytes(value):
+    for unit in ("B", "KB", "MB", "GB"):
+        if value < 1024 or unit == "GB":
+            return f"{value:.1f}{unit}" if unit != "B" else f"{value}B"
+        value /= 1024
+
+
+def print_reports(reports, timed):
+    header = f"{'Archiv':<28} {'Req/VP':>7} {'p95':>5} {'Bytes/VP':>10} {'Tiles/VP':>9} {'Leafs':>6} {'Dir-Req':>8} {'Dir-Bytes':>10}"
+    if timed:
+        header += f" {'t p50':>8} {'t p95':>8}"
+    print(header)
+    for r in reports:
+        line = (f"{Path(r['archive']).name[:28]:<28} {r['requests_per_viewport']:>7.2f} {r['requests_per_viewport_p95']:>5} "
+                f"{_fmt_bytes(r['bytes_per_viewport']):>10} {r['tiles_per_viewport']:>9.2f} {r['leaf_requests']:>6} "
+                f"{r['directory_requests_share'] * 100:>7.1f}% {r['directory_bytes_share'] * 100:>9.1f}%")
+        if timed:
+            line += f" {r['seconds_per_viewport_p50'] * 1e3:>6.0f}ms {r['seconds_per_viewport_p95'] * 1e3:>6.0f}ms"
+        print(line)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("archives", nargs="*", type=Path)
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--steps", type=int, default=30, help="Viewports pro Sitzung")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--dir-cache", type=int, default=100, help="Directory-Cache des Clients (Einträge)")
+    parser.add_argument("--tile-cache", type=int, default=512, help="Tile-Cache der Karte (Tiles)")
+    parser.add_argument("--http", action="store_true", help="Über lokalen Range-Server statt direkt aus der Datei")
+    parser.add_argument("--latency-ms", type=float, default=40.0, help="Latenz pro Range-Request (nur --http)")
+    parser.add_argument("--parallel", type=int, default=6, help="Gleichzeitige Requests des Clients")
+    parser.add_argument("--trace", type=Path, help="Trace aus Datei statt neu erzeugen")
+    parser.add_argument("--save-trace", type=Path)
+    parser.add_argument("--json", type=Path, help="Bericht als JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        archives = args.archives
+        if not archives:
+            synthetic = Path(tmp) / "synthetic.pmtiles"
+            build_synthetic(synthetic)
+            archives = [synthetic]
+
+        try:
+            headers = [read_header(path) for path in archives]
+        except (OSError, PMTilesError) as e:
+            print(f"❌ {e}", file=sys.stderr)
+            return 2
+
+        if args.trace:
+            trace = json.loads(args.trace.read_text(encoding="utf-8"))
+        else:
+            first = headers[0]
+            trace = generate_trace(first["bounds"], first["minzoom"], first["maxzoom"], args.sessions, args.steps, args.seed)
+        if args.save_trace:
+            args.save_trace.write_text(json.dumps(trace) + "\n", encoding="utf-8")
+
+        server = None
+        if args.http:
+            # Jedes Archiv wird über einen Symlink im Server-Root angeboten
+            root = Path(tmp) / "serve"
+            root.mkdir()
+            names = {}
+            for i, path in enumerate(archives):
+                name = f"{i}-{path.name}"
+                (root / name).symlink_to(path.resolve())
+                names[path] = name
+            server = start_range_server(root, args.latency_ms / 1000)
+            port = server.server_address[1]
+
+            def source_factory(path):
+                return HttpSource("127.0.0.1", port, names[path])
+        else:
+            source_factory = FileSource
+
+        print(f"Trace: {len({s['session'] for s in trace})} Sitzungen, {len(trace)} Viewports "
+              f"({VIEWPORT[0]}x{VIEWPORT[1]}px, {TILE_SIZE}px-Tiles), Quelle: "
+              + (f"HTTP, {args.latency_ms:.0f}ms Latenz, {args.parallel} parallel" if args.http else "Datei"))
+        try:
+            reports = [replay(path, trace, args, source_factory) for path in archives]
+        finally:
+            if server:
+                server.shutdown()
+
+    print_reports(reports, timed=args.http)
+    if args.json:
+        args.json.write_text(json.dumps(reports, indent=2) + "\n", encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Durchsatz-Benchmark für tile_server.py unter paralleler Last.
+
+Baut ein synthetisches PMTiles-Archiv (Österreich-Ausschnitt, gzip-Tiles,
+mit Leaf-Directories), startet den Server als eigenen Prozess und feuert
+mit N Keep-Alive-Verbindungen Tile-Requests darauf. Die Tile-Auswahl ist
+Zipf-verteilt (wenige sehr beliebte Tiles, langer Schwanz), wie bei echten
+Kartenaufrufen.
+
+Pro Konfiguration (Hot-Tile-Cache an/aus, Leser-Threads) und Parallelität:
+Requests/s, MB/s, Latenz p50/p99 sowie Cache-Trefferquoten aus /stats.json.
+
+Usage: bench_tile_server.py [--maxzoom 12] [--concurrency 1 16 64]
+                            [--requests 20000] [--client-procs 4] [--workdir /tmp]
+"""
+import argparse
+import asyncio
+import bisect
+import concurrent.futures
+import gzip
+import itertools
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SCRIPTS_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(SCRIPTS_DIR))
+
+from pmtiles_reader import zxy_to_tileid  # noqa: E402
+from pmtiles_writer import PMTilesWriter  # noqa: E402
+
+# Österreich (grob), Tiles außerhalb bleiben leer -> 204
+BOUNDS = (9.5, 46.3, 17.2, 49.1)
+
+CONFIGS = [
+    # (Bezeichnung, Cache-MB, Threads)
+    ("kein Cache, Loop", 0, 0),
+    ("kein Cache, 4 Threads", 0, 4),
+    ("Cache 64MB, 4 Threads", 64, 4),
+]
+
+
+def tile_range(z, bounds=BOUNDS):
+    n = 1 << z
+
+    def tx(lon):
+        return min(n - 1, int((lon + 180.0) / 360.0 * n))
+
+    def ty(lat):
+        rad = math.radians(lat)
+        return min(n - 1, int((1.0 - math.asinh(math.tan(rad)) / math.pi) / 2.0 * n))
+
+    return tx(bounds[0]), ty(bounds[3]), tx(bounds[2]), ty(bounds[1])
+
+
+def build_archive(path, maxzoom, seed=42):
+    """Synthetisches Archiv; Tile-Inhalt ~1-12 KB, teilweise komprimierbar."""
+    rnd = random.Random(seed)
+    tiles = []
+    for z in range(maxzoom + 1):
+        x0, y0, x1, y1 = tile_range(z)
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                tiles.append((zxy_to_tileid(z, x, y), (z, x, y)))
+    tiles.sort()
+    with PMTilesWriter(path, tile_type="mvt", tile_compression="gzip") as writer:
+        for tile_id, zxy in tiles:
+            size = rnd.randint(1000, 12000)
+            raw = rnd.randbytes(size // 2) + bytes(size // 2)
+            writer.add_tile(tile_id, gzip.compress(raw, compresslevel=1, mtime=0), zxy)
+        stats = writer.finish({"name": "bench", "vector_layers": [{"id": "bench", "fields": {}}]}, bounds=list(BOUNDS))
+    return [zxy for _, zxy in tiles], stats
+
+
+def zipf_workload(tiles, count, seed=7, s=1.1):
+    """count Tiles aus `tiles`, Zipf-verteilt über eine zufällige Rangfolge."""
+    rnd = random.Random(seed)
+    ranked = list(tiles)
+    rnd.shuffle(ranked)
+    weights = list(itertools.accumulate(1.0 / (rank + 1) ** s for rank in range(len(ranked))))
+    total = weights[-1]
+    return [ranked[bisect.bisect_left(weights, rnd.random() * total)] for _ in range(count)]
+
+
+async def client(host, port, paths, latencies, counters):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for path in paths:
+            t0 = time.perf_counter()
+            writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\nAccept-Encoding: gzip\r\n\r\n".encode())
+            status_line = await reader.readline()
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                if name.lower() == "content-length":
+                    length = int(value)
+            if length:
+                await reader.readexactly(length)
+            latencies.append(time.perf_counter() - t0)
+            status = int(status_line.split()[1])
+            counters[status] = counters.get(status, 0) + 1
+            counters["bytes"] = counters.get("bytes", 0) + length
+    finally:
+        writer.close()
+
+
+async def run_load(host, port, paths, concurrency):
+    latencies = []
+    counters = {}
+    chunks = [paths[i::concurrency] for i in range(concurrency)]
+    t0 = time.perf_counter()
+    await asyncio.gather(*(client(host, port, chunk, latencies, counters) for chunk in chunks))
+    return time.perf_counter() - t0, sorted(latencies), counters
+
+
+def _load_process(port, paths, concurrency):
+    """Lastgenerator in eigenem Prozess (sonst begrenzt der Client den Durchsatz)."""
+    _, latencies, counters = asyncio.run(run_load("127.0.0.1", port, paths, concurrency))
+    return latencies, counters
+
+
+def run_load_processes(port, paths, concurrency, procs):
+    if procs <= 1:
+        return asyncio.run(run_load("127.0.0.1", port, paths, concurrency))
+    per_proc = max(1, concurrency // procs)
+    t0 = time.perf_counter()
+    with concurrent.futures.ProcessPoolExecutor(procs) as pool:
+        results = list(pool.map(_load_process, [port] * procs, [paths[i::procs] for i in range(procs)], [per_proc] * procs))
+    elapsed = time.perf_counter() - t0
+    latencies = sorted(itertools.chain.from_iterable(r[0] for r in results))
+    counters = {}
+    for _, partial in results:
+        for key, value in partial.items():
+            counters[key] = counters.get(key, 0) + value
+    return elapsed, latencies, counters
+
+
+async def fetch_json(host, port, path):
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode())
+    raw = await reader.read()
+    writer.close()
+    return json.loads(raw.split(b"\r\n\r\n", 1)[1])
+
+
+def start_server(tiles_dir, port, cache_mb, threads):
+    env = dict(os.environ, TILES_DIR=str(tiles_dir))
+    proc = subprocess.Popen(
+        [sys.executable, str(SCRIPTS_DIR / "tile_server.py"), "--port", str(port),
+         "--cache-mb", str(cache_mb), "--threads", str(threads)],
+        env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+    )
+    # Bereit, sobald die Erfolgsmeldung kommt
+    for line in proc.stdout:
+        if "Tileserver auf" in line:
+            return proc
+    raise RuntimeError("Tileserver startet nicht")
+
+
+def percentile(values, p):
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0.0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--maxzoom", type=int, default=12)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--client-procs", type=int, default=1, help="Lastgenerator-Prozesse (Verbindungen werden aufgeteilt)")
+    parser.add_argument("--port", type=int, default=18081)
+    parser.add_argument("--workdir", default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.workdir) as tmp:
+        tiles_dir = Path(tmp)
+        archive = tiles_dir / "bench" / "pmtiles" / "at.pmtiles"
+        archive.parent.mkdir(parents=True)
+        t0 = time.perf_counter()
+        tiles, stats = build_archive(archive, args.maxzoom)
+        print(f"Archiv: {len(tiles)} Tiles, z0-{args.maxzoom}, {archive.stat().st_size / 1e6:.1f}MB, "
+              f"Leaf-Directories {stats['leaf_dirs_bytes'] / 1e3:.0f}KB ({time.perf_counter() - t0:.1f}s)")
+
+        workload = zipf_workload(tiles, args.requests)
+        paths = [f"/bench/at/{z}/{x}/{y}.mvt" for z, x, y in workload]
+
+        print(f"{'Konfiguration':<24} {'Conn':>5} {'Req/s':>9} {'MB/s':>7} {'p50':>8} {'p99':>8} {'Tile-Hit':>9} {'Leaf-Hit':>9}")
+        for label, cache_mb, threads in CONFIGS:
+            for concurrency in args.concurrency:
+                proc = start_server(tiles_dir, args.port, cache_mb, threads)
+                try:
+                    elapsed, latencies, counters = run_load_processes(args.port, paths, concurrency, args.client_procs)
+                    server_stats = asyncio.run(fetch_json("127.0.0.1", args.port, "/stats.json"))
+                finally:
+                    proc.terminate()
+                    proc.wait()
+
+                def hit_rate(cache):
+                    lookups = cache["hits"] + cache["misses"]
+                    return f"{cache['hits'] / lookups * 100:.1f}%" if lookups else "-"
+
+                if counters.get(200, 0) != len(paths):
+                    print(f"⚠️  Unerwartete Statuscodes: {counters}")
+                print(f"{label:<24} {concurrency:>5} {len(paths) / elapsed:>9.0f} {counters.get('bytes', 0) / elapsed / 1e6:>7.1f} "
+                      f"{percentile(latencies, 0.5) * 1e3:>6.2f}ms {percentile(latencies, 0.99) * 1e3:>6.2f}ms "
+                      f"{hit_rate(server_stats['tile_cache']):>9} {hit_rate(server_stats['leaf_cache']):>9}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
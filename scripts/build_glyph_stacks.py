@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+Zusammengesetzte Fontstacks für MapLibre.
+
+MapLibre fordert Glyphen pro Fontstack an, z.B.
+`fonts/Open-Sans-Bold,Noto-Sans-Bold/0-255.pbf`. Unter /srv/assets/fonts
+liegen aber nur einzelne Schriften. Dieses Skript
+
+1. sammelt alle `text-font`-Stacks aus den deployten Styles
+   (`TILES_DIR/*/styles/*/style.json`),
+2. verschmilzt pro Stack und Range die Glyph-PBFs der beteiligten
+   Schriften (erste Schrift gewinnt pro Codepoint) - parallel im
+   Prozess-Pool,
+3. schreibt die Stack-Ordner neben die einzelnen Schriften (erst in
+   .<stack>.staging, dann per rename umgeschaltet) und ein Inventar nach
+   INFO_DIR/glyph_stacks.json.
+
+Stacks mit unveränderten Quell-Ranges werden übersprungen; Stacks, die
+kein Style mehr nutzt, werden entfernt.
+
+Usage:
+  build_glyph_stacks.py [--force] [--workers N]
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from inventory_scan import compact_json
+
+TILES_DIR = Path(os.environ.get("TILES_DIR", "/srv/tiles"))
+ASSETS_DIR = Path(os.environ.get("ASSETS_DIR", "/srv/assets"))
+FONTS_DIR = Path(os.environ.get("FONTS_DIR", str(ASSETS_DIR / "fonts")))
+INFO_DIR = Path(os.environ.get("INFO_DIR", "/srv/info"))
+INVENTORY_FILE = Path(os.environ.get("GLYPH_INVENTORY_FILE", str(INFO_DIR / "glyph_stacks.json")))
+GLYPH_WORKERS = int(os.environ.get("GLYPH_WORKERS", "0") or 0) or (os.cpu_count() or 1)
+# Ranges pro Worker-Auftrag (256 Ranges pro Stack insgesamt)
+RANGES_PER_JOB = 32
+
+# Expression-Operatoren, deren String-Argumente keine Schriftnamen sind
+EXPRESSION_OPERATORS = {"get", "has", "var", "concat", "to-string", "coalesce", "at", "format"}
+
+
+# --- LOGGING HELPER ---
+def log_info(msg):
+    print(f"   ℹ️  {msg}")
+
+def log_success(msg):
+    print(f"   ✅ {msg}")
+
+def log_warn(msg):
+    print(f"   ⚠️  {msg}")
+
+def log_error(msg):
+    print(f"   ❌ {msg}")
+
+
+# --- PROTOBUF (glyphs.proto) ---
+# glyphs { repeated fontstack stacks = 1; }
+# fontstack { string name = 1; string range = 2; repeated glyph glyphs = 3; }
+# glyph { uint32 id = 1; bytes bitmap = 2; ... }
+
+def _read_varint(buf, pos):
+    result = shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def _write_varint(value, out):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _iter_fields(buf):
+    """(Feldnummer, Wire-Typ, Wert) - Wert ist int (varint) oder memoryview (length-delimited)."""
+    pos = 0
+    end = len(buf)
+    while pos < end:
+        key, pos = _read_varint(buf, pos)
+        field, wire = key >> 3, key & 0x7
+        if wire == 0:
+            value, pos = _read_varint(buf, pos)
+        elif wire == 2:
+            length, pos = _read_varint(buf, pos)
+            value = buf[pos:pos + length]
+            pos += length
+        elif wire == 1:
+            value, pos = buf[pos:pos + 8], pos + 8
+        elif wire == 5:
+            value, pos = buf[pos:pos + 4], pos + 4
+        else:
+            raise ValueError(f"Wire-Typ {wire} nicht unterstützt")
+        yield field, wire, value
+
+
+def read_glyphs(data):
+    """Glyph-PBF -> {codepoint: rohe Glyph-Nachricht}."""
+    glyphs = {}
+    for field, wire, stack in _iter_fields(memoryview(data)):
+        if field != 1 or wire != 2:
+            continue
+        for sub_field, sub_wire, glyph in _iter_fields(stack):
+            if sub_field != 3 or sub_wire != 2:
+                continue
+            for glyph_field, glyph_wire, value in _iter_fields(glyph):
+                if glyph_field == 1 and glyph_wire == 0:
+                    glyphs.setdefault(value, bytes(glyph))
+                    break
+    return glyphs
+
+
+def _length_delimited(field, payload, out):
+    _write_varint((field << 3) | 2, out)
+    _write_varint(len(payload), out)
+    out += payload
+
+
+def write_glyphs(stack_name, range_name, glyphs):
+    """{codepoint: Glyph-Nachricht} -> Glyph-PBF."""
+    stack = bytearray()
+    _length_delimited(1, stack_name.encode("utf-8"), stack)
+    _length_delimited(2, range_name.encode("utf-8"), stack)
+    for codepoint in sorted(glyphs):
+        _length_delimited(3, glyphs[codepoint], stack)
+    out = bytearray()
+    _length_delimited(1, stack, out)
+    return bytes(out)
+
+
+# --- STYLES ---
+
+def _collect_font_lists(node, found):
+    """Findet Schriftlisten in `text-font` (Literal, ["literal", [...]], step/match, stops)."""
+    if isinstance(node, list):
+        if node and all(isinstance(v, str) for v in node):
+            if node[0] not in EXPRESSION_OPERATORS:
+                found.append(tuple(node))
+            return
+        for value in node:
+            _collect_font_lists(value, found)
+    elif isinstance(node, dict):
+        for value in node.values():
+            _collect_font_lists(value, found)
+
+
+def collect_fontstacks(tiles_dir=TILES_DIR):
+    """Rückgabe: {stack_name: {"fonts": [...], "styles": [...]}} für Stacks mit mehr als einer Schrift."""
+    stacks = {}
+    for style_path in sorted(tiles_dir.glob("*/styles/*/style.json")):
+        style_key = f"{style_path.parent.parent.parent.name}/{style_path.parent.name}"
+        try:
+            style = json.loads(style_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            log_warn(f"Style nicht lesbar ({style_path}): {e}")
+            continue
+        for layer in style.get("layers") or []:
+            layout = layer.get("layout") if isinstance(layer, dict) else None
+            if not isinstance(layout, dict) or "text-font" not in layout:
+                continue
+            found = []
+            _collect_font_lists(layout["text-font"], found)
+            for fonts in found:
+                if len(fonts) < 2:
+                    continue  # Einzelschriften liegen schon als Ordner vor
+                entry = stacks.setdefault(",".join(fonts), {"fonts": list(fonts), "styles": []})
+                if style_key not in entry["styles"]:
+                    entry["styles"].append(style_key)
+    return stacks
+
+
+# --- MERGE ---
+
+def _range_sort_key(name):
+    start = name.split("-", 1)[0]
+    return int(start) if start.isdigit() else 0
+
+
+def source_ranges(fonts_dir, fonts):
+    """{range_name: [(font, path, size, mtime_ns), ...]} in Stack-Reihenfolge."""
+    ranges = {}
+    for font in fonts:
+        font_dir = fonts_dir / font
+        if not font_dir.is_dir():
+            continue
+        for path in font_dir.glob("*.pbf"):
+            st = path.stat()
+            ranges.setdefault(path.stem, []).append((font, str(path), st.st_size, st.st_mtime_ns))
+    return {name: ranges[name] for name in sorted(ranges, key=_range_sort_key)}
+
+
+def source_hash(ranges):
+    digest = hashlib.sha256()
+    for name, sources in ranges.items():
+        for font, _, size, mtime_ns in sources:
+            digest.update(f"{name}|{font}|{size}|{mtime_ns}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def merge_ranges(stack_name, out_dir, jobs):
+    """Worker: verschmilzt mehrere Ranges eines Stacks. Rückgabe: (Ranges, Glyphen, Bytes)."""
+    out_dir = Path(out_dir)
+    written = glyph_count = total_bytes = 0
+    for range_name, paths in jobs:
+        merged = {}
+        for path in paths:
+            for codepoint, glyph in read_glyphs(Path(path).read_bytes()).items():
+                merged.setdefault(codepoint, glyph)  # erste Schrift gewinnt
+        if not merged:
+            continue  # leere Ranges entfernt auch font_inventory.sh
+        data = write_glyphs(stack_name, range_name, merged)
+        tmp = out_dir / f".{range_name}.pbf.tmp"
+        tmp.write_bytes(data)
+        tmp.replace(out_dir / f"{range_name}.pbf")
+        written += 1
+        glyph_count += len(merged)
+        total_bytes += len(data)
+    return written, glyph_count, total_bytes
+
+
+def swap_into_place(staging, out_dir):
+    """Fertigen Staging-Ordner per rename an die Stelle des live Ordners setzen."""
+    retired = out_dir.with_name(f".{out_dir.name}.old")
+    shutil.rmtree(retired, ignore_errors=True)
+    if out_dir.is_dir():
+        os.rename(out_dir, retired)
+    os.rename(staging, out_dir)
+    shutil.rmtree(retired, ignore_errors=True)
+
+
+def load_inventory(path=INVENTORY_FILE):
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {"stacks": {}}
+
+
+def build_stacks(tiles_dir=TILES_DIR, fonts_dir=FONTS_DIR, inventory_file=INVENTORY_FILE,
+                 workers=GLYPH_WORKERS, force=False):
+    """Baut alle genutzten Stacks. Rückgabe: (Inventar, Anzahl neu gebauter Stacks)."""
+    stacks = collect_fontstacks(tiles_dir)
+    previous = load_inventory(inventory_file).get("stacks", {})
+    inventory = {"generated_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "fonts_dir": str(fonts_dir), "stacks": {}}
+
+    plans = []
+    for name, entry in sorted(stacks.items()):
+        fonts = entry["fonts"]
+        missing = [font for font in fonts if not (fonts_dir / font).is_dir()]
+        if len(missing) == len(fonts):
+            log_warn(f"{name}: keine der Schriften vorhanden - übersprungen")
+            continue
+        if missing:
+            log_warn(f"{name}: fehlende Schriften {', '.join(missing)}")
+        ranges = source_ranges(fonts_dir, fonts)
+        record = {"fonts": fonts, "missing": missing, "styles": entry["styles"], "source_hash": source_hash(ranges)}
+        out_dir = fonts_dir / name
+        old = previous.get(name)
+        if not force and old and old.get("source_hash") == record["source_hash"] and out_dir.is_dir():
+            for key in ("ranges", "glyphs", "bytes"):
+                record[key] = old.get(key, 0)
+            inventory["stacks"][name] = record
+            continue
+        plans.append((name, record, ranges))
+
+    if plans:
+        # Neu gebaut wird in .<stack>.staging, der live Ordner bleibt bis zum
+        # Umschalten erreichbar (kein 404 für Clients während des Builds)
+        jobs = []
+        for name, record, ranges in plans:
+            staging = fonts_dir / f".{name}.staging"
+            shutil.rmtree(staging, ignore_errors=True)
+            staging.mkdir(parents=True)
+            items = [(range_name, [src[1] for src in sources]) for range_name, sources in ranges.items()]
+            for start in range(0, len(items), RANGES_PER_JOB):
+                jobs.append((name, str(staging), items[start:start + RANGES_PER_JOB]))
+
+        try:
+            if workers <= 1 or len(jobs) == 1:
+                results = [merge_ranges(*job) for job in jobs]
+            else:
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    results = list(executor.map(merge_ranges, *zip(*jobs)))
+        except BaseException:
+            # Alte Stacks bleiben unverändert
+            for name, _, _ in plans:
+                shutil.rmtree(fonts_dir / f".{name}.staging", ignore_errors=True)
+            raise
+
+        for name, _, _ in plans:
+            swap_into_place(fonts_dir / f".{name}.staging", fonts_dir / name)
+
+        totals = {}
+        for (name, _, _), (written, glyph_count, total_bytes) in zip(jobs, results):
+            total = totals.setdefault(name, [0, 0, 0])
+            total[0] += written
+            total[1] += glyph_count
+            total[2] += total_bytes
+        for name, record, _ in plans:
+            record["ranges"], record["glyphs"], record["bytes"] = totals.get(name, [0, 0, 0])
+            inventory["stacks"][name] = record
+            log_success(f"{name}: {record['ranges']} Ranges, {record['glyphs']} Glyphen")
+
+    # Nur selbst erzeugte Stacks entfernen, nie einzelne Schriften
+    for name in sorted(set(previous) - set(inventory["stacks"])):
+        stale = fonts_dir / name
+        if "," in name and stale.is_dir():
+            shutil.rmtree(stale)
+            log_info(f"{name}: nicht mehr verwendet - entfernt")
+
+    inventory["stacks"] = dict(sorted(inventory["stacks"].items()))
+    inventory_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp = inventory_file.with_name(inventory_file.name + ".tmp")
+    tmp.write_bytes(compact_json(inventory))
+    tmp.replace(inventory_file)
+    return inventory, len(plans)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Fontstacks aus den deployten Styles bauen")
+    parser.add_argument("--force", action="store_true", help="Alle Stacks neu bauen")
+    parser.add_argument("--workers", type=int, default=GLYPH_WORKERS)
+    args = parser.parse_args(argv)
+
+    if not FONTS_DIR.is_dir():
+        log_error(f"Font-Verzeichnis nicht gefunden: {FONTS_DIR}")
+        return 1
+    try:
+        inventory, rebuilt = build_stacks(workers=max(1, args.workers), force=args.force)
+    except (OSError, ValueError, IndexError) as e:
+        log_error(f"Fontstacks fehlgeschlagen: {e}")
+        return 1
+    log_info(f"{len(inventory['stacks'])} Fontstacks, {rebuilt} neu gebaut -> {INVENTORY_FILE}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
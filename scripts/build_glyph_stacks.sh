@@ -0,0 +1,23 @@
+#!/bin/bash
+set -euo pipefail
+
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+if [ -f "$SCRIPT_DIR/utils.sh" ]; then
+    source "$SCRIPT_DIR/utils.sh"
+else
+    echo "❌ Fehler: utils.sh nicht gefunden!"
+    exit 1
+fi
+
+export TILES_DIR="${TILES_DIR:-/srv/tiles}"
+export FONTS_DIR="${FONTS_DIR:-${ASSETS_DIR:-/srv/assets}/fonts}"
+export GLYPH_INVENTORY_FILE="${GLYPH_INVENTORY_FILE:-${INFO_DIR:-/srv/info}/glyph_stacks.json}"
+PYTHON_SCRIPT="$SCRIPT_DIR/build_glyph_stacks.py"
+
+if [ ! -f "$PYTHON_SCRIPT" ]; then
+    log_error "Python-Skript nicht gefunden: $PYTHON_SCRIPT"
+    exit 1
+fi
+
+log_info "Baue Fontstacks aus den deployten Styles..."
+python3 "$PYTHON_SCRIPT" "$@"
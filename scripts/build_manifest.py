@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Build-Manifest pro Karte für den OSM-Pfad (Merge + Planetiler).
+
+Pro Stufe werden die Fingerprints der Eingaben, Image-Digest und Argumente
+sowie die erzeugten Ausgaben festgehalten. `check` entscheidet, ob eine
+Stufe übersprungen werden kann, `record` schreibt nach erfolgreichem Build
+den neuen Stand inklusive Rebuild-Grund.
+
+Aufruf:
+  build_manifest.py check   <map> <stage> --input F... --output F... [--image-id ID] [-- ARGS...]
+  build_manifest.py record  <map> <stage> --input F... --output F... [--image ID] [--image-id ID] [-- ARGS...]
+  build_manifest.py refresh --output F... -- BEFEHL...
+
+Exit-Code von `check`: 0 = aktuell (überspringen), 1 = neu bauen.
+
+`refresh` führt einen Befehl aus, der Ausgaben an Ort und Stelle
+nachbearbeitet (z.B. pmtiles_optimize.py), und übernimmt danach deren neue
+Fingerprints in alle Stufen, die genau den Stand vor dem Befehl erzeugt
+hatten - sonst baut die Stufe beim nächsten Lauf wegen "Ausgabe verändert"
+neu. Exit-Code = Exit-Code des Befehls.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from pbf_validate import download_md5
+
+OSM_BUILD_DIR = os.environ.get("OSM_BUILD_DIR", "/srv/build/osm")
+MANIFEST_DIR = Path(os.environ.get("BUILD_MANIFEST_DIR", f"{OSM_BUILD_DIR}/manifests"))
+FORCE_REBUILD = os.environ.get("FORCE_REBUILD", "0") == "1"
+HISTORY_LIMIT = 20
+
+
+def fingerprint(path):
+    """Größe + mtime; md5 zusätzlich, wenn der Download ihn schon kennt."""
+    path = Path(path)
+    st = path.stat()
+    fp = {"path": str(path.resolve()), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+    md5 = download_md5(path)
+    if md5:
+        fp["md5"] = md5
+    return fp
+
+
+def same_file(old, new):
+    if old.get("path") != new.get("path"):
+        return False
+    # Gleicher Inhalt trotz neuer mtime (z.B. 304 / identischer Re-Download)
+    if old.get("md5") and new.get("md5"):
+        return old["md5"] == new["md5"]
+    return old.get("size") == new.get("size") and old.get("mtime_ns") == new.get("mtime_ns")
+
+
+def manifest_path(map_name):
+    return MANIFEST_DIR / f"{map_name}.json"
+
+
+def load_manifest(map_name):
+    try:
+        return json.loads(manifest_path(map_name).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {"map": map_name, "stages": {}, "history": []}
+
+
+def save_manifest(map_name, manifest):
+    path = manifest_path(map_name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(manifest, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+    tmp.replace(path)
+
+
+def rebuild_reasons(previous, inputs, outputs, image_id, args):
+    """Leere Liste = Stufe ist aktuell."""
+    if FORCE_REBUILD:
+        return ["FORCE_REBUILD=1"]
+    if not previous:
+        return ["Kein Manifest-Eintrag (erster Build)"]
+
+    reasons = []
+    old_inputs = {fp["path"]: fp for fp in previous.get("inputs", [])}
+    new_paths = [str(Path(p).resolve()) for p in inputs]
+    if sorted(old_inputs) != sorted(new_paths):
+        reasons.append("Eingabeliste geändert")
+    for path in inputs:
+        if not Path(path).exists():
+            reasons.append(f"Eingabe fehlt: {Path(path).name}")
+            continue
+        fp = fingerprint(path)
+        old = old_inputs.get(fp["path"])
+        if old is not None and not same_file(old, fp):
+            reasons.append(f"Eingabe geändert: {Path(path).name}")
+
+    if image_id is not None:
+        if not image_id:
+            reasons.append("Image-Digest unbekannt")
+        elif previous.get("image_id") != image_id:
+            reasons.append(f"Image geändert: {(previous.get('image_id') or '-')[:19]} -> {image_id[:19]}")
+    if args is not None and previous.get("args") != args:
+        reasons.append("Argumente geändert")
+
+    old_outputs = {fp["path"]: fp for fp in previous.get("outputs", [])}
+    for path in outputs:
+        if not Path(path).exists():
+            reasons.append(f"Ausgabe fehlt: {Path(path).name}")
+            continue
+        fp = fingerprint(path)
+        old = old_outputs.get(fp["path"])
+        if old is None or not same_file(old, fp):
+            reasons.append(f"Ausgabe verändert: {Path(path).name}")
+    return reasons
+
+
+def check(map_name, stage, inputs, outputs, image_id=None, args=None):
+    manifest = load_manifest(map_name)
+    reasons = rebuild_reasons(manifest["stages"].get(stage), inputs, outputs, image_id, args)
+    if reasons:
+        # Grund merken, `record` übernimmt ihn in den Stufen-Eintrag
+        manifest.setdefault("pending", {})[stage] = reasons
+        save_manifest(map_name, manifest)
+    return reasons
+
+
+def record(map_name, stage, inputs, outputs, image=None, image_id=None, args=None):
+    manifest = load_manifest(map_name)
+    reasons = manifest.get("pending", {}).pop(stage, None) or ["unbekannt (ohne check gebaut)"]
+    now = time.strftime("%Y-%m-%dT%H:%M:%S")
+    entry = {
+        "built_at": now,
+        "reason": reasons,
+        "inputs": [fingerprint(p) for p in inputs],
+        "outputs": [fingerprint(p) for p in outputs],
+    }
+    if image is not None:
+        entry["image"] = image
+    if image_id is not None:
+        entry["image_id"] = image_id
+    if args is not None:
+        entry["args"] = args
+    manifest["stages"][stage] = entry
+    manifest["history"] = ([{"stage": stage, "built_at": now, "reason": reasons}] + manifest.get("history", []))[:HISTORY_LIMIT]
+    if not manifest.get("pending"):
+        manifest.pop("pending", None)
+    save_manifest(map_name, manifest)
+
+
+def refresh(outputs, command):
+    """Befehl ausführen; bei Erfolg nachbearbeitete Ausgaben in den Manifesten nachziehen."""
+    before = {}
+    for path in outputs:
+        if Path(path).exists():
+            fp = fingerprint(path)
+            before[fp["path"]] = fp
+    returncode = subprocess.call(command)
+    if returncode != 0 or not MANIFEST_DIR.is_dir():
+        return returncode
+
+    for manifest_file in sorted(MANIFEST_DIR.glob("*.json")):
+        map_name = manifest_file.stem
+        manifest = load_manifest(map_name)
+        changed = False
+        for stage, entry in manifest["stages"].items():
+            for i, old in enumerate(entry.get("outputs", [])):
+                previous = before.get(old["path"])
+                # Nur Stufen, deren Ausgabe vor der Nachbearbeitung aktuell war
+                if previous is None or not same_file(old, previous) or not Path(old["path"]).exists():
+                    continue
+                entry["outputs"][i] = fingerprint(old["path"])
+                changed = True
+                print(f"   ℹ️  {map_name}/{stage}: Ausgabe nachbearbeitet, Fingerprint aktualisiert ({Path(old['path']).name})")
+        if changed:
+            save_manifest(map_name, manifest)
+    return 0
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Build-Manifest (Merge/Planetiler)")
+    parser.add_argument("command", choices=["check", "record", "refresh"])
+    parser.add_argument("map", nargs="?")
+    parser.add_argument("stage", nargs="?")
+    parser.add_argument("--input", action="append", default=[], dest="inputs")
+    parser.add_argument("--output", action="append", default=[], dest="outputs")
+    parser.add_argument("--image")
+    parser.add_argument("--image-id")
+
+    # Tool-Argumente nach `--` (z.B. --force) nicht von argparse deuten lassen;
+    # ohne `--` werden Argumente nicht verglichen.
+    tool_args = None
+    if "--" in argv:
+        split = argv.index("--")
+        argv, tool_args = argv[:split], argv[split + 1:]
+    args = parser.parse_args(argv)
+    args.args = tool_args
+    if args.command == "refresh":
+        if not args.outputs or not tool_args:
+            parser.error("refresh: --output und Befehl nach `--` erforderlich")
+    elif not (args.map and args.stage):
+        parser.error(f"{args.command}: <map> und <stage> erforderlich")
+    return args
+
+
+def main(argv=None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    args = parse_args(argv)
+
+    if args.command == "refresh":
+        return refresh(args.outputs, args.args)
+
+    if args.command == "check":
+        reasons = check(args.map, args.stage, args.inputs, args.outputs, args.image_id, args.args)
+        if not reasons:
+            print(f"⏭️  {args.map}/{args.stage}: Eingaben unverändert - überspringe.")
+            return 0
+        for reason in reasons:
+            print(f"   ℹ️  {args.map}/{args.stage}: {reason}")
+        return 1
+
+    record(args.map, args.stage, args.inputs, args.outputs, args.image, args.image_id, args.args)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
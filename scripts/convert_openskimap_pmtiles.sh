@@ -27,32 +27,46 @@ if [ ! -f "$INPUT_FILE" ]; then
     exit 1
 fi
 
-# In den Arbeitsordner wechseln für temporäre Dateien
 mkdir -p "$TMP_DIR"
-cd "$TMP_DIR"
 
-# 3. Extraktion der Layer (GeoJSONSeq für Tippecanoe)
-log_info "Extrahiere Layer aus GeoPackage..."
-ogr2ogr -f GeoJSONSeq areas_p.jsonseq "$INPUT_FILE" ski_areas_point
-ogr2ogr -f GeoJSONSeq areas_poly.jsonseq "$INPUT_FILE" ski_areas_multipolygon
-ogr2ogr -f GeoJSONSeq lifts.jsonseq "$INPUT_FILE" lifts_linestring
-ogr2ogr -f GeoJSONSeq runs_poly.jsonseq "$INPUT_FILE" runs_multipolygon
-ogr2ogr -f GeoJSONSeq runs_line.jsonseq "$INPUT_FILE" runs_linestring
+TIPPECANOE_ARGS=(
+  --force
+  --minimum-zoom=0 --maximum-zoom=14
+  --drop-densest-as-needed
+  --extend-zooms-if-still-dropping
+)
+# GPKG-Tabelle=Layername in den PMTiles
+LAYER_ARGS=(
+  --layer ski_areas_point=areas_p
+  --layer ski_areas_multipolygon=areas_poly
+  --layer lifts_linestring=lifts
+  --layer runs_multipolygon=runs_poly
+  --layer runs_linestring=runs_line
+)
+TIPPECANOE_VERSION="$(tippecanoe --version 2>&1 | head -n 1 || true)"
+MANIFEST_ARGS=(
+  --input "$INPUT_FILE"
+  --output "$OUTPUT_PMTILES"
+  --image tippecanoe
+  --image-id "$TIPPECANOE_VERSION"
+)
+export BUILD_MANIFEST_DIR="${BUILD_MANIFEST_DIR:-$BASE_DIR/manifests}"
 
-# 4. Konvertierung mit Tippecanoe
+# 3. Gleiches GeoPackage, gleiche tippecanoe-Version und Argumente -> überspringen
+if python3 "$SCRIPT_DIR/build_manifest.py" check openskimap tippecanoe "${MANIFEST_ARGS[@]}" -- "${LAYER_ARGS[@]}" "${TIPPECANOE_ARGS[@]}"; then
+    log_success "Übersprungen: $(basename "$OUTPUT_PMTILES") ist aktuell."
+    exit 0
+fi
+
+# Reste des früheren ogr2ogr-Exports entfernen
+rm -f "$TMP_DIR"/*.jsonseq
+
+# 4. Layer parallel dekodieren und direkt in tippecanoe streamen (keine Zwischendateien)
 log_info "Erstelle PMTiles: $OUTPUT_PMTILES"
-tippecanoe -o "$OUTPUT_PMTILES" --force \
-  --minimum-zoom=0 --maximum-zoom=14 \
-  --drop-densest-as-needed \
-  --extend-zooms-if-still-dropping \
-  --layer=areas_p areas_p.jsonseq \
-  --layer=areas_poly areas_poly.jsonseq \
-  --layer=lifts lifts.jsonseq \
-  --layer=runs_poly runs_poly.jsonseq \
-  --layer=runs_line runs_line.jsonseq
-
-# 5. Aufräumen
-log_info "Bereinige temporäre JSON-Dateien..."
-rm -f *.jsonseq
+rm -f "$OUTPUT_PMTILES"
+ledger_step "tippecanoe:openskimap" python3 "$SCRIPT_DIR/gpkg_to_tippecanoe.py" "$INPUT_FILE" "$OUTPUT_PMTILES" \
+  "${LAYER_ARGS[@]}" -- "${TIPPECANOE_ARGS[@]}"
+
+python3 "$SCRIPT_DIR/build_manifest.py" record openskimap tippecanoe "${MANIFEST_ARGS[@]}" -- "${LAYER_ARGS[@]}" "${TIPPECANOE_ARGS[@]}"
 
 log_success "OpenSkimap PMTiles erfolgreich erstellt."
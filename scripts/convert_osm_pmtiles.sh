@@ -11,7 +11,7 @@ MERGE_DIR="${OSM_BUILD_DIR:-/srv/build/osm}/merged"
 TILESET_ID="${TILESET_ID:-osm}"
 # BUILD_BASE wird durch OSM_BUILD_DIR ersetzt/abgedeckt
 BUILD_TMP="${OSM_BUILD_DIR:-/srv/build/osm}/tmp"
-STATS_DIR="${INSTALL_DIR:-/srv/scripts}/stats"
+export STATS_DIR="${INSTALL_DIR:-/srv/scripts}/stats"
 
 DOCKER_IMAGE="ghcr.io/onthegomap/planetiler:latest"
 USE_SUDO="${USE_SUDO:-0}"
@@ -29,9 +29,12 @@ DOCKER_CMD="$DOCKER_BIN"
 
 mkdir -p "$BUILD_TMP" "$STATS_DIR"
 
+# Optional: nur eine Karte (z.B. `convert_osm_pmtiles.sh at`, genutzt von pipeline.py)
+MAP_FILTER="${1:-*}"
+
 # --- HAUPTSCHLEIFE ---
 FOUND_ANY=0
-for pbf_file in "$MERGE_DIR"/*.osm.pbf; do
+for pbf_file in "$MERGE_DIR"/$MAP_FILTER.osm.pbf; do
     [ -e "$pbf_file" ] || continue
     FOUND_ANY=1
     
@@ -44,32 +47,77 @@ for pbf_file in "$MERGE_DIR"/*.osm.pbf; do
     log_info "Input:  $(basename "$pbf_file")"
     log_info "Output: $PMTILES_NAME"
     log_info "Log:    $LOG_FILE"
-    
+
+    # Image-Digest für Metriken-Historie und Build-Manifest (planetiler:latest ändert sich unter uns)
+    export PLANETILER_IMAGE="$DOCKER_IMAGE"
+    export PLANETILER_IMAGE_ID="$($DOCKER_CMD image inspect --format '{{.Id}}' "$DOCKER_IMAGE" 2>/dev/null || true)"
+
+    PLANETILER_ARGS=(
+      --osm-path="/in/$(basename "$pbf_file")"
+      --output="/out/$PMTILES_NAME"
+      --force
+      --download=true
+    )
+    MANIFEST_ARGS=(
+      --input "$pbf_file"
+      --output "$BUILD_TMP/$PMTILES_NAME"
+      --output "$INFO_JSON"
+      --image "$DOCKER_IMAGE"
+      --image-id "$PLANETILER_IMAGE_ID"
+    )
+
+    # Gleiche Eingabe, gleiches Image, gleiche Argumente -> Planetiler überspringen
+    if python3 "$SCRIPT_DIR/build_manifest.py" check "$MAP_NAME" convert "${MANIFEST_ARGS[@]}" -- "${PLANETILER_ARGS[@]}"; then
+        log_success "Übersprungen: $PMTILES_NAME ist aktuell."
+        echo ""
+        continue
+    fi
+
+    # Heap, Threads, Node-Map und Storage passend zu PBF-Größe und Host wählen.
+    # Passt der Build nicht (RAM/Scratch), brechen wir vor dem Docker-Start ab.
+    # Die Sizing-Argumente gehen bewusst nicht ins Manifest (ändern das Ergebnis nicht).
+    if ! SIZING="$(python3 "$SCRIPT_DIR/planetiler_sizing.py" \
+            --map "$MAP_NAME" \
+            --pbf "$pbf_file" \
+            --scratch-dir "$BUILD_TMP/planetiler_tmp" \
+            --container-tmpdir /out/planetiler_tmp \
+            --shell)"; then
+        log_error "Build für $MAP_NAME passt nicht auf diesen Host (Details: $STATS_DIR/sizing_${MAP_NAME}.json)."
+        exit 1
+    fi
+    eval "$SIZING"
+    log_info "Sizing: $PLANETILER_SIZING_SUMMARY"
+
     # Logfile leeren
     > "$LOG_FILE"
-    
+
+    # Neue Datei statt In-Place-Überschreiben (Release kann per Hardlink darauf zeigen)
+    rm -f "$BUILD_TMP/$PMTILES_NAME"
+
     # 1. Planetiler starten (Hintergrund)
     $DOCKER_CMD run --rm \
+      -e JAVA_TOOL_OPTIONS="-Xmx$PLANETILER_HEAP" \
       -v "$MERGE_DIR":/in:ro \
       -v "$BUILD_TMP":/out \
       "$DOCKER_IMAGE" \
-      --osm-path="/in/$(basename "$pbf_file")" \
-      --output="/out/$PMTILES_NAME" \
-      --force \
-      --download=true \
+      "${PLANETILER_ARGS[@]}" \
+      "${PLANETILER_SIZING_ARGS[@]}" \
       > "$LOG_FILE" 2>&1 &
       
     PID=$!
     
     # 2. Progress anzeigen
     if [ -f "$SCRIPT_DIR/planetiler_follow.py" ]; then
-        # Python Skript übernimmt die "Live"-Anzeige
-        python3 -u "$SCRIPT_DIR/planetiler_follow.py" "$LOG_FILE" "$PID"
+        # Python Skript übernimmt die "Live"-Anzeige; sein Exit-Code sagt
+        # nichts über Planetiler aus (Anzeige darf den Build nicht kippen)
+        python3 -u "$SCRIPT_DIR/planetiler_follow.py" "$LOG_FILE" "$PID" || log_warn "Fortschrittsanzeige abgebrochen."
     else
         log_info "Warte auf Docker Prozess (PID $PID)..."
-        wait $PID
     fi
-    EXIT_CODE=$?
+    # Exit-Code des Containers: nur ein erfolgreicher Lauf darf ins Manifest,
+    # sonst gälte ein abgebrochenes Teil-Archiv beim nächsten Lauf als aktuell
+    EXIT_CODE=0
+    wait "$PID" || EXIT_CODE=$?
     
     # 3. Ergebnis prüfen
     if [ $EXIT_CODE -eq 0 ] && [ -f "$BUILD_TMP/$PMTILES_NAME" ]; then
@@ -87,6 +135,7 @@ for pbf_file in "$MERGE_DIR"/*.osm.pbf; do
   "attribution": "© OpenMapTiles © OpenStreetMap contributors"
 }
 EOF
+        python3 "$SCRIPT_DIR/build_manifest.py" record "$MAP_NAME" convert "${MANIFEST_ARGS[@]}" -- "${PLANETILER_ARGS[@]}"
         log_success "Fertig! Datei: $PMTILES_NAME ($SIZE_H)"
     else
         log_error "Konvertierung fehlgeschlagen (Exit Code: $EXIT_CODE). Details siehe Log."
@@ -21,103 +21,49 @@ BASEMAP_SRC="$(realpath -m "${BASEMAP_BUILD_DIR:-/srv/build/basemap-at}/tmp")"
 
 log_info "Deployment Ziel: $TILES_DIR"
 
-copy_if_newer() {
-    local src="$1"
-    local dst="$2"
-    local label="$3"
-
-    if [ ! -f "$src" ]; then
-        return
-    fi
-
-    if [ -f "$dst" ]; then
-        local src_mtime dst_mtime
-        src_mtime=$(stat -c %Y "$src")
-        dst_mtime=$(stat -c %Y "$dst")
-
-        if [ "$src_mtime" -le "$dst_mtime" ]; then
-            echo "   ⏭️  $label unverändert: $(basename "$src")"
-            return
-        fi
-    fi
-
-    mkdir -p "$(dirname "$dst")"
-    cp -f "$src" "$dst"
-    chmod 644 "$dst"
-    echo "   📦 $label aktualisiert: $(basename "$src")"
-}
-
+# Versioniertes Release statt In-Place-Kopie: neue Dateien werden per
+# reflink/hardlink/copy_file_range gestaged, geprüft und per Symlink-Flip
+# atomar aktiviert. Rollback: pmtiles_release.py rollback <tileset>
+RELEASE_SCRIPT="$SCRIPT_DIR/pmtiles_release.py"
+export TILES_DIR
 
 # --- FUNKTION: Deploy Tileset ---
 deploy_tileset() {
-    local src_dir="$1"
-    local tileset_name="$2"  # z.B. "osm"
+    local tileset_name="$1"  # z.B. "osm"
+    shift
 
-    local pmtiles_dest="$TILES_DIR/$tileset_name/pmtiles"
-    local tilejson_dest="$TILES_DIR/$tileset_name/tilejson"
+    local src_args=()
+    local src
+    for src in "$@"; do
+        [ -e "$src" ] && src_args+=(--src "$src")
+    done
 
-    if [ ! -d "$src_dir" ]; then 
-        log_warn "Quellverzeichnis nicht gefunden: $src_dir"
+    if [ ${#src_args[@]} -eq 0 ]; then
+        log_warn "Keine Quellen für $tileset_name gefunden: $*"
         return
     fi
 
-    # A) PMTiles kopieren
-    shopt -s nullglob
-    local pmtiles_files=("$src_dir"/*.pmtiles)
-    shopt -u nullglob
-
-    if [ ${#pmtiles_files[@]} -gt 0 ]; then
-        log_info "📂 Verarbeite Tileset: $tileset_name"
-        mkdir -p "$pmtiles_dest"
-
-        for file in "${pmtiles_files[@]}"; do
-            target="$pmtiles_dest/$(basename "$file")"
-
-            copy_if_newer "$file" "$target" "PMTiles"
-        done
-
-        # B) Metadaten (JSON) kopieren (z.B. at.json von Planetiler)
-        shopt -s nullglob
-        local json_files=("$src_dir"/*.json)
-        shopt -u nullglob
-        
-        if [ ${#json_files[@]} -gt 0 ]; then
-            mkdir -p "$tilejson_dest"
-            for jfile in "${json_files[@]}"; do
-                copy_if_newer "$jfile" "$tilejson_dest/$(basename "$jfile")" "Info"
-            done
-        fi
+    log_info "📂 Verarbeite Tileset: $tileset_name"
+    if ! ledger_step "release:$tileset_name" python3 "$RELEASE_SCRIPT" publish "$tileset_name" "${src_args[@]}"; then
+        log_error "Release für $tileset_name fehlgeschlagen - vorheriges Release bleibt aktiv."
+        DEPLOY_FAILED=1
     fi
 }
 
 # --- HAUPTABLAUF ---
+DEPLOY_FAILED=0
 
 # 1. OSM & Basemap (Standard-Struktur)
-deploy_tileset "$OSM_SRC" "osm"
-deploy_tileset "$BASEMAP_SRC" "basemap-at"
-
-# 2. OVERLAYS (Manuelle Pfade, da Dateien direkt im BUILD_DIR liegen)
-log_info "📂 Verarbeite Overlays..."
-mkdir -p "$TILES_DIR/overlays/pmtiles"
-mkdir -p "$TILES_DIR/overlays/tilejson"
+deploy_tileset "osm" "$OSM_SRC"
+deploy_tileset "basemap-at" "$BASEMAP_SRC"
 
-# Contours
+# 2. OVERLAYS (Dateien liegen direkt in den jeweiligen Build-Verzeichnissen)
 CONTOURS_TMP="${CONTOURS_BUILD_DIR:-/srv/build/overlays/contours}/tmp"
-if [ -f "$CONTOURS_TMP/basemap-at-contours.pmtiles" ]; then
-    copy_if_newer "$CONTOURS_TMP/basemap-at-contours.pmtiles" "$TILES_DIR/overlays/pmtiles/basemap-at-contours.pmtiles" "PMTiles"
-
-    # Metadaten-JSON für Contours (falls generiert)
-    CONTOURS_JSON="$CONTOURS_TMP/basemap-at-contours.json"
-    if [ -f "$CONTOURS_JSON" ]; then
-        copy_if_newer "$CONTOURS_JSON" "$TILES_DIR/overlays/tilejson/basemap-at-contours.json" "Info"
-    fi
-fi
-
-# OpenSkimap
 SKIMAP_TMP="${SKIMAP_BUILD_DIR:-/srv/build/overlays/openskimap}/tmp"
-if [ -f "$SKIMAP_TMP/openskimap.pmtiles" ]; then
-    copy_if_newer "$SKIMAP_TMP/openskimap.pmtiles" "$TILES_DIR/overlays/pmtiles/openskimap.pmtiles" "PMTiles"
-fi
+deploy_tileset "overlays" \
+    "$CONTOURS_TMP/basemap-at-contours.pmtiles" \
+    "$CONTOURS_TMP/basemap-at-contours.json" \
+    "$SKIMAP_TMP/openskimap.pmtiles"
 
 # 3. Abschluss: Inventar & Info-Generation
 INFO_SCRIPT="$SCRIPT_DIR/generate_endpoints_info.sh"
@@ -128,4 +74,8 @@ if [ -f "$INFO_SCRIPT" ]; then
 fi
 
 echo ""
+if [ "$DEPLOY_FAILED" -ne 0 ]; then
+    log_error "Deployment (Phase 4) mit Fehlern beendet."
+    exit 1
+fi
 log_success "Deployment (Phase 4) abgeschlossen."
@@ -0,0 +1,492 @@
+#!/usr/bin/env python3
+"""
+Nebenläufige Download-Engine für die OSM-Quellen (ersetzt die serielle
+aria2c-Schleife in download_osm.sh).
+
+- Dedupliziert URLs über alle conf/sources/*.txt (austria-latest wird nur
+  einmal geprüft, auch wenn es in at.txt und at-plus.txt steht)
+- Lädt verschiedene Quellen parallel mit globalem Verbindungsbudget
+- Conditional GET (ETag / Last-Modified), Resume per HTTP Range
+- MD5 wird beim Streamen berechnet (kein zweiter Lesedurchgang)
+- Prüft neue Dateien mit pbf_validate.py (Ergebnis im Validierungs-Cache)
+- Schreibt wie bisher <map>.list und .<datei>.source-url
+
+Nur stdlib (asyncio Streams), funktioniert mit http:// und https://,
+daher auch gegen einen lokalen Test-Server nutzbar.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import ssl
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from email.utils import formatdate
+from pathlib import Path
+from urllib.parse import urljoin, urlsplit
+
+import pbf_validate
+
+INSTALL_DIR = os.environ.get("INSTALL_DIR", "/srv/scripts")
+OSM_BUILD_DIR = os.environ.get("OSM_BUILD_DIR", "/srv/build/osm")
+SOURCES_DIR = Path(os.environ.get("SOURCES_DIR", f"{INSTALL_DIR}/sources"))
+DOWNLOAD_DIR = Path(os.environ.get("DOWNLOAD_BASE_DIR", f"{OSM_BUILD_DIR}/src"))
+
+MAX_CONNECTIONS = int(os.environ.get("DOWNLOAD_MAX_CONNECTIONS", "4"))
+IDLE_TIMEOUT = float(os.environ.get("DOWNLOAD_IDLE_TIMEOUT", "60"))
+ATTEMPTS = 2
+CHUNK_SIZE = 1 << 20
+MAX_REDIRECTS = 10
+USER_AGENT = "geodata-updater/1.0"
+
+
+def log_info(msg):
+    print(f"   ℹ️  {msg}", flush=True)
+
+def log_success(msg):
+    print(f"   ✅ {msg}", flush=True)
+
+def log_warn(msg):
+    print(f"   ⚠️  {msg}", flush=True)
+
+def log_error(msg):
+    print(f"   ❌ {msg}", file=sys.stderr, flush=True)
+
+
+class DownloadError(Exception):
+    pass
+
+
+def parse_sources(sources_dir):
+    """
+    Rückgabe: {map_name: [url, ...]} in Dateireihenfolge.
+    Leere Zeilen und Kommentare (#) werden ignoriert.
+    """
+    maps = {}
+    for source_file in sorted(Path(sources_dir).glob("*.txt")):
+        urls = []
+        for line in source_file.read_text(encoding="utf-8").splitlines():
+            line = line.strip()
+            if line and not line.startswith("#"):
+                urls.append(line)
+        maps[source_file.stem] = urls
+    return maps
+
+
+def unique_urls(maps):
+    seen = {}
+    for urls in maps.values():
+        for url in urls:
+            seen.setdefault(url, None)
+    return list(seen)
+
+
+def filename_for(url):
+    return os.path.basename(urlsplit(url).path)
+
+
+# --- HTTP (asyncio Streams) ---
+
+class Response:
+    def __init__(self, status, headers, reader, writer, url):
+        self.status = status
+        self.headers = headers
+        self.reader = reader
+        self.writer = writer
+        self.url = url
+
+    async def iter_body(self):
+        reader = self.reader
+        if self.headers.get("transfer-encoding", "").lower() == "chunked":
+            while True:
+                size_line = await asyncio.wait_for(reader.readline(), IDLE_TIMEOUT)
+                size = int(size_line.split(b";")[0].strip() or b"0", 16)
+                if size == 0:
+                    await reader.readline()
+                    return
+                yield await asyncio.wait_for(reader.readexactly(size), IDLE_TIMEOUT)
+                await reader.readline()
+        elif "content-length" in self.headers:
+            remaining = int(self.headers["content-length"])
+            while remaining > 0:
+                chunk = await asyncio.wait_for(reader.read(min(CHUNK_SIZE, remaining)), IDLE_TIMEOUT)
+                if not chunk:
+                    raise DownloadError(f"Verbindung abgebrochen ({remaining} Bytes fehlen)")
+                remaining -= len(chunk)
+                yield chunk
+        else:
+            while True:
+                chunk = await asyncio.wait_for(reader.read(CHUNK_SIZE), IDLE_TIMEOUT)
+                if not chunk:
+                    return
+                yield chunk
+
+    async def read(self):
+        return b"".join([chunk async for chunk in self.iter_body()])
+
+    def close(self):
+        self.writer.close()
+
+
+async def _request_once(method, url, headers):
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https"):
+        raise DownloadError(f"Nicht unterstütztes Schema: {url}")
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    ssl_ctx = ssl.create_default_context() if parts.scheme == "https" else None
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_connection(parts.hostname, port, ssl=ssl_ctx, limit=CHUNK_SIZE), IDLE_TIMEOUT
+    )
+
+    path = parts.path or "/"
+    if parts.query:
+        path += f"?{parts.query}"
+    host = parts.hostname if parts.port is None else f"{parts.hostname}:{parts.port}"
+    lines = [f"{method} {path} HTTP/1.1", f"Host: {host}", f"User-Agent: {USER_AGENT}", "Connection: close"]
+    lines += [f"{k}: {v}" for k, v in headers.items()]
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+    await writer.drain()
+
+    status_line = await asyncio.wait_for(reader.readline(), IDLE_TIMEOUT)
+    try:
+        status = int(status_line.split()[1])
+    except (IndexError, ValueError):
+        writer.close()
+        raise DownloadError(f"Ungültige HTTP-Antwort von {url}: {status_line[:80]!r}")
+
+    resp_headers = {}
+    while True:
+        line = await asyncio.wait_for(reader.readline(), IDLE_TIMEOUT)
+        if line in (b"\r\n", b"\n", b""):
+            break
+        key, _, value = line.decode("latin-1").partition(":")
+        resp_headers[key.strip().lower()] = value.strip()
+    return Response(status, resp_headers, reader, writer, url)
+
+
+async def http_request(method, url, headers=None):
+    """Folgt Redirects; Response.url ist die finale URL."""
+    headers = headers or {}
+    for _ in range(MAX_REDIRECTS):
+        resp = await _request_once(method, url, headers)
+        if resp.status in (301, 302, 303, 307, 308) and "location" in resp.headers:
+            resp.close()
+            url = urljoin(url, resp.headers["location"])
+            continue
+        return resp
+    raise DownloadError(f"Zu viele Redirects: {url}")
+
+
+# --- DOWNLOAD ---
+
+class FileSink:
+    """Schreibt Chunks und aktualisiert dabei den MD5 (läuft in Threads)."""
+
+    def __init__(self, path, append):
+        self.md5 = hashlib.md5()
+        if append:
+            # Resume: vorhandenen Anfang einmalig hashen
+            with open(path, "rb") as f:
+                while True:
+                    block = f.read(CHUNK_SIZE)
+                    if not block:
+                        break
+                    self.md5.update(block)
+        self.fh = open(path, "ab" if append else "wb")
+
+    def write(self, chunk):
+        self.fh.write(chunk)
+        self.md5.update(chunk)
+
+    def close(self):
+        self.fh.close()
+
+
+class Downloader:
+    def __init__(self, dest_dir, max_connections=MAX_CONNECTIONS, validator=None):
+        self.dest_dir = Path(dest_dir)
+        self.budget = asyncio.Semaphore(max_connections)
+        self.validator = validator
+
+    def _paths(self, url):
+        name = filename_for(url)
+        return (
+            self.dest_dir / name,
+            self.dest_dir / f"{name}.part",
+            self.dest_dir / f".{name}.source-url",
+            self.dest_dir / f".{name}.download.json",
+        )
+
+    @staticmethod
+    def _load_state(path):
+        try:
+            return json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+
+    async def expected_md5(self, final_url):
+        """Liest <url>.md5 (Geofabrik); None wenn nicht vorhanden/unbrauchbar."""
+        try:
+            async with self.budget:
+                resp = await http_request("GET", f"{final_url}.md5")
+                try:
+                    if resp.status != 200:
+                        return None
+                    body = await resp.read()
+                finally:
+                    resp.close()
+        except (OSError, asyncio.TimeoutError, DownloadError):
+            return None
+        token = body.decode("ascii", errors="ignore").split()
+        if token and len(token[0]) == 32 and all(c in "0123456789abcdef" for c in token[0].lower()):
+            return token[0].lower()
+        return None
+
+    async def fetch(self, url):
+        """Lädt eine Quelle (mit Wiederholung). Rückgabe: Ergebnis-Dict."""
+        last_error = None
+        for attempt in range(1, ATTEMPTS + 1):
+            try:
+                return await self._fetch_once(url, fresh=attempt > 1)
+            except (OSError, asyncio.TimeoutError, DownloadError) as e:
+                last_error = e
+                log_error(f"{filename_for(url)}: {e}")
+                if attempt < ATTEMPTS:
+                    log_warn(f"Neuer Versuch mit Full-Redownload: {filename_for(url)}")
+        raise DownloadError(f"Datei konnte nicht zuverlässig geladen werden: {filename_for(url)} ({last_error})")
+
+    async def _fetch_once(self, url, fresh=False):
+        full_path, part_path, meta_path, state_path = self._paths(url)
+        state = {} if fresh else self._load_state(state_path)
+        if fresh:
+            part_path.unlink(missing_ok=True)
+
+        if not state and not fresh and full_path.exists():
+            # Bestand aus der alten aria2c-Schleife: Datei-mtime + .source-url übernehmen
+            state = {
+                "final_url": meta_path.read_text(encoding="utf-8").strip() if meta_path.exists() else None,
+                "last_modified": formatdate(full_path.stat().st_mtime, usegmt=True),
+                "complete": True,
+            }
+
+        headers = {}
+        have_file = not fresh and full_path.exists() and state.get("complete")
+        resume_from = part_path.stat().st_size if part_path.exists() and state.get("partial_validator") else 0
+        if have_file:
+            if state.get("etag"):
+                headers["If-None-Match"] = state["etag"]
+            if state.get("last_modified"):
+                headers["If-Modified-Since"] = state["last_modified"]
+        elif resume_from:
+            headers["Range"] = f"bytes={resume_from}-"
+            headers["If-Range"] = state["partial_validator"]
+
+        async with self.budget:
+            resp = await http_request("GET", url, headers)
+            try:
+                final_url = resp.url
+                if have_file and final_url != state.get("final_url"):
+                    if resp.status == 304:
+                        # Versionswechsel (Redirect-Ziel anders) -> ohne Bedingungen neu anfragen
+                        resp.close()
+                        log_warn(f"Remote-Version geändert: {filename_for(url)} -> {final_url}")
+                        resp = await http_request("GET", url)
+                        final_url = resp.url
+
+                if resp.status == 304:
+                    log_info(f"Unverändert: {full_path.name}")
+                    if not state_path.exists():
+                        meta_path.write_text(final_url + "\n", encoding="utf-8")
+                        self._write_state(state_path, state)
+                    return {"url": url, "path": full_path, "status": "unchanged", "final_url": final_url}
+
+                if resp.status == 206 and resume_from:
+                    append = True
+                    log_info(f"Setze Download fort ab {resume_from / 1e6:.0f} MB: {full_path.name}")
+                elif resp.status == 200:
+                    append = False
+                    log_info(f"Starte Download: {full_path.name}")
+                else:
+                    raise DownloadError(f"HTTP {resp.status} für {url}")
+
+                etag = resp.headers.get("etag")
+                last_modified = resp.headers.get("last-modified")
+                # Validator für einen späteren Resume merken (falls wir abbrechen)
+                state.update({
+                    "final_url": final_url,
+                    "partial_validator": etag or last_modified,
+                    "complete": False,
+                })
+                self._write_state(state_path, state)
+
+                started = time.monotonic()
+                sink = await asyncio.to_thread(FileSink, part_path, append)
+                try:
+                    async for chunk in resp.iter_body():
+                        await asyncio.to_thread(sink.write, chunk)
+                finally:
+                    await asyncio.to_thread(sink.close)
+            finally:
+                resp.close()
+
+        actual_md5 = sink.md5.hexdigest()
+        expected = await self.expected_md5(final_url)
+        if expected is None:
+            log_info(f"Keine verwertbare MD5 für {full_path.name} - überspringe MD5-Check.")
+        elif expected != actual_md5:
+            part_path.unlink(missing_ok=True)
+            raise DownloadError(f"MD5 mismatch für {full_path.name}: erwartet {expected}, bekommen {actual_md5}")
+
+        validation = None
+        if self.validator is not None:
+            ok, validation = await self.validator.check(part_path, actual_md5)
+            if not ok:
+                part_path.unlink(missing_ok=True)
+                raise DownloadError(f"Integritätscheck fehlgeschlagen: {full_path.name}")
+
+        os.replace(part_path, full_path)
+        if validation is not None:
+            # rename erhält Größe + mtime -> run_merge.sh findet den Eintrag
+            self.validator.cache.record(full_path, validation)
+        size = full_path.stat().st_size
+        meta_path.write_text(final_url + "\n", encoding="utf-8")
+        self._write_state(state_path, {
+            "final_url": final_url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "size": size,
+            "md5": actual_md5,
+            "complete": True,
+        })
+        elapsed = max(time.monotonic() - started, 1e-6)
+        log_success(f"Geladen: {full_path.name} ({size / 1e6:.1f} MB, {size / 1e6 / elapsed:.1f} MB/s)")
+        return {"url": url, "path": full_path, "status": "downloaded", "final_url": final_url, "md5": actual_md5}
+
+    @staticmethod
+    def _write_state(path, state):
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(json.dumps(state, indent=2), encoding="utf-8")
+        tmp.replace(path)
+
+
+async def osmium_validator(path):
+    """Fallback: Header + kompletter Stream (findet späte Dekompressionsfehler)."""
+    if not shutil.which("osmium"):
+        log_warn(f"osmium nicht verfügbar - überspringe Integritätsprüfung für {Path(path).name.removesuffix('.part')}.")
+        return True
+    for args in (["fileinfo", str(path)], ["cat", "-f", "opl", str(path)]):
+        proc = await asyncio.create_subprocess_exec(
+            "osmium", *args, "-F", "pbf", stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL
+        )
+        if await proc.wait() != 0:
+            return False
+    return True
+
+
+class PbfValidator:
+    """pbf_validate im gemeinsamen Worker-Pool; osmium nur für nicht prüfbare Dateien."""
+
+    def __init__(self, workers=pbf_validate.WORKERS):
+        self.cache = pbf_validate.ValidationCache()
+        self.executor = ProcessPoolExecutor(max_workers=max(1, workers))
+
+    async def check(self, path, md5=None):
+        """Rückgabe: (ok, result) - result nur, wenn es in den Cache darf."""
+        result = await asyncio.to_thread(pbf_validate.validate_pbf, path, self.executor, md5=md5)
+        name = Path(path).name.removesuffix(".part")
+        if result["valid"] is None:
+            log_warn(f"{name}: {result['error']} - nutze osmium.")
+            return await osmium_validator(path), None
+        if not result["valid"]:
+            log_error(f"Defekte OSM PBF: {name} ({result['error']})")
+            return False, None
+        return True, result
+
+    def close(self):
+        self.executor.shutdown()
+        self.cache.save()
+
+
+def check_filename_conflicts(urls):
+    by_name = {}
+    for url in urls:
+        by_name.setdefault(filename_for(url), []).append(url)
+    return {name: found for name, found in by_name.items() if len(found) > 1}
+
+
+def write_lists(maps, results, dest_dir):
+    for map_name, urls in maps.items():
+        list_file = Path(dest_dir) / f"{map_name}.list"
+        if not urls:
+            log_warn(f"Keine URLs für Karte {map_name} gefunden.")
+            list_file.write_text("", encoding="utf-8")
+            continue
+        paths = [str(results[url]["path"]) for url in urls]
+        list_file.write_text("\n".join(paths) + "\n", encoding="utf-8")
+        log_success(f"Liste erstellt: {list_file.name} ({len(paths)} Dateien).")
+
+
+async def run(maps, dest_dir, max_connections=MAX_CONNECTIONS, validate=True):
+    urls = unique_urls(maps)
+    conflicts = check_filename_conflicts(urls)
+    if conflicts:
+        for name, found in conflicts.items():
+            log_error(f"Dateiname {name} wird von mehreren URLs genutzt: {found}")
+        return False
+
+    total = sum(len(u) for u in maps.values())
+    log_info(f"{len(maps)} Karten, {total} Einträge -> {len(urls)} eindeutige Quellen (max. {max_connections} Verbindungen)")
+
+    dest_dir = Path(dest_dir).resolve()
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    validator = PbfValidator() if validate else None
+    downloader = Downloader(dest_dir, max_connections, validator)
+    try:
+        outcomes = await asyncio.gather(*(downloader.fetch(url) for url in urls), return_exceptions=True)
+    finally:
+        if validator is not None:
+            validator.close()
+
+    results = {}
+    failed = False
+    for url, outcome in zip(urls, outcomes):
+        if isinstance(outcome, Exception):
+            log_error(str(outcome))
+            failed = True
+        else:
+            results[url] = outcome
+    if failed:
+        return False
+
+    write_lists(maps, results, dest_dir)
+    changed = sum(1 for r in results.values() if r["status"] != "unchanged")
+    log_success(f"Download abgeschlossen. {len(results)} Dateien bereit ({changed} neu geladen).")
+    return True
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="OSM Download-Engine")
+    parser.add_argument("--sources-dir", default=str(SOURCES_DIR))
+    parser.add_argument("--dest-dir", default=str(DOWNLOAD_DIR))
+    parser.add_argument("--max-connections", type=int, default=MAX_CONNECTIONS)
+    parser.add_argument("--no-validate", action="store_true", help="Keine PBF-Integritätsprüfung")
+    args = parser.parse_args(argv)
+
+    if not Path(args.sources_dir).is_dir():
+        log_error(f"Quellen-Verzeichnis nicht gefunden: {args.sources_dir}")
+        return 1
+
+    maps = parse_sources(args.sources_dir)
+    if not maps:
+        log_warn(f"Keine Karten-Definitionen in {args.sources_dir}.")
+        return 0
+
+    ok = asyncio.run(run(maps, args.dest_dir, max(1, args.max_connections), not args.no_validate))
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
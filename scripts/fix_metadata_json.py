@@ -4,39 +4,119 @@ import json
 import re
 from pathlib import Path
 
+CHUNK_SIZE = 1 << 20
+
+# Sauberer String-Abschnitt: normale Zeichen und gültige Escape-Paare (unrolled loop).
+# Er endet vor dem String-Ende, einem Steuerzeichen oder einem ungültigen Backslash.
+CLEAN_RUN = re.compile(r'[^"\\\x00-\x1f]*(?:\\["\\/bfnrtu][^"\\\x00-\x1f]*)*')
+VALID_ESCAPES = frozenset('"\\/bfnrtu')
+CONTROL_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t"}
+
+
+class JsonRepairer:
+    """
+    Chunk-weiser Reparierer für kaputte JSON-Strings (rohe Zeilenumbrüche,
+    ungültige Backslashes). Außerhalb von String-Literalen und zwischen
+    Sonderzeichen werden saubere Abschnitte am Stück kopiert. Der Zustand
+    (in String / offener Backslash) überlebt Chunk-Grenzen.
+    """
+
+    def __init__(self):
+        self.in_str = False
+        self.pending_backslash = False
+
+    def feed(self, chunk: str) -> str:
+        out = []
+        pos = 0
+        end = len(chunk)
+
+        if self.pending_backslash and end:
+            self.pending_backslash = False
+            if chunk[0] in VALID_ESCAPES:
+                out.append("\\" + chunk[0])
+                pos = 1
+            else:
+                out.append("\\\\")
+
+        while pos < end:
+            if not self.in_str:
+                quote = chunk.find('"', pos)
+                if quote < 0:
+                    out.append(chunk[pos:])
+                    break
+                out.append(chunk[pos:quote + 1])
+                pos = quote + 1
+                self.in_str = True
+                continue
+
+            idx = CLEAN_RUN.match(chunk, pos).end()
+            out.append(chunk[pos:idx])
+            if idx >= end:
+                break
+            char = chunk[idx]
 
-def fix_json(value: str) -> str:
-    value = re.sub(r"\\(?![\"\\/bfnrtu])", r"\\\\", value)
-    out = []
-    in_str = False
-    esc = False
-    for char in value:
-        if not in_str:
             if char == '"':
-                in_str = True
-            out.append(char)
-            continue
-        if esc:
-            out.append(char)
-            esc = False
-            continue
-        if char == "\\":
-            out.append(char)
-            esc = True
-            continue
-        if char == '"':
-            out.append(char)
-            in_str = False
-            continue
-        if char == "\n":
-            out.append("\\n")
-        elif char == "\r":
-            out.append("\\r")
-        elif char == "\t":
-            out.append("\\t")
-        else:
-            out.append(char)
-    return "".join(out)
+                out.append('"')
+                self.in_str = False
+                pos = idx + 1
+            elif char == "\\":
+                if idx + 1 >= end:
+                    self.pending_backslash = True
+                    pos = end
+                elif chunk[idx + 1] in VALID_ESCAPES:
+                    out.append(chunk[idx:idx + 2])
+                    pos = idx + 2
+                else:
+                    out.append("\\\\")
+                    pos = idx + 1
+            else:
+                out.append(CONTROL_ESCAPES.get(char) or f"\\u{ord(char):04x}")
+                pos = idx + 1
+
+        return "".join(out)
+
+    def finish(self) -> str:
+        if self.pending_backslash:
+            self.pending_backslash = False
+            return "\\\\"
+        return ""
+
+
+def fix_json(value: str) -> str:
+    repairer = JsonRepairer()
+    return repairer.feed(value) + repairer.finish()
+
+
+def repair_file(src: Path, dst: Path, chunk_size: int = CHUNK_SIZE) -> None:
+    """Repariert src nach dst mit konstantem Speicherbedarf (pro Chunk)."""
+    repairer = JsonRepairer()
+    with open(src, "r", encoding="utf-8", errors="replace") as fin, open(dst, "w", encoding="utf-8") as fout:
+        while True:
+            chunk = fin.read(chunk_size)
+            if not chunk:
+                break
+            fout.write(repairer.feed(chunk))
+        fout.write(repairer.finish())
+
+
+def load_metadata(src: Path, scratch: Path):
+    """
+    Fast-Path: direkt parsen. Nur wenn das scheitert, wird chunkweise
+    nach `scratch` repariert und erneut geparst.
+    Rückgabe: (obj, repaired)
+    """
+    try:
+        with open(src, "r", encoding="utf-8", errors="replace") as f:
+            return json.load(f), False
+    except ValueError:
+        pass
+
+    try:
+        repair_file(src, scratch)
+        with open(scratch, "r", encoding="utf-8") as f:
+            return json.load(f), True
+    finally:
+        scratch.unlink(missing_ok=True)
 
 
 def main() -> None:
@@ -49,10 +129,13 @@ def main() -> None:
     dst = Path(args.output)
 
     try:
-        raw = src.read_text(encoding="utf-8", errors="replace")
-        obj = json.loads(fix_json(raw))
-        dst.write_text(json.dumps(obj, ensure_ascii=False, indent=2), encoding="utf-8")
-        print("✅ metadata.json repariert")
+        obj, repaired = load_metadata(src, dst.with_name(dst.name + ".repair.tmp"))
+        with open(dst, "w", encoding="utf-8") as f:
+            json.dump(obj, f, ensure_ascii=False, indent=2)
+        if repaired:
+            print("✅ metadata.json repariert")
+        else:
+            print("✅ metadata.json gültig (keine Reparatur nötig)")
     except Exception as exc:
         dst.write_text(
             json.dumps({"warning": "parse failed", "error": str(exc)}, indent=2),
@@ -4,6 +4,8 @@ import os
 import datetime
 from pathlib import Path
 
+from inventory_scan import write_json_if_changed
+
 # --- KONFIGURATION ---
 # Input Pfade (Inventare)
 INFO_DIR = Path("/srv/info")
@@ -145,10 +147,11 @@ def main():
     }
 
     # 4. Speichern
-    OUTPUT_FILE.parent.mkdir(parents=True, exist_ok=True)
     try:
-        OUTPUT_FILE.write_text(json.dumps(master_data, indent=2), encoding="utf-8")
-        print(f"✅ MASTER JSON erstellt: {OUTPUT_FILE}")
+        if write_json_if_changed(OUTPUT_FILE, master_data):
+            print(f"✅ MASTER JSON erstellt: {OUTPUT_FILE}")
+        else:
+            print(f"⏭️  MASTER JSON unverändert: {OUTPUT_FILE}")
         print(f"   - Datasets: {len(master_data['datasets'])}")
         print(f"   - Sprites:  {len(master_data['sprites'])} Sets")
         print(f"   - Fonts:    {len(processed_fonts.get('families', []))} Familien (Details in {processed_fonts['inventory_file']})")
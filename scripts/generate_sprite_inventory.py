@@ -1,9 +1,10 @@
 #!/usr/bin/env python3
 import datetime
-import json
 import os
 from pathlib import Path
 
+from inventory_scan import iter_files, scan_tree, write_json_if_changed
+
 SPRITES_DIR = Path(os.environ.get("SPRITES_DIR", "/srv/assets/sprites"))
 OUTPUT_FILE = Path(
     os.environ.get(
@@ -14,23 +15,19 @@ OUTPUT_FILE = Path(
 
 
 def main() -> int:
-    sprites = []
-
-    if SPRITES_DIR.exists():
-        for path in SPRITES_DIR.rglob("*"):
-            if path.is_file() and path.suffix.lower() in {".json", ".png"}:
-                sprites.append(path.relative_to(SPRITES_DIR).as_posix())
-
-    sprites.sort()
-    OUTPUT_FILE.parent.mkdir(parents=True, exist_ok=True)
+    tree, stats = scan_tree(SPRITES_DIR, "sprites")
+    sprites = sorted(rel for rel, _, _ in iter_files(tree, {".json", ".png"}))
 
     payload = {
         "generated_at": datetime.datetime.now().isoformat(),
         "sprites": sprites,
     }
 
-    OUTPUT_FILE.write_text(json.dumps(payload, indent=2) + "\n", encoding="utf-8")
-    print(f"✅ Sprite-Inventory erstellt: {OUTPUT_FILE} ({len(sprites)} Dateien)")
+    scan_info = f"{stats['rescanned']}/{stats['dirs']} Verzeichnisse neu gelesen"
+    if write_json_if_changed(OUTPUT_FILE, payload):
+        print(f"✅ Sprite-Inventory erstellt: {OUTPUT_FILE} ({len(sprites)} Dateien, {scan_info})")
+    else:
+        print(f"⏭️  Sprite-Inventory unverändert: {OUTPUT_FILE} ({len(sprites)} Dateien, {scan_info})")
     return 0
 
 
@@ -4,6 +4,10 @@ import os
 import datetime
 from pathlib import Path
 
+from inventory_scan import scan_tree, write_json_if_changed
+from pmtiles_reader import PMTilesError, read_root
+from pmtiles_stats import analyze
+
 # --- KONFIGURATION ---
 TILES_DIR = Path(os.environ.get("TILES_DIR", "/srv/tiles"))
 # Output ist jetzt tiles_inventory.json
@@ -12,6 +16,15 @@ OUTPUT_FILE = Path(os.environ.get("TILES_INVENTORY_PATH", "/srv/info/tiles_inven
 # Base URL (Optional)
 TILES_BASE_URL = os.environ.get("TILES_BASE_URL", "").rstrip("/")
 
+# Sidecar-Cache für PMTiles-Header (Schlüssel: inode, size, mtime_ns)
+HEADER_CACHE_FILE = Path(
+    os.environ.get("TILES_HEADER_CACHE_PATH", str(OUTPUT_FILE.parent / ".tiles_header_cache.json"))
+)
+
+# Tile-Statistiken (pmtiles_stats.py) pro Archiv, neu berechnet nur bei geänderter Datei
+TILE_STATS_DIR = Path(os.environ.get("TILE_STATS_DIR", str(OUTPUT_FILE.parent / "tile_stats")))
+TILE_STATS_ENABLED = os.environ.get("TILE_STATS", "1") == "1"
+
 
 def classify_tileset_type(tileset_name):
     """
@@ -25,35 +38,128 @@ def classify_tileset_type(tileset_name):
         return "elevation"
     return "unknown"
 
+
+def load_header_cache():
+    if not HEADER_CACHE_FILE.exists():
+        return {}
+    try:
+        data = json.loads(HEADER_CACHE_FILE.read_text(encoding="utf-8"))
+    except Exception as e:
+        print(f"⚠️  Header-Cache unlesbar, wird neu aufgebaut: {e}")
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def save_header_cache(cache):
+    try:
+        HEADER_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        tmp = HEADER_CACHE_FILE.with_suffix(".tmp")
+        tmp.write_text(json.dumps(cache, separators=(",", ":")), encoding="utf-8")
+        tmp.replace(HEADER_CACHE_FILE)
+    except Exception as e:
+        print(f"⚠️  Header-Cache konnte nicht gespeichert werden: {e}")
+
+
+def read_pmtiles_header(pmtiles_path, st, cache, new_cache):
+    """
+    Liefert Header + Root-Directory-Infos. Unveränderte Dateien
+    (gleiches inode/size/mtime_ns) werden aus dem Cache bedient.
+    """
+    key = pmtiles_path.as_posix()
+    stat_key = [st.st_ino, st.st_size, st.st_mtime_ns]
+
+    cached = cache.get(key)
+    if isinstance(cached, dict) and cached.get("stat") == stat_key:
+        new_cache[key] = cached
+        return cached.get("header")
+
+    try:
+        header = read_root(pmtiles_path)
+    except (OSError, PMTilesError) as e:
+        print(f"   ⚠️  PMTiles Header nicht lesbar ({pmtiles_path.name}): {e}")
+        header = None
+
+    new_cache[key] = {"stat": stat_key, "header": header}
+    return header
+
+
+def load_tile_stats(tileset_name, map_id, pmtiles_path, st):
+    """
+    Liefert die Kurzfassung der Tile-Statistik. Der vollständige Report liegt
+    unter TILE_STATS_DIR/<tileset>/<map_id>.json und wird nur neu erzeugt,
+    wenn sich das Archiv geändert hat (inode/size/mtime_ns).
+    """
+    stats_file = TILE_STATS_DIR / tileset_name / f"{map_id}.json"
+    stat_key = [st.st_ino, st.st_size, st.st_mtime_ns]
+    report = None
+    try:
+        cached = json.loads(stats_file.read_text(encoding="utf-8"))
+        if cached.get("stat") == stat_key:
+            report = cached["stats"]
+    except (OSError, ValueError, KeyError, AttributeError):
+        pass
+
+    if report is None:
+        print(f"   📊 Analysiere Tiles: {tileset_name}/{map_id} ...")
+        try:
+            report = analyze(pmtiles_path)
+        except (OSError, PMTilesError) as e:
+            print(f"   ⚠️  Tile-Statistik fehlgeschlagen ({pmtiles_path.name}): {e}")
+            return None
+        write_json_if_changed(stats_file, {"stat": stat_key, "stats": report})
+
+    top = report["top_tiles"][0] if report["top_tiles"] else None
+    return {
+        "tiles": report["tiles"],
+        "unique_tiles": report["unique_tiles"],
+        "duplicate_ratio": report["duplicate_ratio"],
+        "avg_tile_bytes": report["avg_tile"],
+        "max_tile_bytes": report["max_tile"],
+        "max_tile": f"{top['z']}/{top['x']}/{top['y']}" if top else None,
+        "largest_layers": list(report["layers"])[:5],
+        "stats_path": stats_file.as_posix(),
+    }
+
+
 def main():
     if not TILES_DIR.exists():
         print(f"❌ Fehler: Tiles Verzeichnis {TILES_DIR} existiert nicht.")
         return
 
     datasets = []
+    header_cache = load_header_cache()
+    new_header_cache = {}
     
+    # Inkrementeller Scan (nur geänderte Verzeichnisse werden neu gelistet)
+    tree, scan_stats = scan_tree(TILES_DIR, "tiles")
+
+    def dir_files(rel):
+        node = tree.get(rel)
+        return node["files"] if node else {}
+
     # Sortierte Liste der Tilesets
-    tileset_dirs = sorted([d for d in TILES_DIR.iterdir() if d.is_dir()])
+    tileset_names = tree.get("", {}).get("dirs", [])
 
-    for tileset_dir in tileset_dirs:
-        tileset_name = tileset_dir.name # z.B. "osm"
-        
+    for tileset_name in tileset_names:
+        # tileset_name z.B. "osm"
+        tileset_dir = TILES_DIR / tileset_name
         pmtiles_dir = tileset_dir / "pmtiles"
         tilejson_dir = tileset_dir / "tilejson"
         styles_dir = tileset_dir / "styles"
 
-        if not pmtiles_dir.exists():
+        if f"{tileset_name}/pmtiles" not in tree:
             continue
 
-        pmtiles_files = sorted(pmtiles_dir.glob("*.pmtiles"))
+        pmtiles_names = sorted(n for n in dir_files(f"{tileset_name}/pmtiles") if n.endswith(".pmtiles"))
+        tilejson_names = dir_files(f"{tileset_name}/tilejson")
 
-        for pmtiles_path in pmtiles_files:
-            filename = pmtiles_path.name       
+        for filename in pmtiles_names:
+            pmtiles_path = pmtiles_dir / filename
             map_id = pmtiles_path.stem         
 
             # 1. STYLE PFADE (optional, z.B. bei elevation/terrain gibt es ggf. keinen Style)
             style_file = styles_dir / map_id / "style.json"
-            style_exists = style_file.exists()
+            style_exists = "style.json" in dir_files(f"{tileset_name}/styles/{map_id}")
 
             style_abs_path = style_file.as_posix() if style_exists else None
             style_rel_path = f"{tileset_name}/styles/{map_id}/style.json" if style_exists else None
@@ -71,10 +177,19 @@ def main():
 
             # 3. INFO JSON
             info_json_file = tilejson_dir / f"{map_id}.json"
-            info_json_path = info_json_file.as_posix() if info_json_file.exists() else None
+            info_json_path = info_json_file.as_posix() if info_json_file.name in tilejson_names else None
             
             dataset_type = classify_tileset_type(tileset_name)
 
+            # 4. PMTILES HEADER (bounds, zoom, counts ...)
+            # Eigener stat(): cp -f überschreibt in-place, die Verzeichnis-mtime bleibt gleich.
+            try:
+                st = pmtiles_path.stat()
+            except OSError as e:
+                print(f"   ⚠️  PMTiles verschwunden während des Scans: {pmtiles_path} ({e})")
+                continue
+            header = read_pmtiles_header(pmtiles_path, st, header_cache, new_header_cache)
+
             dataset = {
                 "id": map_id,
                 "tileset": tileset_name,
@@ -84,11 +199,18 @@ def main():
                 "relative_path": style_rel_path,
                 "pmtiles_path": pmtiles_abs_path,
                 "pmtiles_file": filename,
-                "size_bytes": pmtiles_path.stat().st_size,
+                "size_bytes": st.st_size,
                 "tileset_info_path": info_json_path,
                 "has_style": style_exists
             }
 
+            if header:
+                dataset["pmtiles_header"] = header
+                if TILE_STATS_ENABLED:
+                    tile_stats = load_tile_stats(tileset_name, map_id, pmtiles_path, st)
+                    if tile_stats:
+                        dataset["tile_stats"] = tile_stats
+
             if style_url:
                 dataset["url"] = style_url
             if pmtiles_url:
@@ -98,15 +220,19 @@ def main():
             datasets.append(dataset)
             print(f"   ➕ Dataset: {tileset_name}/{map_id} (Typ: {dataset_type})")
 
+    save_header_cache(new_header_cache)
+
     output_data = {
         "generated_at": datetime.datetime.now().isoformat(),
         "datasets": datasets
     }
     
-    OUTPUT_FILE.parent.mkdir(parents=True, exist_ok=True)
+    scan_info = f"{scan_stats['rescanned']}/{scan_stats['dirs']} Verzeichnisse neu gelesen"
     try:
-        OUTPUT_FILE.write_text(json.dumps(output_data, indent=2), encoding="utf-8")
-        print(f"✅ Tiles Inventory gespeichert: {OUTPUT_FILE}")
+        if write_json_if_changed(OUTPUT_FILE, output_data):
+            print(f"✅ Tiles Inventory gespeichert: {OUTPUT_FILE} ({scan_info})")
+        else:
+            print(f"⏭️  Tiles Inventory unverändert: {OUTPUT_FILE} ({scan_info})")
     except Exception as e:
         print(f"❌ Fehler beim Schreiben: {e}")
 
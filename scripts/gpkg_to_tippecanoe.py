@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+GeoPackage -> tippecanoe ohne Zwischendateien (OpenSkiMap-Overlay).
+
+Ersetzt die seriellen ogr2ogr-Exporte nach *.jsonseq: Die Layer werden mit
+sqlite3 gelesen, die GPKG-Geometrie-Blobs (Header + WKB) selbst dekodiert
+und als GeoJSONSeq direkt in tippecanoes stdin gestreamt. Jedes Feature
+trägt seinen Ziel-Layer als `"tippecanoe": {"layer": ...}`, daher reicht
+ein einziger Eingabestrom für alle Layer.
+
+Große Layer werden nach fid-Bereichen auf mehrere Worker-Prozesse
+verteilt; eine begrenzte Queue hält den Speicherbedarf konstant, wenn
+tippecanoe langsamer liest als dekodiert wird.
+
+Usage:
+  gpkg_to_tippecanoe.py openskidata.gpkg openskimap.pmtiles \
+      --layer ski_areas_point=areas_p --layer lifts_linestring=lifts ... \
+      [--workers N] [-- TIPPECANOE-ARGS...]
+"""
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import queue as queue_module
+import sqlite3
+import struct
+import subprocess
+import sys
+import time
+
+TIPPECANOE_BIN = os.environ.get("TIPPECANOE_BIN", "tippecanoe")
+WORKERS = int(os.environ.get("GPKG_WORKERS", "0")) or min(8, os.cpu_count() or 1)
+CHUNK_BYTES = 1024 * 1024
+QUEUE_CHUNKS_PER_WORKER = 4
+# Wartezeit auf die Queue, danach wird geprüft, ob ein Worker gestorben ist
+QUEUE_POLL_SECONDS = 5
+# Mindestgröße eines fid-Bereichs, damit sich ein eigener Task lohnt
+MIN_ROWS_PER_TASK = 20_000
+COORD_PRECISION = 7
+WEB_MERCATOR_HALF = 20037508.342789244
+ENVELOPE_BYTES = {0: 0, 1: 32, 2: 48, 3: 48, 4: 64}
+WKB_TYPES = {1: "Point", 2: "LineString", 3: "Polygon", 4: "MultiPoint", 5: "MultiLineString", 6: "MultiPolygon", 7: "GeometryCollection"}
+
+
+class GPKGError(Exception):
+    pass
+
+
+# --- GEOMETRIE ---
+
+def _wkb_geometry(buf, pos, to_lonlat):
+    """Rückgabe: (GeoJSON-Geometrie, neue Position). Z/M werden verworfen."""
+    endian = "<" if buf[pos] == 1 else ">"
+    (type_code,) = struct.unpack_from(endian + "I", buf, pos + 1)
+    pos += 5
+    # EWKB-Flags und ISO-Codes (1001 = Point Z, 2001 = Point M, 3001 = Point ZM)
+    has_z = bool(type_code & 0x80000000)
+    has_m = bool(type_code & 0x40000000)
+    if type_code & 0x20000000:
+        pos += 4
+    type_code &= 0x0FFFFFFF
+    iso_dims, base = divmod(type_code, 1000)
+    has_z = has_z or iso_dims in (1, 3)
+    has_m = has_m or iso_dims in (2, 3)
+    dims = 2 + has_z + has_m
+    name = WKB_TYPES.get(base)
+    if name is None:
+        raise GPKGError(f"WKB-Typ {type_code} nicht unterstützt")
+
+    def points(count):
+        nonlocal pos
+        values = struct.unpack_from(f"{endian}{count * dims}d", buf, pos)
+        pos += 8 * count * dims
+        return to_lonlat(values[0::dims], values[1::dims])
+
+    def count():
+        nonlocal pos
+        (n,) = struct.unpack_from(endian + "I", buf, pos)
+        pos += 4
+        return n
+
+    if name == "Point":
+        coords = points(1)
+        if any(math.isnan(v) for v in coords[0]):
+            return None, pos  # leerer Punkt
+        return {"type": name, "coordinates": coords[0]}, pos
+    if name == "LineString":
+        return {"type": name, "coordinates": points(count())}, pos
+    if name == "Polygon":
+        return {"type": name, "coordinates": [points(count()) for _ in range(count())]}, pos
+
+    parts = []
+    for _ in range(count()):
+        part, pos = _wkb_geometry(buf, pos, to_lonlat)
+        if part is not None:
+            parts.append(part)
+    if name == "GeometryCollection":
+        return {"type": name, "geometries": parts}, pos
+    return {"type": name, "coordinates": [part["coordinates"] for part in parts]}, pos
+
+
+def _lonlat_4326(xs, ys):
+    return [[round(x, COORD_PRECISION), round(y, COORD_PRECISION)] for x, y in zip(xs, ys)]
+
+
+def _lonlat_3857(xs, ys):
+    return [
+        [
+            round(x / WEB_MERCATOR_HALF * 180.0, COORD_PRECISION),
+            round(math.degrees(2 * math.atan(math.exp(y / WEB_MERCATOR_HALF * math.pi)) - math.pi / 2), COORD_PRECISION),
+        ]
+        for x, y in zip(xs, ys)
+    ]
+
+
+def decode_gpkg_geometry(blob, to_lonlat=_lonlat_4326):
+    """GPKG-Blob (Header "GP" + Envelope + WKB) -> GeoJSON-Geometrie oder None."""
+    if blob is None:
+        return None
+    if blob[:2] != b"GP":
+        raise GPKGError("Kein GPKG-Geometrie-Blob")
+    if len(blob) < 8:
+        raise GPKGError(f"GPKG-Geometrie-Blob zu kurz ({len(blob)} Byte)")
+    flags = blob[3]
+    if flags & 0x10:
+        return None  # leere Geometrie
+    envelope = ENVELOPE_BYTES.get((flags >> 1) & 0x7)
+    if envelope is None:
+        raise GPKGError("Ungültiger Envelope-Typ")
+    geometry, _ = _wkb_geometry(blob, 8 + envelope, to_lonlat)
+    return geometry
+
+
+# --- GEOPACKAGE ---
+
+def open_readonly(path):
+    return sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+
+
+def describe_layer(conn, table):
+    """Geometriespalte, Koordinatensystem und Spaltentypen eines Layers."""
+    row = conn.execute(
+        "SELECT g.column_name, s.organization, s.organization_coordsys_id "
+        "FROM gpkg_geometry_columns g LEFT JOIN gpkg_spatial_ref_sys s ON s.srs_id = g.srs_id "
+        "WHERE g.table_name = ?",
+        (table,),
+    ).fetchone()
+    if row is None:
+        raise GPKGError(f"Layer {table} nicht gefunden")
+    geom_column, organization, srs = row
+    if srs in (3857, 900913):
+        transform = "3857"
+    elif srs in (4326, 0, -1, None) or (organization or "").upper() != "EPSG":
+        transform = "4326"
+    else:
+        raise GPKGError(f"Layer {table}: EPSG:{srs} nicht unterstützt (nur 4326/3857)")
+
+    columns = conn.execute(f'PRAGMA table_info("{table}")').fetchall()
+    pk = next((c[1] for c in columns if c[5]), "rowid")
+    json_columns = set()
+    try:
+        json_columns = {
+            r[0] for r in conn.execute(
+                "SELECT column_name FROM gpkg_data_columns WHERE table_name = ? AND mime_type = 'application/json'",
+                (table,),
+            )
+        }
+    except sqlite3.OperationalError:
+        pass
+    fields = [
+        (c[1], "json" if c[1] in json_columns else "bool" if (c[2] or "").upper() == "BOOLEAN" else None)
+        for c in columns
+        if c[1] not in (geom_column, pk)
+    ]
+    return {"table": table, "geom": geom_column, "pk": pk, "transform": transform, "fields": fields}
+
+
+def plan_tasks(gpkg_path, layers, workers):
+    """Teilt jeden Layer in fid-Bereiche; Rückgabe: Tasks, größte zuerst."""
+    tasks = []
+    with open_readonly(gpkg_path) as conn:
+        for table, target in layers:
+            info = describe_layer(conn, table)
+            low, high, rows = conn.execute(
+                f'SELECT MIN("{info["pk"]}"), MAX("{info["pk"]}"), COUNT(*) FROM "{table}"'
+            ).fetchone()
+            if not rows:
+                continue
+            parts = max(1, min(workers, rows // MIN_ROWS_PER_TASK))
+            step = (high - low) // parts + 1
+            for i in range(parts):
+                start = low + i * step
+                tasks.append({**info, "layer": target, "lo": start, "hi": min(high + 1, start + step), "rows": rows // parts})
+    tasks.sort(key=lambda t: -t["rows"])
+    return tasks
+
+
+def iter_features(gpkg_path, task):
+    """GeoJSONSeq-Zeilen (bytes) eines fid-Bereichs."""
+    to_lonlat = _lonlat_3857 if task["transform"] == "3857" else _lonlat_4326
+    names = [name for name, _ in task["fields"]]
+    kinds = [kind for _, kind in task["fields"]]
+    columns = ", ".join(f'"{c}"' for c in [task["geom"], *names])
+    sql = f'SELECT {columns} FROM "{task["table"]}" WHERE "{task["pk"]}" >= ? AND "{task["pk"]}" < ?'
+    marker = {"layer": task["layer"]}
+    with open_readonly(gpkg_path) as conn:
+        for row in conn.execute(sql, (task["lo"], task["hi"])):
+            geometry = decode_gpkg_geometry(row[0], to_lonlat)
+            if geometry is None:
+                continue
+            properties = {}
+            for name, kind, value in zip(names, kinds, row[1:]):
+                if value is None or isinstance(value, bytes):
+                    continue
+                if kind == "json" and isinstance(value, str):
+                    try:
+                        value = json.loads(value)
+                    except ValueError:
+                        pass
+                elif kind == "bool":
+                    value = bool(value)
+                properties[name] = value
+            feature = {"type": "Feature", "tippecanoe": marker, "properties": properties, "geometry": geometry}
+            yield (json.dumps(feature, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+# --- PARALLEL-STREAMING ---
+
+def _worker(gpkg_path, tasks, queue):
+    try:
+        for task in tasks:
+            chunk = []
+            size = 0
+            features = 0
+            for line in iter_features(gpkg_path, task):
+                chunk.append(line)
+                size += len(line)
+                features += 1
+                if size >= CHUNK_BYTES:
+                    queue.put(("data", task["layer"], b"".join(chunk), features))
+                    chunk, size, features = [], 0, 0
+            if chunk:
+                queue.put(("data", task["layer"], b"".join(chunk), features))
+    except (sqlite3.Error, GPKGError, struct.error) as e:
+        queue.put(("error", None, f"{e}", 0))
+    except Exception as e:
+        # Unerwartete Fehler (z.B. IndexError bei kaputten Blobs) ebenfalls melden,
+        # sonst wartet der Koordinator ewig auf "done"
+        queue.put(("error", None, f"{type(e).__name__}: {e}", 0))
+    finally:
+        queue.put(("done", None, None, 0))
+
+
+def stream(gpkg_path, out, layers, workers=WORKERS):
+    """Schreibt alle Layer als GeoJSONSeq nach `out` (Binär-Stream). Rückgabe: Features pro Layer."""
+    tasks = plan_tasks(gpkg_path, layers, workers)
+    workers = max(1, min(workers, len(tasks)))
+    # Round-Robin der nach Größe sortierten Tasks
+    assignments = [tasks[i::workers] for i in range(workers)]
+    ctx = multiprocessing.get_context("fork")
+    queue = ctx.Queue(maxsize=workers * QUEUE_CHUNKS_PER_WORKER)
+    procs = [ctx.Process(target=_worker, args=(gpkg_path, part, queue), daemon=True) for part in assignments]
+    for proc in procs:
+        proc.start()
+
+    counts = {target: 0 for _, target in layers}
+    errors = []
+    running = len(procs)
+    try:
+        while running:
+            try:
+                kind, layer, payload, features = queue.get(timeout=QUEUE_POLL_SECONDS)
+            except queue_module.Empty:
+                # Hart beendete Worker (OOM-Killer, Signal) senden kein "done"
+                dead = [proc.exitcode for proc in procs if proc.exitcode not in (None, 0)]
+                if dead:
+                    errors.append(f"Worker abgestürzt (Exit {dead[0]})")
+                    break
+                continue
+            if kind == "data":
+                out.write(payload)
+                counts[layer] += features
+            elif kind == "error":
+                errors.append(payload)
+            else:
+                running -= 1
+    finally:
+        for proc in procs:
+            if proc.is_alive():
+                proc.terminate()
+            proc.join()
+    if errors:
+        raise GPKGError("; ".join(errors))
+    return counts
+
+
+def main(argv=None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    tippecanoe_args = []
+    if "--" in argv:
+        split = argv.index("--")
+        argv, tippecanoe_args = argv[:split], argv[split + 1:]
+
+    parser = argparse.ArgumentParser(description="GeoPackage -> tippecanoe (Streaming)")
+    parser.add_argument("gpkg")
+    parser.add_argument("output", help="Ziel-PMTiles ('-' = GeoJSONSeq auf stdout, ohne tippecanoe)")
+    parser.add_argument("--layer", action="append", required=True, help="gpkg_tabelle=zielname")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    args = parser.parse_args(argv)
+
+    layers = []
+    for spec in args.layer:
+        table, _, target = spec.partition("=")
+        layers.append((table, target or table))
+
+    started = time.monotonic()
+    if args.output == "-":
+        try:
+            stream(args.gpkg, sys.stdout.buffer, layers, args.workers)
+        except (sqlite3.Error, GPKGError) as e:
+            print(f"❌ {args.gpkg}: {e}", file=sys.stderr)
+            return 1
+        return 0
+
+    cmd = [TIPPECANOE_BIN, "-o", args.output, *tippecanoe_args]
+    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+    try:
+        counts = stream(args.gpkg, proc.stdin, layers, args.workers)
+        proc.stdin.close()
+    except BrokenPipeError:
+        counts = None
+    except (sqlite3.Error, GPKGError) as e:
+        print(f"❌ {args.gpkg}: {e}", file=sys.stderr)
+        proc.kill()
+        proc.wait()
+        return 1
+    rc = proc.wait()
+    if rc != 0 or counts is None:
+        print(f"❌ tippecanoe beendet mit Code {rc}", file=sys.stderr)
+        return rc or 1
+
+    summary = ", ".join(f"{layer}: {n}" for layer, n in counts.items())
+    print(f"✅ {os.path.basename(args.output)}: {sum(counts.values())} Features ({summary}), {time.monotonic() - started:.0f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Gemeinsame Inventar-Engine für Tiles-, Sprite- und Endpoints-Generatoren.
+
+- scan_tree(): inkrementeller os.scandir-Walk mit persistentem Manifest.
+  Ein Verzeichnis wird nur neu gelistet, wenn sich seine mtime geändert hat
+  (Dateien angelegt/gelöscht/umbenannt). Unveränderte Verzeichnisse kosten
+  genau einen stat().
+- write_json_if_changed(): schreibt JSON nur, wenn sich der Inhalt (ohne
+  flüchtige Felder wie generated_at) geändert hat. Ausgabe kompakt
+  (compact_json), ausgeliefert wird sie über publish_static.py.
+
+Hinweis: In-place überschriebene Dateien ändern die Verzeichnis-mtime nicht.
+Größe/mtime im Manifest können dann veraltet sein; wer exakte Werte braucht
+(z.B. PMTiles), stat't die Datei selbst. INVENTORY_FULL_SCAN=1 erzwingt
+einen vollständigen Neuaufbau.
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+
+INFO_DIR = Path(os.environ.get("INFO_DIR", "/srv/info"))
+STATE_DIR = Path(os.environ.get("INVENTORY_STATE_DIR", str(INFO_DIR / ".inventory_state")))
+FULL_SCAN = os.environ.get("INVENTORY_FULL_SCAN", "0") == "1"
+
+MANIFEST_VERSION = 1
+VOLATILE_KEYS = ("generated_at",)
+
+
+def _load_manifest(state_path, root):
+    if not state_path.exists():
+        return {}
+    try:
+        data = json.loads(state_path.read_text(encoding="utf-8"))
+    except Exception as e:
+        print(f"⚠️  Scan-Manifest unlesbar, vollständiger Scan: {e}")
+        return {}
+    if data.get("version") != MANIFEST_VERSION or data.get("root") != str(root):
+        return {}
+    dirs = data.get("dirs")
+    return dirs if isinstance(dirs, dict) else {}
+
+
+def _save_manifest(state_path, root, dirs):
+    state_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = state_path.with_name(state_path.name + ".tmp")
+    payload = {"version": MANIFEST_VERSION, "root": str(root), "dirs": dirs}
+    tmp.write_text(json.dumps(payload, separators=(",", ":")), encoding="utf-8")
+    tmp.replace(state_path)
+
+
+def _list_dir(full_path):
+    files = {}
+    subdirs = []
+    with os.scandir(full_path) as it:
+        for entry in it:
+            try:
+                if entry.is_dir():
+                    # Versteckte Verzeichnisse (z.B. .releases) gehören nicht zum Inventar
+                    if not entry.name.startswith("."):
+                        subdirs.append(entry.name)
+                elif entry.is_file():
+                    st = entry.stat()
+                    files[entry.name] = [st.st_size, st.st_mtime_ns]
+            except OSError:
+                # z.B. kaputter Symlink oder während des Scans gelöscht
+                continue
+    subdirs.sort()
+    return files, subdirs
+
+
+def scan_tree(root, state_name, force=False):
+    """
+    Scannt `root` inkrementell. `state_name` bestimmt die Manifest-Datei
+    unter STATE_DIR (z.B. "sprites" -> sprites.scan.json).
+
+    Rückgabe: (tree, stats)
+      tree:  {rel_dir: {"mtime_ns": int, "files": {name: [size, mtime_ns]}, "dirs": [name, ...]}}
+             rel_dir ist "" für root, sonst POSIX-Pfad relativ zu root.
+      stats: {"dirs": n, "rescanned": n}
+    """
+    root = Path(root)
+    state_path = STATE_DIR / f"{state_name}.scan.json"
+    previous = {} if (force or FULL_SCAN) else _load_manifest(state_path, root)
+
+    tree = {}
+    stats = {"dirs": 0, "rescanned": 0}
+    if not root.is_dir():
+        return tree, stats
+
+    stack = [""]
+    while stack:
+        rel = stack.pop()
+        full = root / rel if rel else root
+        try:
+            mtime_ns = os.stat(full).st_mtime_ns
+        except OSError:
+            continue
+
+        stats["dirs"] += 1
+        cached = previous.get(rel)
+        if cached and cached.get("mtime_ns") == mtime_ns:
+            node = cached
+        else:
+            try:
+                files, subdirs = _list_dir(full)
+            except OSError as e:
+                print(f"⚠️  Verzeichnis nicht lesbar: {full} ({e})")
+                continue
+            node = {"mtime_ns": mtime_ns, "files": files, "dirs": subdirs}
+            stats["rescanned"] += 1
+
+        tree[rel] = node
+        for name in node["dirs"]:
+            stack.append(f"{rel}/{name}" if rel else name)
+
+    try:
+        _save_manifest(state_path, root, tree)
+    except OSError as e:
+        print(f"⚠️  Scan-Manifest konnte nicht gespeichert werden: {e}")
+
+    return tree, stats
+
+
+def iter_files(tree, suffixes=None):
+    """Liefert (rel_path, size, mtime_ns) für alle Dateien im Tree, sortiert."""
+    for rel in sorted(tree):
+        for name in sorted(tree[rel]["files"]):
+            if suffixes and Path(name).suffix.lower() not in suffixes:
+                continue
+            size, mtime_ns = tree[rel]["files"][name]
+            yield (f"{rel}/{name}" if rel else name), size, mtime_ns
+
+
+def content_hash(payload, volatile_keys=VOLATILE_KEYS):
+    if isinstance(payload, dict):
+        payload = {k: v for k, v in payload.items() if k not in volatile_keys}
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def compact_json(payload):
+    """Kompakte UTF-8-Serialisierung für ausgelieferte JSON-Dateien."""
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def write_json_if_changed(path, payload, volatile_keys=VOLATILE_KEYS):
+    """
+    Schreibt `payload` nach `path`, wenn sich der Inhalt geändert hat.
+    Der Hash liegt als Sidecar (.<name>.sha256) neben der Datei.
+    Rückgabe: True wenn geschrieben wurde.
+    """
+    path = Path(path)
+    hash_path = path.with_name(f".{path.name}.sha256")
+    digest = content_hash(payload, volatile_keys)
+
+    if path.exists() and hash_path.exists():
+        try:
+            if hash_path.read_text(encoding="utf-8").strip() == digest:
+                return False
+        except OSError:
+            pass
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(compact_json(payload))
+    tmp.replace(path)
+    hash_path.write_text(digest + "\n", encoding="utf-8")
+    return True
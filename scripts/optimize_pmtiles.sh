@@ -0,0 +1,64 @@
+#!/bin/bash
+set -euo pipefail
+
+# 1. Utils & Config laden
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+if [ -f "$SCRIPT_DIR/utils.sh" ]; then
+    source "$SCRIPT_DIR/utils.sh"
+else
+    echo "❌ Fehler: utils.sh nicht gefunden!"
+    exit 1
+fi
+
+log_section "PMTILES OPTIMIEREN (Clustering, Dedup, Leaf-Directories)"
+
+# --- KONFIGURATION ---
+# Gleiche Quellen wie deploy_pmtiles.sh - optimiert wird vor dem Release,
+# damit alle Tilesets (Planetiler, tippecanoe, vtpk) dasselbe Layout haben.
+BUILD_TMP_DIRS=(
+    "${OSM_BUILD_DIR:-/srv/build/osm}/tmp"
+    "${BASEMAP_BUILD_DIR:-/srv/build/basemap-at}/tmp"
+    "${CONTOURS_BUILD_DIR:-/srv/build/overlays/contours}/tmp"
+    "${SKIMAP_BUILD_DIR:-/srv/build/overlays/openskimap}/tmp"
+)
+PYTHON_SCRIPT="$SCRIPT_DIR/pmtiles_optimize.py"
+OPTIMIZE_ARGS=("$@")
+
+if [ ! -f "$PYTHON_SCRIPT" ]; then
+    log_error "Python-Skript nicht gefunden: $PYTHON_SCRIPT"
+    exit 1
+fi
+
+FAILED=0
+for dir in "${BUILD_TMP_DIRS[@]}"; do
+    [ -d "$dir" ] || continue
+    # Manifeste der Konverter liegen neben tmp/ (<build>/manifests) - dort
+    # auch die optimize-Stufe, damit refresh die Konverter-Stufe findet.
+    export BUILD_MANIFEST_DIR="$(dirname "$dir")/manifests"
+    for archive in "$dir"/*.pmtiles; do
+        [ -f "$archive" ] || continue
+        name="$(basename "$archive" .pmtiles)"
+
+        # Build-Manifest: Archiv seit der letzten Optimierung unverändert -> nichts zu tun.
+        # Baut der Konverter neu, ändert sich der Fingerprint der Ausgabe.
+        if python3 "$SCRIPT_DIR/build_manifest.py" check "$name" optimize --output "$archive" -- "${OPTIMIZE_ARGS[@]}"; then
+            continue
+        fi
+
+        # Optimierung ersetzt das Archiv in-place: refresh zieht den Fingerprint
+        # in der Konverter-Stufe (Planetiler/tippecanoe) nach, sonst baut sie
+        # beim nächsten Lauf wegen "Ausgabe verändert" neu.
+        if ledger_step "optimize:$name" python3 "$SCRIPT_DIR/build_manifest.py" refresh --output "$archive" \
+                -- python3 -u "$PYTHON_SCRIPT" "$archive" "${OPTIMIZE_ARGS[@]}"; then
+            python3 "$SCRIPT_DIR/build_manifest.py" record "$name" optimize --output "$archive" -- "${OPTIMIZE_ARGS[@]}"
+        else
+            log_error "Optimierung von $(basename "$archive") fehlgeschlagen - Original bleibt unverändert."
+            FAILED=1
+        fi
+    done
+done
+
+if [ "$FAILED" -ne 0 ]; then
+    exit 1
+fi
+log_success "PMTiles-Optimierung abgeschlossen."
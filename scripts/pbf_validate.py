@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+"""
+Block-paralleler OSM PBF Validator (nur stdlib, zstd/lz4 optional).
+
+Liest das BlobHeader/Blob-Framing sequenziell per mmap, entpackt die Blobs
+in einem Worker-Pool und prüft die Struktur (Größen, raw_size, Protobuf-
+Framing des Blocks). Ersetzt `osmium cat -f opl`, das die Datei nur für die
+Integritätsprüfung einmal komplett in OPL-Text serialisiert.
+
+Ergebnisse landen in einem Validierungs-Cache, Schlüssel (Pfad, Größe,
+mtime, md5). download_engine.py trägt frisch geladene Dateien ein,
+run_merge.sh überspringt damit bereits geprüfte Dateien.
+"""
+import argparse
+import fcntl
+import hashlib
+import json
+import lzma
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import time
+import zlib
+from concurrent.futures import FIRST_EXCEPTION, ProcessPoolExecutor, wait
+from pathlib import Path
+
+OSM_BUILD_DIR = os.environ.get("OSM_BUILD_DIR", "/srv/build/osm")
+CACHE_FILE = Path(os.environ.get("PBF_VALIDATION_CACHE", f"{OSM_BUILD_DIR}/.pbf_validation.json"))
+WORKERS = int(os.environ.get("PBF_VALIDATE_WORKERS", "0")) or os.cpu_count() or 1
+
+# Grenzen laut OSM PBF Spezifikation
+MAX_HEADER_SIZE = 64 * 1024
+MAX_BLOB_SIZE = 32 * 1024 * 1024
+BATCH_BYTES = 32 * 1024 * 1024
+HASH_CHUNK = 8 * 1024 * 1024
+
+BLOB_RAW, BLOB_RAW_SIZE, BLOB_ZLIB, BLOB_LZMA, BLOB_BZIP2, BLOB_LZ4, BLOB_ZSTD = 1, 2, 3, 4, 5, 6, 7
+
+
+class PBFError(Exception):
+    """Datei ist strukturell kein gültiges OSM PBF."""
+
+
+class PBFUnsupported(Exception):
+    """Datei nutzt eine Kompression, die hier nicht geprüft werden kann."""
+
+
+def _read_varint(buf, pos, end):
+    result = 0
+    shift = 0
+    while True:
+        if pos >= end:
+            raise PBFError("Varint über Nachrichtenende hinaus")
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+        if shift > 63:
+            raise PBFError("Varint zu lang")
+
+
+def iter_fields(buf, pos=0, end=None):
+    """
+    Iteriert Protobuf-Felder einer Nachricht.
+    Liefert (field_number, wire_type, value); bei wire_type 2 ist value
+    ein (start, end)-Tupel in buf.
+    """
+    end = len(buf) if end is None else end
+    while pos < end:
+        key, pos = _read_varint(buf, pos, end)
+        field, wire = key >> 3, key & 7
+        if field == 0:
+            raise PBFError("Ungültige Feldnummer 0")
+        if wire == 0:
+            value, pos = _read_varint(buf, pos, end)
+        elif wire == 1:
+            value, pos = pos, pos + 8
+        elif wire == 2:
+            length, pos = _read_varint(buf, pos, end)
+            value, pos = (pos, pos + length), pos + length
+        elif wire == 5:
+            value, pos = pos, pos + 4
+        else:
+            raise PBFError(f"Ungültiger Wire-Type {wire}")
+        if pos > end:
+            raise PBFError("Feld über Nachrichtenende hinaus")
+        yield field, wire, value
+
+
+def parse_blob_header(buf):
+    blob_type = None
+    datasize = None
+    for field, wire, value in iter_fields(buf):
+        if field == 1 and wire == 2:
+            blob_type = bytes(buf[value[0]:value[1]]).decode("utf-8", errors="replace")
+        elif field == 3 and wire == 0:
+            datasize = value
+    if blob_type is None or datasize is None:
+        raise PBFError("BlobHeader ohne type/datasize")
+    return blob_type, datasize
+
+
+def decode_blob(buf) -> bytes:
+    raw_size = None
+    payload = None
+    for field, wire, value in iter_fields(buf):
+        if field == BLOB_RAW_SIZE and wire == 0:
+            raw_size = value
+        elif wire == 2:
+            payload = (field, buf[value[0]:value[1]])
+    if payload is None:
+        raise PBFError("Blob ohne Daten")
+
+    kind, data = payload
+    try:
+        if kind == BLOB_RAW:
+            out = bytes(data)
+        elif kind == BLOB_ZLIB:
+            out = zlib.decompress(data)
+        elif kind == BLOB_LZMA:
+            out = lzma.decompress(data)
+        elif kind == BLOB_ZSTD:
+            try:
+                import zstandard  # optional
+            except ImportError as e:
+                raise PBFUnsupported("Zstd-komprimierte Blobs, Modul 'zstandard' fehlt") from e
+            out = zstandard.ZstdDecompressor().decompress(bytes(data), max_output_size=raw_size or MAX_BLOB_SIZE)
+        elif kind == BLOB_LZ4:
+            try:
+                import lz4.block  # optional
+            except ImportError as e:
+                raise PBFUnsupported("LZ4-komprimierte Blobs, Modul 'lz4' fehlt") from e
+            out = lz4.block.decompress(bytes(data), uncompressed_size=raw_size or MAX_BLOB_SIZE)
+        else:
+            raise PBFUnsupported(f"Nicht unterstützte Blob-Kompression (Feld {kind})")
+    except (zlib.error, lzma.LZMAError) as e:
+        raise PBFError(f"Dekompression fehlgeschlagen: {e}") from e
+
+    if raw_size is not None and len(out) != raw_size:
+        raise PBFError(f"raw_size {raw_size} != entpackt {len(out)}")
+    if len(out) > MAX_BLOB_SIZE:
+        raise PBFError("Entpackter Block größer als 32 MiB")
+    return out
+
+
+def check_block(blob_type, block):
+    """Prüft das Framing von HeaderBlock / PrimitiveBlock (oberste Ebene)."""
+    fields = {field for field, _, _ in iter_fields(block)}
+    if blob_type == "OSMData" and 1 not in fields:
+        raise PBFError("PrimitiveBlock ohne Stringtable")
+
+
+# --- WORKER ---
+
+_WORKER_MAPS = {}
+
+
+def _worker_map(path, key):
+    cached = _WORKER_MAPS.get(path)
+    if cached and cached[0] == key:
+        return cached[1]
+    if cached:
+        cached[1].close()
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    _WORKER_MAPS[path] = (key, mm)
+    return mm
+
+
+def check_blobs(path, key, spans):
+    """Worker: entpackt und prüft eine Charge von Blobs. Rückgabe: Anzahl."""
+    mm = _worker_map(path, key)
+    for index, blob_type, start, end in spans:
+        try:
+            check_block(blob_type, decode_blob(memoryview(mm)[start:end]))
+        except PBFError as e:
+            raise PBFError(f"Blob #{index} @ {start}: {e}") from None
+    return len(spans)
+
+
+# --- VALIDIERUNG ---
+
+def iter_spans(mm, size):
+    """Liest das Framing: liefert (index, type, blob_start, blob_end)."""
+    pos = 0
+    index = 0
+    while pos < size:
+        if pos + 4 > size:
+            raise PBFError(f"Abgeschnittene Datei bei Offset {pos}")
+        (header_len,) = struct.unpack_from(">I", mm, pos)
+        if header_len == 0 or header_len > MAX_HEADER_SIZE:
+            raise PBFError(f"Ungültige BlobHeader-Länge {header_len} bei Offset {pos}")
+        header_start = pos + 4
+        blob_start = header_start + header_len
+        if blob_start > size:
+            raise PBFError(f"Abgeschnittener BlobHeader bei Offset {pos}")
+        blob_type, datasize = parse_blob_header(memoryview(mm)[header_start:blob_start])
+        if datasize > MAX_BLOB_SIZE:
+            raise PBFError(f"Blob #{index} zu groß ({datasize} Bytes)")
+        blob_end = blob_start + datasize
+        if blob_end > size:
+            raise PBFError(f"Abgeschnittener Blob #{index} bei Offset {blob_start}")
+
+        if index == 0 and blob_type != "OSMHeader":
+            raise PBFError(f"Erster Blob ist '{blob_type}' statt 'OSMHeader'")
+        if index > 0 and blob_type not in ("OSMData", "OSMHeader"):
+            raise PBFError(f"Unbekannter Blob-Typ '{blob_type}'")
+
+        yield index, blob_type, blob_start, blob_end
+        pos = blob_end
+        index += 1
+
+
+def validate_pbf(path, executor=None, workers=WORKERS, md5=None) -> dict:
+    """
+    Validiert eine PBF-Datei und berechnet nebenbei den MD5 (außer er ist
+    schon bekannt, z.B. aus dem Download-Stream).
+    Rückgabe: {"valid": True/False/None, "error", "blobs", "md5", "size", "mtime_ns"}
+    valid=None heißt: nicht prüfbar (Kompression nicht unterstützt).
+    """
+    path = Path(path)
+    st = path.stat()
+    result = {"valid": False, "error": None, "blobs": 0, "md5": md5, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+    if st.st_size == 0:
+        result["error"] = "Leere Datei"
+        return result
+
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=max(1, workers))
+    key = (st.st_ino, st.st_size, st.st_mtime_ns)
+    futures = []
+    try:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            batch, batch_bytes = [], 0
+            try:
+                for span in iter_spans(mm, st.st_size):
+                    batch.append(span)
+                    batch_bytes += span[3] - span[2]
+                    if batch_bytes >= BATCH_BYTES:
+                        futures.append(executor.submit(check_blobs, str(path), key, batch))
+                        batch, batch_bytes = [], 0
+                if batch:
+                    futures.append(executor.submit(check_blobs, str(path), key, batch))
+            except PBFError as e:
+                result["error"] = str(e)
+
+            # MD5 im Hauptprozess, während die Worker entpacken
+            if md5 is None:
+                hasher = hashlib.md5()
+                view = memoryview(mm)
+                for offset in range(0, st.st_size, HASH_CHUNK):
+                    hasher.update(view[offset:offset + HASH_CHUNK])
+                view.release()
+                result["md5"] = hasher.hexdigest()
+
+        done, pending = wait(futures, return_when=FIRST_EXCEPTION)
+        for future in pending:
+            future.cancel()
+        unsupported = None
+        for future in done:
+            exc = future.exception()
+            if exc is None:
+                result["blobs"] += future.result()
+            elif isinstance(exc, PBFUnsupported):
+                unsupported = str(exc)
+            elif result["error"] is None:
+                result["error"] = str(exc)
+    finally:
+        if own_executor:
+            executor.shutdown(cancel_futures=True)
+
+    if result["error"] is None:
+        result["valid"] = None if unsupported else True
+        result["error"] = unsupported
+    return result
+
+
+# --- CACHE ---
+
+def download_md5(path):
+    """MD5 aus dem Download-Status (.<datei>.download.json), falls vorhanden."""
+    path = Path(path)
+    try:
+        state = json.loads((path.parent / f".{path.name}.download.json").read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if state.get("complete") and state.get("size") == path.stat().st_size:
+        return state.get("md5")
+    return None
+
+
+class ValidationCache:
+    def __init__(self, path=CACHE_FILE):
+        self.path = Path(path)
+        self.entries = self._read()
+        self.changed = {}
+
+    def _read(self):
+        try:
+            return json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+
+    def lookup(self, pbf_path, md5=None):
+        """Treffer nur, wenn Größe + mtime (und md5, falls bekannt) passen."""
+        pbf_path = Path(pbf_path).resolve()
+        entry = self.entries.get(str(pbf_path))
+        if not entry or not entry.get("valid"):
+            return None
+        st = pbf_path.stat()
+        if entry.get("size") != st.st_size or entry.get("mtime_ns") != st.st_mtime_ns:
+            return None
+        if md5 is not None and entry.get("md5") != md5:
+            return None
+        return entry
+
+    def record(self, pbf_path, result):
+        pbf_path = Path(pbf_path).resolve()
+        st = pbf_path.stat()
+        if st.st_size != result["size"]:
+            return
+        entry = {
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "md5": result["md5"],
+            "valid": result["valid"],
+            "blobs": result["blobs"],
+            "checked_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        self.entries[str(pbf_path)] = entry
+        self.changed[str(pbf_path)] = entry
+
+    def save(self):
+        """
+        Eigene Einträge in den aktuellen Stand auf der Platte mergen. Mehrere
+        Prozesse (parallele merge-Tasks) speichern gleichzeitig: Lock-Datei,
+        eindeutige Temp-Datei, os.replace. Fehler sind nur eine Warnung - der
+        Cache spart Zeit, über gültig/ungültig entscheidet er nicht.
+        """
+        if not self.changed:
+            return True
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path.with_name(self.path.name + ".lock"), "w") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                entries = {**self._read(), **self.changed}
+                entries = {k: v for k, v in entries.items() if os.path.exists(k)}
+                fd, tmp = tempfile.mkstemp(prefix=f".{self.path.name}.", suffix=".tmp", dir=self.path.parent)
+                os.fchmod(fd, 0o644)
+                try:
+                    with os.fdopen(fd, "w", encoding="utf-8") as f:
+                        json.dump(entries, f, indent=2, sort_keys=True)
+                    os.replace(tmp, self.path)
+                except BaseException:
+                    os.unlink(tmp)
+                    raise
+        except OSError as e:
+            print(f"⚠️  Validierungs-Cache nicht gespeichert: {e}", file=sys.stderr)
+            return False
+        self.entries = entries
+        self.changed = {}
+        return True
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="OSM PBF Validator (block-parallel, mit Cache)")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--no-cache", action="store_true", help="Cache ignorieren und nicht schreiben")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    args = parser.parse_args(argv)
+
+    cache = None if args.no_cache else ValidationCache()
+    invalid = 0
+    unsupported = 0
+    with ProcessPoolExecutor(max_workers=max(1, args.workers)) as executor:
+        for name in args.files:
+            path = Path(name)
+            if not path.is_file():
+                print(f"❌ Eingabedatei fehlt: {path}", file=sys.stderr)
+                invalid += 1
+                continue
+
+            if cache is not None and cache.lookup(path, download_md5(path)):
+                print(f"⏭️  Bereits validiert: {path.name}")
+                continue
+
+            started = time.monotonic()
+            result = validate_pbf(path, executor)
+            elapsed = time.monotonic() - started
+            if result["valid"] is None:
+                print(f"⚠️  Nicht prüfbar: {path.name} ({result['error']})")
+                unsupported += 1
+            elif not result["valid"]:
+                print(f"❌ Defekte OSM PBF: {path} ({result['error']})", file=sys.stderr)
+                invalid += 1
+            else:
+                print(f"✅ OK: {path.name} ({result['blobs']} Blobs, {result['size'] / 1e6:.0f} MB in {elapsed:.1f}s)")
+                if cache is not None:
+                    cache.record(path, result)
+
+    if cache is not None:
+        cache.save()
+    if invalid:
+        return 1
+    return 2 if unsupported else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+"""
+DAG-Pipeline-Runner für start.sh.
+
+Jeder Schritt (pro Quelle bzw. pro Karte) ist ein Task mit deklarierten
+Ein- und Ausgaben. Abhängigkeiten ergeben sich aus überlappenden Pfaden
+(Ausgabe eines Tasks = Eingabe eines anderen). Unabhängige Zweige laufen
+parallel, solange das CPU-, RAM- und IO-Budget reicht - z.B. VTPK-Entpacken
+von basemap.at oder der tippecanoe-Build der Skimap, während Planetiler
+an OSM arbeitet.
+
+Jeder Task schreibt ein eigenes Log ($PIPELINE_LOG_DIR/<lauf>/<task>.log),
+die Ausgabe wird zusätzlich mit Präfix auf die Konsole gestreamt.
+Ressourcen pro Task landen im Ledger (resource_ledger.py report).
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+from download_engine import SOURCES_DIR, parse_sources
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+INSTALL_DIR = os.environ.get("INSTALL_DIR", "/srv/scripts")
+OSM_BUILD_DIR = os.environ.get("OSM_BUILD_DIR", "/srv/build/osm")
+BASEMAP_BUILD_DIR = os.environ.get("BASEMAP_BUILD_DIR", "/srv/build/basemap-at")
+OVERLAYS_BUILD_DIR = os.environ.get("OVERLAYS_BUILD_DIR", "/srv/build/overlays")
+SKIMAP_BUILD_DIR = os.environ.get("SKIMAP_BUILD_DIR", f"{OVERLAYS_BUILD_DIR}/openskimap")
+CONTOURS_BUILD_DIR = os.environ.get("CONTOURS_BUILD_DIR", f"{OVERLAYS_BUILD_DIR}/contours")
+TILES_DIR = os.environ.get("TILES_DIR", "/srv/tiles")
+INFO_DIR = os.environ.get("INFO_DIR", "/srv/info")
+ORS_DIR = os.environ.get("ORS_DIR", "/srv/ors")
+LOG_DIR = Path(os.environ.get("PIPELINE_LOG_DIR", f"{INSTALL_DIR}/stats/pipeline"))
+
+
+def total_ram_gb():
+    try:
+        with open("/proc/meminfo", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("MemTotal:"):
+                    return int(line.split()[1]) / (1024 * 1024)
+    except OSError:
+        pass
+    return 8.0
+
+
+CPU_BUDGET = float(os.environ.get("PIPELINE_CPUS", os.cpu_count() or 1))
+RAM_BUDGET = float(os.environ.get("PIPELINE_RAM_GB", round(total_ram_gb() * 0.9, 1)))
+IO_BUDGET = float(os.environ.get("PIPELINE_IO_SLOTS", "2"))
+PLANETILER_RAM_GB = float(os.environ.get("PLANETILER_RAM_GB", round(RAM_BUDGET * 0.5, 1)))
+# Worker-Pools der Python-Skripte (Standard: alle Kerne) - pro Task auf dessen CPU-Budget gedeckelt
+WORKER_ENV_VARS = ("PBF_VALIDATE_WORKERS", "PMTILES_WORKERS", "GPKG_WORKERS",
+                   "GLYPH_WORKERS", "SPRITE_WORKERS", "STYLE_WORKERS")
+# Tasks mit Planetiler: planetiler_sizing.py bekommt RAM und Threads aus der Reservierung
+PLANETILER_SCRIPTS = {"convert_osm_pmtiles.sh"}
+
+
+class PipelineError(Exception):
+    pass
+
+
+class Task:
+    def __init__(self, name, script, args=(), inputs=(), outputs=(), after=(),
+                 cpu=1, ram_gb=1, io=1, est_min=5, optional=False):
+        self.name = name
+        self.script = script
+        self.args = list(args)
+        self.inputs = [os.path.normpath(p) for p in inputs]
+        self.outputs = [os.path.normpath(p) for p in outputs]
+        self.after = set(after)
+        self.cpu = cpu
+        self.ram_gb = ram_gb
+        self.io = io
+        self.est_min = est_min
+        self.optional = optional
+
+        self.deps = set()
+        self.dependents = set()
+        self.priority = 0.0
+        self.state = "pending"
+        self.returncode = None
+        self.started = None
+        self.finished = None
+        self.log_path = None
+
+    @property
+    def command(self):
+        # Über das Ressourcen-Ledger: CPU/IO/RSS pro Task, Unterschritte hängen darunter
+        return [sys.executable, str(SCRIPT_DIR / "resource_ledger.py"), "run", self.name, "--",
+                "bash", str(SCRIPT_DIR / self.script), *self.args]
+
+    @property
+    def duration(self):
+        if self.started is None:
+            return None
+        return (self.finished or time.monotonic()) - self.started
+
+
+def _overlaps(a, b):
+    return a == b or a.startswith(b + os.sep) or b.startswith(a + os.sep)
+
+
+def build_tasks(rebuild_ors=False):
+    """Task-Definitionen der Geodata-Pipeline."""
+    osm_src = f"{OSM_BUILD_DIR}/src"
+    osm_merged = f"{OSM_BUILD_DIR}/merged"
+    osm_tmp = f"{OSM_BUILD_DIR}/tmp"
+    maps = sorted(parse_sources(SOURCES_DIR)) if SOURCES_DIR.is_dir() else []
+
+    tasks = [
+        Task("download_osm", "download_osm.sh", outputs=[osm_src], cpu=1, ram_gb=0.5, io=1, est_min=10),
+        Task("download_basemap", "download_basemap.sh", outputs=[f"{BASEMAP_BUILD_DIR}/src"],
+             cpu=0.5, ram_gb=0.5, io=1, est_min=10, optional=True),
+        Task("download_contours", "download_basemap_contours.sh", outputs=[f"{CONTOURS_BUILD_DIR}/src"],
+             cpu=0.5, ram_gb=0.5, io=1, est_min=5, optional=True),
+        Task("download_openskimap", "download_openskimap.sh", outputs=[f"{SKIMAP_BUILD_DIR}/src"],
+             cpu=0.5, ram_gb=0.5, io=1, est_min=2, optional=True),
+    ]
+
+    for map_name in maps:
+        tasks.append(Task(
+            f"merge:{map_name}", "run_merge.sh", args=[map_name],
+            inputs=[f"{osm_src}/{map_name}.list"], outputs=[f"{osm_merged}/{map_name}.osm.pbf"],
+            cpu=1, ram_gb=1, io=1, est_min=5,
+        ))
+        # Planetiler nutzt fast alle Kerne; zwei Kerne bleiben für Nebenzweige
+        tasks.append(Task(
+            f"convert_osm:{map_name}", "convert_osm_pmtiles.sh", args=[map_name],
+            inputs=[f"{osm_merged}/{map_name}.osm.pbf"],
+            outputs=[f"{osm_tmp}/{map_name}.pmtiles", f"{osm_tmp}/{map_name}.json"],
+            cpu=max(1.0, CPU_BUDGET - 2), ram_gb=PLANETILER_RAM_GB, io=1, est_min=60,
+        ))
+
+    tasks += [
+        Task("convert_basemap", "convert_basemap_at_pmtiles.sh",
+             inputs=[f"{BASEMAP_BUILD_DIR}/src"], outputs=[f"{BASEMAP_BUILD_DIR}/tmp"],
+             cpu=1, ram_gb=2, io=1, est_min=30, optional=True),
+        Task("convert_contours", "convert_basemap_contours_pmtiles.sh",
+             inputs=[f"{CONTOURS_BUILD_DIR}/src"], outputs=[f"{CONTOURS_BUILD_DIR}/tmp"],
+             cpu=1, ram_gb=2, io=1, est_min=10, optional=True),
+        # GPKG-Dekodierung (Worker-Prozesse) + tippecanoe laufen gleichzeitig
+        Task("convert_openskimap", "convert_openskimap_pmtiles.sh",
+             inputs=[f"{SKIMAP_BUILD_DIR}/src"], outputs=[f"{SKIMAP_BUILD_DIR}/tmp"],
+             cpu=min(4.0, CPU_BUDGET), ram_gb=2, io=1, est_min=10, optional=True),
+        # Beginnt mit pmtiles_optimize.py (Worker-Prozesse über Tile-ID-Bereiche)
+        Task("deploy", "run_deploy.sh",
+             inputs=[osm_tmp, f"{BASEMAP_BUILD_DIR}/tmp", f"{CONTOURS_BUILD_DIR}/tmp", f"{SKIMAP_BUILD_DIR}/tmp"],
+             outputs=[TILES_DIR, INFO_DIR], cpu=min(4.0, CPU_BUDGET), ram_gb=1, io=1, est_min=15),
+    ]
+    if rebuild_ors:
+        tasks.append(Task("ors", "run_ors.sh", inputs=[osm_merged], outputs=[ORS_DIR],
+                          after=["deploy"], cpu=2, ram_gb=min(8.0, RAM_BUDGET), io=1, est_min=60))
+
+    # Optionale Schritte ohne Skript fallen weg (wie bisher in run_*.sh)
+    kept = []
+    for task in tasks:
+        if not (SCRIPT_DIR / task.script).is_file():
+            if not task.optional:
+                raise PipelineError(f"Skript nicht gefunden: {task.script}")
+            print(f"   ⚠️  {task.script} nicht gefunden - überspringe {task.name}.")
+            continue
+        kept.append(task)
+    return kept
+
+
+def link_tasks(tasks):
+    """Leitet Abhängigkeiten aus Pfaden ab, prüft auf Zyklen, setzt Prioritäten."""
+    by_name = {t.name: t for t in tasks}
+    for task in tasks:
+        for other in tasks:
+            if other is task:
+                continue
+            if other.name in task.after or any(
+                _overlaps(i, o) for i in task.inputs for o in other.outputs
+            ):
+                task.deps.add(other.name)
+                other.dependents.add(task.name)
+        task.after &= set(by_name)
+
+    # Topologische Ordnung (Kahn) -> Zyklen erkennen
+    indegree = {t.name: len(t.deps) for t in tasks}
+    order = [name for name, deg in indegree.items() if deg == 0]
+    for name in order:
+        for dep_name in by_name[name].dependents:
+            indegree[dep_name] -= 1
+            if indegree[dep_name] == 0:
+                order.append(dep_name)
+    if len(order) != len(tasks):
+        cyclic = sorted(name for name, deg in indegree.items() if deg > 0)
+        raise PipelineError(f"Zyklische Abhängigkeiten: {', '.join(cyclic)}")
+
+    # Priorität = längster geschätzter Restpfad (kritischer Pfad zuerst)
+    for name in reversed(order):
+        task = by_name[name]
+        task.priority = task.est_min + max((by_name[d].priority for d in task.dependents), default=0)
+    return order
+
+
+class Budget:
+    def __init__(self, cpu, ram_gb, io):
+        self.total = {"cpu": cpu, "ram_gb": ram_gb, "io": io}
+        self.used = {"cpu": 0.0, "ram_gb": 0.0, "io": 0.0}
+
+    def demand(self, task):
+        # Zu große Tasks werden gedeckelt, damit sie zumindest allein laufen
+        return {k: min(getattr(task, k), self.total[k]) for k in self.total}
+
+    def fits(self, task):
+        return all(self.used[k] + v <= self.total[k] + 1e-9 for k, v in self.demand(task).items())
+
+    def acquire(self, task):
+        for k, v in self.demand(task).items():
+            self.used[k] += v
+
+    def release(self, task):
+        for k, v in self.demand(task).items():
+            self.used[k] -= v
+
+    def env(self, task):
+        """Umgebung für den Task: Worker-Pools und Planetiler nicht größer als die Reservierung."""
+        workers = max(1, int(self.demand(task)["cpu"]))
+        env = dict(os.environ)
+        for var in WORKER_ENV_VARS:
+            # Explizit kleiner gesetzte Werte bleiben erhalten
+            current = int(env.get(var, "0") or 0)
+            env[var] = str(min(current, workers) if current > 0 else workers)
+        if task.script in PLANETILER_SCRIPTS:
+            env["PLANETILER_RAM_GB"] = f"{self.demand(task)['ram_gb']:g}"
+            env["PLANETILER_THREADS"] = str(workers)
+        return env
+
+
+class Runner:
+    def __init__(self, tasks, log_dir, budget, keep_going=False):
+        self.tasks = {t.name: t for t in tasks}
+        self.log_dir = Path(log_dir)
+        self.budget = budget
+        self.keep_going = keep_going
+        self.stop = False
+
+    def _ready(self):
+        ready = [
+            t for t in self.tasks.values()
+            if t.state == "pending" and all(self.tasks[d].state == "done" for d in t.deps)
+        ]
+        return sorted(ready, key=lambda t: -t.priority)
+
+    def _skip_dependents(self, task):
+        for name in task.dependents:
+            dep = self.tasks[name]
+            if dep.state == "pending":
+                dep.state = "skipped"
+                print(f"   ⏭️  {dep.name} übersprungen (hängt von {task.name} ab)", flush=True)
+                self._skip_dependents(dep)
+
+    async def _run(self, task):
+        task.log_path = self.log_dir / f"{task.name.replace(':', '_')}.log"
+        prefix = f"[{task.name}]"
+        with open(task.log_path, "w", encoding="utf-8") as log:
+            proc = await asyncio.create_subprocess_exec(
+                *task.command,
+                env=self.budget.env(task),
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
+                stdin=asyncio.subprocess.DEVNULL,
+                limit=1 << 20,
+            )
+            while True:
+                line = await proc.stdout.readline()
+                if not line:
+                    break
+                text = line.decode("utf-8", errors="replace").rstrip("\r\n")
+                log.write(text + "\n")
+                log.flush()
+                print(f"{prefix} {text}", flush=True)
+            return await proc.wait()
+
+    def _start(self, task, running):
+        self.budget.acquire(task)
+        task.state = "running"
+        task.started = time.monotonic()
+        print(f"   ▶️  Start {task.name} (cpu {task.cpu:g}, ram {task.ram_gb:g} GB, io {task.io:g})", flush=True)
+        running[asyncio.ensure_future(self._run(task))] = task
+
+    async def run(self):
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        running = {}
+        while True:
+            if not self.stop:
+                for task in self._ready():
+                    if self.budget.fits(task):
+                        self._start(task, running)
+            if not running:
+                break
+
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                task = running.pop(future)
+                self.budget.release(task)
+                task.finished = time.monotonic()
+                try:
+                    task.returncode = future.result()
+                except OSError as e:
+                    print(f"   ❌ {task.name}: {e}", file=sys.stderr, flush=True)
+                    task.returncode = -1
+                if task.returncode == 0:
+                    task.state = "done"
+                    print(f"   ✅ {task.name} fertig ({task.duration / 60:.1f} min)", flush=True)
+                else:
+                    task.state = "failed"
+                    print(f"   ❌ {task.name} fehlgeschlagen (Exit {task.returncode}), Log: {task.log_path}",
+                          file=sys.stderr, flush=True)
+                    self._skip_dependents(task)
+                    if not self.keep_going:
+                        self.stop = True
+
+        for task in self.tasks.values():
+            if task.state == "pending":
+                task.state = "skipped"
+        return all(t.state == "done" for t in self.tasks.values())
+
+    def summary(self):
+        return {
+            "budget": self.budget.total,
+            "tasks": [
+                {
+                    "name": t.name,
+                    "state": t.state,
+                    "returncode": t.returncode,
+                    "duration_s": round(t.duration, 1) if t.duration is not None else None,
+                    "deps": sorted(t.deps),
+                    "log": str(t.log_path) if t.log_path else None,
+                }
+                for t in self.tasks.values()
+            ],
+        }
+
+
+def print_plan(tasks, order):
+    by_name = {t.name: t for t in tasks}
+    print(f"Budget: {CPU_BUDGET:g} CPU, {RAM_BUDGET:g} GB RAM, {IO_BUDGET:g} IO-Slots")
+    for name in order:
+        t = by_name[name]
+        deps = ", ".join(sorted(t.deps)) or "-"
+        print(f"  {t.name:<24} prio {t.priority:>5.0f}  cpu {t.cpu:>4g}  ram {t.ram_gb:>5g}  io {t.io:g}  <- {deps}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Geodata DAG-Pipeline")
+    parser.add_argument("--rebuild-ors", action="store_true", help="ORS-Graphen am Ende neu bauen")
+    parser.add_argument("--keep-going", action="store_true", help="Unabhängige Zweige nach Fehlern weiterlaufen lassen")
+    parser.add_argument("--dry-run", action="store_true", help="Nur Plan anzeigen")
+    args = parser.parse_args(argv)
+
+    try:
+        tasks = build_tasks(args.rebuild_ors)
+        order = link_tasks(tasks)
+    except PipelineError as e:
+        print(f"   ❌ {e}", file=sys.stderr)
+        return 1
+
+    if args.dry_run:
+        print_plan(tasks, order)
+        return 0
+
+    run_dir = LOG_DIR / time.strftime("%Y-%m-%d_%H%M%S")
+    # Gleiche ID im Ledger: resource_ledger.py report --run <lauf>
+    os.environ["LEDGER_RUN_ID"] = run_dir.name
+    runner = Runner(tasks, run_dir, Budget(CPU_BUDGET, RAM_BUDGET, IO_BUDGET), args.keep_going)
+    print(f"   ℹ️  {len(tasks)} Tasks, Budget {CPU_BUDGET:g} CPU / {RAM_BUDGET:g} GB / {IO_BUDGET:g} IO, Logs: {run_dir}")
+    started = time.monotonic()
+    ok = asyncio.run(runner.run())
+
+    summary = runner.summary()
+    summary["wall_s"] = round(time.monotonic() - started, 1)
+    (run_dir / "summary.json").write_text(json.dumps(summary, indent=2) + "\n", encoding="utf-8")
+
+    failed = [t["name"] for t in summary["tasks"] if t["state"] == "failed"]
+    if not ok:
+        print(f"   ❌ Pipeline fehlgeschlagen: {', '.join(failed) or 'abgebrochen'}", file=sys.stderr)
+        return 1
+    print(f"   ✅ Pipeline fertig in {summary['wall_s'] / 60:.1f} min.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
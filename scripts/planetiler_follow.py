@@ -1,35 +1,45 @@
+#!/usr/bin/env python3
+"""
+Live-Anzeige für Planetiler/Tippecanoe Builds (Follower-Modus).
+
+Usage: planetiler_follow.py <logfile> <pid> [<logfile> <pid> ...]
+
+Mehrere Logs/PIDs werden gleichzeitig in einem mehrzeiligen Dashboard
+verfolgt. Statt zeilenweise zu pollen wartet der Follower auf inotify
+(Log-Verzeichnisse) und pidfd (Prozessende) und liest neue Daten blockweise.
+Ohne inotify/pidfd wird auf einen langsamen Poll-Takt zurückgefallen.
+"""
+import ctypes
+import ctypes.util
 import json
 import os
 import re
+import select
 import shutil
 import sys
 import time
-import warnings
 from datetime import datetime
 
-warnings.filterwarnings("ignore")
+from planetiler_metrics import MetricsCollector, record_run
 
-log_file_path = sys.argv[1]
-docker_pid = int(sys.argv[2])
+CHUNK_SIZE = 1 << 20
+RENDER_INTERVAL = 0.2
+# Ohne Terminal (z.B. Task-Log im Pipeline-Runner): schlichte Statuszeilen
+PLAIN_RENDER_INTERVAL = 30.0
+POLL_TIMEOUT_MS = 1000
+FALLBACK_POLL_MS = 250
+
+# inotify Masken (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
 
 cols = shutil.get_terminal_size().columns
 bar_width = 25
 stats_dir = os.environ.get("STATS_DIR", "/tmp")
 current_date = datetime.now().strftime("%Y-%m-%d")
-json_path = os.path.join(stats_dir, f"stats_{current_date}.json")
-report_path = os.path.join(stats_dir, f"report_{current_date}.txt")
-
-data = {
-    "date": current_date,
-    "timestamp": datetime.now().isoformat(),
-    "duration": "N/A",
-    "cpu_time": "N/A",
-    "file_size": "N/A",
-    "max_tile_size": "N/A",
-    "avg_tile_size": "N/A",
-    "biggest_tiles": [],
-}
-capture_mode = None
+
 ansi_escape = re.compile(r"\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])")
 ESC = chr(27)
 RED = f"{ESC}[91m"
@@ -40,9 +50,39 @@ MAGENTA = f"{ESC}[1;35m"
 WHITE = f"{ESC}[1;37m"
 RESET = f"{ESC}[0m"
 
+# Ein kombiniertes Muster pro Zeile (verankert, per match()); die Reihenfolge
+# der Alternativen bestimmt die Priorität, die Gruppe den Handler.
+LINE_RE = re.compile(
+    r"(?=.*?(?P<biggest_start>Biggest tiles))"
+    r"|(?=.*?(?P<error>Exception|Error|❌))"
+    r"|(?=.*?(?P<bounds>Bounds not found|osm_bounds))"
+    r"|(?:(?P<elapsed>\d+:\d{2}:\d{2})\s)?.*?INF \[(?P<phase>.*?)\] - (?P<details>.*)"
+    r"|.*?INF - (?P<init>.*)"
+)
+# Kennzahlen (nur für Zeilen, die "tile"/"Finished" enthalten)
+DETAIL_RE = re.compile(
+    r"(?P<kind>Max|Avg) tile:.*?\(gzipped:\s+(?P<tile_size>.*?)\)"
+    r"|Finished in\s+(?P<duration>.*?)\s+cpu:(?P<cpu>.*?)\s"
+    r"|features:.*tiles:.*?\]\s+(?P<file_size>\S+)"
+)
+# Eingerückte Prozess-Statistik unter einer Phasenzeile ("cpu: 7.6 gc: 1% heap: ...")
+CONTINUATION_RE = re.compile(r"cpu:|.*?\b(?:heap|postGC|rss):")
+PERCENT_RE = re.compile(r"(\d+)%")
+BIGGEST_RE = re.compile(r"^\d+\.\s+(\S+)\s+\((.*?)\)\s+(.*?)\s+\((.*?)\)")
+BIGGEST_ENTRY_RE = re.compile(r"^\d+\.")
 
-def clean_line(line):
-    return ansi_escape.sub("", line)
+
+def new_stats():
+    return {
+        "date": current_date,
+        "timestamp": datetime.now().isoformat(),
+        "duration": "N/A",
+        "cpu_time": "N/A",
+        "file_size": "N/A",
+        "max_tile_size": "N/A",
+        "avg_tile_size": "N/A",
+        "biggest_tiles": [],
+    }
 
 
 def is_process_running(pid):
@@ -53,10 +93,10 @@ def is_process_running(pid):
         return False
 
 
-def print_status(phase, details, percent=None):
-    status = f" >> {CYAN}{phase}{RESET}: "
+def format_status(label, phase, details, percent=None):
+    status = f" {WHITE}{label}{RESET} >> {CYAN}{phase}{RESET}: "
     if "osm_bounds" in phase:
-        status = f" >> {MAGENTA}KARTEN-SCAN{RESET}: "
+        status = f" {WHITE}{label}{RESET} >> {MAGENTA}KARTEN-SCAN{RESET}: "
         details = "Suche Koordinaten... (Geduld...)"
     if percent is not None:
         try:
@@ -66,48 +106,92 @@ def print_status(phase, details, percent=None):
             status += f"[{bar}] {YELLOW}{p}%{RESET} "
         except Exception:
             pass
-    sys.stdout.write(chr(13) + (status + details)[: cols + 10].ljust(cols + 10))
-    sys.stdout.flush()
+    return (status + details)[: cols + 10]
+
 
+class Follower:
+    """Verfolgt ein Logfile + PID und sammelt die Kennzahlen."""
 
-print(f"{'--- OSM PLANETILER RUNNER (FOLLOWER MODE) ---'.center(cols)}")
-print(f"Log: {log_file_path}")
-print(f"{YELLOW}[INFO] Warte auf Log-Daten...{RESET}")
+    def __init__(self, log_path, pid):
+        self.log_path = log_path
+        self.pid = pid
+        self.label = os.path.basename(log_path).replace("_build.log", "").replace(".log", "")
+        self.data = new_stats()
+        self.metrics = MetricsCollector(self.label, os.path.abspath(log_path))
+        self.capture_mode = None
+        # Letzte Phasenzeile: Planetiler schreibt heap/postGC/rss in
+        # eingerückte Folgezeilen ohne "INF [phase]"-Präfix
+        self.last_phase = None
+        self.last_elapsed = None
+        self.status = format_status(self.label, "WAIT", "Warte auf Log-Daten...")
+        self.fh = None
+        self.pos = 0
+        self.partial = b""
+        self.done = False
+        self.pidfd = None
+        try:
+            self.pidfd = os.pidfd_open(pid)
+        except (AttributeError, OSError):
+            self.pidfd = None
+            if not is_process_running(pid):
+                self.done = True
 
-# Warten bis Logfile existiert
-while not os.path.exists(log_file_path):
-    time.sleep(0.1)
+    def _open(self):
+        if self.fh is None:
+            try:
+                self.fh = open(self.log_path, "rb")
+            except OSError:
+                return False
+        return True
+
+    def pump(self, messages):
+        """Liest alle verfügbaren Daten blockweise und verarbeitet komplette Zeilen."""
+        if not self._open():
+            return
+        try:
+            if os.fstat(self.fh.fileno()).st_size < self.pos:
+                # Logfile wurde geleert/neu angelegt
+                self.fh.seek(0)
+                self.pos = 0
+                self.partial = b""
+        except OSError:
+            return
 
-try:
-    with open(log_file_path, "r", encoding="utf-8", errors="ignore") as f:
         while True:
-            line = f.readline()
-            if not line:
-                # Keine neue Zeile? Prüfen ob Docker noch läuft
-                if not is_process_running(docker_pid):
-                    break  # Docker fertig, Loop beenden
-                time.sleep(0.1)  # Warten auf neue Daten
+            chunk = self.fh.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            self.pos += len(chunk)
+            buf = self.partial + chunk
+            cut = buf.rfind(b"\n")
+            if cut < 0:
+                self.partial = buf
                 continue
+            self.partial = buf[cut + 1:]
+            self._process(buf[: cut + 1], messages)
+
+    def flush(self, messages):
+        if self.partial:
+            self._process(self.partial, messages)
+            self.partial = b""
 
-            line_clean = line.strip()
-            line_no_color = clean_line(line_clean)
+    def _process(self, raw, messages):
+        text = raw.decode("utf-8", errors="ignore")
+        if ESC in text:
+            text = ansi_escape.sub("", text)
 
-            # --- PARSING ---
-            if "Biggest tiles" in line_no_color:
-                capture_mode = "biggest"
+        for line in text.splitlines():
+            line = line.strip()
+            if not line:
                 continue
-            if capture_mode == "biggest":
-                if not re.match(r"^\d+\.", line_no_color) and (
-                    "DEB" in line_no_color or "INF" in line_no_color
-                ):
-                    capture_mode = None
+
+            if self.capture_mode == "biggest":
+                if not BIGGEST_ENTRY_RE.match(line) and ("DEB" in line or "INF" in line):
+                    self.capture_mode = None
                 else:
-                    m = re.match(
-                        r"^\d+\.\s+(\S+)\s+\((.*?)\)\s+(.*?)\s+\((.*?)\)",
-                        line_no_color,
-                    )
+                    m = BIGGEST_RE.match(line)
                     if m:
-                        data["biggest_tiles"].append(
+                        self.data["biggest_tiles"].append(
                             {
                                 "coord": m.group(1),
                                 "size": m.group(2),
@@ -116,65 +200,256 @@ try:
                             }
                         )
 
-            if "Max tile:" in line_no_color:
-                m = re.search(r"Max tile:.*?\(gzipped:\s+(.*?)\)", line_no_color)
-                if m:
-                    data["max_tile_size"] = m.group(1)
-            if "Avg tile:" in line_no_color:
-                m = re.search(r"Avg tile:.*?\(gzipped:\s+(.*?)\)", line_no_color)
-                if m:
-                    data["avg_tile_size"] = m.group(1)
-            if "Finished in" in line_no_color and "cpu:" in line_no_color:
-                m = re.search(r"Finished in\s+(.*?)\s+cpu:(.*?)\s", line_no_color)
-                if m:
-                    data["duration"] = m.group(1)
-                    data["cpu_time"] = m.group(2)
-            if (
-                "archive" in line_no_color
-                and "features:" in line_no_color
-                and "tiles:" in line_no_color
-            ):
-                m = re.search(r"tiles:.*?\]\s+(\S+)", line_no_color)
-                if m:
-                    data["file_size"] = m.group(1)
-
-            # --- ANZEIGE ---
-            if "Exception" in line_clean or "Error" in line_clean or "❌" in line_clean:
-                sys.stdout.write("\n")
-                print(f"{RED}{line_clean}{RESET}")
+            if "tile" in line or "Finished" in line:
+                self._scan_details(line)
+
+            m = LINE_RE.match(line)
+            if not m:
+                if self.last_phase and CONTINUATION_RE.match(line):
+                    self.metrics.feed(self.last_phase, line, self.last_elapsed, continuation=True)
                 continue
+            group = m.lastgroup
+            if group != "error":
+                self.last_phase = None
+
+            if group == "biggest_start":
+                self.capture_mode = "biggest"
+            elif group == "error":
+                messages.append(f"{RED}[{self.label}] {line}{RESET}")
+            elif group == "bounds":
+                self.status = format_status(self.label, "osm_bounds", "Start...")
+            elif group == "init":
+                self.metrics.feed(None, m.group("init"))
+                if "bracket" not in line:
+                    self.status = format_status(self.label, "INIT", m.group("init").strip()[:50])
+            else:
+                self.metrics.feed(m.group("phase"), m.group("details"), m.group("elapsed"))
+                self._handle_phase(m.group("phase"), m.group("details"))
+                self.last_phase = m.group("phase")
+                self.last_elapsed = m.group("elapsed")
+
+    def _scan_details(self, line):
+        d = DETAIL_RE.search(line)
+        if not d:
+            return
+        kind = d.lastgroup
+        if kind == "tile_size":
+            key = "max_tile_size" if d.group("kind") == "Max" else "avg_tile_size"
+            self.data[key] = d.group("tile_size")
+        elif kind == "cpu":
+            self.data["duration"] = d.group("duration")
+            self.data["cpu_time"] = d.group("cpu")
+        elif kind == "file_size" and "archive" in line:
+            self.data["file_size"] = d.group("file_size")
+
+    def _handle_phase(self, phase, details):
+        perc_match = PERCENT_RE.search(details)
+        percent = perc_match.group(1) if perc_match else None
+        clean_details = details.replace("[", "").replace("]", "").strip()
+        self.status = format_status(self.label, phase, clean_details, percent)
+
+    def check_exit(self):
+        if self.done:
+            return
+        if self.pidfd is None and not is_process_running(self.pid):
+            self.done = True
+
+    def close(self):
+        if self.fh:
+            self.fh.close()
+        if self.pidfd is not None:
+            os.close(self.pidfd)
+            self.pidfd = None
+
+
+class Dashboard:
+    """Mehrzeilige Statusanzeige, eine Zeile pro Follower."""
+
+    def __init__(self, followers):
+        self.followers = followers
+        self.drawn = 0
+        self.last_render = 0.0
+        self.tty = sys.stdout.isatty()
+
+    def _clear(self):
+        if not self.drawn or not self.tty:
+            return
+        up = f"{ESC}[{self.drawn - 1}A" if self.drawn > 1 else ""
+        sys.stdout.write(chr(13) + up + f"{ESC}[J")
+        self.drawn = 0
+
+    def message(self, lines):
+        if not lines:
+            return
+        self._clear()
+        sys.stdout.write("\n".join(lines) + "\n")
+        self.render(force=True)
+
+    def render(self, force=False):
+        now = time.monotonic()
+        interval = RENDER_INTERVAL if self.tty else PLAIN_RENDER_INTERVAL
+        if not force and now - self.last_render < interval:
+            return
+        self.last_render = now
+        if not self.tty:
+            sys.stdout.write("\n".join(f.status for f in self.followers) + "\n")
+            sys.stdout.flush()
+            return
+        self._clear()
+        sys.stdout.write("\n".join(f.status for f in self.followers))
+        sys.stdout.flush()
+        self.drawn = len(self.followers)
+
+    def finish(self):
+        self.render(force=True)
+        if self.tty:
+            sys.stdout.write("\n")
+        self.drawn = 0
+
+
+def setup_inotify(paths):
+    """Beobachtet die Log-Verzeichnisse. Rückgabe: fd oder None."""
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+    if fd < 0:
+        return None
+
+    mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+    watched = 0
+    for directory in sorted({os.path.dirname(os.path.abspath(p)) for p in paths}):
+        if libc.inotify_add_watch(fd, os.fsencode(directory), mask) >= 0:
+            watched += 1
+    if not watched:
+        os.close(fd)
+        return None
+    return fd
+
+
+def drain(fd):
+    try:
+        while os.read(fd, 65536):
+            pass
+    except BlockingIOError:
+        pass
+
+
+def follow(followers):
+    dashboard = Dashboard(followers)
+    inotify_fd = setup_inotify([f.log_path for f in followers])
+
+    poller = select.poll()
+    if inotify_fd is not None:
+        poller.register(inotify_fd, select.POLLIN)
+    pidfds = {}
+    for f in followers:
+        if f.pidfd is not None:
+            poller.register(f.pidfd, select.POLLIN)
+            pidfds[f.pidfd] = f
+    timeout = POLL_TIMEOUT_MS if inotify_fd is not None and len(pidfds) == len(followers) else FALLBACK_POLL_MS
+
+    try:
+        while True:
+            messages = []
+            for f in followers:
+                f.pump(messages)
+            dashboard.message(messages)
+            dashboard.render()
+
+            for f in followers:
+                f.check_exit()
+            if all(f.done for f in followers):
+                break
+
+            for fd, _ in poller.poll(timeout):
+                if fd == inotify_fd:
+                    drain(fd)
+                elif fd in pidfds:
+                    pidfds[fd].done = True
+                    poller.unregister(fd)
+
+        # Restdaten nach Prozessende einlesen
+        messages = []
+        for f in followers:
+            f.pump(messages)
+            f.flush(messages)
+        dashboard.message(messages)
+    finally:
+        dashboard.finish()
+        if inotify_fd is not None:
+            os.close(inotify_fd)
+
+
+def save_stats(follower):
+    # Pro Karte eigene Dateien, damit at/at-plus am selben Tag sich nicht überschreiben
+    json_path = os.path.join(stats_dir, f"stats_{current_date}_{follower.label}.json")
+    report_path = os.path.join(stats_dir, f"report_{current_date}_{follower.label}.txt")
+    data = follower.data
+    # Sizing-Entscheidung (planetiler_sizing.py) zum Tunen neben die Stats legen
+    sizing_path = os.path.join(stats_dir, f"sizing_{follower.label}.json")
+    try:
+        with open(sizing_path, encoding="utf-8") as f:
+            data["sizing"] = json.load(f)
+    except (OSError, ValueError):
+        pass
+    try:
+        data["run_id"] = record_run(follower.metrics, data["file_size"], sizing=data.get("sizing"))
+    except Exception as e:
+        print(f"⚠️  Metriken-Historie nicht gespeichert ({follower.label}): {e}")
+    with open(json_path, "w") as f:
+        json.dump(data, f, indent=2)
+    with open(report_path, "w") as f:
+        f.write(
+            f"REPORT {data['date']}\nDuration: {data['duration']}\nSize: {data['file_size']}\n"
+        )
+
+
+def parse_args(argv):
+    if len(argv) < 2 or len(argv) % 2:
+        print("Usage: planetiler_follow.py <logfile> <pid> [<logfile> <pid> ...]")
+        sys.exit(2)
+    followers = []
+    for i in range(0, len(argv), 2):
+        try:
+            pid = int(argv[i + 1])
+        except ValueError:
+            print(f"❌ Ungültige PID: {argv[i + 1]}")
+            sys.exit(2)
+        followers.append(Follower(argv[i], pid))
+    return followers
+
+
+def main():
+    followers = parse_args(sys.argv[1:])
+
+    print(f"{'--- OSM PLANETILER RUNNER (FOLLOWER MODE) ---'.center(cols)}")
+    for f in followers:
+        print(f"Log: {f.log_path} (PID {f.pid})")
+    print(f"{YELLOW}[INFO] Warte auf Log-Daten...{RESET}")
+
+    try:
+        follow(followers)
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        print(f"\nERROR: {e}")
+
+    multi = len(followers) > 1
+    for f in followers:
+        save_stats(f)
+        f.close()
+
+    print("=" * cols)
+    for f in followers:
+        data = f.data
+        title = f" [{f.label}]" if multi else ""
+        print(f" {GREEN}✅ FERTIG!{RESET}{title}   (Dauer: {data['duration']})")
+        print(f" 📂 Datei:     {WHITE}{data['file_size']}{RESET}")
+        print(f" 📊 Kacheln:   Ø {data['avg_tile_size']} (Max: {RED}{data['max_tile_size']}{RESET})")
+    print("=" * cols)
+
 
-            if "Bounds not found" in line_no_color or "osm_bounds" in line_no_color:
-                print_status("osm_bounds", "Start...")
-
-            match = re.search(r"INF \[(.*?)\] - (.*)", line_no_color)
-            if match:
-                phase = match.group(1)
-                details = match.group(2)
-                perc_match = re.search(r"(\d+)%", details)
-                percent = perc_match.group(1) if perc_match else None
-                clean_details = details.replace("[", "").replace("]", "").strip()
-                print_status(phase, clean_details, percent)
-            elif "INF" in line_no_color and "bracket" not in line_no_color:
-                parts = line_no_color.split("INF - ")
-                if len(parts) > 1:
-                    print_status("INIT", parts[1].strip()[:50])
-
-except KeyboardInterrupt:
-    pass
-except Exception as e:
-    print(f"\nERROR: {e}")
-
-# Stats speichern
-with open(json_path, "w") as f:
-    json.dump(data, f, indent=2)
-with open(report_path, "w") as f:
-    f.write(
-        f"REPORT {data['date']}\nDuration: {data['duration']}\nSize: {data['file_size']}\n"
-    )
-
-print("\n" + "=" * cols)
-print(f" {GREEN}✅ FERTIG!{RESET}   (Dauer: {data['duration']})")
-print(f" 📂 Datei:     {WHITE}{data['file_size']}{RESET}")
-print(f" 📊 Kacheln:   Ø {data['avg_tile_size']} (Max: {RED}{data['max_tile_size']}{RESET})")
-print("=" * cols)
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+Planetiler Metriken-Historie (SQLite).
+
+Sammelt pro Karte und Lauf eine Zeitreihe aus dem Planetiler-Log
+(Phase, Raten, Heap/RSS) und legt sie in einer lokalen SQLite-DB ab.
+Die CLI vergleicht Läufe und markiert Phasen, die langsamer geworden sind.
+
+Usage:
+  planetiler_metrics.py runs [--map at] [--limit 20]
+  planetiler_metrics.py show <run_id>
+  planetiler_metrics.py compare --map at [--run ID] [--base ID] [--threshold 0.15]
+"""
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+STATS_DIR = Path(os.environ.get("STATS_DIR", "/tmp"))
+HISTORY_DB = Path(os.environ.get("PLANETILER_HISTORY_DB", str(STATS_DIR / "planetiler_history.sqlite")))
+
+DEFAULT_THRESHOLD = 0.15
+DEFAULT_MIN_SECONDS = 5.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    map TEXT NOT NULL,
+    started_at TEXT NOT NULL,
+    finished_at TEXT,
+    duration_s REAL,
+    cpu_s REAL,
+    file_size TEXT,
+    image TEXT,
+    image_id TEXT,
+    log_path TEXT,
+    sizing TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_map ON runs(map, id);
+CREATE TABLE IF NOT EXISTS phases (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    phase TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    wall_s REAL,
+    cpu_s REAL,
+    features_per_s REAL,
+    tiles_per_s REAL,
+    heap_max_bytes REAL,
+    postgc_max_bytes REAL,
+    rss_max_bytes REAL,
+    samples INTEGER,
+    PRIMARY KEY (run_id, phase)
+);
+CREATE TABLE IF NOT EXISTS samples (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    elapsed_s REAL,
+    phase TEXT,
+    metric TEXT,
+    value REAL
+);
+CREATE INDEX IF NOT EXISTS samples_run ON samples(run_id);
+"""
+
+# Ein Muster für alle Kennzahlen einer Planetiler-Phasenzeile
+METRIC_RE = re.compile(
+    r"(?P<counter>\w+): \[\s*[\d.]+[kMGTB]?\s+(?:\d+%\s+)?(?P<rate>[\d.]+[kMGT]?)/s"
+    r"|heap: (?P<heap>[\d.]+[kMGT]?B?)/"
+    r"|postGC: (?P<postgc>[\d.]+[kMGT]?B?)"
+    r"|rss: (?P<rss>[\d.]+[kMGT]?B?)"
+    r"|Finished in\s+(?P<wall>\S+)\s+cpu:(?P<cpu>\S+)"
+)
+DURATION_RE = re.compile(r"([\d.]+)(ms|h|m|s)")
+SIZE_UNITS = {"": 1, "k": 1e3, "M": 1e6, "G": 1e9, "T": 1e12}
+
+
+def parse_elapsed(value):
+    """'1:02:03' -> Sekunden."""
+    h, m, s = value.split(":")
+    return int(h) * 3600 + int(m) * 60 + int(s)
+
+
+def parse_duration(value):
+    """Planetiler-Dauer ('1h2m3s', '27s', '350ms') -> Sekunden."""
+    if not value:
+        return None
+    total = 0.0
+    found = False
+    for number, unit in DURATION_RE.findall(value):
+        found = True
+        n = float(number)
+        total += n * {"h": 3600, "m": 60, "s": 1, "ms": 0.001}[unit]
+    return total if found else None
+
+
+def parse_size(value):
+    """'2.3G' / '12k' / '1.3M' -> Zahl (dezimale Einheiten wie im Planetiler-Log)."""
+    if not value:
+        return None
+    value = value.rstrip("B")
+    unit = value[-1] if value and value[-1] in SIZE_UNITS else ""
+    number = value[: -1] if unit else value
+    try:
+        return float(number) * SIZE_UNITS[unit]
+    except ValueError:
+        return None
+
+
+class MetricsCollector:
+    """Wird vom Follower mit Phasenzeilen gefüttert und erzeugt die Zeitreihe."""
+
+    def __init__(self, map_name, log_path=None):
+        self.map_name = map_name
+        self.log_path = log_path
+        self.started_at = datetime.now().isoformat()
+        self.phases = {}
+        self.samples = []
+        self.duration_s = None
+        self.cpu_s = None
+
+    def _phase(self, name):
+        phase = self.phases.get(name)
+        if phase is None:
+            phase = {
+                "seq": len(self.phases),
+                "first": None, "last": None,
+                "wall_s": None, "cpu_s": None,
+                "features_per_s": None, "tiles_per_s": None,
+                "heap_max_bytes": None, "postgc_max_bytes": None, "rss_max_bytes": None,
+                "samples": 0,
+            }
+            self.phases[name] = phase
+        return phase
+
+    def feed(self, phase_name, details, elapsed=None, continuation=False):
+        """
+        phase_name=None steht für Zeilen ohne [phase] (Gesamtlauf).
+        continuation=True: eingerückte Folgezeile ohne Präfix (cpu/heap/postGC),
+        zählt nicht als eigener Fortschritts-Sample der Phase.
+        """
+        elapsed_s = parse_elapsed(elapsed) if elapsed else None
+        phase = self._phase(phase_name) if phase_name else None
+        if phase is not None and elapsed_s is not None and not continuation:
+            if phase["first"] is None:
+                phase["first"] = elapsed_s
+            phase["last"] = elapsed_s
+            phase["samples"] += 1
+
+        for m in METRIC_RE.finditer(details):
+            kind = m.lastgroup
+            if kind == "cpu":
+                wall = parse_duration(m.group("wall"))
+                cpu = parse_duration(m.group("cpu"))
+                if phase is None:
+                    self.duration_s, self.cpu_s = wall, cpu
+                else:
+                    phase["wall_s"], phase["cpu_s"] = wall, cpu
+                continue
+            if phase is None:
+                continue
+
+            if kind == "rate":
+                metric = f"{m.group('counter')}_per_s"
+                value = parse_size(m.group("rate"))
+                if metric in ("features_per_s", "tiles_per_s") and value is not None:
+                    phase[metric] = max(phase[metric] or 0, value)
+            else:
+                metric = f"{kind}_bytes"
+                value = parse_size(m.group(kind))
+                key = f"{kind}_max_bytes"
+                if value is not None:
+                    phase[key] = max(phase[key] or 0, value)
+
+            if value is not None:
+                self.samples.append((elapsed_s, phase_name, metric, value))
+
+    def phase_rows(self):
+        for name, p in self.phases.items():
+            wall = p["wall_s"]
+            if wall is None and p["first"] is not None:
+                wall = float(p["last"] - p["first"])
+            yield name, p, wall
+
+
+def connect(db_path=HISTORY_DB):
+    db_path = Path(db_path)
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(db_path))
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.executescript(SCHEMA)
+    # Ältere DBs ohne Sizing-Spalte nachrüsten
+    columns = {row["name"] for row in conn.execute("PRAGMA table_info(runs)")}
+    if "sizing" not in columns:
+        conn.execute("ALTER TABLE runs ADD COLUMN sizing TEXT")
+    return conn
+
+
+def record_run(collector, file_size=None, db_path=HISTORY_DB, sizing=None):
+    """Speichert einen abgeschlossenen Lauf. Rückgabe: run_id."""
+    conn = connect(db_path)
+    try:
+        with conn:
+            cur = conn.execute(
+                "INSERT INTO runs (map, started_at, finished_at, duration_s, cpu_s, file_size, image, image_id, log_path, sizing)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    collector.map_name,
+                    collector.started_at,
+                    datetime.now().isoformat(),
+                    collector.duration_s,
+                    collector.cpu_s,
+                    file_size,
+                    os.environ.get("PLANETILER_IMAGE"),
+                    os.environ.get("PLANETILER_IMAGE_ID"),
+                    collector.log_path,
+                    json.dumps(sizing) if sizing else None,
+                ),
+            )
+            run_id = cur.lastrowid
+            conn.executemany(
+                "INSERT INTO phases (run_id, phase, seq, wall_s, cpu_s, features_per_s, tiles_per_s,"
+                " heap_max_bytes, postgc_max_bytes, rss_max_bytes, samples) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        run_id, name, p["seq"], wall, p["cpu_s"], p["features_per_s"], p["tiles_per_s"],
+                        p["heap_max_bytes"], p["postgc_max_bytes"], p["rss_max_bytes"], p["samples"],
+                    )
+                    for name, p, wall in collector.phase_rows()
+                ],
+            )
+            conn.executemany(
+                "INSERT INTO samples (run_id, elapsed_s, phase, metric, value) VALUES (?, ?, ?, ?, ?)",
+                [(run_id, *sample) for sample in collector.samples],
+            )
+        return run_id
+    finally:
+        conn.close()
+
+
+def load_phases(conn, run_id):
+    rows = conn.execute("SELECT * FROM phases WHERE run_id = ? ORDER BY seq", (run_id,)).fetchall()
+    return {row["phase"]: row for row in rows}
+
+
+def compare_runs(base, current, threshold=DEFAULT_THRESHOLD, min_seconds=DEFAULT_MIN_SECONDS):
+    """
+    Vergleicht zwei Phasen-Dicts ({phase: row}). Rückgabe: Liste von
+    (phase, base_wall, cur_wall, ratio, regression).
+    """
+    result = []
+    for phase, row in current.items():
+        cur_wall = row["wall_s"]
+        base_row = base.get(phase)
+        base_wall = base_row["wall_s"] if base_row is not None else None
+        ratio = None
+        regression = False
+        if cur_wall is not None and base_wall:
+            ratio = cur_wall / base_wall
+            regression = ratio > 1 + threshold and (cur_wall - base_wall) >= min_seconds
+        result.append((phase, base_wall, cur_wall, ratio, regression))
+    return result
+
+
+def _fmt_s(value):
+    return "-" if value is None else time.strftime("%H:%M:%S", time.gmtime(value))
+
+
+def _fmt_bytes(value):
+    return "-" if value is None else f"{value / 1e9:.1f}G"
+
+
+def cmd_runs(conn, args):
+    query = "SELECT * FROM runs"
+    params = []
+    if args.map:
+        query += " WHERE map = ?"
+        params.append(args.map)
+    query += " ORDER BY id DESC LIMIT ?"
+    params.append(args.limit)
+    for row in conn.execute(query, params):
+        image = (row["image_id"] or "")[:19]
+        print(f"#{row['id']:<5} {row['map']:<12} {row['started_at'][:19]}  Dauer {_fmt_s(row['duration_s'])}  {row['file_size'] or '-':>8}  {image}")
+    return 0
+
+
+def cmd_show(conn, args):
+    run = conn.execute("SELECT * FROM runs WHERE id = ?", (args.run_id,)).fetchone()
+    if run is None:
+        print(f"❌ Lauf #{args.run_id} nicht gefunden.")
+        return 1
+    print(f"Lauf #{run['id']} ({run['map']}, {run['started_at'][:19]}, Image {run['image_id'] or '-'})")
+    if run["sizing"]:
+        sizing = json.loads(run["sizing"])
+        print(
+            f"   Sizing: Heap {sizing.get('heap')}, {sizing.get('threads')} Threads,"
+            f" nodemap {sizing.get('nodemap_type')}, storage {sizing.get('storage')}"
+        )
+    for phase, row in load_phases(conn, run["id"]).items():
+        print(
+            f"   {phase:<24} {_fmt_s(row['wall_s'])}  features/s {row['features_per_s'] or '-'}"
+            f"  tiles/s {row['tiles_per_s'] or '-'}  heap {_fmt_bytes(row['heap_max_bytes'])}"
+        )
+    return 0
+
+
+def cmd_compare(conn, args):
+    run_ids = [
+        row["id"]
+        for row in conn.execute("SELECT id FROM runs WHERE map = ? ORDER BY id DESC", (args.map,))
+    ]
+    current_id = args.run or (run_ids[0] if run_ids else None)
+    base_id = args.base or next((rid for rid in run_ids if rid < (current_id or 0)), None)
+    if current_id is None or base_id is None:
+        print(f"⚠️  Zu wenige Läufe für '{args.map}' zum Vergleichen.")
+        return 0
+
+    rows = compare_runs(load_phases(conn, base_id), load_phases(conn, current_id), args.threshold, args.min_seconds)
+    print(f"Vergleich {args.map}: Basis #{base_id} -> Lauf #{current_id} (Schwelle +{args.threshold:.0%})")
+    regressions = 0
+    for phase, base_wall, cur_wall, ratio, regression in rows:
+        marker = "🔴" if regression else "  "
+        change = "-" if ratio is None else f"{(ratio - 1):+.0%}"
+        print(f" {marker} {phase:<24} {_fmt_s(base_wall)} -> {_fmt_s(cur_wall)}  {change:>6}")
+        regressions += regression
+    if regressions:
+        print(f"❌ {regressions} Phase(n) langsamer geworden.")
+        return 1 if args.fail_on_regression else 0
+    print("✅ Keine Regressionen.")
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Planetiler Metriken-Historie")
+    parser.add_argument("--db", default=str(HISTORY_DB))
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_runs = sub.add_parser("runs", help="Letzte Läufe auflisten")
+    p_runs.add_argument("--map")
+    p_runs.add_argument("--limit", type=int, default=20)
+
+    p_show = sub.add_parser("show", help="Phasen eines Laufs anzeigen")
+    p_show.add_argument("run_id", type=int)
+
+    p_cmp = sub.add_parser("compare", help="Zwei Läufe einer Karte vergleichen")
+    p_cmp.add_argument("--map", required=True)
+    p_cmp.add_argument("--run", type=int, help="Lauf (Standard: letzter)")
+    p_cmp.add_argument("--base", type=int, help="Basis (Standard: vorheriger)")
+    p_cmp.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    p_cmp.add_argument("--min-seconds", type=float, default=DEFAULT_MIN_SECONDS)
+    p_cmp.add_argument("--fail-on-regression", action="store_true")
+
+    args = parser.parse_args()
+    if not Path(args.db).exists():
+        print(f"⚠️  Keine Historie gefunden: {args.db}")
+        return 0
+
+    conn = connect(args.db)
+    try:
+        handler = {"runs": cmd_runs, "show": cmd_show, "compare": cmd_compare}[args.command]
+        return handler(conn, args)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
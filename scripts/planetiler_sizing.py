@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Ressourcen-Sizing für Planetiler pro Karte.
+
+Aus PBF-Größe (-> geschätzte Node-Anzahl), Host-RAM, Kernen und freiem
+Scratch-Platz werden Heap, --threads, --nodemap-type und --storage
+(ram vs. mmap) gewählt. Passt der Build nicht auf den Host, bricht das
+Skript vor dem Docker-Start mit einer klaren Meldung ab.
+
+Die Entscheidung landet als $STATS_DIR/sizing_<karte>.json neben den
+Build-Stats; planetiler_follow.py übernimmt sie in Stats-JSON und Historie.
+
+Faustregeln (Planetiler-Doku, an unseren Läufen justierbar per Env):
+- Node-Locations (sparsearray): ~8 Byte pro Node
+- Feature-Zwischenspeicher: ~1x PBF-Größe
+- --storage=ram: Heap ~1.5x PBF + Basis; --storage=mmap: Heap ~0.5x PBF + Basis,
+  Rest liegt als Datei im Scratch und profitiert vom Page-Cache
+
+Usage:
+  planetiler_sizing.py --map at --pbf merged/at.osm.pbf --scratch-dir /srv/build/osm/tmp [--shell]
+"""
+import argparse
+import json
+import os
+import shlex
+import shutil
+import sys
+from datetime import datetime
+from pathlib import Path
+
+STATS_DIR = Path(os.environ.get("STATS_DIR", "/tmp"))
+
+NODES_PER_BYTE = float(os.environ.get("PLANETILER_NODES_PER_BYTE", "0.12"))
+NODE_BYTES = 8 * 1.1
+FEATURE_FACTOR = 1.0
+OUTPUT_FACTOR = 1.0
+RAM_HEAP_FACTOR = 1.5
+MMAP_HEAP_FACTOR = 0.5
+BASE_HEAP = 2 * 1024**3
+# Nicht-Heap-Anteil der JVM (Metaspace, Direct Buffers, Threads) + OS
+JVM_OVERHEAD = 0.15
+HOST_RESERVE = 1.5 * 1024**3
+# Ab hier lohnt sich das dichte Array statt sparsearray (praktisch: Planet)
+ARRAY_NODEMAP_NODES = 1_500_000_000
+GIB = 1024**3
+
+
+class SizingError(Exception):
+    """Build passt nicht auf den Host."""
+
+
+def read_meminfo():
+    values = {}
+    try:
+        with open("/proc/meminfo", encoding="ascii") as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                values[key] = int(rest.split()[0]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return values
+
+
+def host_capacity(scratch_dir):
+    mem = read_meminfo()
+    total = mem.get("MemTotal", 8 * GIB)
+    available = mem.get("MemAvailable", total // 2)
+    # Budget aus dem Pipeline-Runner respektieren (Planetiler läuft neben anderen Zweigen)
+    budget = os.environ.get("PLANETILER_RAM_GB")
+    if budget:
+        available = min(available, int(float(budget) * GIB))
+    cores = int(os.environ.get("PLANETILER_THREADS", "0")) or os.cpu_count() or 1
+    return {
+        "cores": cores,
+        "mem_total": total,
+        "mem_available": available,
+        "scratch_free": shutil.disk_usage(scratch_dir).free,
+    }
+
+
+def size_build(pbf_bytes, host):
+    """Reine Entscheidungslogik. Rückgabe: dict; SizingError wenn nichts passt."""
+    nodes = int(pbf_bytes * NODES_PER_BYTE)
+    nodemap_bytes = int(nodes * NODE_BYTES)
+    feature_bytes = int(pbf_bytes * FEATURE_FACTOR)
+    output_bytes = int(pbf_bytes * OUTPUT_FACTOR)
+    usable = max(0, host["mem_available"] - HOST_RESERVE)
+    heap_cap = int(usable / (1 + JVM_OVERHEAD))
+
+    ram_heap = int(BASE_HEAP + RAM_HEAP_FACTOR * pbf_bytes)
+    mmap_heap = int(BASE_HEAP + MMAP_HEAP_FACTOR * pbf_bytes)
+    notes = []
+
+    if ram_heap <= heap_cap:
+        storage = "ram"
+        heap = ram_heap
+        scratch_needed = output_bytes
+        notes.append("Alles passt in den Heap -> --storage=ram (kein mmap-Overhead)")
+    elif mmap_heap <= heap_cap:
+        storage = "mmap"
+        heap = mmap_heap
+        scratch_needed = nodemap_bytes + feature_bytes + output_bytes
+        page_cache = usable - int(heap * (1 + JVM_OVERHEAD))
+        notes.append(f"Heap für --storage=ram ({ram_heap / GIB:.1f} GiB) > verfügbar ({heap_cap / GIB:.1f} GiB) -> mmap")
+        if page_cache < nodemap_bytes:
+            notes.append(
+                f"Page-Cache ({page_cache / GIB:.1f} GiB) kleiner als Node-Map ({nodemap_bytes / GIB:.1f} GiB) - Build wird langsamer"
+            )
+    else:
+        raise SizingError(
+            f"Zu wenig RAM: Planetiler braucht mindestens {mmap_heap * (1 + JVM_OVERHEAD) / GIB:.1f} GiB "
+            f"(Heap {mmap_heap / GIB:.1f} GiB + JVM), verfügbar sind {usable / GIB:.1f} GiB."
+        )
+
+    if scratch_needed > host["scratch_free"]:
+        raise SizingError(
+            f"Zu wenig Platz im Scratch-Verzeichnis: benötigt ~{scratch_needed / GIB:.1f} GiB, "
+            f"frei {host['scratch_free'] / GIB:.1f} GiB (storage={storage})."
+        )
+
+    # Kleine Heaps vertragen nicht beliebig viele Worker (je Thread Puffer im Heap)
+    threads = max(1, min(host["cores"], int(heap / (GIB / 2))))
+    nodemap_type = "array" if nodes >= ARRAY_NODEMAP_NODES else "sparsearray"
+
+    # -Xmx in ganzen GiB: aufrunden nur, wenn es noch in den geprüften Heap passt
+    heap_gib = -(-heap // GIB)
+    if heap_gib * GIB > heap_cap:
+        heap_gib = heap // GIB
+    heap_gib = max(1, heap_gib)
+    return {
+        "heap": f"{heap_gib}g",
+        "threads": threads,
+        "nodemap_type": nodemap_type,
+        "nodemap_storage": storage,
+        "storage": storage,
+        "estimates": {
+            "nodes": nodes,
+            "nodemap_bytes": nodemap_bytes,
+            "feature_bytes": feature_bytes,
+            "heap_ram_bytes": ram_heap,
+            "heap_mmap_bytes": mmap_heap,
+            "scratch_needed_bytes": scratch_needed,
+        },
+        "notes": notes,
+    }
+
+
+def planetiler_args(decision, tmpdir):
+    return [
+        f"--threads={decision['threads']}",
+        f"--nodemap-type={decision['nodemap_type']}",
+        f"--nodemap-storage={decision['nodemap_storage']}",
+        f"--storage={decision['storage']}",
+        f"--tmpdir={tmpdir}",
+    ]
+
+
+def sizing_path(map_name):
+    return STATS_DIR / f"sizing_{map_name}.json"
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Planetiler Ressourcen-Sizing")
+    parser.add_argument("--map", required=True)
+    parser.add_argument("--pbf", required=True)
+    parser.add_argument("--scratch-dir", required=True, help="Host-Verzeichnis für Planetiler-Temp-Dateien")
+    parser.add_argument("--container-tmpdir", default="/out/planetiler_tmp", help="Gleiches Verzeichnis im Container")
+    parser.add_argument("--shell", action="store_true", help="Ausgabe als Shell-Zuweisungen (für eval)")
+    args = parser.parse_args(argv)
+
+    pbf_bytes = Path(args.pbf).stat().st_size
+    Path(args.scratch_dir).mkdir(parents=True, exist_ok=True)
+    host = host_capacity(args.scratch_dir)
+
+    record = {
+        "map": args.map,
+        "decided_at": datetime.now().isoformat(timespec="seconds"),
+        "pbf": str(args.pbf),
+        "pbf_bytes": pbf_bytes,
+        "host": host,
+    }
+    try:
+        decision = size_build(pbf_bytes, host)
+    except SizingError as e:
+        record["error"] = str(e)
+        STATS_DIR.mkdir(parents=True, exist_ok=True)
+        sizing_path(args.map).write_text(json.dumps(record, indent=2) + "\n", encoding="utf-8")
+        print(f"❌ {args.map}: {e}", file=sys.stderr)
+        return 1
+
+    record.update(decision)
+    record["args"] = planetiler_args(decision, args.container_tmpdir)
+    STATS_DIR.mkdir(parents=True, exist_ok=True)
+    sizing_path(args.map).write_text(json.dumps(record, indent=2) + "\n", encoding="utf-8")
+
+    summary = (
+        f"Heap {decision['heap']}, {decision['threads']} Threads, nodemap {decision['nodemap_type']}, "
+        f"storage {decision['storage']} (PBF {pbf_bytes / GIB:.2f} GiB, ~{decision['estimates']['nodes'] / 1e6:.0f} Mio. Nodes)"
+    )
+    if args.shell:
+        print(f"PLANETILER_HEAP={shlex.quote(decision['heap'])}")
+        print(f"PLANETILER_SIZING_ARGS=({' '.join(shlex.quote(a) for a in record['args'])})")
+        print(f"PLANETILER_SIZING_SUMMARY={shlex.quote(summary)}")
+        for note in decision["notes"]:
+            print(f"   ℹ️  {args.map}: {note}", file=sys.stderr)
+    else:
+        print(json.dumps(record, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
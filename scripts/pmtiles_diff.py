@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Diff zweier PMTiles v3 Archive (z.B. altes und neues Release von at.pmtiles).
+
+Beide Archive werden per mmap geöffnet und Root- sowie Leaf-Directories
+parallel nach Tile-ID durchlaufen. Pro Tile werden Länge und Inhalt
+verglichen (Länge zuerst, Bytes nur bei gleicher Länge; identische
+Offset-Paare aus deduplizierten Tiles werden nur einmal verglichen).
+
+Ergebnis:
+- Zusammenfassung pro Zoomstufe (unverändert/geändert/neu/entfernt, Bytes)
+- Bounding-Box der geänderten Tiles pro Zoomstufe (Tile-Koordinaten + lon/lat)
+- kompakte Liste geänderter Tile-IDs als Bereiche (für Cache-Purges)
+
+Der Tile-ID-Raum wird an den Leaf-Grenzen in Bereiche geteilt, die
+Worker-Prozesse unabhängig vergleichen. Im Speicher liegen pro Worker
+nur die gerade gelesenen Directories.
+
+Usage:
+  pmtiles_diff.py alt.pmtiles neu.pmtiles [--json report.json] [--ids changed.txt] [--zxy] [--workers N]
+"""
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from pmtiles_reader import (
+    PMTilesError,
+    archive_key,
+    iter_runs,
+    map_archive,
+    range_bbox,
+    read_metadata,
+    split_by_zoom,
+    split_id_space,
+    tile_bbox_lonlat,
+    tileid_to_zxy,
+    worker_archive,
+)
+
+WORKERS = int(os.environ.get("PMTILES_WORKERS", "0")) or os.cpu_count() or 1
+# Bereiche pro Worker (mehr = bessere Lastverteilung bei ungleich dichten Zoomstufen)
+PARTS_PER_WORKER = 4
+COMPARE_CACHE_LIMIT = 200_000
+# Header-Felder, deren Änderung nichts über den Tile-Inhalt aussagt
+LAYOUT_FIELDS = {
+    "root_offset", "root_length", "metadata_offset", "metadata_length",
+    "leaf_dirs_offset", "leaf_dirs_length", "tile_data_offset", "tile_data_length",
+}
+KINDS = ("unchanged", "changed", "added", "removed")
+
+
+# --- WORKER ---
+
+class RangeDiff:
+    """Sammelt das Ergebnis eines ID-Bereichs."""
+
+    def __init__(self):
+        self.zooms = {}
+        self.changed = []  # [start, end) zusammengefasst
+
+    def _zoom(self, z):
+        stats = self.zooms.get(z)
+        if stats is None:
+            stats = self.zooms[z] = {kind: 0 for kind in KINDS}
+            stats.update(bytes_old=0, bytes_new=0, bbox=None)
+        return stats
+
+    def add(self, kind, start, end, old_length=0, new_length=0):
+        for z, s, e in split_by_zoom(start, end):
+            stats = self._zoom(z)
+            count = e - s
+            stats[kind] += count
+            stats["bytes_old"] += old_length * count
+            stats["bytes_new"] += new_length * count
+            if kind == "unchanged":
+                continue
+            _, minx, miny, maxx, maxy = range_bbox(s, e)
+            bbox = stats["bbox"]
+            stats["bbox"] = [minx, miny, maxx, maxy] if bbox is None else [
+                min(bbox[0], minx), min(bbox[1], miny), max(bbox[2], maxx), max(bbox[3], maxy)
+            ]
+        if kind != "unchanged":
+            if self.changed and self.changed[-1][1] == start:
+                self.changed[-1][1] = end
+            else:
+                self.changed.append([start, end])
+
+
+def diff_range(old_path, old_key, new_path, new_key, lo, hi):
+    """Worker: vergleicht beide Archive im Tile-ID-Bereich [lo, hi)."""
+    mm_old, header_old = worker_archive(old_path, old_key)
+    mm_new, header_new = worker_archive(new_path, new_key)
+    result = RangeDiff()
+    compared = {}
+
+    def same(a, b):
+        if a[3] != b[3]:
+            return False
+        key = (a[2], b[2])
+        hit = compared.get(key)
+        if hit is None:
+            if len(compared) >= COMPARE_CACHE_LIMIT:
+                compared.clear()
+            hit = compared[key] = mm_old[a[2]:a[2] + a[3]] == mm_new[b[2]:b[2] + b[3]]
+        return hit
+
+    old_iter = iter_runs(mm_old, header_old, lo, hi)
+    new_iter = iter_runs(mm_new, header_new, lo, hi)
+    a = next(old_iter, None)
+    b = next(new_iter, None)
+    while a is not None or b is not None:
+        if b is None or (a is not None and a[1] <= b[0]):
+            result.add("removed", a[0], a[1], old_length=a[3])
+            a = next(old_iter, None)
+            continue
+        if a is None or b[1] <= a[0]:
+            result.add("added", b[0], b[1], new_length=b[3])
+            b = next(new_iter, None)
+            continue
+
+        # Überlappung: Vorlauf des früheren Intervalls ist neu bzw. entfernt
+        start = max(a[0], b[0])
+        if a[0] < start:
+            result.add("removed", a[0], start, old_length=a[3])
+        if b[0] < start:
+            result.add("added", b[0], start, new_length=b[3])
+        end = min(a[1], b[1])
+        kind = "unchanged" if same(a, b) else "changed"
+        result.add(kind, start, end, old_length=a[3], new_length=b[3])
+
+        a = (end, *a[1:]) if a[1] > end else next(old_iter, None)
+        b = (end, *b[1:]) if b[1] > end else next(new_iter, None)
+
+    return result.zooms, result.changed
+
+
+# --- KOORDINATION ---
+
+def merge_results(results):
+    zooms = {}
+    changed = []
+    for part_zooms, part_changed in results:
+        for z, stats in part_zooms.items():
+            total = zooms.setdefault(z, {kind: 0 for kind in KINDS} | {"bytes_old": 0, "bytes_new": 0, "bbox": None})
+            for key in (*KINDS, "bytes_old", "bytes_new"):
+                total[key] += stats[key]
+            bbox, other = total["bbox"], stats["bbox"]
+            if other is not None:
+                total["bbox"] = other if bbox is None else [
+                    min(bbox[0], other[0]), min(bbox[1], other[1]), max(bbox[2], other[2]), max(bbox[3], other[3])
+                ]
+        for start, end in part_changed:
+            if changed and changed[-1][1] == start:
+                changed[-1][1] = end
+            else:
+                changed.append([start, end])
+    return zooms, changed
+
+
+def diff_archives(old_path, new_path, workers=WORKERS, executor=None):
+    """Vergleicht zwei Archive. Rückgabe: (report, changed_ranges)."""
+    old_path, new_path = str(old_path), str(new_path)
+    archives = [map_archive(old_path), map_archive(new_path)]
+    try:
+        (mm_old, header_old), (mm_new, header_new) = archives
+        header_changes = {
+            key: [header_old[key], header_new[key]]
+            for key in header_old
+            if key not in LAYOUT_FIELDS and header_old[key] != header_new[key]
+        }
+        metadata_changed = read_metadata(mm_old, header_old) != read_metadata(mm_new, header_new)
+        ranges = split_id_space(archives, workers * PARTS_PER_WORKER)
+    finally:
+        for mm, _ in archives:
+            mm.close()
+
+    jobs = [(old_path, archive_key(old_path), new_path, archive_key(new_path), lo, hi) for lo, hi in ranges]
+    if len(jobs) == 1 or workers <= 1:
+        results = [diff_range(*job) for job in jobs]
+    else:
+        own_executor = executor is None
+        if own_executor:
+            executor = ProcessPoolExecutor(max_workers=workers)
+        try:
+            results = list(executor.map(diff_range, *zip(*jobs)))
+        finally:
+            if own_executor:
+                executor.shutdown(cancel_futures=True)
+
+    zooms, changed = merge_results(results)
+    totals = {key: sum(stats[key] for stats in zooms.values()) for key in (*KINDS, "bytes_old", "bytes_new")}
+    report = {
+        "old": old_path,
+        "new": new_path,
+        "identical": not header_changes and not metadata_changed and not changed,
+        "header_changes": header_changes,
+        "metadata_changed": metadata_changed,
+        "totals": totals,
+        "changed_ranges": len(changed),
+        "zooms": {},
+    }
+    for z in sorted(zooms):
+        stats = zooms[z]
+        entry = {key: stats[key] for key in (*KINDS, "bytes_old", "bytes_new")}
+        if stats["bbox"] is not None:
+            entry["bbox_tiles"] = stats["bbox"]
+            entry["bbox"] = tile_bbox_lonlat(z, *stats["bbox"])
+        report["zooms"][str(z)] = entry
+    return report, changed
+
+
+def write_ids(path, changed, zxy=False):
+    """Geänderte Tiles: eine Zeile pro Bereich `start-end` (inklusive) bzw. pro Tile `z/x/y`."""
+    with open(path, "w", encoding="ascii") as f:
+        for start, end in changed:
+            if zxy:
+                for tile_id in range(start, end):
+                    f.write("%d/%d/%d\n" % tileid_to_zxy(tile_id))
+            elif end - start == 1:
+                f.write(f"{start}\n")
+            else:
+                f.write(f"{start}-{end - 1}\n")
+
+
+def print_summary(report):
+    totals = report["totals"]
+    print(f"📊 {Path(report['old']).name} -> {Path(report['new']).name}")
+    if report["identical"]:
+        print("   ✅ Inhalt identisch.")
+        return
+    for key, (old, new) in report["header_changes"].items():
+        print(f"   ℹ️  Header {key}: {old} -> {new}")
+    if report["metadata_changed"]:
+        print("   ℹ️  Metadaten geändert")
+    print(f"   {'Zoom':>4} {'unverändert':>12} {'geändert':>10} {'neu':>10} {'entfernt':>10}  Bounding-Box (geändert)")
+    for z, stats in report["zooms"].items():
+        bbox = ",".join(f"{v:.4f}" for v in stats["bbox"]) if "bbox" in stats else "-"
+        print(
+            f"   {z:>4} {stats['unchanged']:>12} {stats['changed']:>10} {stats['added']:>10} {stats['removed']:>10}  {bbox}"
+        )
+    touched = totals["changed"] + totals["added"] + totals["removed"]
+    share = touched / max(1, touched + totals["unchanged"]) * 100
+    print(f"   Σ {touched} von {touched + totals['unchanged']} Tiles betroffen ({share:.1f} %), {report['changed_ranges']} ID-Bereiche")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Diff zweier PMTiles-Archive")
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--json", help="Report als JSON schreiben ('-' = stdout)")
+    parser.add_argument("--ids", help="Geänderte Tile-IDs (Bereiche) in diese Datei schreiben")
+    parser.add_argument("--zxy", action="store_true", help="--ids als z/x/y-Liste statt ID-Bereichen")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    args = parser.parse_args(argv)
+
+    try:
+        report, changed = diff_archives(args.old, args.new, max(1, args.workers))
+    except (OSError, PMTilesError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 2
+
+    if args.json == "-":
+        print(json.dumps(report, indent=2))
+    else:
+        print_summary(report)
+        if args.json:
+            Path(args.json).write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+    if args.ids:
+        write_ids(args.ids, changed, args.zxy)
+    return 0 if report["identical"] else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+PMTiles-Optimierer: bringt Archive aus Planetiler, `pmtiles convert` und
+tippecanoe auf ein einheitliches Layout, bevor sie deployt werden.
+
+1. Clustering: Tile-Daten in Hilbert-Reihenfolge (Tile-ID), damit
+   benachbarte Tiles auch in der Datei benachbart liegen.
+2. Deduplizierung: identische Tiles (blake2b) liegen nur einmal im Archiv,
+   direkt aufeinanderfolgende identische Tiles (Meer, leere Flächen) werden
+   als Run-Length-Eintrag geschrieben.
+3. Leaf-Directories: die Leaf-Größe wird so gewählt, dass typische
+   Viewports (4x3 Tiles pro Zoomstufe, Stichprobe über alle Zoomstufen)
+   die geringsten Kosten haben - pro Directory-Fetch PMTILES_REQUEST_COST_BYTES
+   plus die geladenen Directory-Bytes.
+4. Prüfung: Ausgabe und Eingabe werden Tile für Tile (Inhalts-Hash)
+   verglichen; erst dann wird die Ausgabe übernommen.
+
+Worker-Prozesse lesen und hashen Tile-ID-Bereiche (Grenzen an den
+Root-Einträgen) und schreiben bereichsweise eindeutige Inhalte in
+Teil-Dateien; der Hauptprozess streamt sie in Bereichsreihenfolge in den
+Writer. Im Speicher liegen nur Directory-Einträge und Hashes, nie Tile-Daten.
+
+Usage:
+  pmtiles_optimize.py archiv.pmtiles [ziel.pmtiles] [--leaf-size N] [--workers N] [--no-verify] [--json out.json]
+  Ohne Ziel wird das Archiv ersetzt (neue Datei + os.replace, Hardlinks alter Releases bleiben intakt).
+
+Exit-Code: 0 = ok, 1 = Fehler oder Ausgabe nicht äquivalent.
+"""
+import argparse
+import bisect
+import gzip
+import hashlib
+import itertools
+import json
+import mmap
+import os
+import random
+import shutil
+import tempfile
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from pmtiles_reader import (
+    PMTilesError,
+    archive_key,
+    iter_runs,
+    map_archive,
+    read_metadata,
+    split_id_space,
+    tileid_to_zxy,
+    worker_archive,
+    zoom_first_id,
+    zxy_to_tileid,
+)
+from pmtiles_writer import LEAF_START_SIZE, PMTilesWriter, serialize_directory
+
+WORKERS = int(os.environ.get("PMTILES_WORKERS", "0")) or os.cpu_count() or 1
+PARTS_PER_WORKER = 4
+# Kosten eines zusätzlichen Range-Requests in Byte-Äquivalent (Latenz x Bandbreite)
+REQUEST_COST_BYTES = int(os.environ.get("PMTILES_REQUEST_COST_BYTES", "65536"))
+LEAF_CANDIDATES = [1024 << i for i in range(7)]  # 1024 .. 65536 Einträge
+SAMPLE_VIEWPORTS = 200
+VIEWPORT_TILES = (4, 3)
+DIGEST_SIZE = 16
+
+
+def log_info(msg):
+    print(f"   ℹ️  {msg}")
+
+def log_success(msg):
+    print(f"   ✅ {msg}")
+
+def log_warn(msg):
+    print(f"   ⚠️  {msg}")
+
+def log_error(msg):
+    print(f"   ❌ {msg}")
+
+
+def _digest(data):
+    return hashlib.blake2b(data, digest_size=DIGEST_SIZE).digest()
+
+
+def iter_segments(mm, header, lo, hi):
+    """
+    (start, end, offset, length, digest) in Tile-ID-Reihenfolge, auf [lo, hi)
+    beschnitten. Aufeinanderfolgende Einträge mit gleichem Inhalt werden
+    zusammengefasst - so sind Ein- und Ausgabe direkt vergleichbar.
+    """
+    by_offset = {}
+    current = None
+    for start, end, offset, length in iter_runs(mm, header, lo, hi):
+        digest = by_offset.get(offset)
+        if digest is None:
+            digest = by_offset[offset] = _digest(mm[offset:offset + length])
+        if current and current[1] == start and current[4] == digest:
+            current[1] = end
+            continue
+        if current:
+            yield tuple(current)
+        current = [start, end, offset, length, digest]
+    if current:
+        yield tuple(current)
+
+
+# --- WORKER ---
+
+def rewrite_range(path, key, lo, hi, part_path):
+    """
+    Worker: schreibt die im Bereich eindeutigen Inhalte nach part_path.
+    Rückgabe: (tile_ids, run_lengths, lengths, part_offsets, digests) als Bytes.
+    """
+    mm, header = worker_archive(path, key)
+    tile_ids = array("Q")
+    run_lengths = array("Q")
+    lengths = array("L")
+    part_offsets = array("Q")
+    digests = bytearray()
+    seen = {}
+    written = 0
+    with open(part_path, "wb") as out:
+        for start, end, offset, length, digest in iter_segments(mm, header, lo, hi):
+            part_offset = seen.get(digest)
+            if part_offset is None:
+                part_offset = seen[digest] = written
+                out.write(mm[offset:offset + length])
+                written += length
+            tile_ids.append(start)
+            run_lengths.append(end - start)
+            lengths.append(length)
+            part_offsets.append(part_offset)
+            digests += digest
+    return tile_ids.tobytes(), run_lengths.tobytes(), lengths.tobytes(), part_offsets.tobytes(), bytes(digests)
+
+
+def verify_range(src, src_key, dst, dst_key, lo, hi):
+    """Worker: vergleicht [lo, hi) beider Archive. Rückgabe: (Segmente, erste Abweichung oder None)."""
+    src_archive = worker_archive(src, src_key)
+    dst_archive = worker_archive(dst, dst_key)
+    count = 0
+    pairs = itertools.zip_longest(iter_segments(*src_archive, lo, hi), iter_segments(*dst_archive, lo, hi))
+    for a, b in pairs:
+        if a is None or b is None:
+            return count, (a or b)[0]
+        if (a[0], a[1], a[4]) != (b[0], b[1], b[4]):
+            return count, min(a[0], b[0])
+        count += 1
+    return count, None
+
+
+# --- LEAF-GRÖSSE ---
+
+def directory_bytes_per_entry(tile_ids, offsets, lengths, run_lengths, samples=8):
+    """Komprimierte Directory-Bytes pro Eintrag, geschätzt aus Stichproben-Leafs."""
+    n = len(tile_ids)
+    if n == 0:
+        return 0.0
+    size = min(LEAF_START_SIZE, n)
+    starts = sorted({int(i * (n - size) / max(1, samples - 1)) for i in range(samples)})
+    total = entries = 0
+    for s in starts:
+        e = s + size
+        total += len(gzip.compress(serialize_directory(tile_ids[s:e], offsets[s:e], lengths[s:e], run_lengths[s:e]), mtime=0))
+        entries += e - s
+    return total / entries
+
+
+def sample_viewports(tile_ids, run_lengths, seed=0):
+    """Pro Zoomstufe Viewports um zufällige vorhandene Tiles -> Listen von Eintrags-Indizes."""
+    rnd = random.Random(seed)
+    n = len(tile_ids)
+    viewports = []
+    if n == 0:
+        return viewports
+    last_zoom = tileid_to_zxy(tile_ids[-1])[0]
+    for z in range(last_zoom + 1):
+        lo = bisect.bisect_left(tile_ids, zoom_first_id(z))
+        hi = bisect.bisect_left(tile_ids, zoom_first_id(z + 1))
+        if lo >= hi:
+            continue
+        side = 1 << z
+        for _ in range(SAMPLE_VIEWPORTS):
+            _, cx, cy = tileid_to_zxy(tile_ids[rnd.randrange(lo, hi)])
+            indices = set()
+            for x in range(cx - VIEWPORT_TILES[0] // 2, cx + (VIEWPORT_TILES[0] + 1) // 2):
+                for y in range(cy - VIEWPORT_TILES[1] // 2, cy + (VIEWPORT_TILES[1] + 1) // 2):
+                    if 0 <= x < side and 0 <= y < side:
+                        tile_id = zxy_to_tileid(z, x, y)
+                        i = bisect.bisect_right(tile_ids, tile_id) - 1
+                        if i >= 0 and tile_id < tile_ids[i] + run_lengths[i]:
+                            indices.add(i)
+            if indices:
+                viewports.append(sorted(indices))
+    return viewports
+
+
+def choose_leaf_size(tile_ids, offsets, lengths, run_lengths, request_cost=REQUEST_COST_BYTES):
+    """
+    Leaf-Größe mit den geringsten mittleren Viewport-Kosten:
+    Fetches x request_cost + Fetches x Leaf-Größe x Bytes/Eintrag.
+    Rückgabe: (leaf_size, {kandidat: kosten}).
+    """
+    per_entry = directory_bytes_per_entry(tile_ids, offsets, lengths, run_lengths)
+    viewports = sample_viewports(tile_ids, run_lengths)
+    if not viewports:
+        return LEAF_START_SIZE, {}
+    costs = {}
+    for size in LEAF_CANDIDATES:
+        fetches = sum(len({i // size for i in vp}) for vp in viewports) / len(viewports)
+        costs[size] = round(fetches * (request_cost + size * per_entry))
+    best = min(costs, key=lambda size: (costs[size], size))
+    return best, costs
+
+
+# --- KOORDINATION ---
+
+def optimize(src, dst, workers=WORKERS, leaf_size=None, verify=True, executor=None):
+    src = str(src)
+    dst = str(dst)
+    t0 = time.monotonic()
+    mm, header = map_archive(src)
+    try:
+        metadata = read_metadata(mm, header)
+        ranges = split_id_space([(mm, header)], workers * PARTS_PER_WORKER)
+    finally:
+        mm.close()
+    key = archive_key(src)
+
+    own_executor = executor is None and workers > 1
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=workers)
+    part_dir = Path(tempfile.mkdtemp(prefix=".optimize-", dir=str(Path(dst).parent)))
+    try:
+        parts = [str(part_dir / f"part-{i:05d}") for i in range(len(ranges))]
+        jobs = [(src, key, lo, hi, part) for (lo, hi), part in zip(ranges, parts)]
+        results = executor.map(rewrite_range, *zip(*jobs)) if executor else (rewrite_range(*job) for job in jobs)
+
+        writer = PMTilesWriter(dst, tile_type=header["tile_type"], tile_compression=header["tile_compression"])
+        with writer:
+            for part, (ids_raw, runs_raw, lengths_raw, offsets_raw, digests) in zip(parts, results):
+                tile_ids, run_lengths, lengths, part_offsets = array("Q"), array("Q"), array("L"), array("Q")
+                tile_ids.frombytes(ids_raw)
+                run_lengths.frombytes(runs_raw)
+                lengths.frombytes(lengths_raw)
+                part_offsets.frombytes(offsets_raw)
+                with open(part, "rb") as f:
+                    size = os.fstat(f.fileno()).st_size
+                    part_mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+                    try:
+                        for i, tile_id in enumerate(tile_ids):
+                            start = part_offsets[i]
+                            digest = digests[i * DIGEST_SIZE:(i + 1) * DIGEST_SIZE]
+                            writer.add_tile(tile_id, part_mm[start:start + lengths[i]], run_length=run_lengths[i], digest=digest)
+                    finally:
+                        if size:
+                            part_mm.close()
+                os.unlink(part)
+
+            if leaf_size is None:
+                leaf_size, costs = choose_leaf_size(writer.tile_ids, writer.offsets, writer.lengths, writer.run_lengths)
+            else:
+                costs = {}
+            stats = writer.finish(metadata, bounds=header["bounds"], center=header["center"], leaf_size=leaf_size)
+        report = {
+            "source": src,
+            "output": dst,
+            "source_bytes": os.path.getsize(src),
+            "output_bytes": os.path.getsize(dst),
+            "source_clustered": header["clustered"],
+            "source_entries": header["tile_entries_count"],
+            "source_contents": header["tile_contents_count"],
+            "leaf_size": leaf_size,
+            "leaf_costs": costs,
+            **stats,
+        }
+        if verify:
+            report["verify"] = verify_equivalent(src, dst, workers, executor)
+    finally:
+        shutil.rmtree(part_dir, ignore_errors=True)
+        if own_executor:
+            executor.shutdown(cancel_futures=True)
+    report["seconds"] = round(time.monotonic() - t0, 1)
+    return report
+
+
+def verify_equivalent(src, dst, workers=WORKERS, executor=None):
+    src_mm, src_header = map_archive(src)
+    dst_mm, dst_header = map_archive(dst)
+    try:
+        problems = [
+            f"{field}: {src_header[field]} != {dst_header[field]}"
+            for field in ("tile_type", "tile_compression", "addressed_tiles_count")
+            # Manche Writer lassen die Zähler im Header leer (0)
+            if src_header[field] != dst_header[field] and not (field == "addressed_tiles_count" and not src_header[field])
+        ]
+        if read_metadata(src_mm, src_header) != read_metadata(dst_mm, dst_header):
+            problems.append("Metadaten unterschiedlich")
+        ranges = split_id_space([(src_mm, src_header), (dst_mm, dst_header)], workers * PARTS_PER_WORKER)
+    finally:
+        src_mm.close()
+        dst_mm.close()
+
+    jobs = [(src, archive_key(src), dst, archive_key(dst), lo, hi) for lo, hi in ranges]
+    own_executor = executor is None and workers > 1 and len(jobs) > 1
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        results = list(executor.map(verify_range, *zip(*jobs))) if executor else [verify_range(*job) for job in jobs]
+    finally:
+        if own_executor:
+            executor.shutdown(cancel_futures=True)
+
+    segments = sum(count for count, _ in results)
+    for _, first in results:
+        if first is not None:
+            z, x, y = tileid_to_zxy(first)
+            problems.append(f"Tile-Inhalt weicht ab ab {z}/{x}/{y}")
+            break
+    return {"ok": not problems, "segments": segments, "problems": problems}
+
+
+def _fmt_mb(value):
+    return f"{value / 1e6:.1f}MB"
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="PMTiles clustern, deduplizieren und Leaf-Directories abstimmen")
+    parser.add_argument("source", type=Path)
+    parser.add_argument("target", type=Path, nargs="?", help="Ziel (ohne: Quelle ersetzen)")
+    parser.add_argument("--leaf-size", type=int, help="Feste Leaf-Größe in Einträgen statt automatisch")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--no-verify", action="store_true", help="Tile-für-Tile-Vergleich überspringen")
+    parser.add_argument("--json", type=Path, help="Bericht als JSON")
+    args = parser.parse_args(argv)
+
+    in_place = args.target is None or args.target.resolve() == args.source.resolve()
+    target = args.source.with_name(f".{args.source.name}.optimized") if in_place else args.target
+    try:
+        report = optimize(args.source, target, max(1, args.workers), args.leaf_size, not args.no_verify)
+    except (OSError, PMTilesError) as e:
+        log_error(f"{args.source.name}: {e}")
+        Path(target).unlink(missing_ok=True)
+        return 1
+
+    verify = report.get("verify")
+    if verify and not verify["ok"]:
+        for problem in verify["problems"]:
+            log_error(f"{args.source.name}: {problem}")
+        Path(target).unlink(missing_ok=True)
+        return 1
+    if in_place:
+        os.replace(target, args.source)
+        report["output"] = str(args.source)
+
+    log_success(
+        f"{args.source.name}: {_fmt_mb(report['source_bytes'])} -> {_fmt_mb(report['output_bytes'])}, "
+        f"{report['tile_entries']} Einträge / {report['tile_contents']} Inhalte"
+        f" (vorher {report['source_entries']} / {report['source_contents']}), "
+        f"Leaf-Größe {report['leaf_size']}, {report['seconds']}s"
+        + (f", geprüft ({verify['segments']} Segmente)" if verify else "")
+    )
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
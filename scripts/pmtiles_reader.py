@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+"""
+Minimaler PMTiles v3 Reader (nur stdlib).
+
+Liest Header und Root-Directory per mmap, ohne das (oft mehrere GB große)
+Archiv komplett zu laden. Der Root-Directory liegt laut Spezifikation in den
+ersten 16 KiB, daher werden nur diese Seiten tatsächlich angefasst.
+"""
+import gzip
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+from pathlib import Path
+
+HEADER_LEN = 127
+HEADER_STRUCT = struct.Struct("<7sB11Q6B4iB2i")
+MAGIC = b"PMTiles"
+
+COMPRESSION_NAMES = {0: "unknown", 1: "none", 2: "gzip", 3: "brotli", 4: "zstd"}
+TILE_TYPE_NAMES = {0: "unknown", 1: "mvt", 2: "png", 3: "jpeg", 4: "webp", 5: "avif"}
+
+
+class PMTilesError(Exception):
+    """Archiv ist kein gültiges PMTiles v3 oder nicht lesbar."""
+
+
+def parse_header(buf) -> dict:
+    if len(buf) < HEADER_LEN:
+        raise PMTilesError("Datei zu klein für einen PMTiles Header")
+
+    fields = HEADER_STRUCT.unpack_from(buf, 0)
+    magic, version = fields[0], fields[1]
+    if magic != MAGIC:
+        raise PMTilesError("Kein PMTiles Archiv (Magic fehlt)")
+    if version != 3:
+        raise PMTilesError(f"Nicht unterstützte PMTiles Version: {version}")
+
+    (
+        root_offset, root_length, metadata_offset, metadata_length,
+        leaf_offset, leaf_length, tile_data_offset, tile_data_length,
+        addressed_tiles, tile_entries, tile_contents,
+    ) = fields[2:13]
+    clustered, internal_comp, tile_comp, tile_type, min_zoom, max_zoom = fields[13:19]
+    min_lon, min_lat, max_lon, max_lat = fields[19:23]
+    center_zoom, center_lon, center_lat = fields[23:26]
+
+    return {
+        "version": version,
+        "root_offset": root_offset,
+        "root_length": root_length,
+        "metadata_offset": metadata_offset,
+        "metadata_length": metadata_length,
+        "leaf_dirs_offset": leaf_offset,
+        "leaf_dirs_length": leaf_length,
+        "tile_data_offset": tile_data_offset,
+        "tile_data_length": tile_data_length,
+        "addressed_tiles_count": addressed_tiles,
+        "tile_entries_count": tile_entries,
+        "tile_contents_count": tile_contents,
+        "clustered": bool(clustered),
+        "internal_compression": COMPRESSION_NAMES.get(internal_comp, str(internal_comp)),
+        "tile_compression": COMPRESSION_NAMES.get(tile_comp, str(tile_comp)),
+        "tile_type": TILE_TYPE_NAMES.get(tile_type, str(tile_type)),
+        "minzoom": min_zoom,
+        "maxzoom": max_zoom,
+        "bounds": [min_lon / 1e7, min_lat / 1e7, max_lon / 1e7, max_lat / 1e7],
+        "center": [center_lon / 1e7, center_lat / 1e7, center_zoom],
+    }
+
+
+def decompress(data: bytes, compression: str) -> bytes:
+    if compression in ("none", "unknown"):
+        return bytes(data)
+    if compression == "gzip":
+        return gzip.decompress(data)
+    if compression == "brotli":
+        try:
+            import brotli  # optional
+        except ImportError as e:
+            raise PMTilesError("Brotli-komprimiertes Directory, Modul 'brotli' fehlt") from e
+        return brotli.decompress(bytes(data))
+    if compression == "zstd":
+        try:
+            import zstandard  # optional
+        except ImportError as e:
+            raise PMTilesError("Zstd-komprimiertes Directory, Modul 'zstandard' fehlt") from e
+        return zstandard.ZstdDecompressor().decompress(bytes(data))
+    raise PMTilesError(f"Unbekannte Kompression: {compression}")
+
+
+def _read_varint(buf, pos):
+    result = 0
+    shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+def deserialize_directory(buf: bytes) -> list:
+    """
+    Dekodiert ein (bereits entpacktes) Directory.
+    Rückgabe: Liste von (tile_id, offset, length, run_length).
+    run_length == 0 markiert einen Verweis auf ein Leaf-Directory.
+    """
+    count, pos = _read_varint(buf, 0)
+    tile_ids = [0] * count
+    run_lengths = [0] * count
+    lengths = [0] * count
+    offsets = [0] * count
+
+    last_id = 0
+    for i in range(count):
+        delta, pos = _read_varint(buf, pos)
+        last_id += delta
+        tile_ids[i] = last_id
+    for i in range(count):
+        run_lengths[i], pos = _read_varint(buf, pos)
+    for i in range(count):
+        lengths[i], pos = _read_varint(buf, pos)
+    for i in range(count):
+        value, pos = _read_varint(buf, pos)
+        if value == 0 and i > 0:
+            offsets[i] = offsets[i - 1] + lengths[i - 1]
+        else:
+            offsets[i] = value - 1
+
+    return list(zip(tile_ids, offsets, lengths, run_lengths))
+
+
+# --- TILE-IDS (Hilbert-Kurve pro Zoomstufe, siehe PMTiles-Spezifikation) ---
+
+def zoom_first_id(z: int) -> int:
+    """Erste Tile-ID der Zoomstufe z (= Anzahl aller Tiles in 0..z-1)."""
+    return ((1 << (2 * z)) - 1) // 3
+
+
+def tileid_zoom(tile_id: int) -> int:
+    z = 0
+    while zoom_first_id(z + 1) <= tile_id:
+        z += 1
+    return z
+
+
+def _hilbert_d2xy(z, pos):
+    x = y = 0
+    s = 1
+    n = 1 << z
+    while s < n:
+        rx = 1 & (pos >> 1)
+        ry = 1 & (pos ^ rx)
+        if ry == 0:
+            if rx == 1:
+                x = s - 1 - x
+                y = s - 1 - y
+            x, y = y, x
+        x += s * rx
+        y += s * ry
+        pos >>= 2
+        s <<= 1
+    return x, y
+
+
+def tileid_to_zxy(tile_id: int) -> tuple:
+    z = tileid_zoom(tile_id)
+    x, y = _hilbert_d2xy(z, tile_id - zoom_first_id(z))
+    return z, x, y
+
+
+def zxy_to_tileid(z: int, x: int, y: int) -> int:
+    n = 1 << z
+    if not (0 <= x < n and 0 <= y < n):
+        raise ValueError(f"Tile {z}/{x}/{y} außerhalb der Zoomstufe")
+    d = 0
+    s = n >> 1
+    while s > 0:
+        rx = 1 if x & s else 0
+        ry = 1 if y & s else 0
+        d += s * s * ((3 * rx) ^ ry)
+        if ry == 0:
+            if rx == 1:
+                x = s - 1 - x
+                y = s - 1 - y
+            x, y = y, x
+        s >>= 1
+    return zoom_first_id(z) + d
+
+
+def range_bbox(start: int, end: int):
+    """
+    Tile-Bounding-Box (z, minx, miny, maxx, maxy) eines ID-Bereichs [start, end)
+    innerhalb einer Zoomstufe. Der Bereich wird in ausgerichtete Hilbert-Blöcke
+    (4^k IDs = 2^k x 2^k Tiles) zerlegt, daher O(log n) statt O(Tiles).
+    """
+    z = tileid_zoom(start)
+    base = zoom_first_id(z)
+    pos, stop = start - base, end - base
+    bbox = None
+    while pos < stop:
+        k = 0
+        while k < z and pos % (4 ** (k + 1)) == 0 and pos + 4 ** (k + 1) <= stop:
+            k += 1
+        side = 1 << k
+        x, y = _hilbert_d2xy(z, pos)
+        x, y = x - x % side, y - y % side
+        block = (x, y, x + side - 1, y + side - 1)
+        bbox = block if bbox is None else (
+            min(bbox[0], block[0]), min(bbox[1], block[1]), max(bbox[2], block[2]), max(bbox[3], block[3])
+        )
+        pos += 4 ** k
+    return (z, *bbox)
+
+
+def split_by_zoom(start: int, end: int):
+    """Teilt [start, end) an Zoomgrenzen: liefert (z, start, end)."""
+    while start < end:
+        z = tileid_zoom(start)
+        stop = min(end, zoom_first_id(z + 1))
+        yield z, start, stop
+        start = stop
+
+
+def tile_bbox_lonlat(z, minx, miny, maxx, maxy):
+    """Tile-Bereich -> [west, south, east, north] (Web Mercator)."""
+    n = 1 << z
+
+    def lon(x):
+        return x / n * 360.0 - 180.0
+
+    def lat(y):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+
+    return [round(lon(minx), 6), round(lat(maxy + 1), 6), round(lon(maxx + 1), 6), round(lat(miny), 6)]
+
+
+# --- ARCHIV-ZUGRIFF ---
+
+def map_archive(path):
+    """Öffnet ein Archiv per mmap. Rückgabe: (mmap, header); Aufrufer schließt die mmap."""
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < HEADER_LEN:
+            raise PMTilesError("Datei zu klein für einen PMTiles Header")
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        header = parse_header(mm[:HEADER_LEN])
+        for section in ("root", "leaf_dirs", "tile_data"):
+            if header[f"{section}_offset"] + header[f"{section}_length"] > size:
+                raise PMTilesError(f"{section} liegt außerhalb der Datei")
+    except PMTilesError:
+        mm.close()
+        raise
+    return mm, header
+
+
+def read_directory(mm, header, offset, length) -> list:
+    return deserialize_directory(decompress(mm[offset:offset + length], header["internal_compression"]))
+
+
+def iter_entries(mm, header, lo=0, hi=None):
+    """
+    Liefert alle Tile-Einträge (tile_id, abs_offset, length, run_length) in
+    Tile-ID-Reihenfolge, die [lo, hi) berühren. Leaf-Directories außerhalb
+    des Bereichs werden nicht gelesen; im Speicher liegt immer nur ein
+    Directory pro Ebene (begrenzter Speicher auch bei GB-Archiven).
+    """
+    data_offset = header["tile_data_offset"]
+    leaf_offset = header["leaf_dirs_offset"]
+
+    def walk(entries, span_end):
+        for i, (tile_id, offset, length, run_length) in enumerate(entries):
+            if hi is not None and tile_id >= hi:
+                return
+            if run_length == 0:
+                next_id = entries[i + 1][0] if i + 1 < len(entries) else span_end
+                if next_id is not None and next_id <= lo:
+                    continue
+                yield from walk(read_directory(mm, header, leaf_offset + offset, length), next_id)
+            elif tile_id + run_length > lo:
+                yield tile_id, data_offset + offset, length, run_length
+
+    root = read_directory(mm, header, header["root_offset"], header["root_length"])
+    yield from walk(root, None)
+
+
+def iter_runs(mm, header, lo=0, hi=None):
+    """
+    Wie iter_entries, aber jeder Lauf auf [lo, hi) beschnitten: (start, end,
+    abs_offset, length). So zählen Worker mit angrenzenden Bereichen keinen
+    Lauf doppelt, der über die Bereichsgrenze reicht.
+    """
+    for tile_id, offset, length, run_length in iter_entries(mm, header, lo, hi):
+        start = max(tile_id, lo)
+        end = tile_id + run_length if hi is None else min(tile_id + run_length, hi)
+        if start < end:
+            yield start, end, offset, length
+
+
+def split_id_space(archives, parts) -> list:
+    """
+    Teilt den Tile-ID-Raum an den Root-Einträgen der Archive in ~parts
+    Bereiche [lo, hi) für Worker-Prozesse (hi=None = bis zum Ende).
+    """
+    boundaries = set()
+    for mm, header in archives:
+        for entry in read_directory(mm, header, header["root_offset"], header["root_length"]):
+            boundaries.add(entry[0])
+    boundaries.discard(0)
+    points = sorted(boundaries)
+    if parts <= 1 or not points:
+        return [(0, None)]
+    step = max(1, len(points) // parts)
+    cuts = points[step - 1::step][:parts - 1]
+    edges = [0, *cuts, None]
+    return list(zip(edges[:-1], edges[1:]))
+
+
+def archive_key(path) -> tuple:
+    st = os.stat(path)
+    return (st.st_size, st.st_mtime_ns, st.st_ino)
+
+
+_WORKER_ARCHIVES = {}
+
+
+def worker_archive(path, key):
+    """mmap pro Worker-Prozess wiederverwenden, solange sich die Datei nicht ändert."""
+    cached = _WORKER_ARCHIVES.get(path)
+    if cached and cached[0] == key:
+        return cached[1]
+    if cached:
+        cached[1][0].close()
+    archive = map_archive(path)
+    _WORKER_ARCHIVES[path] = (key, archive)
+    return archive
+
+
+def read_metadata(mm, header) -> dict:
+    start = header["metadata_offset"]
+    raw = decompress(mm[start:start + header["metadata_length"]], header["internal_compression"])
+    try:
+        return json.loads(raw or b"{}")
+    except ValueError as e:
+        raise PMTilesError(f"Metadaten sind kein gültiges JSON: {e}") from None
+
+
+def read_root(path) -> dict:
+    """
+    Liest Header + Root-Directory eines Archivs via mmap.
+    Liefert den Header ergänzt um Root-Directory-Kennzahlen.
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < HEADER_LEN:
+            raise PMTilesError("Datei zu klein für einen PMTiles Header")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            header = parse_header(mm[:HEADER_LEN])
+            start = header["root_offset"]
+            end = start + header["root_length"]
+            if end > size:
+                raise PMTilesError("Root-Directory liegt außerhalb der Datei")
+            root = deserialize_directory(
+                decompress(mm[start:end], header["internal_compression"])
+            )
+
+    leaf_refs = sum(1 for entry in root if entry[3] == 0)
+    header["root_entries"] = len(root)
+    header["root_leaf_refs"] = leaf_refs
+    return header
+
+
+def main() -> int:
+    if len(sys.argv) < 2:
+        print("Usage: pmtiles_reader.py <archiv.pmtiles> [...]")
+        return 1
+    status = 0
+    for arg in sys.argv[1:]:
+        try:
+            print(json.dumps({"path": arg, **read_root(Path(arg))}, indent=2))
+        except (OSError, PMTilesError) as e:
+            print(f"❌ {arg}: {e}", file=sys.stderr)
+            status = 1
+    return status
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+"""
+Atomares, versioniertes PMTiles-Release (ersetzt copy_if_newer).
+
+Struktur pro Tileset:
+  $TILES_DIR/.releases/<tileset>/<release-id>/pmtiles/*.pmtiles
+  $TILES_DIR/.releases/<tileset>/<release-id>/tilejson/*.json
+  $TILES_DIR/.releases/<tileset>/<release-id>/release.json
+  $TILES_DIR/.releases/<tileset>/current -> <release-id>
+  $TILES_DIR/<tileset>/pmtiles  -> ../.releases/<tileset>/current/pmtiles
+  $TILES_DIR/<tileset>/tilejson -> ../.releases/<tileset>/current/tilejson
+
+Neue Dateien werden per reflink, hardlink, copy_file_range oder (mit
+--move) rename gestaged - je nachdem, was das Dateisystem kann. Unveränderte
+Archive werden aus dem aktuellen Release verlinkt. Jedes Archiv wird per
+SHA-256 und PMTiles-Header geprüft, erst dann kippt der `current`-Symlink
+atomar. Clients sehen also nie eine halb geschriebene Datei.
+
+Usage:
+  pmtiles_release.py publish <tileset> --src DIR_ODER_DATEI [--src ...] [--keep N] [--move]
+  pmtiles_release.py rollback <tileset> [--to RELEASE_ID]
+  pmtiles_release.py list <tileset>
+"""
+import argparse
+import errno
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+from pathlib import Path
+
+from pmtiles_reader import PMTilesError, read_root
+
+TILES_DIR = Path(os.path.realpath(os.environ.get("TILES_DIR", "/srv/tiles")))
+RELEASES_DIR = TILES_DIR / ".releases"
+KEEP_RELEASES = int(os.environ.get("RELEASE_KEEP", "3"))
+ALLOW_HARDLINK = os.environ.get("RELEASE_HARDLINK", "1") == "1"
+
+# Kleine Dateien (JSON) werden von den Build-Skripten in-place geschrieben
+# (`cat > file`) - Hardlinks darauf würden das Live-Release mitändern.
+LINK_MIN_BYTES = 1024 * 1024
+HASH_CHUNK = 8 * 1024 * 1024
+FICLONE = 0x40049409
+SUBDIRS = {".pmtiles": "pmtiles", ".json": "tilejson"}
+MANIFEST_NAME = "release.json"
+
+
+class ReleaseError(Exception):
+    pass
+
+
+def sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(HASH_CHUNK)
+            if not block:
+                break
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _fsync_dir(path):
+    fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+# --- STAGING ---
+
+def _try_reflink(src, dst):
+    with open(src, "rb") as fin:
+        fd = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        try:
+            fcntl.ioctl(fd, FICLONE, fin.fileno())
+        except OSError:
+            os.close(fd)
+            os.unlink(dst)
+            return False
+        os.close(fd)
+    return True
+
+
+def _copy_file_range(src, dst):
+    with open(src, "rb") as fin, open(dst, "wb") as fout:
+        remaining = os.fstat(fin.fileno()).st_size
+        while remaining > 0:
+            copied = os.copy_file_range(fin.fileno(), fout.fileno(), min(remaining, 1 << 30))
+            if copied == 0:
+                break
+            remaining -= copied
+        if remaining:
+            raise OSError(errno.EIO, f"copy_file_range unvollständig ({remaining} Bytes fehlen)")
+        fout.flush()
+        os.fsync(fout.fileno())
+
+
+def stage_file(src, dst, move=False):
+    """Legt src als dst ab. Rückgabe: verwendete Methode."""
+    size = os.stat(src).st_size
+    if move:
+        try:
+            os.rename(src, dst)
+            return "rename"
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+
+    if _try_reflink(src, dst):
+        shutil.copystat(src, dst)
+        return "reflink"
+
+    if ALLOW_HARDLINK and size >= LINK_MIN_BYTES:
+        try:
+            os.link(src, dst)
+            return "hardlink"
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP):
+                raise
+
+    try:
+        _copy_file_range(src, dst)
+        method = "copy_file_range"
+    except OSError as e:
+        if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+            raise
+        Path(dst).unlink(missing_ok=True)
+        shutil.copyfile(src, dst)
+        method = "copy"
+    shutil.copystat(src, dst)
+    return method
+
+
+# --- VERIFIKATION ---
+
+def verify_archive(path):
+    """PMTiles-Header + Directory lesen und prüfen, dass die Tile-Daten in der Datei liegen."""
+    header = read_root(path)
+    size = os.stat(path).st_size
+    for section in ("root", "metadata", "leaf_dirs", "tile_data"):
+        offset = header[f"{section}_offset"]
+        length = header[f"{section}_length"]
+        if length and offset + length > size:
+            raise PMTilesError(f"{section} liegt außerhalb der Datei (abgeschnitten?)")
+    return {
+        "minzoom": header["minzoom"],
+        "maxzoom": header["maxzoom"],
+        "tile_type": header["tile_type"],
+        "addressed_tiles_count": header["addressed_tiles_count"],
+    }
+
+
+# --- RELEASES ---
+
+def tileset_store(tileset):
+    return RELEASES_DIR / tileset
+
+
+def list_releases(tileset):
+    store = tileset_store(tileset)
+    if not store.is_dir():
+        return []
+    return sorted(p.name for p in store.iterdir() if p.is_dir() and not p.is_symlink() and (p / MANIFEST_NAME).exists())
+
+
+def current_release(tileset):
+    link = tileset_store(tileset) / "current"
+    try:
+        return os.readlink(link)
+    except OSError:
+        return None
+
+
+def load_release(tileset, release_id):
+    if not release_id:
+        return {"files": {}}
+    try:
+        return json.loads((tileset_store(tileset) / release_id / MANIFEST_NAME).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {"files": {}}
+
+
+def collect_sources(sources):
+    """--src Verzeichnisse/Dateien -> {rel_name: Pfad}, rel_name z.B. pmtiles/at.pmtiles"""
+    files = {}
+    for src in sources:
+        src = Path(src)
+        candidates = sorted(src.iterdir()) if src.is_dir() else [src] if src.is_file() else []
+        for path in candidates:
+            subdir = SUBDIRS.get(path.suffix)
+            if subdir and path.is_file():
+                files[f"{subdir}/{path.name}"] = path
+    return files
+
+
+def _same_content(src_st, entry, release_file):
+    # Bewusst kein Inode-Vergleich: bei Hardlinks hätte ein In-Place-Schreiber
+    # dieselbe Datei verändert, Größe/mtime fallen dann aber auf.
+    if not os.path.exists(release_file):
+        return False
+    return entry.get("size") == src_st.st_size and entry.get("mtime_ns") == src_st.st_mtime_ns
+
+
+def flip_current(tileset, release_id):
+    store = tileset_store(tileset)
+    tmp_link = store / f".current.{os.getpid()}"
+    tmp_link.unlink(missing_ok=True)
+    os.symlink(release_id, tmp_link)
+    os.replace(tmp_link, store / "current")
+    _fsync_dir(store)
+
+
+def ensure_public_links(tileset):
+    """
+    $TILES_DIR/<tileset>/{pmtiles,tilejson} auf das current-Release zeigen lassen.
+    Alte echte Verzeichnisse werden einmalig ins Release-Archiv verschoben.
+    """
+    public = TILES_DIR / tileset
+    public.mkdir(parents=True, exist_ok=True)
+    for subdir in SUBDIRS.values():
+        target = os.path.join("..", ".releases", tileset, "current", subdir)
+        path = public / subdir
+        if path.is_symlink() and os.readlink(path) == target:
+            continue
+        tmp_link = public / f".{subdir}.{os.getpid()}"
+        tmp_link.unlink(missing_ok=True)
+        os.symlink(target, tmp_link)
+        if path.is_dir() and not path.is_symlink():
+            legacy = tileset_store(tileset) / f"legacy-{subdir}-{time.strftime('%Y%m%d-%H%M%S')}"
+            os.rename(path, legacy)
+            print(f"   ℹ️  Altes Verzeichnis {path} -> {legacy}")
+        os.replace(tmp_link, path)
+
+
+def legacy_files(tileset):
+    """Dateien aus dem alten (nicht versionierten) Layout als Ausgangsstand."""
+    files = {}
+    for subdir in SUBDIRS.values():
+        path = TILES_DIR / tileset / subdir
+        if path.is_dir() and not path.is_symlink():
+            for entry in sorted(path.iterdir()):
+                if entry.is_file() and SUBDIRS.get(entry.suffix) == subdir:
+                    files[f"{subdir}/{entry.name}"] = entry
+    return files
+
+
+def publish(tileset, sources, keep=KEEP_RELEASES, move=False):
+    """Erstellt und aktiviert ein neues Release. Rückgabe: Release-ID oder None (unverändert)."""
+    store = tileset_store(tileset)
+    store.mkdir(parents=True, exist_ok=True)
+    current_id = current_release(tileset)
+    current = load_release(tileset, current_id)
+    current_dir = store / current_id if current_id else None
+
+    wanted = collect_sources(sources)
+    if not wanted and not current["files"]:
+        print(f"   ⏭️  {tileset}: keine Quelldateien.")
+        return None
+
+    # Unverändert? (gleiche Dateien wie im aktuellen Release)
+    if current_id and set(wanted) <= set(current["files"]):
+        if all(_same_content(p.stat(), current["files"][rel], current_dir / rel) for rel, p in wanted.items()):
+            print(f"   ⏭️  {tileset}: Release {current_id} ist aktuell.")
+            return None
+
+    release_id = time.strftime("%Y%m%d-%H%M%S")
+    while (store / release_id).exists():
+        time.sleep(1)
+        release_id = time.strftime("%Y%m%d-%H%M%S")
+    staging = store / f".staging-{release_id}"
+    shutil.rmtree(staging, ignore_errors=True)
+    for subdir in SUBDIRS.values():
+        (staging / subdir).mkdir(parents=True)
+
+    manifest = {"tileset": tileset, "release": release_id, "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "files": {}}
+    try:
+        # 1. Neue/geänderte Dateien stagen, unveränderte aus dem aktuellen Release verlinken
+        for rel, src in sorted(wanted.items()):
+            dst = staging / rel
+            src_st = src.stat()
+            entry = current["files"].get(rel)
+            if entry and current_dir and _same_content(src_st, entry, current_dir / rel):
+                os.link(current_dir / rel, dst)
+                manifest["files"][rel] = {**entry, "method": "unchanged"}
+                continue
+
+            method = stage_file(src, dst, move=move)
+            digest = sha256_file(dst)
+            if method in ("copy", "copy_file_range") and sha256_file(src) != digest:
+                raise ReleaseError(f"Prüfsumme nach Kopie abweichend: {rel}")
+            st = dst.stat()
+            manifest["files"][rel] = {
+                "size": st.st_size,
+                "mtime_ns": st.st_mtime_ns,
+                "sha256": digest,
+                "method": method,
+                "source": str(src),
+            }
+            print(f"   📦 {tileset}: {rel} ({method}, {st.st_size / 1e6:.1f} MB)")
+
+        # 2. Dateien ohne Quelle übernehmen (Build-Verzeichnis aufgeräumt o.ä.)
+        carried = legacy_files(tileset) if not current_id else {rel: current_dir / rel for rel in current["files"]}
+        for rel, path in carried.items():
+            if rel in manifest["files"] or not path.exists():
+                continue
+            os.link(path, staging / rel)
+            entry = current["files"].get(rel) or {
+                "size": path.stat().st_size,
+                "mtime_ns": path.stat().st_mtime_ns,
+                "sha256": sha256_file(path),
+            }
+            manifest["files"][rel] = {**entry, "method": "carried"}
+
+        # 3. Verifikation: Prüfsumme + Header jedes Archivs
+        for rel, entry in manifest["files"].items():
+            path = staging / rel
+            if path.stat().st_size != entry["size"]:
+                raise ReleaseError(f"Größe weicht ab: {rel}")
+            if entry["method"] not in ("unchanged", "carried") or "header" not in entry:
+                if entry["method"] in ("unchanged", "carried") and sha256_file(path) != entry["sha256"]:
+                    raise ReleaseError(f"Prüfsumme weicht ab: {rel}")
+                if rel.endswith(".pmtiles"):
+                    entry["header"] = verify_archive(path)
+                elif rel.endswith(".json"):
+                    json.loads(path.read_text(encoding="utf-8"))
+
+        (staging / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2) + "\n", encoding="utf-8")
+        os.rename(staging, store / release_id)
+        _fsync_dir(store)
+    except (OSError, ValueError, PMTilesError, ReleaseError):
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    # 4. Atomar umschalten
+    flip_current(tileset, release_id)
+    ensure_public_links(tileset)
+    print(f"   ✅ {tileset}: Release {release_id} aktiv ({len(manifest['files'])} Dateien).")
+    prune(tileset, keep)
+    return release_id
+
+
+def prune(tileset, keep=KEEP_RELEASES):
+    """Behält das aktuelle und `keep` vorherige Releases."""
+    current_id = current_release(tileset)
+    releases = [r for r in list_releases(tileset) if r != current_id]
+    older = [r for r in releases if current_id is None or r < current_id]
+    keep_set = set(older[-keep:]) if keep > 0 else set()
+    for release_id in releases:
+        if release_id in keep_set or (current_id and release_id > current_id):
+            continue
+        shutil.rmtree(tileset_store(tileset) / release_id, ignore_errors=True)
+        print(f"   🗑️  {tileset}: altes Release {release_id} entfernt.")
+    for path in tileset_store(tileset).glob("legacy-*"):
+        if path.is_dir() and current_id:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def rollback(tileset, to=None):
+    current_id = current_release(tileset)
+    releases = list_releases(tileset)
+    if to is None:
+        older = [r for r in releases if current_id is None or r < current_id]
+        if not older:
+            raise ReleaseError(f"{tileset}: kein älteres Release vorhanden.")
+        to = older[-1]
+    elif to not in releases:
+        raise ReleaseError(f"{tileset}: Release {to} nicht gefunden.")
+    flip_current(tileset, to)
+    ensure_public_links(tileset)
+    print(f"   ✅ {tileset}: Rollback {current_id or '-'} -> {to}")
+    return to
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Versioniertes PMTiles-Release")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_publish = sub.add_parser("publish", help="Neues Release erstellen und aktivieren")
+    p_publish.add_argument("tileset")
+    p_publish.add_argument("--src", action="append", required=True, help="Quellverzeichnis oder Datei")
+    p_publish.add_argument("--keep", type=int, default=KEEP_RELEASES, help="Anzahl vorheriger Releases")
+    p_publish.add_argument("--move", action="store_true", help="Quelldateien verschieben (rename) statt kopieren")
+
+    p_rollback = sub.add_parser("rollback", help="Auf vorheriges Release zurückschalten")
+    p_rollback.add_argument("tileset")
+    p_rollback.add_argument("--to", help="Release-ID (Standard: das vorherige)")
+
+    p_list = sub.add_parser("list", help="Releases anzeigen")
+    p_list.add_argument("tileset")
+
+    args = parser.parse_args(argv)
+    try:
+        if args.command == "publish":
+            publish(args.tileset, args.src, args.keep, args.move)
+        elif args.command == "rollback":
+            rollback(args.tileset, args.to)
+        else:
+            current_id = current_release(args.tileset)
+            for release_id in list_releases(args.tileset):
+                info = load_release(args.tileset, release_id)
+                marker = "*" if release_id == current_id else " "
+                size = sum(e.get("size", 0) for e in info["files"].values())
+                print(f" {marker} {release_id}  {len(info['files'])} Dateien  {size / 1e9:.2f} GB")
+    except (OSError, PMTilesError, ReleaseError) as e:
+        print(f"   ❌ {args.tileset}: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
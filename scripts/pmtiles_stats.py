@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+Tile-Statistiken für beliebige PMTiles v3 Archive.
+
+Ersetzt das Log-Scraping aus planetiler_follow.py als einzige Quelle für
+Tile-Größen: funktioniert auch für basemap-at, Contours (pmtiles convert)
+und OpenSkiMap (tippecanoe).
+
+Pro Archiv:
+- Anzahl und Größen-Histogramm (Zweierpotenzen) pro Zoomstufe
+- Anteil doppelter Tiles (gleicher Inhalt, z.B. Meer/Wald)
+- die N größten Tiles mit z/x/y
+- Größe pro Vektor-Layer (MVT; unkomprimiert gemessen, komprimierter
+  Anteil anteilig pro Tile hochgerechnet)
+
+Alle Tile-Einträge werden per mmap gestreamt; der Tile-ID-Raum wird an den
+Leaf-Grenzen auf Worker-Prozesse verteilt.
+
+Usage:
+  pmtiles_stats.py archiv.pmtiles [...] [--top 10] [--no-layers] [--json out.json] [--workers N]
+"""
+import argparse
+import heapq
+import json
+import os
+import sys
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+from pmtiles_reader import (
+    PMTilesError,
+    _read_varint,
+    archive_key,
+    decompress,
+    iter_runs,
+    map_archive,
+    split_by_zoom,
+    split_id_space,
+    tileid_to_zxy,
+    worker_archive,
+)
+
+WORKERS = int(os.environ.get("PMTILES_WORKERS", "0")) or os.cpu_count() or 1
+PARTS_PER_WORKER = 4
+TOP_N = 10
+
+
+# --- MVT ---
+
+def mvt_layer_sizes(tile: bytes) -> dict:
+    """Layer-Name -> Bytes (inkl. Feld-Header) einer unkomprimierten MVT-Kachel."""
+    sizes = {}
+    pos = 0
+    end = len(tile)
+    while pos < end:
+        start = pos
+        key, pos = _read_varint(tile, pos)
+        wire_type = key & 0x7
+        if wire_type == 2:
+            length, pos = _read_varint(tile, pos)
+            body = pos
+            pos += length
+        elif wire_type == 0:
+            _, pos = _read_varint(tile, pos)
+            continue
+        elif wire_type in (1, 5):
+            pos += 8 if wire_type == 1 else 4
+            continue
+        else:
+            raise PMTilesError(f"MVT: unbekannter Wire-Type {wire_type}")
+        if key >> 3 != 3:
+            continue
+        name = "?"
+        lpos = body
+        while lpos < pos:
+            lkey, lpos = _read_varint(tile, lpos)
+            if lkey == (1 << 3 | 2):
+                nlen, lpos = _read_varint(tile, lpos)
+                name = bytes(tile[lpos:lpos + nlen]).decode("utf-8", "replace")
+                break
+            lwire = lkey & 0x7
+            if lwire == 2:
+                skip, lpos = _read_varint(tile, lpos)
+                lpos += skip
+            elif lwire == 0:
+                _, lpos = _read_varint(tile, lpos)
+            else:
+                lpos += 8 if lwire == 1 else 4
+        sizes[name] = sizes.get(name, 0) + (pos - start)
+    return sizes
+
+
+# --- WORKER ---
+
+def _size_bucket(length):
+    """Obergrenze des Histogramm-Buckets (Zweierpotenz in Bytes)."""
+    return 1 << max(0, length - 1).bit_length()
+
+
+def analyze_range(path, key, lo, hi, top_n, layers):
+    """Worker: Statistik über alle Tile-Einträge in [lo, hi)."""
+    mm, header = worker_archive(path, key)
+    zooms = {}
+    top = []
+    layer_stats = {}
+    seen = set()
+    decode_layers = layers and header["tile_type"] == "mvt"
+
+    for start, end, offset, length in iter_runs(mm, header, lo, hi):
+        for z, s, e in split_by_zoom(start, end):
+            stats = zooms.get(z)
+            if stats is None:
+                stats = zooms[z] = {"count": 0, "bytes": 0, "min": length, "max": 0, "histogram": {}, "offsets": set()}
+            count = e - s
+            stats["count"] += count
+            stats["bytes"] += length * count
+            stats["min"] = min(stats["min"], length)
+            stats["max"] = max(stats["max"], length)
+            bucket = _size_bucket(length)
+            stats["histogram"][bucket] = stats["histogram"].get(bucket, 0) + count
+            stats["offsets"].add(offset)
+
+        # Pro Inhalt (Offset) nur einmal: Top-Liste und Layer-Größen. Ein Inhalt,
+        # der in mehreren Bereichen vorkommt, wird je Bereich einmal gezählt -
+        # bei den Layern vernachlässigbar, die Top-Liste wird beim Mergen bereinigt.
+        if offset in seen:
+            continue
+        seen.add(offset)
+        if len(top) < top_n:
+            heapq.heappush(top, (length, start, offset))
+        elif length > top[0][0]:
+            heapq.heapreplace(top, (length, start, offset))
+        if decode_layers and length:
+            try:
+                raw = decompress(mm[offset:offset + length], header["tile_compression"])
+                sizes = mvt_layer_sizes(raw)
+            except (PMTilesError, OSError, EOFError, IndexError, ValueError):
+                layer_stats.setdefault("<ungültig>", [0, 0, 0])[2] += 1
+                continue
+            raw_total = sum(sizes.values()) or 1
+            for name, size in sizes.items():
+                entry = layer_stats.setdefault(name, [0, 0, 0])
+                entry[0] += size
+                entry[1] += length * size / raw_total
+                entry[2] += 1
+
+    for stats in zooms.values():
+        # Offsets kompakt an den Hauptprozess (Duplikate über Bereichsgrenzen)
+        stats["offsets"] = array("Q", sorted(stats["offsets"])).tobytes()
+    return zooms, top, layer_stats
+
+
+# --- KOORDINATION ---
+
+def analyze(path, workers=WORKERS, top_n=TOP_N, layers=True, executor=None) -> dict:
+    path = str(path)
+    mm, header = map_archive(path)
+    try:
+        ranges = split_id_space([(mm, header)], workers * PARTS_PER_WORKER)
+    finally:
+        mm.close()
+
+    jobs = [(path, archive_key(path), lo, hi, top_n, layers) for lo, hi in ranges]
+    if len(jobs) == 1 or workers <= 1:
+        results = [analyze_range(*job) for job in jobs]
+    else:
+        own_executor = executor is None
+        if own_executor:
+            executor = ProcessPoolExecutor(max_workers=workers)
+        try:
+            results = list(executor.map(analyze_range, *zip(*jobs)))
+        finally:
+            if own_executor:
+                executor.shutdown(cancel_futures=True)
+
+    zooms = {}
+    offsets = {}
+    top = []
+    layer_stats = {}
+    for part_zooms, part_top, part_layers in results:
+        for z, stats in part_zooms.items():
+            total = zooms.setdefault(z, {"count": 0, "bytes": 0, "min": stats["min"], "max": 0, "histogram": {}})
+            total["count"] += stats["count"]
+            total["bytes"] += stats["bytes"]
+            total["min"] = min(total["min"], stats["min"])
+            total["max"] = max(total["max"], stats["max"])
+            for bucket, count in stats["histogram"].items():
+                total["histogram"][bucket] = total["histogram"].get(bucket, 0) + count
+            part_offsets = array("Q")
+            part_offsets.frombytes(stats["offsets"])
+            offsets.setdefault(z, set()).update(part_offsets)
+        top.extend(part_top)
+        for name, (raw, compressed, tiles) in part_layers.items():
+            entry = layer_stats.setdefault(name, [0, 0.0, 0])
+            entry[0] += raw
+            entry[1] += compressed
+            entry[2] += tiles
+
+    st = os.stat(path)
+    addressed = sum(stats["count"] for stats in zooms.values())
+    # Der Writer kennt die Zahl eindeutiger Inhalte; sonst aus den Offsets zählen
+    unique = header["tile_contents_count"] or len(set().union(*offsets.values()))
+    report = {
+        "path": path,
+        "analyzed_at": datetime.now().isoformat(timespec="seconds"),
+        "size_bytes": st.st_size,
+        "tile_type": header["tile_type"],
+        "tile_compression": header["tile_compression"],
+        "tiles": addressed,
+        "unique_tiles": unique,
+        "duplicate_ratio": round(1 - unique / addressed, 4) if addressed else 0.0,
+        "tile_bytes": sum(stats["bytes"] for stats in zooms.values()),
+        "zooms": {},
+        "top_tiles": [],
+        "layers": {},
+    }
+    max_tile = 0
+    for z in sorted(zooms):
+        stats = zooms[z]
+        distinct = len(offsets[z])
+        max_tile = max(max_tile, stats["max"])
+        report["zooms"][str(z)] = {
+            "count": stats["count"],
+            "unique": distinct,
+            "duplicate_ratio": round(1 - distinct / stats["count"], 4) if stats["count"] else 0.0,
+            "bytes": stats["bytes"],
+            "min": stats["min"],
+            "avg": round(stats["bytes"] / stats["count"]) if stats["count"] else 0,
+            "max": stats["max"],
+            "histogram": {str(b): stats["histogram"][b] for b in sorted(stats["histogram"])},
+        }
+    report["max_tile"] = max_tile
+    report["avg_tile"] = round(report["tile_bytes"] / addressed) if addressed else 0
+    top_offsets = set()
+    for length, tile_id, offset in sorted(top, reverse=True):
+        # Gleicher Inhalt kann in mehreren Bereichen als "erstes Vorkommen" auftauchen
+        if offset in top_offsets or len(top_offsets) >= top_n:
+            continue
+        top_offsets.add(offset)
+        z, x, y = tileid_to_zxy(tile_id)
+        report["top_tiles"].append({"z": z, "x": x, "y": y, "bytes": length})
+    for name, (raw, compressed, tiles) in sorted(layer_stats.items(), key=lambda item: -item[1][1]):
+        report["layers"][name] = {"raw_bytes": raw, "compressed_bytes": round(compressed), "tiles": tiles}
+    return report
+
+
+def _fmt_bytes(value):
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if value < 1024 or unit == "GiB":
+            return f"{value:.0f} {unit}" if unit == "B" else f"{value:.1f} {unit}"
+        value /= 1024
+
+
+def print_report(report):
+    print(f"📊 {report['path']} ({_fmt_bytes(report['size_bytes'])}, {report['tile_type']}/{report['tile_compression']})")
+    print(
+        f"   Tiles: {report['tiles']} ({report['unique_tiles']} eindeutig, {report['duplicate_ratio'] * 100:.1f} % doppelt), "
+        f"Ø {_fmt_bytes(report['avg_tile'])}, max {_fmt_bytes(report['max_tile'])}"
+    )
+    print(f"   {'Zoom':>4} {'Tiles':>10} {'doppelt':>8} {'Ø':>10} {'max':>10} {'gesamt':>10}")
+    for z, stats in report["zooms"].items():
+        print(
+            f"   {z:>4} {stats['count']:>10} {stats['duplicate_ratio'] * 100:>7.1f}% "
+            f"{_fmt_bytes(stats['avg']):>10} {_fmt_bytes(stats['max']):>10} {_fmt_bytes(stats['bytes']):>10}"
+        )
+    if report["top_tiles"]:
+        print("   Größte Tiles:")
+        for i, tile in enumerate(report["top_tiles"], 1):
+            print(f"   {i:>3}. {tile['z']}/{tile['x']}/{tile['y']} ({_fmt_bytes(tile['bytes'])})")
+    if report["layers"]:
+        print("   Layer (komprimiert, anteilig):")
+        for name, layer in report["layers"].items():
+            print(f"   - {name}: {_fmt_bytes(layer['compressed_bytes'])} ({layer['tiles']} Tiles)")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Tile-Statistiken für PMTiles-Archive")
+    parser.add_argument("archives", nargs="+")
+    parser.add_argument("--top", type=int, default=TOP_N, help="Anzahl der größten Tiles")
+    parser.add_argument("--no-layers", action="store_true", help="MVT-Layer nicht dekodieren (schneller)")
+    parser.add_argument("--json", help="Reports als JSON schreiben ('-' = stdout)")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    args = parser.parse_args(argv)
+
+    reports = []
+    status = 0
+    with ProcessPoolExecutor(max_workers=max(1, args.workers)) as executor:
+        for path in args.archives:
+            try:
+                report = analyze(path, max(1, args.workers), args.top, not args.no_layers, executor)
+            except (OSError, PMTilesError) as e:
+                print(f"❌ {path}: {e}", file=sys.stderr)
+                status = 1
+                continue
+            reports.append(report)
+            if args.json != "-":
+                print_report(report)
+
+    if args.json == "-":
+        print(json.dumps(reports, indent=2))
+    elif args.json:
+        Path(args.json).write_text(json.dumps(reports, indent=2) + "\n", encoding="utf-8")
+    return status
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Minimaler PMTiles v3 Writer (nur stdlib).
+
+Tiles werden in aufsteigender Tile-ID (Hilbert-Reihenfolge) übergeben und
+direkt in die Zieldatei gestreamt - kein Zwischenformat, keine zweite
+Kopie der Tile-Daten. Aufeinanderfolgende identische Tiles werden als
+Run-Length-Eintrag, kleine identische Tiles (Meer, leere Flächen) per
+Hash dedupliziert.
+
+Layout der Datei:
+  [Header | Root-Directory | Padding bis 16 KiB] [Tile-Daten] [Leaf-Directories] [Metadaten]
+
+Der Root-Directory muss laut Spezifikation in den ersten 16 KiB liegen;
+die übrigen Abschnitte werden über die Offsets im Header gefunden. Die
+Datei entsteht als `<ziel>.tmp` und wird erst am Ende umbenannt.
+"""
+import gzip
+import hashlib
+import json
+import os
+from array import array
+
+from pmtiles_reader import (
+    COMPRESSION_NAMES,
+    HEADER_LEN,
+    HEADER_STRUCT,
+    MAGIC,
+    TILE_TYPE_NAMES,
+    PMTilesError,
+    range_bbox,
+    split_by_zoom,
+    tile_bbox_lonlat,
+    tileid_to_zxy,
+)
+
+ROOT_LIMIT = 16384
+# Nur kleine Tiles deduplizieren: große sind praktisch nie identisch, kosten aber Hash-Speicher
+DEDUP_MAX_BYTES = int(os.environ.get("PMTILES_DEDUP_MAX_BYTES", "4096"))
+LEAF_START_SIZE = 4096
+
+COMPRESSION_CODES = {name: code for code, name in COMPRESSION_NAMES.items()}
+TILE_TYPE_CODES = {name: code for code, name in TILE_TYPE_NAMES.items()}
+
+
+def _write_varint(value, out):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def serialize_directory(tile_ids, offsets, lengths, run_lengths) -> bytes:
+    """Gegenstück zu pmtiles_reader.deserialize_directory (unkomprimiert)."""
+    out = bytearray()
+    _write_varint(len(tile_ids), out)
+    last_id = 0
+    for tile_id in tile_ids:
+        _write_varint(tile_id - last_id, out)
+        last_id = tile_id
+    for run_length in run_lengths:
+        _write_varint(run_length, out)
+    for length in lengths:
+        _write_varint(length, out)
+    for i, offset in enumerate(offsets):
+        if i > 0 and offset == offsets[i - 1] + lengths[i - 1]:
+            _write_varint(0, out)
+        else:
+            _write_varint(offset + 1, out)
+    return bytes(out)
+
+
+def _compress(data):
+    return gzip.compress(data, mtime=0)
+
+
+def build_directories(tile_ids, offsets, lengths, run_lengths, leaf_size=LEAF_START_SIZE):
+    """
+    Root-Directory (passt in die ersten 16 KiB) + Leaf-Directories.
+    Leaf-Größe (Einträge, Start: leaf_size) wird verdoppelt, bis die
+    Leaf-Verweise in den Root passen.
+    """
+    root_budget = ROOT_LIMIT - HEADER_LEN
+    if len(tile_ids) <= LEAF_START_SIZE:
+        root = _compress(serialize_directory(tile_ids, offsets, lengths, run_lengths))
+        if len(root) <= root_budget:
+            return root, b""
+
+    while True:
+        leaves = bytearray()
+        refs = ([], [], [], [])
+        for start in range(0, len(tile_ids), leaf_size):
+            end = start + leaf_size
+            leaf = _compress(serialize_directory(
+                tile_ids[start:end], offsets[start:end], lengths[start:end], run_lengths[start:end]
+            ))
+            refs[0].append(tile_ids[start])
+            refs[1].append(len(leaves))
+            refs[2].append(len(leaf))
+            refs[3].append(0)
+            leaves += leaf
+        root = _compress(serialize_directory(*refs))
+        if len(root) <= root_budget:
+            return root, bytes(leaves)
+        leaf_size *= 2
+
+
+class PMTilesWriter:
+    """
+    Streaming-Writer. Nutzung:
+
+        with PMTilesWriter(path, tile_type="mvt", tile_compression="gzip") as writer:
+            for tile_id, data in tiles_in_hilbert_order:
+                writer.add_tile(tile_id, data)
+            writer.finish(metadata)
+    """
+
+    def __init__(self, path, tile_type="mvt", tile_compression="gzip", dedup_max_bytes=DEDUP_MAX_BYTES):
+        if tile_type not in TILE_TYPE_CODES or tile_compression not in COMPRESSION_CODES:
+            raise PMTilesError(f"Unbekannter Tile-Typ/Kompression: {tile_type}/{tile_compression}")
+        self.path = str(path)
+        self.tmp_path = self.path + ".tmp"
+        self.tile_type = tile_type
+        self.tile_compression = tile_compression
+        self.dedup_max_bytes = dedup_max_bytes
+        self.file = open(self.tmp_path, "wb")
+        self.file.seek(ROOT_LIMIT)
+        self.data_length = 0
+
+        self.tile_ids = array("Q")
+        self.offsets = array("Q")
+        self.lengths = array("L")
+        self.run_lengths = array("L")
+        self.addressed = 0
+        self.contents = 0
+        self.seen = {}
+        self.last_data = None
+        self.last_digest = None
+        self.zoom_bounds = {}
+        self.finished = False
+
+    def _extend_bounds(self, z, minx, miny, maxx, maxy):
+        bounds = self.zoom_bounds.get(z)
+        self.zoom_bounds[z] = [minx, miny, maxx, maxy] if bounds is None else [
+            min(bounds[0], minx), min(bounds[1], miny), max(bounds[2], maxx), max(bounds[3], maxy)
+        ]
+
+    def add_tile(self, tile_id, data, zxy=None, run_length=1, digest=None):
+        """
+        zxy optional, wenn der Aufrufer die Koordinaten schon kennt (spart die Umrechnung).
+        run_length > 1 schreibt einen Lauf identischer Tiles ab tile_id. `digest`
+        (blake2b, 16 Byte) vom Aufrufer erzwingt die Deduplizierung unabhängig
+        von dedup_max_bytes.
+        """
+        if self.tile_ids and tile_id <= self.tile_ids[-1] + self.run_lengths[-1] - 1:
+            raise PMTilesError(f"Tile-IDs müssen aufsteigend sein ({tile_id} nach {self.tile_ids[-1]})")
+        self.addressed += run_length
+        if run_length == 1:
+            z, x, y = zxy or tileid_to_zxy(tile_id)
+            self._extend_bounds(z, x, y, x, y)
+        else:
+            for _, start, end in split_by_zoom(tile_id, tile_id + run_length):
+                self._extend_bounds(*range_bbox(start, end))
+
+        # Run-Length: direkt anschließende ID mit identischem Inhalt
+        if digest is not None:
+            same = digest == self.last_digest
+        else:
+            same = self.last_data is not None and data == self.last_data
+        if same and tile_id == self.tile_ids[-1] + self.run_lengths[-1]:
+            self.run_lengths[-1] += run_length
+            return
+
+        offset = None
+        key = digest
+        if key is None and len(data) <= self.dedup_max_bytes:
+            key = hashlib.blake2b(data, digest_size=16).digest()
+        if key is not None:
+            offset = self.seen.get(key)
+        if offset is None:
+            offset = self.data_length
+            self.file.write(data)
+            self.data_length += len(data)
+            self.contents += 1
+            if key is not None:
+                self.seen[key] = offset
+
+        self.tile_ids.append(tile_id)
+        self.offsets.append(offset)
+        self.lengths.append(len(data))
+        self.run_lengths.append(run_length)
+        self.last_data = bytes(data) if digest is None else None
+        self.last_digest = digest
+
+    def finish(self, metadata, bounds=None, center=None, leaf_size=LEAF_START_SIZE):
+        """Schreibt Directories, Metadaten und Header; benennt die Datei um. Rückgabe: Kennzahlen."""
+        if not self.tile_ids:
+            raise PMTilesError("Keine Tiles geschrieben")
+        root, leaves = build_directories(self.tile_ids, self.offsets, self.lengths, self.run_lengths, leaf_size)
+        meta = _compress(json.dumps(metadata, ensure_ascii=False).encode("utf-8"))
+
+        minzoom = min(self.zoom_bounds)
+        maxzoom = max(self.zoom_bounds)
+        if bounds is None:
+            bounds = tile_bbox_lonlat(maxzoom, *self.zoom_bounds[maxzoom])
+        if center is None:
+            center = [(bounds[0] + bounds[2]) / 2, (bounds[1] + bounds[3]) / 2, minzoom]
+
+        data_offset = ROOT_LIMIT
+        leaf_offset = data_offset + self.data_length
+        meta_offset = leaf_offset + len(leaves)
+        self.file.write(leaves)
+        self.file.write(meta)
+
+        header = HEADER_STRUCT.pack(
+            MAGIC, 3,
+            HEADER_LEN, len(root),
+            meta_offset, len(meta),
+            leaf_offset, len(leaves),
+            data_offset, self.data_length,
+            self.addressed, len(self.tile_ids), self.contents,
+            1,  # clustered: Tile-Daten liegen in Tile-ID-Reihenfolge
+            COMPRESSION_CODES["gzip"],
+            COMPRESSION_CODES[self.tile_compression],
+            TILE_TYPE_CODES[self.tile_type],
+            minzoom, maxzoom,
+            *(round(v * 1e7) for v in bounds),
+            center[2], round(center[0] * 1e7), round(center[1] * 1e7),
+        )
+        self.file.seek(0)
+        self.file.write(header)
+        self.file.write(root)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        os.replace(self.tmp_path, self.path)
+        self.finished = True
+        return {
+            "addressed_tiles": self.addressed,
+            "tile_entries": len(self.tile_ids),
+            "tile_contents": self.contents,
+            "tile_data_bytes": self.data_length,
+            "leaf_dirs_bytes": len(leaves),
+            "minzoom": minzoom,
+            "maxzoom": maxzoom,
+            "bounds": bounds,
+        }
+
+    def abort(self):
+        if not self.file.closed:
+            self.file.close()
+        if not self.finished:
+            try:
+                os.unlink(self.tmp_path)
+            except FileNotFoundError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.abort()
+        return False
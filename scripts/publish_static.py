@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+Veröffentlichung der JSON-Endpunkte (INFO_DIR/*.json) und Styles
+(TILES_DIR/*/styles/*/style.json) für die Auslieferung per nginx.
+
+Pro Datei:
+1. kompakt neu schreiben (falls noch eingerückt),
+2. `.gz` und `.br` daneben legen (gzip_static / brotli_static),
+3. starken ETag aus dem SHA-256 des Inhalts ableiten und als nginx-Map
+   ausgeben (`map $uri $published_etag`),
+4. optional (PUBLISH_VERSIONED=1) eine unveränderliche Kopie
+   `<name>.<hash12>.json` anlegen. endpoints_info.json verweist unter
+   "published" (und pro Dataset unter "url_immutable") darauf; diese URLs
+   können Clients unbegrenzt cachen.
+
+Dateien, deren Hash sich seit dem letzten Lauf nicht geändert hat, werden
+nicht neu komprimiert - es werden nur die mtimes der Geschwister angeglichen.
+endpoints_info.json wird zuletzt veröffentlicht, weil es auf alle anderen
+verweist; es selbst bleibt unversioniert (Einstiegspunkt, wird revalidiert).
+
+Brotli: Modul `brotli`, sonst das `brotli`-CLI (BROTLI_BIN), sonst ohne `.br`.
+
+Usage:
+  publish_static.py [--force]
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import time
+from pathlib import Path
+from urllib.parse import urlparse
+
+from inventory_scan import INFO_DIR, STATE_DIR, compact_json
+
+TILES_DIR = Path(os.environ.get("TILES_DIR", "/srv/tiles"))
+ENDPOINTS_INFO_PATH = Path(os.environ.get("ENDPOINTS_INFO_PATH", str(INFO_DIR / "endpoints_info.json")))
+TILES_BASE_URL = os.environ.get("TILES_BASE_URL", "").rstrip("/")
+# URL, unter der INFO_DIR ausgeliefert wird (ohne: keine URLs/ETags für Inventare)
+INFO_BASE_URL = os.environ.get("INFO_BASE_URL", "").rstrip("/")
+PUBLISH_VERSIONED = os.environ.get("PUBLISH_VERSIONED", "0") == "1"
+# Ältere versionierte Kopien, die für Clients mit gecachter endpoints_info.json erhalten bleiben
+KEEP_VERSIONS = int(os.environ.get("PUBLISH_KEEP_VERSIONS", "3"))
+MANIFEST_FILE = Path(os.environ.get("PUBLISH_MANIFEST", str(STATE_DIR / "publish.json")))
+ETAG_MAP_FILE = Path(os.environ.get("PUBLISH_ETAG_MAP", str(STATE_DIR / "published_etags.map")))
+BROTLI_BIN = os.environ.get("BROTLI_BIN", "").strip() or shutil.which("brotli")
+
+MANIFEST_VERSION = 1
+HASH_LEN = 12
+VERSIONED_RE = re.compile(r"\.[0-9a-f]{%d}\.json$" % HASH_LEN)
+SIBLING_SUFFIXES = (".gz", ".br")
+
+
+def log_info(msg):
+    print(f"   ℹ️  {msg}")
+
+def log_success(msg):
+    print(f"   ✅ {msg}")
+
+def log_warn(msg):
+    print(f"   ⚠️  {msg}")
+
+def log_error(msg):
+    print(f"   ❌ {msg}")
+
+
+def gzip_bytes(data):
+    # mtime=0: gleicher Inhalt -> byte-identisches .gz
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def brotli_available():
+    try:
+        import brotli  # noqa: F401 - optional
+    except ImportError:
+        return bool(BROTLI_BIN)
+    return True
+
+
+def brotli_bytes(data):
+    """Rückgabe None, wenn weder Modul noch CLI verfügbar sind."""
+    try:
+        import brotli  # optional
+    except ImportError:
+        brotli = None
+    if brotli is not None:
+        return brotli.compress(data, quality=11)
+    if BROTLI_BIN:
+        return subprocess.run([BROTLI_BIN, "-c", "-q", "11"], input=data, capture_output=True, check=True).stdout
+    return None
+
+
+def strong_etag(digest):
+    return f'"{digest[:32]}"'
+
+
+def versioned_name(path, digest):
+    return f"{path.stem}.{digest[:HASH_LEN]}{path.suffix}"
+
+
+def _write_atomic(path, data, mtime_ns=None):
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(data)
+    if mtime_ns is not None:
+        os.utime(tmp, ns=(mtime_ns, mtime_ns))
+    tmp.replace(path)
+
+
+def _sync_mtime(path, mtime_ns):
+    """Geschwister tragen die mtime der Quelle (Last-Modified bleibt konsistent)."""
+    try:
+        if path.stat().st_mtime_ns != mtime_ns:
+            os.utime(path, ns=(mtime_ns, mtime_ns))
+    except FileNotFoundError:
+        pass
+
+
+def _remove_with_siblings(path):
+    for candidate in (path, *(path.with_name(path.name + s) for s in SIBLING_SUFFIXES)):
+        candidate.unlink(missing_ok=True)
+
+
+def collect_sources():
+    """Liefert (key, root_label, root, rel) - endpoints_info.json nicht enthalten."""
+    sources = []
+    for style in sorted(TILES_DIR.glob("*/styles/*/style.json")):
+        rel = style.relative_to(TILES_DIR).as_posix()
+        if any(part.startswith(".") for part in rel.split("/")):
+            continue
+        sources.append((f"tiles/{rel}", "tiles", TILES_DIR, rel))
+    if INFO_DIR.is_dir():
+        for path in sorted(INFO_DIR.glob("*.json")):
+            if path.name.startswith(".") or VERSIONED_RE.search(path.name) or path == ENDPOINTS_INFO_PATH:
+                continue
+            sources.append((f"info/{path.name}", "info", INFO_DIR, path.name))
+    return sources
+
+
+def base_url(root_label):
+    return TILES_BASE_URL if root_label == "tiles" else INFO_BASE_URL
+
+
+def publish_file(path, entry, root_label, rel, force=False, data=None):
+    """
+    Veröffentlicht eine Datei. `data` überschreibt den Inhalt (endpoints_info).
+    Rückgabe: (neuer Manifest-Eintrag, geändert?).
+    """
+    raw = path.read_bytes()
+    compact = compact_json(json.loads(raw) if data is None else data)
+    if compact != raw:
+        _write_atomic(path, compact)
+    digest = hashlib.sha256(compact).hexdigest()
+    mtime_ns = path.stat().st_mtime_ns
+
+    versioned = PUBLISH_VERSIONED and root_label != "endpoints"
+    siblings = [path.with_name(path.name + s) for s in SIBLING_SUFFIXES]
+    current = (
+        not force
+        and entry
+        and entry.get("hash") == digest
+        and siblings[0].exists()
+        # .br nachziehen, sobald Brotli verfügbar wird
+        and (siblings[1].exists() if entry.get("br") is not None else not brotli_available())
+        and (not versioned or (path.parent / versioned_name(path, digest)).exists())
+    )
+    if current:
+        for sibling in siblings:
+            _sync_mtime(sibling, mtime_ns)
+        return entry, False
+
+    gz = gzip_bytes(compact)
+    br = brotli_bytes(compact)
+    _write_atomic(siblings[0], gz, mtime_ns)
+    if br is not None:
+        _write_atomic(siblings[1], br, mtime_ns)
+    else:
+        siblings[1].unlink(missing_ok=True)
+
+    versions = list((entry or {}).get("versions", []))
+    if versioned:
+        target = path.parent / versioned_name(path, digest)
+        _write_atomic(target, compact)
+        _write_atomic(target.with_name(target.name + ".gz"), gz)
+        if br is not None:
+            _write_atomic(target.with_name(target.name + ".br"), br)
+        versions = [digest[:HASH_LEN]] + [v for v in versions if v != digest[:HASH_LEN]]
+        for old in versions[KEEP_VERSIONS + 1:]:
+            _remove_with_siblings(path.with_name(f"{path.stem}.{old}{path.suffix}"))
+        versions = versions[:KEEP_VERSIONS + 1]
+
+    new_entry = {
+        "hash": digest,
+        "etag": strong_etag(digest),
+        "size": len(compact),
+        "gz": len(gz),
+        "br": len(br) if br is not None else None,
+        "versions": versions,
+        "published_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    return new_entry, True
+
+
+def published_info(entry, root_label, rel):
+    """Eintrag für endpoints_info.json["published"]."""
+    info = {"etag": entry["etag"]}
+    if entry.get("versions") and PUBLISH_VERSIONED:
+        rel_path = Path(rel)
+        versioned_rel = (rel_path.parent / f"{rel_path.stem}.{entry['versions'][0]}{rel_path.suffix}").as_posix()
+        info["file"] = versioned_rel
+        if base_url(root_label):
+            info["url"] = f"{base_url(root_label)}/{versioned_rel}"
+    return info
+
+
+def attach_published(endpoints, published):
+    """Ergänzt endpoints_info.json um die veröffentlichten Versionen."""
+    endpoints = dict(endpoints)
+    endpoints["published"] = published
+    styles = published.get("styles", {})
+    datasets = []
+    for dataset in endpoints.get("datasets", []):
+        if isinstance(dataset, dict):
+            dataset = dict(dataset)
+            style = dataset.get("style") if isinstance(dataset.get("style"), dict) else {}
+            target = styles.get(style.get("relative_path") or "")
+            if target and target.get("url"):
+                dataset["url_immutable"] = target["url"]
+            else:
+                dataset.pop("url_immutable", None)
+        datasets.append(dataset)
+    if "datasets" in endpoints:
+        endpoints["datasets"] = datasets
+    return endpoints
+
+
+def write_etag_map(manifest_files):
+    """nginx-Map $uri -> ETag (nur für Dateien mit bekannter Basis-URL)."""
+    lines = ["# Automatisch erzeugt von publish_static.py", "map $uri $published_etag {", '    default "";']
+    for key, entry in sorted(manifest_files.items()):
+        root_label, _, rel = key.partition("/")
+        url = base_url(root_label)
+        if not url:
+            continue
+        prefix = urlparse(url).path.rstrip("/")
+        names = [rel]
+        if entry.get("versions") and PUBLISH_VERSIONED:
+            rel_path = Path(rel)
+            names.append((rel_path.parent / f"{rel_path.stem}.{entry['versions'][0]}{rel_path.suffix}").as_posix())
+        for name in names:
+            lines.append(f"    {prefix}/{name} '{entry['etag']}';")
+    lines.append("}")
+    content = "\n".join(lines) + "\n"
+    if ETAG_MAP_FILE.exists() and ETAG_MAP_FILE.read_text(encoding="utf-8") == content:
+        return False
+    ETAG_MAP_FILE.parent.mkdir(parents=True, exist_ok=True)
+    _write_atomic(ETAG_MAP_FILE, content.encode("utf-8"))
+    return True
+
+
+def load_manifest():
+    if not MANIFEST_FILE.exists():
+        return {}
+    try:
+        data = json.loads(MANIFEST_FILE.read_text(encoding="utf-8"))
+    except Exception as e:
+        log_warn(f"Publish-Manifest unlesbar, alles wird neu veröffentlicht: {e}")
+        return {}
+    if data.get("version") != MANIFEST_VERSION:
+        return {}
+    return data.get("files", {})
+
+
+def save_manifest(files):
+    MANIFEST_FILE.parent.mkdir(parents=True, exist_ok=True)
+    payload = {"version": MANIFEST_VERSION, "files": dict(sorted(files.items()))}
+    _write_atomic(MANIFEST_FILE, (json.dumps(payload, indent=2) + "\n").encode("utf-8"))
+
+
+def publish_all(force=False):
+    """Rückgabe: (veröffentlicht, unverändert, Fehler)."""
+    previous = load_manifest()
+    files = {}
+    published = {"styles": {}, "inventories": {}}
+    written = skipped = failures = 0
+
+    for key, root_label, root, rel in collect_sources():
+        path = root / rel
+        try:
+            entry, changed = publish_file(path, previous.get(key), root_label, rel, force)
+        except (OSError, ValueError, subprocess.CalledProcessError) as e:
+            log_error(f"{key}: {e}")
+            failures += 1
+            if key in previous:
+                files[key] = previous[key]
+            continue
+        files[key] = entry
+        group = "styles" if root_label == "tiles" else "inventories"
+        published[group][rel] = published_info(entry, root_label, rel)
+        if changed:
+            written += 1
+            log_info(f"{key}: {entry['size']} B -> gz {entry['gz']} B" + (f", br {entry['br']} B" if entry["br"] is not None else ""))
+        else:
+            skipped += 1
+
+    if ENDPOINTS_INFO_PATH.exists():
+        key = f"info/{ENDPOINTS_INFO_PATH.name}"
+        try:
+            endpoints = json.loads(ENDPOINTS_INFO_PATH.read_text(encoding="utf-8"))
+            data = attach_published(endpoints, published) if isinstance(endpoints, dict) else endpoints
+            entry, changed = publish_file(ENDPOINTS_INFO_PATH, previous.get(key), "endpoints", ENDPOINTS_INFO_PATH.name, force, data)
+            files[key] = entry
+            if changed:
+                written += 1
+                log_info(f"{key}: {entry['size']} B -> gz {entry['gz']} B")
+            else:
+                skipped += 1
+        except (OSError, ValueError, subprocess.CalledProcessError) as e:
+            log_error(f"{key}: {e}")
+            failures += 1
+
+    # Verschwundene Quellen: Geschwister und Versionen mit entfernen,
+    # sonst liefert gzip_static weiter den alten Inhalt aus
+    for key in sorted(set(previous) - set(files)):
+        root_label, _, rel = key.partition("/")
+        path = (TILES_DIR if root_label == "tiles" else INFO_DIR) / rel
+        if path.exists():
+            continue
+        _remove_with_siblings(path)
+        for version in previous[key].get("versions", []):
+            _remove_with_siblings(path.with_name(f"{path.stem}.{version}{path.suffix}"))
+        log_info(f"{key}: Quelle entfernt - komprimierte Kopien gelöscht")
+
+    save_manifest(files)
+    if write_etag_map(files):
+        log_info(f"ETag-Map aktualisiert: {ETAG_MAP_FILE} (nginx reload nötig)")
+    return written, skipped, failures
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="JSON-Endpunkte und Styles komprimiert veröffentlichen")
+    parser.add_argument("--force", action="store_true", help="Alle Dateien neu komprimieren")
+    args = parser.parse_args(argv)
+
+    if not brotli_available():
+        log_info("Kein Brotli (Modul oder CLI) verfügbar - nur .gz wird erzeugt.")
+
+    written, skipped, failures = publish_all(args.force)
+    log_success(f"Veröffentlicht: {written} neu, {skipped} unverändert" + (f", {failures} Fehler" if failures else ""))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
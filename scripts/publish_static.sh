@@ -0,0 +1,24 @@
+#!/bin/bash
+set -euo pipefail
+
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+if [ -f "$SCRIPT_DIR/utils.sh" ]; then
+    source "$SCRIPT_DIR/utils.sh"
+else
+    echo "❌ Fehler: utils.sh nicht gefunden!"
+    exit 1
+fi
+
+log_section "VERÖFFENTLICHUNG: JSON-ENDPUNKTE & STYLES"
+
+export TILES_DIR="${TILES_DIR:-/srv/tiles}"
+export INFO_DIR="${INFO_DIR:-/srv/info}"
+export ENDPOINTS_INFO_PATH="${ENDPOINTS_INFO_PATH:-$INFO_DIR/endpoints_info.json}"
+PYTHON_SCRIPT="$SCRIPT_DIR/publish_static.py"
+
+if [ ! -f "$PYTHON_SCRIPT" ]; then
+    log_error "Python-Skript nicht gefunden: $PYTHON_SCRIPT"
+    exit 1
+fi
+
+python3 "$PYTHON_SCRIPT" "$@"
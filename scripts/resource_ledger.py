@@ -0,0 +1,428 @@
+#!/usr/bin/env python3
+"""
+Ressourcen-Ledger für die gesamte Pipeline.
+
+Jeder Schritt (Skript, Befehl oder Python-Block) wird mit Wall-Zeit,
+User-/Sys-CPU, gelesenen/geschriebenen Bytes, Peak-RSS und der Änderung
+des freien Plattenplatzes in ein Ledger pro Lauf geschrieben
+($LEDGER_DIR/<lauf>.jsonl, eine Zeile pro Schritt).
+
+- Shell:   `ledger_step <name> befehl args...` (utils.sh) bzw.
+           resource_ledger.py run <name> -- befehl args...
+- Python:  with ledger_step("name"): ...
+- Bericht: resource_ledger.py report [--runs 5] [--run ID] [--metric wall]
+
+Messung:
+- CPU und Peak-RSS aus rusage der Kindprozesse (wait4): enthält alle
+  Nachfahren, die gewartet wurden. Peak-RSS ist der größte Einzelprozess.
+- IO aus /proc/self/io des Wrappers - Linux rechnet die IO-Zähler beendeter
+  Kindprozesse dem Elternprozess zu. read/write_bytes = Block-Layer
+  (tatsächliche Platten-IO), rchar/wchar = inkl. Page-Cache.
+- Docker-Container sind keine Nachfahren: CPU/IO von Planetiler fehlen
+  (siehe planetiler_follow.py), die Plattenplatz-Änderung stimmt trotzdem.
+
+Schritte schachteln sich über LEDGER_PARENT, ein Lauf über LEDGER_RUN_ID
+(utils.sh setzt sie beim ersten Skript, pipeline.py pro Pipeline-Lauf).
+RESOURCE_LEDGER=0 schaltet die Messung ab.
+"""
+import argparse
+import contextlib
+import json
+import os
+import resource
+import shutil
+import signal
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+INSTALL_DIR = os.environ.get("INSTALL_DIR", "/srv/scripts")
+LEDGER_DIR = Path(os.environ.get("LEDGER_DIR", f"{INSTALL_DIR}/stats/ledger"))
+ENABLED = os.environ.get("RESOURCE_LEDGER", "1") != "0"
+DISK_PATHS = [
+    p for p in os.environ.get(
+        "LEDGER_DISK_PATHS",
+        ":".join(os.environ.get(k, d) for k, d in (
+            ("BUILD_DIR", "/srv/build"), ("TILES_DIR", "/srv/tiles"), ("INFO_DIR", "/srv/info"),
+        )),
+    ).split(":") if p
+]
+# Abweichung zum Median der Vorläufe, ab der der Bericht warnt - sofern der
+# Schritt auch absolut zählt (Anteil am Gesamtwert), sonst warnt jedes Rauschen
+REGRESSION_THRESHOLD = 0.2
+REGRESSION_MIN_SHARE = 0.01
+
+METRICS = {
+    # Name: (Feld, Einheit, Teiler)
+    "wall": ("wall_s", "s", 1),
+    "cpu": ("cpu_s", "s", 1),
+    "read": ("read_bytes", "MB", 1e6),
+    "write": ("write_bytes", "MB", 1e6),
+    "rss": ("peak_rss_kb", "MB", 1e3),
+    "disk": ("disk_delta_bytes", "MB", 1e6),
+}
+
+
+def log_info(msg):
+    print(f"   ℹ️  {msg}")
+
+def log_warn(msg):
+    print(f"   ⚠️  {msg}")
+
+def log_error(msg):
+    print(f"   ❌ {msg}", file=sys.stderr)
+
+
+# --- MESSUNG ---
+
+def read_proc_io():
+    """/proc/self/io als dict (leer, wenn der Kernel keine IO-Zählung hat)."""
+    try:
+        with open("/proc/self/io", encoding="ascii") as f:
+            return {k: int(v) for k, v in (line.split(":") for line in f)}
+    except (OSError, ValueError):
+        return {}
+
+
+def disk_free():
+    """Freier Platz pro Dateisystem (über st_dev dedupliziert) für DISK_PATHS."""
+    free = {}
+    for path in DISK_PATHS:
+        try:
+            dev = os.stat(path).st_dev
+            if dev not in free:
+                free[dev] = (path, shutil.disk_usage(path).free)
+        except OSError:
+            continue
+    return free
+
+
+class Probe:
+    """Momentaufnahme vor einem Schritt; measure() liefert die Differenzen."""
+
+    def __init__(self):
+        self.start = time.time()
+        self.t0 = time.monotonic()
+        self.times = os.times()
+        self.io = read_proc_io()
+        self.disk = disk_free()
+
+    def measure(self, child_rusage=None):
+        wall = time.monotonic() - self.t0
+        io = read_proc_io()
+        disk = disk_free()
+        if child_rusage is not None:
+            # wait4: genau dieser Kindprozess samt gewarteter Nachfahren
+            user, system = child_rusage.ru_utime, child_rusage.ru_stime
+            peak_rss = child_rusage.ru_maxrss
+            blocks = (child_rusage.ru_inblock, child_rusage.ru_oublock)
+        else:
+            # In-Process: eigener Prozess + in der Zeit beendete Kindprozesse
+            now = os.times()
+            user = (now.user - self.times.user) + (now.children_user - self.times.children_user)
+            system = (now.system - self.times.system) + (now.children_system - self.times.children_system)
+            peak_rss = max(
+                resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+            )
+            blocks = None
+
+        record = {
+            "start": round(self.start, 3),
+            "end": round(self.start + wall, 3),
+            "wall_s": round(wall, 3),
+            "user_s": round(user, 3),
+            "sys_s": round(system, 3),
+            "cpu_s": round(user + system, 3),
+            "peak_rss_kb": peak_rss,
+        }
+        if io:
+            for key in ("read_bytes", "write_bytes", "rchar", "wchar"):
+                record[key] = io.get(key, 0) - self.io.get(key, 0)
+        elif blocks:
+            # Ohne /proc/self/io: Block-Zähler aus rusage (512-Byte-Einheiten)
+            record["read_bytes"], record["write_bytes"] = blocks[0] * 512, blocks[1] * 512
+        record["disk_delta_bytes"] = sum(
+            self.disk[dev][1] - free for dev, (_, free) in disk.items() if dev in self.disk
+        )
+        return record
+
+
+def run_id():
+    """Aktueller Lauf; ohne LEDGER_RUN_ID beginnt hier ein neuer (und wird vererbt)."""
+    current = os.environ.get("LEDGER_RUN_ID")
+    if not current:
+        current = os.environ["LEDGER_RUN_ID"] = time.strftime("%Y-%m-%d_%H%M%S")
+    return current
+
+
+def append_record(record):
+    """Eine JSON-Zeile anhängen (O_APPEND, ein write -> parallele Schritte sind sicher)."""
+    try:
+        LEDGER_DIR.mkdir(parents=True, exist_ok=True)
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        fd = os.open(LEDGER_DIR / f"{record['run']}.jsonl", os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+    except OSError as e:
+        # Die Messung darf den eigentlichen Schritt nie scheitern lassen
+        log_warn(f"Ledger nicht geschrieben ({e})")
+
+
+def _new_step(name):
+    return {
+        "run": run_id(),
+        "id": f"{os.getpid()}-{time.monotonic_ns()}",
+        "parent": os.environ.get("LEDGER_PARENT") or None,
+        "name": name,
+        "host": os.uname().nodename,
+    }
+
+
+@contextlib.contextmanager
+def ledger_step(name):
+    """
+    Python-Block messen; darin gestartete Prozesse zählen als Unterschritte.
+    Nur innerhalb eines Laufs (LEDGER_RUN_ID), damit Bibliotheks- und
+    Benchmark-Aufrufe kein Ledger anlegen.
+    """
+    if not ENABLED or not os.environ.get("LEDGER_RUN_ID"):
+        yield
+        return
+    record = _new_step(name)
+    previous_parent = os.environ.get("LEDGER_PARENT")
+    os.environ["LEDGER_PARENT"] = record["id"]
+    probe = Probe()
+    status = 0
+    try:
+        yield
+    except BaseException:
+        status = 1
+        raise
+    finally:
+        if previous_parent is None:
+            os.environ.pop("LEDGER_PARENT", None)
+        else:
+            os.environ["LEDGER_PARENT"] = previous_parent
+        append_record({**record, **probe.measure(), "exit": status})
+
+
+def run_command(name, command):
+    """Befehl als Schritt ausführen. Rückgabe: Exit-Code des Befehls."""
+    if not ENABLED:
+        return subprocess.call(command)
+    record = _new_step(name)
+    record["cmd"] = " ".join(command)[:500]
+    env = dict(os.environ, LEDGER_PARENT=record["id"])
+    probe = Probe()
+    try:
+        proc = subprocess.Popen(command, env=env)
+    except OSError as e:
+        log_error(f"{name}: {e}")
+        return 127
+
+    # Ctrl+C erreicht das Kind über die Prozessgruppe; SIGTERM (pipeline.py) weiterreichen
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda signum, frame: proc.send_signal(signum))
+    while True:
+        try:
+            _, status, usage = os.wait4(proc.pid, 0)
+            break
+        except InterruptedError:
+            continue
+    proc.returncode = returncode = os.waitstatus_to_exitcode(status)
+    if returncode < 0:
+        returncode = 128 - returncode
+    append_record({**record, **probe.measure(usage), "exit": returncode})
+    return returncode
+
+
+# --- BERICHT ---
+
+def load_run(path):
+    steps = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                steps.append(json.loads(line))
+            except ValueError:
+                continue  # abgebrochene Zeile (Absturz mitten im write)
+    return steps
+
+
+def list_runs():
+    return sorted(LEDGER_DIR.glob("*.jsonl")) if LEDGER_DIR.is_dir() else []
+
+
+def roots(steps):
+    """Schritte ohne (bekannten) Elternschritt - z.B. Tasks der Pipeline."""
+    ids = {s["id"] for s in steps}
+    return [s for s in steps if s.get("parent") not in ids]
+
+
+def children(steps, parent_id):
+    return [s for s in steps if s.get("parent") == parent_id]
+
+
+def critical_path(siblings, slack=1.0):
+    """
+    Kette der Geschwister-Schritte, die das Ende bestimmt: vom zuletzt
+    endenden Schritt rückwärts jeweils der Vorgänger, der als letzter vor
+    seinem Start fertig wurde (slack: Toleranz für Start-Overhead in s).
+    """
+    if not siblings:
+        return []
+    path = [max(siblings, key=lambda s: s["end"])]
+    while True:
+        before = [s for s in siblings if s["end"] <= path[-1]["start"] + slack and s is not path[-1] and s not in path]
+        if not before:
+            return path[::-1]
+        path.append(max(before, key=lambda s: s["end"]))
+
+
+def run_span(steps):
+    if not steps:
+        return 0.0
+    return max(s["end"] for s in steps) - min(s["start"] for s in steps)
+
+
+def _fmt_bytes(value):
+    if value is None:
+        return "-"
+    sign = "-" if value < 0 else ""
+    value = abs(value)
+    for unit, factor in (("GB", 1e9), ("MB", 1e6), ("KB", 1e3)):
+        if value >= factor:
+            return f"{sign}{value / factor:.1f}{unit}"
+    return f"{sign}{value}B"
+
+
+def _fmt_seconds(value):
+    if value >= 3600:
+        return f"{value / 3600:.1f}h"
+    if value >= 60:
+        return f"{value / 60:.1f}m"
+    return f"{value:.1f}s"
+
+
+def print_steps(steps, depth=0, max_depth=3, nodes=None):
+    nodes = roots(steps) if nodes is None else nodes
+    for step in sorted(nodes, key=lambda s: s["start"]):
+        label = ("  " * depth + step["name"])[:34]
+        util = step["cpu_s"] / step["wall_s"] * 100 if step["wall_s"] else 0
+        flag = "" if step.get("exit", 0) == 0 else f"  ❌ Exit {step['exit']}"
+        print(
+            f"  {label:<34} {_fmt_seconds(step['wall_s']):>7} {_fmt_seconds(step['user_s']):>7} "
+            f"{_fmt_seconds(step['sys_s']):>7} {util:>5.0f}% {_fmt_bytes(step.get('read_bytes')):>8} "
+            f"{_fmt_bytes(step.get('write_bytes')):>8} {_fmt_bytes(step['peak_rss_kb'] * 1024):>8} "
+            f"{_fmt_bytes(step.get('disk_delta_bytes')):>8}{flag}"
+        )
+        if depth + 1 < max_depth:
+            print_steps(steps, depth + 1, max_depth, children(steps, step["id"]))
+
+
+def print_critical_path(steps, nodes=None, depth=0, max_depth=3):
+    nodes = roots(steps) if nodes is None else nodes
+    path = critical_path(nodes)
+    total = run_span(nodes)
+    for step in path:
+        share = step["wall_s"] / total * 100 if total else 0
+        label = ("  " * depth + ("└─ " if depth else "") + step["name"])[:34]
+        print(f"  {label:<34} {_fmt_seconds(step['wall_s']):>7} ({share:.0f}%)")
+        if depth + 1 < max_depth:
+            print_critical_path(steps, children(steps, step["id"]), depth + 1, max_depth)
+
+
+def compare_runs(runs, metric):
+    """Tabelle Schritt x Lauf (Summe pro Schrittname, oberste zwei Ebenen)."""
+    field, unit, divisor = METRICS[metric]
+    columns = []
+    names = []
+    for path in runs:
+        steps = load_run(path)
+        top = roots(steps)
+        level = top + [c for s in top for c in children(steps, s["id"])]
+        totals = {}
+        for step in level:
+            totals[step["name"]] = totals.get(step["name"], 0) + (step.get(field) or 0)
+            if step["name"] not in names:
+                names.append(step["name"])
+        if metric == "wall":
+            totals["GESAMT"] = run_span(top)
+        else:
+            totals["GESAMT"] = (max if metric == "rss" else sum)(s.get(field) or 0 for s in top) if top else 0
+        columns.append((path.stem, totals))
+    names.append("GESAMT")
+    previous_totals = [totals["GESAMT"] for _, totals in columns[:-1] if totals["GESAMT"]]
+    min_change = statistics.median(previous_totals) * REGRESSION_MIN_SHARE if previous_totals else 0
+
+    print(f"  {'Schritt (' + unit + ')':<30}" + "".join(f" {label[5:]:>12}" for label, _ in columns) + f" {'Δ Median':>9}")
+    for name in names:
+        values = [totals.get(name) for _, totals in columns]
+        cells = "".join(f" {v / divisor:>12.1f}" if v is not None else f" {'-':>12}" for v in values)
+        previous = [v for v in values[:-1] if v]
+        delta = ""
+        if values[-1] is not None and previous:
+            median = statistics.median(previous)
+            change = (values[-1] - median) / median
+            regression = change > REGRESSION_THRESHOLD and values[-1] - median >= min_change
+            delta = f"{change * 100:+.0f}%" + (" ⚠️" if regression else "")
+        print(f"  {name[:30]:<30}{cells} {delta:>9}")
+
+
+def report(run=None, runs=5, metric="wall", depth=3):
+    available = list_runs()
+    if not available:
+        log_warn(f"Keine Läufe in {LEDGER_DIR}")
+        return 1
+    if run:
+        selected = [p for p in available if p.stem == run]
+        if not selected:
+            log_error(f"Lauf nicht gefunden: {run}")
+            return 1
+        current = selected[0]
+    else:
+        current = available[-1]
+
+    steps = load_run(current)
+    print(f"\n📊 Lauf {current.stem}: {len(steps)} Schritte, {_fmt_seconds(run_span(roots(steps)))}")
+    print(f"  {'Schritt':<34} {'Wall':>7} {'User':>7} {'Sys':>7} {'CPU':>6} {'Read':>8} {'Write':>8} {'RSS':>8} {'Disk Δ':>8}")
+    print_steps(steps, max_depth=depth)
+
+    print("\n📊 Kritischer Pfad")
+    print_critical_path(steps, max_depth=depth)
+
+    history = [p for p in available if p <= current][-runs:]
+    if len(history) > 1:
+        print(f"\n📊 Vergleich der letzten {len(history)} Läufe ({metric})")
+        compare_runs(history, metric)
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Ressourcen-Ledger der Pipeline")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run_parser = sub.add_parser("run", help="Befehl als Schritt messen: run <name> -- befehl ...")
+    run_parser.add_argument("name")
+    run_parser.add_argument("cmd", nargs=argparse.REMAINDER)
+    report_parser = sub.add_parser("report", help="Lauf, kritischer Pfad, Vergleich")
+    report_parser.add_argument("--run", help="Lauf-ID (Standard: letzter Lauf)")
+    report_parser.add_argument("--runs", type=int, default=5, help="Anzahl Läufe im Vergleich")
+    report_parser.add_argument("--metric", choices=sorted(METRICS), default="wall")
+    report_parser.add_argument("--depth", type=int, default=3, help="Schachtelungstiefe")
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        command = args.cmd[1:] if args.cmd[:1] == ["--"] else args.cmd
+        if not command:
+            parser.error("run: Befehl fehlt")
+        return run_command(args.name, command)
+    return report(args.run, args.runs, args.metric, args.depth)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -17,7 +17,7 @@ log_header "ASSETS SETUP (Fonts & Sprites)"
 # ---------------------------------------------------------
 # Lädt die Schriften herunter und entpackt sie nach /srv/assets/fonts
 if [ -f "$SCRIPT_DIR/install_fonts.sh" ]; then
-    "$SCRIPT_DIR/install_fonts.sh"
+    ledger_step "assets:fonts" "$SCRIPT_DIR/install_fonts.sh"
 else
     log_warn "install_fonts.sh nicht gefunden - überspringe Download."
 fi
@@ -29,7 +29,7 @@ fi
 if [ -f "$SCRIPT_DIR/font_inventory.sh" ]; then
     # Wir rufen es direkt auf. Das Skript nutzt eigene echo-Befehle,
     # daher lassen wir es einfach durchlaufen.
-    "$SCRIPT_DIR/font_inventory.sh"
+    ledger_step "assets:font-inventory" "$SCRIPT_DIR/font_inventory.sh"
 else
     log_warn "font_inventory.sh nicht gefunden - Inventory wird nicht aktualisiert."
 fi
@@ -39,7 +39,7 @@ fi
 # ---------------------------------------------------------
 # Erstellt die Icons (Sprite-Sheet) aus den SVGs
 if [ -f "$SCRIPT_DIR/build_sprites.sh" ]; then
-    "$SCRIPT_DIR/build_sprites.sh"
+    ledger_step "assets:sprites" "$SCRIPT_DIR/build_sprites.sh"
 else
     log_warn "build_sprites.sh nicht gefunden - überspringe Sprites."
 fi
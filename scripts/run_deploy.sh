@@ -12,9 +12,15 @@ fi
 
 log_header "PHASE 4: DEPLOYMENT (Tiles, Styles, Info)"
 
+# 1b. PMTiles optimieren (Hilbert-Clustering, Dedup, Leaf-Größe; Tile-für-Tile geprüft)
+# Unveränderte Archive überspringt das Build-Manifest. Bei Fehlern bleibt das Original.
+if [ -f "$SCRIPT_DIR/optimize_pmtiles.sh" ]; then
+    ledger_step "deploy:optimize" "$SCRIPT_DIR/optimize_pmtiles.sh" || log_warn "PMTiles-Optimierung unvollständig - betroffene Archive werden unverändert deployt."
+fi
+
 # 2. PMTiles & Metadata deployen (Kopiert von build -> tiles)
 if [ -f "$SCRIPT_DIR/deploy_pmtiles.sh" ]; then
-    "$SCRIPT_DIR/deploy_pmtiles.sh"
+    ledger_step "deploy:pmtiles" "$SCRIPT_DIR/deploy_pmtiles.sh"
 else
     log_error "deploy_pmtiles.sh nicht gefunden!"
     exit 1
@@ -24,37 +30,55 @@ fi
 # Hinweis: Das URL-Update kann hier noch fehlschlagen, da endpoints_info.json noch fehlt.
 # Das ist okay, wir machen am Ende ein fixes Update.
 if [ -f "$SCRIPT_DIR/deploy_stylesheets.sh" ]; then
-    "$SCRIPT_DIR/deploy_stylesheets.sh"
+    ledger_step "deploy:stylesheets" "$SCRIPT_DIR/deploy_stylesheets.sh"
 else
     log_error "deploy_stylesheets.sh nicht gefunden!"
     exit 1
 fi
 
+# 3b. Sprite-Sheets pro Style auf die genutzten Icons trimmen
+# update_stylesheets.sh (Schritt 6) verweist die Styles dann auf die getrimmten Sheets.
+if [ -f "$SCRIPT_DIR/trim_sprites.sh" ]; then
+    ledger_step "deploy:trim-sprites" "$SCRIPT_DIR/trim_sprites.sh" || log_warn "Sprite-Trimmen fehlgeschlagen - Styles behalten die vollen Sheets."
+fi
+
 # 4. Inventare erstellen (Tiles Inventory)
 # (Sprites und Fonts Inventory existieren bereits durch Setup/Assets)
 if [ -f "$SCRIPT_DIR/generate_tiles_inventory.sh" ]; then
     log_info "Generiere Tiles Inventory..."
-    "$SCRIPT_DIR/generate_tiles_inventory.sh"
+    ledger_step "deploy:tiles-inventory" "$SCRIPT_DIR/generate_tiles_inventory.sh"
 fi
 
 
 # 4b. Sprite-Inventory erstellen (einmalig am Ende der Pipeline)
 if [ -f "$SCRIPT_DIR/generate_sprite_inventory.sh" ]; then
     log_info "Generiere Sprite Inventory..."
-    "$SCRIPT_DIR/generate_sprite_inventory.sh"
+    ledger_step "deploy:sprite-inventory" "$SCRIPT_DIR/generate_sprite_inventory.sh"
 fi
 
 # 5. Master Info generieren (Aggregiert alles)
 if [ -f "$SCRIPT_DIR/generate_endpoints_info.sh" ]; then
     log_info "Generiere Endpunkt-Informationen (Master JSON)..."
-    "$SCRIPT_DIR/generate_endpoints_info.sh"
+    ledger_step "deploy:endpoints-info" "$SCRIPT_DIR/generate_endpoints_info.sh"
 fi
 
 # 6. Stylesheets finalisieren (URLs setzen)
 # Jetzt, wo endpoints_info.json da ist, können wir die Links sauber setzen.
 if [ -f "$SCRIPT_DIR/update_stylesheets.sh" ]; then
     log_info "Finalisiere Stylesheets (Links setzen)..."
-    "$SCRIPT_DIR/update_stylesheets.sh"
+    ledger_step "deploy:update-stylesheets" "$SCRIPT_DIR/update_stylesheets.sh"
+fi
+
+# 7. Fontstacks bauen (nach dem Font-Rewrite der Styles)
+# MapLibre lädt z.B. "Open-Sans-Bold,Noto-Sans-Bold/0-255.pbf" - diese Ordner entstehen hier.
+if [ -f "$SCRIPT_DIR/build_glyph_stacks.sh" ]; then
+    ledger_step "deploy:glyph-stacks" "$SCRIPT_DIR/build_glyph_stacks.sh"
+fi
+
+# 8. JSON-Endpunkte & Styles veröffentlichen (kompakt, .gz/.br, ETags)
+# Läuft zuletzt, damit alle Inventare und Styles ihren Endstand haben.
+if [ -f "$SCRIPT_DIR/publish_static.sh" ]; then
+    ledger_step "deploy:publish" "$SCRIPT_DIR/publish_static.sh" || log_warn "Veröffentlichung unvollständig (siehe oben)."
 fi
 
 log_success "Deployment vollständig abgeschlossen."
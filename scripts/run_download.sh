@@ -14,7 +14,7 @@ log_header "PHASE 1: DOWNLOAD DATEN"
 
 # 2. OSM Download (Zwingend erforderlich)
 if [ -f "$SCRIPT_DIR/download_osm.sh" ]; then
-    "$SCRIPT_DIR/download_osm.sh"
+    ledger_step "download:osm" "$SCRIPT_DIR/download_osm.sh"
 else
     log_error "download_osm.sh nicht gefunden! Abbruch."
     exit 1
@@ -22,14 +22,14 @@ fi
 
 # 3. Basemap Download (Optional / Standard)
 if [ -f "$SCRIPT_DIR/download_basemap.sh" ]; then
-    "$SCRIPT_DIR/download_basemap.sh"
+    ledger_step "download:basemap" "$SCRIPT_DIR/download_basemap.sh"
 else
     log_warn "download_basemap.sh nicht gefunden - überspringe."
 fi
 
 # 4. Contours Download (Optional / Overlay)
 if [ -f "$SCRIPT_DIR/download_basemap_contours.sh" ]; then
-    "$SCRIPT_DIR/download_basemap_contours.sh"
+    ledger_step "download:contours" "$SCRIPT_DIR/download_basemap_contours.sh"
 else
     log_warn "download_basemap_contours.sh nicht gefunden - überspringe."
 fi
@@ -38,7 +38,7 @@ log_success "Phase 1 (Download) abgeschlossen."
 
 # 5. OpenSkimap Download (Zusatz-Overlay)
 if [ -f "$SCRIPT_DIR/download_openskimap.sh" ]; then
-    bash "$SCRIPT_DIR/download_openskimap.sh"
+    ledger_step "download:openskimap" bash "$SCRIPT_DIR/download_openskimap.sh"
 else
     log_warn "download_openskimap.sh nicht gefunden - überspringe."
 fi
@@ -28,7 +28,13 @@ fi
 
 # Wir suchen nach .list Dateien (die von download_osm.sh erstellt wurden)
 # Jede .list entspricht einer geplanten Karte (z.B. at-plus.list -> at-plus.pmtiles)
-mapfile -t LIST_FILES < <(find "$INPUT_DIR" -maxdepth 1 -name "*.list" | sort)
+# Optional: nur eine Karte (z.B. `run_merge.sh at`, genutzt von pipeline.py)
+MAP_FILTER="${1:-}"
+if [ -n "$MAP_FILTER" ]; then
+    mapfile -t LIST_FILES < <(find "$INPUT_DIR" -maxdepth 1 -name "${MAP_FILTER}.list")
+else
+    mapfile -t LIST_FILES < <(find "$INPUT_DIR" -maxdepth 1 -name "*.list" | sort)
+fi
 
 if [ ${#LIST_FILES[@]} -eq 0 ]; then
     log_error "Keine .list Dateien in $INPUT_DIR gefunden!"
@@ -55,30 +61,38 @@ for list_file in "${LIST_FILES[@]}"; do
         continue
     fi
 
-    # Integritätsprüfung vor dem eigentlichen Merge.
-    INVALID_COUNT=0
+    # Build-Manifest: gleiche Eingaben + unveränderte Ausgabe -> nichts zu tun
+    MANIFEST_ARGS=(--output "$TARGET_FILE")
     for pbf in "${PBF_INPUTS[@]}"; do
-        if [ ! -f "$pbf" ]; then
-            log_error "Eingabedatei fehlt: $pbf"
-            INVALID_COUNT=$((INVALID_COUNT+1))
-            continue
-        fi
+        MANIFEST_ARGS+=(--input "$pbf")
+    done
+    if python3 "$SCRIPT_DIR/build_manifest.py" check "$MAP_NAME" merge "${MANIFEST_ARGS[@]}"; then
+        log_success "Übersprungen: $(basename "$TARGET_FILE") ist aktuell."
+        continue
+    fi
 
-        if ! osmium fileinfo "$pbf" >/dev/null 2>&1; then
-            log_error "Ungültige OSM PBF erkannt (Header): $pbf"
-            INVALID_COUNT=$((INVALID_COUNT+1))
-            continue
-        fi
+    # Integritätsprüfung vor dem eigentlichen Merge (block-parallel).
+    # Dateien, die download_osm.sh bereits validiert hat, stehen im
+    # Validierungs-Cache (Pfad, Größe, mtime, md5) und werden übersprungen.
+    INVALID_COUNT=0
+    VALIDATE_RC=0
+    ledger_step "validate:$MAP_NAME" python3 -u "$SCRIPT_DIR/pbf_validate.py" "${PBF_INPUTS[@]}" || VALIDATE_RC=$?
 
-        # Liest den kompletten Stream, um späte Dekompressionsfehler zu erkennen.
-        if ! osmium cat -f opl "$pbf" >/dev/null 2>&1; then
-            log_error "Defekte OSM PBF erkannt (Stream/Dekompression): $pbf"
-            INVALID_COUNT=$((INVALID_COUNT+1))
-        fi
-    done
+    if [ "$VALIDATE_RC" -eq 2 ]; then
+        # Kompression nicht prüfbar (z.B. zstd ohne Python-Modul) -> osmium
+        log_warn "Nicht alle Dateien mit pbf_validate.py prüfbar - Fallback auf osmium."
+        for pbf in "${PBF_INPUTS[@]}"; do
+            if ! osmium fileinfo "$pbf" >/dev/null 2>&1 || ! osmium cat -f opl "$pbf" >/dev/null 2>&1; then
+                log_error "Defekte OSM PBF erkannt: $pbf"
+                INVALID_COUNT=$((INVALID_COUNT+1))
+            fi
+        done
+    elif [ "$VALIDATE_RC" -ne 0 ]; then
+        INVALID_COUNT=$VALIDATE_RC
+    fi
 
     if [ "$INVALID_COUNT" -gt 0 ]; then
-        log_error "Abbruch für Karte '$MAP_NAME': $INVALID_COUNT fehlerhafte Eingabedatei(en)."
+        log_error "Abbruch für Karte '$MAP_NAME': fehlerhafte Eingabedatei(en)."
         log_info "Tipp: scripts/download_osm.sh erneut ausführen, um defekte Dateien neu zu laden."
         exit 1
     fi
@@ -88,7 +102,7 @@ for list_file in "${LIST_FILES[@]}"; do
         SINGLE_FILE="${PBF_INPUTS[0]}"
         log_info "Nur eine Datei: $SINGLE_FILE"
         log_info " -> Kopiere zu $TARGET_FILE"
-        cp -f "$SINGLE_FILE" "$TARGET_FILE"
+        ledger_step "merge:$MAP_NAME" cp -f "$SINGLE_FILE" "$TARGET_FILE"
     else
         log_info "Merge $FILE_COUNT Dateien..."
         for f in "${PBF_INPUTS[@]}"; do
@@ -96,7 +110,7 @@ for list_file in "${LIST_FILES[@]}"; do
         done
         
         # Merge ausführen
-        if osmium merge "${PBF_INPUTS[@]}" -o "$TARGET_FILE" --overwrite; then
+        if ledger_step "merge:$MAP_NAME" osmium merge "${PBF_INPUTS[@]}" -o "$TARGET_FILE" --overwrite; then
             log_success "Merge OK."
         else
             log_error "Fehler beim Mergen von $MAP_NAME"
@@ -108,6 +122,7 @@ for list_file in "${LIST_FILES[@]}"; do
     if [ -f "$TARGET_FILE" ]; then
         SIZE=$(du -h "$TARGET_FILE" | cut -f1)
         log_success "Erstellt: $TARGET_FILE ($SIZE)"
+        python3 "$SCRIPT_DIR/build_manifest.py" record "$MAP_NAME" merge "${MANIFEST_ARGS[@]}"
     fi
 done
 
@@ -18,7 +18,7 @@ log_section "PHASE 3: PMTILES KONVERTIERUNG (Orchestrator)"
 # Ruft das Docker-Skript auf, das wir gerade repariert haben
 if [ -f "$SCRIPT_DIR/convert_osm_pmtiles.sh" ]; then
     # Wir rufen es explizit mit bash auf, damit Environment sauber bleibt
-    bash "$SCRIPT_DIR/convert_osm_pmtiles.sh"
+    ledger_step "convert:osm" bash "$SCRIPT_DIR/convert_osm_pmtiles.sh"
 else
     log_error "Skript nicht gefunden: convert_osm_pmtiles.sh"
     exit 1
@@ -29,7 +29,7 @@ fi
 # ---------------------------------------------------------
 # Falls du auch die Basemap Konvertierung hast
 if [ -f "$SCRIPT_DIR/convert_basemap_at_pmtiles.sh" ]; then
-    bash "$SCRIPT_DIR/convert_basemap_at_pmtiles.sh"
+    ledger_step "convert:basemap" bash "$SCRIPT_DIR/convert_basemap_at_pmtiles.sh"
 else
     log_info "Kein Basemap-Skript gefunden, überspringe..."
 fi
@@ -39,7 +39,7 @@ fi
 # ---------------------------------------------------------
 # Falls du das Contours-Skript hast
 if [ -f "$SCRIPT_DIR/convert_basemap_contours_pmtiles.sh" ]; then
-    bash "$SCRIPT_DIR/convert_basemap_contours_pmtiles.sh"
+    ledger_step "convert:contours" bash "$SCRIPT_DIR/convert_basemap_contours_pmtiles.sh"
 fi
 
 log_success "Alle Konvertierungs-Schritte abgeschlossen."
@@ -48,7 +48,7 @@ log_success "Alle Konvertierungs-Schritte abgeschlossen."
 # 4. OPENSKIMAP KONVERTIEREN
 # ---------------------------------------------------------
 if [ -f "$SCRIPT_DIR/convert_openskimap_pmtiles.sh" ]; then
-    bash "$SCRIPT_DIR/convert_openskimap_pmtiles.sh"
+    ledger_step "convert:openskimap" bash "$SCRIPT_DIR/convert_openskimap_pmtiles.sh"
 else
     log_warn "convert_openskimap_pmtiles.sh nicht gefunden - überspringe."
 fi
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+Sprite-Build (maki, temaki) mit Content-Hash-Cache.
+
+Statt bei jedem Lauf neu zu klonen und alle vier spreet-Läufe seriell
+auszuführen:
+
+1. Quelle auflösen: `git ls-remote` liefert den Upstream-Commit; der
+   gecachte Klon unter SPRITE_SRC_DIR wird nur bei neuem Commit
+   aktualisiert. Alternativ ein lokales Verzeichnis
+   (`--source maki=/pfad` oder SPRITE_SOURCE_MAKI=/pfad), z.B. offline.
+2. Content-Hash über alle SVGs (Name + Inhalt) plus spreet-Version.
+   Gleicher Hash wie beim letzten Build -> Set wird übersprungen.
+3. 1x und @2x aller geänderten Sets laufen parallel.
+4. Veröffentlichung atomar: SPRITES_DIR/<set> ist ein Symlink auf
+   SPRITES_DIR/.builds/<set>-<hash>-<zeit>; umgeschaltet wird per os.replace.
+
+Usage:
+  sprite_build.py [--set maki] [--source maki=/pfad] [--force]
+"""
+import argparse
+import concurrent.futures
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import time
+from pathlib import Path
+
+from inventory_scan import STATE_DIR
+
+ASSETS_DIR = Path(os.environ.get("ASSETS_DIR", "/srv/assets"))
+SPRITES_DIR = Path(os.environ.get("SPRITES_DIR", str(ASSETS_DIR / "sprites")))
+BUILD_DIR = Path(os.environ.get("BUILD_DIR", "/srv/build"))
+SPRITE_SRC_DIR = Path(os.environ.get("SPRITE_SRC_DIR", str(BUILD_DIR / "sprites" / "src")))
+STATE_FILE = Path(os.environ.get("SPRITE_BUILD_STATE", str(STATE_DIR / "sprite_build.json")))
+# Eigenes spreet-Binary statt Docker (z.B. für lokale Tests)
+SPREET_BIN = os.environ.get("SPREET_BIN", "").strip()
+SPREET_IMAGE = os.environ.get("SPREET_IMAGE", "local-spreet-builder")
+DOCKER_CMD = os.environ.get("DOCKER_CMD", "docker")
+BUILD_JOBS = int(os.environ.get("SPRITE_BUILD_JOBS", "4"))
+KEEP_BUILDS = int(os.environ.get("SPRITE_KEEP_BUILDS", "2"))
+BUILDS_DIR_NAME = ".builds"
+
+SETS = {
+    "maki": {
+        "repo": os.environ.get("MAKI_REPO", "https://github.com/mapbox/maki.git"),
+        "icons": "icons",
+        "recursive": False,
+        "license": "LICENSE.txt",
+    },
+    "temaki": {
+        "repo": os.environ.get("TEMAKI_REPO", "https://github.com/rapideditor/temaki.git"),
+        "icons": "icons",
+        # Unterordner werden zu Präfixen: icons/a/b.svg -> a_b.svg
+        "recursive": True,
+        "license": "LICENSE",
+    },
+}
+RATIOS = {"sprite": False, "sprite@2x": True}
+
+
+class SpriteBuildError(Exception):
+    pass
+
+
+# --- LOGGING HELPER ---
+def log_info(msg):
+    print(f"   ℹ️  {msg}", flush=True)
+
+def log_success(msg):
+    print(f"   ✅ {msg}", flush=True)
+
+def log_warn(msg):
+    print(f"   ⚠️  {msg}", flush=True)
+
+def log_error(msg):
+    print(f"   ❌ {msg}", flush=True)
+
+
+def _git(*args, cwd=None):
+    result = subprocess.run(["git", *args], cwd=cwd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise SpriteBuildError(f"git {' '.join(args)}: {result.stderr.strip()}")
+    return result.stdout.strip()
+
+
+# --- QUELLEN ---
+
+def resolve_source(name, config, local=None):
+    """Rückgabe: (Verzeichnis mit dem Repo-Inhalt, Commit oder None)."""
+    if local:
+        root = Path(local)
+        if not root.is_dir():
+            raise SpriteBuildError(f"{name}: lokale Quelle fehlt: {root}")
+        try:
+            commit = _git("rev-parse", "HEAD", cwd=root)
+        except SpriteBuildError:
+            commit = None
+        return root, commit
+
+    clone = SPRITE_SRC_DIR / name
+    try:
+        upstream = _git("ls-remote", config["repo"], "HEAD").split()[0]
+    except (SpriteBuildError, IndexError) as e:
+        if (clone / ".git").is_dir():
+            log_warn(f"{name}: Upstream nicht erreichbar, nutze gecachten Klon ({e})")
+            return clone, _git("rev-parse", "HEAD", cwd=clone)
+        raise SpriteBuildError(f"{name}: Upstream nicht erreichbar und kein Klon vorhanden ({e})")
+
+    if (clone / ".git").is_dir():
+        if _git("rev-parse", "HEAD", cwd=clone) != upstream:
+            log_info(f"{name}: neuer Upstream-Commit {upstream[:10]} - aktualisiere Klon")
+            _git("fetch", "--depth", "1", "origin", "HEAD", cwd=clone)
+            _git("checkout", "--force", "--detach", "FETCH_HEAD", cwd=clone)
+            _git("clean", "-fdx", cwd=clone)
+    else:
+        log_info(f"{name}: klone {config['repo']}")
+        clone.parent.mkdir(parents=True, exist_ok=True)
+        shutil.rmtree(clone, ignore_errors=True)
+        _git("clone", "--depth", "1", config["repo"], str(clone))
+    return clone, _git("rev-parse", "HEAD", cwd=clone)
+
+
+def collect_icons(root, config):
+    """{flacher Name: Pfad} aller SVGs."""
+    icons_dir = root / config["icons"]
+    if not icons_dir.is_dir():
+        icons_dir = root  # lokale Quelle ohne icons/-Unterordner
+    pattern = "**/*.svg" if config["recursive"] else "*.svg"
+    icons = {}
+    for path in sorted(icons_dir.glob(pattern)):
+        if path.is_file():
+            icons[path.relative_to(icons_dir).as_posix().replace("/", "_")] = path
+    if not icons:
+        raise SpriteBuildError(f"Keine SVGs gefunden in {icons_dir}")
+    return icons
+
+
+def spreet_identity():
+    """Version bzw. Image-ID von spreet (Teil des Content-Hash)."""
+    if SPREET_BIN:
+        result = subprocess.run([SPREET_BIN, "--version"], capture_output=True, text=True)
+        return f"bin:{result.stdout.strip() or SPREET_BIN}"
+    result = subprocess.run(
+        [DOCKER_CMD, "image", "inspect", "-f", "{{.Id}}", SPREET_IMAGE], capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise SpriteBuildError(f"spreet-Image {SPREET_IMAGE} nicht gefunden")
+    return f"image:{result.stdout.strip()}"
+
+
+def content_hash(icons, spreet_id):
+    digest = hashlib.sha256(f"{spreet_id}\n".encode("utf-8"))
+    for name, path in sorted(icons.items()):
+        digest.update(name.encode("utf-8") + b"\0")
+        digest.update(hashlib.sha256(path.read_bytes()).digest())
+    return digest.hexdigest()
+
+
+# --- BUILD ---
+
+def stage_icons(icons, flat_dir):
+    """Flacher SVG-Ordner für spreet (Hardlinks, sonst Kopie)."""
+    shutil.rmtree(flat_dir, ignore_errors=True)
+    flat_dir.mkdir(parents=True)
+    for name, path in icons.items():
+        try:
+            os.link(path, flat_dir / name)
+        except OSError:
+            shutil.copyfile(path, flat_dir / name)
+
+
+def spreet_command(flat_dir, out_dir, sheet, retina):
+    retina_args = ["--retina"] if retina else []
+    if SPREET_BIN:
+        return [SPREET_BIN, *retina_args, str(flat_dir), str(out_dir / sheet)]
+    return [
+        DOCKER_CMD, "run", "--rm", "--user", f"{os.getuid()}:{os.getgid()}",
+        "--entrypoint", "/app/spreet",
+        "-v", f"{flat_dir}:/sources:ro", "-v", f"{out_dir}:/output",
+        SPREET_IMAGE, *retina_args, "/sources", f"/output/{sheet}",
+    ]
+
+
+def run_spreet(name, flat_dir, out_dir, sheet, retina):
+    result = subprocess.run(spreet_command(flat_dir, out_dir, sheet, retina), capture_output=True, text=True)
+    if result.returncode != 0:
+        raise SpriteBuildError(f"{name}/{sheet}: spreet Exit {result.returncode}: {result.stderr.strip()[-500:]}")
+    try:
+        icons = len(json.loads((out_dir / f"{sheet}.json").read_text(encoding="utf-8")))
+    except (OSError, ValueError) as e:
+        raise SpriteBuildError(f"{name}/{sheet}: Ausgabe unvollständig ({e})")
+    if not (out_dir / f"{sheet}.png").is_file():
+        raise SpriteBuildError(f"{name}/{sheet}: {sheet}.png fehlt")
+    return icons
+
+
+# --- VERÖFFENTLICHUNG ---
+
+def publish(name, build_dir):
+    """SPRITES_DIR/<name> atomar auf build_dir umschalten."""
+    link = SPRITES_DIR / name
+    target = os.path.relpath(build_dir, SPRITES_DIR)
+    if link.is_dir() and not link.is_symlink():
+        # Erster Lauf: bisherigen echten Ordner in .builds übernehmen
+        legacy = build_dir.parent / f"{name}-legacy-{time.strftime('%Y%m%d-%H%M%S')}"
+        link.rename(legacy)
+    tmp = SPRITES_DIR / f".{name}.link.tmp"
+    if tmp.is_symlink() or tmp.exists():
+        tmp.unlink()
+    os.symlink(target, tmp)
+    os.replace(tmp, link)
+    fd = os.open(SPRITES_DIR, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def prune(name, builds_dir, keep=KEEP_BUILDS):
+    """Ältere Builds eines Sets entfernen (der aktuelle bleibt immer)."""
+    current = (SPRITES_DIR / name).resolve()
+    builds = sorted(
+        (p for p in builds_dir.glob(f"{name}-*") if p.is_dir() and p.resolve() != current),
+        key=lambda p: p.stat().st_mtime,
+        reverse=True,
+    )
+    for old in builds[max(0, keep - 1):]:
+        shutil.rmtree(old, ignore_errors=True)
+
+
+def load_state():
+    try:
+        return json.loads(STATE_FILE.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(state):
+    STATE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    tmp = STATE_FILE.with_name(STATE_FILE.name + ".tmp")
+    tmp.write_text(json.dumps(state, indent=2) + "\n", encoding="utf-8")
+    tmp.replace(STATE_FILE)
+
+
+def build_sets(names, sources=None, force=False, jobs=BUILD_JOBS):
+    """Baut die angegebenen Sets. Rückgabe: Anzahl Fehler."""
+    sources = sources or {}
+    state = load_state()
+    builds_dir = SPRITES_DIR / BUILDS_DIR_NAME
+    builds_dir.mkdir(parents=True, exist_ok=True)
+    spreet_id = spreet_identity()
+    failures = 0
+
+    planned = []
+    for name in names:
+        config = SETS[name]
+        try:
+            root, commit = resolve_source(name, config, sources.get(name))
+            icons = collect_icons(root, config)
+            digest = content_hash(icons, spreet_id)
+        except (OSError, SpriteBuildError) as e:
+            log_error(f"{name}: {e}")
+            failures += 1
+            continue
+
+        previous = state.get(name, {})
+        published = (SPRITES_DIR / name).is_symlink() and (SPRITES_DIR / name).resolve().name == previous.get("build")
+        if not force and previous.get("hash") == digest and published:
+            log_info(f"{name}: unverändert ({len(icons)} Icons, Commit {(commit or 'lokal')[:10]}) - übersprungen")
+            continue
+        # Immer ein neuer Ordner: der veröffentlichte Build wird nie überschrieben
+        build_dir = builds_dir / f"{name}-{digest[:12]}-{time.strftime('%Y%m%d%H%M%S')}"
+        planned.append((name, config, root, commit, icons, digest, build_dir))
+        log_info(f"{name}: {len(icons)} Icons, Hash {digest[:12]} - baue")
+
+    # Alle spreet-Läufe (Sets x 1x/@2x) gemeinsam parallel
+    futures = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        for name, config, root, commit, icons, digest, build_dir in planned:
+            staging = builds_dir / f".{build_dir.name}.staging"
+            flat_dir = SPRITE_SRC_DIR / f".flat-{name}"
+            shutil.rmtree(staging, ignore_errors=True)
+            staging.mkdir(parents=True)
+            stage_icons(icons, flat_dir)
+            for sheet, retina in RATIOS.items():
+                futures[executor.submit(run_spreet, name, flat_dir, staging, sheet, retina)] = (name, sheet)
+
+        results = {}
+        for future in concurrent.futures.as_completed(futures):
+            name, sheet = futures[future]
+            try:
+                results.setdefault(name, {})[sheet] = future.result()
+            except (OSError, SpriteBuildError) as e:
+                results.setdefault(name, {})[sheet] = e
+
+    for name, config, root, commit, icons, digest, build_dir in planned:
+        staging = builds_dir / f".{build_dir.name}.staging"
+        shutil.rmtree(SPRITE_SRC_DIR / f".flat-{name}", ignore_errors=True)
+        errors = [r for r in results.get(name, {}).values() if isinstance(r, Exception)]
+        if errors or len(results.get(name, {})) != len(RATIOS):
+            for error in errors:
+                log_error(str(error))
+            shutil.rmtree(staging, ignore_errors=True)
+            failures += 1
+            continue
+
+        license_file = root / config["license"]
+        if license_file.is_file():
+            shutil.copyfile(license_file, staging / license_file.name)
+        staging.rename(build_dir)
+        publish(name, build_dir)
+        prune(name, builds_dir)
+        state[name] = {
+            "hash": digest,
+            "commit": commit,
+            "source": str(sources.get(name) or config["repo"]),
+            "icons": len(icons),
+            "sheets": results[name],
+            "build": build_dir.name,
+            "built_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        save_state(state)
+        log_success(f"{name}: veröffentlicht ({build_dir.name})")
+    return failures
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Sprite-Build mit Content-Hash-Cache")
+    parser.add_argument("--set", action="append", choices=sorted(SETS), dest="sets", help="Nur dieses Set (mehrfach möglich)")
+    parser.add_argument("--source", action="append", default=[], help="Lokale Quelle: set=/pfad")
+    parser.add_argument("--force", action="store_true", help="Auch unveränderte Sets neu bauen")
+    parser.add_argument("--jobs", type=int, default=BUILD_JOBS)
+    args = parser.parse_args(argv)
+
+    sources = {name: os.environ[f"SPRITE_SOURCE_{name.upper()}"] for name in SETS if os.environ.get(f"SPRITE_SOURCE_{name.upper()}")}
+    for spec in args.source:
+        name, _, path = spec.partition("=")
+        if name not in SETS or not path:
+            parser.error(f"--source erwartet set=/pfad ({', '.join(SETS)})")
+        sources[name] = path
+
+    try:
+        failures = build_sets(args.sets or list(SETS), sources, args.force, args.jobs)
+    except (OSError, SpriteBuildError) as e:
+        log_error(f"Sprite-Build fehlgeschlagen: {e}")
+        return 1
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -26,25 +26,18 @@ if [ "$REBUILD_ORS" -eq 0 ] && [ -t 0 ]; then
     esac
 fi
 
-# --- 2. Die Pipeline (Run-Skripte) ---
-
-# Phase 1: Download
-"$SCRIPT_DIR/run_download.sh"
-
-# Phase 2: Merge
-"$SCRIPT_DIR/run_merge.sh"
-
-# Phase 3: Konvertierung
-"$SCRIPT_DIR/run_pmtiles.sh"
-
-# Phase 4: Deployment (Neuer Name!)
-"$SCRIPT_DIR/run_deploy.sh"
-
-# Phase 5: ORS (Optional)
+# --- 2. Die Pipeline (DAG-Runner) ---
+# pipeline.py startet Download, Merge, Konvertierung und Deployment als Tasks
+# mit Abhängigkeiten: unabhängige Zweige (z.B. basemap.at-Konvertierung und
+# Planetiler für OSM) laufen parallel im Budget PIPELINE_CPUS / PIPELINE_RAM_GB
+# / PIPELINE_IO_SLOTS. Die run_*.sh Skripte bleiben für manuelle Läufe.
+PIPELINE_ARGS=()
 if [ "$REBUILD_ORS" -eq 1 ]; then
-    "$SCRIPT_DIR/run_ors.sh"
+    PIPELINE_ARGS+=(--rebuild-ors)
 else
     log_info "ORS Rebuild übersprungen."
 fi
 
+python3 -u "$SCRIPT_DIR/pipeline.py" "${PIPELINE_ARGS[@]}"
+
 log_success "Gesamte Pipeline erfolgreich beendet."
@@ -0,0 +1,435 @@
+#!/usr/bin/env python3
+"""
+Lokaler z/x/y-Tileserver (asyncio, nur stdlib) für Clients ohne
+PMTiles-Range-Requests (ältere Leaflet-Plugins, QGIS & Co.).
+
+Archive werden wie im Tiles-Inventar gefunden
+(`TILES_DIR/{tileset}/pmtiles/{map}.pmtiles`) und per mmap gelesen.
+
+Endpunkte:
+  /{tileset}/{map}/{z}/{x}/{y}.mvt   Tile (auch .pbf bzw. .png/.jpg/.webp/.avif bei Raster)
+  /{tileset}/{map}.json               TileJSON 3.0.0
+  /index.json                         alle Archive mit TileJSON-URL
+  /stats.json                         Zähler (Requests, Cache-Treffer)
+
+- Leaf-Directories: LRU über dekodierte Directories (TILE_SERVER_LEAF_CACHE).
+- Hot-Tiles: LRU über Tile-Bytes mit Größenlimit (TILE_SERVER_CACHE_MB).
+- Kompression: Tiles werden so ausgeliefert, wie sie im Archiv liegen
+  (Content-Encoding), nie neu komprimiert. Nur gzip-Tiles für Clients ohne
+  gzip in Accept-Encoding werden entpackt.
+- Release-Flips (pmtiles_release.py) werden alle TILE_SERVER_RECHECK
+  Sekunden erkannt; die alte mmap verschwindet mit der letzten Referenz.
+- Cache-Misses lesen in einem Thread-Pool (TILE_SERVER_THREADS, 0 = im
+  Event-Loop), damit kalte Seiten aus dem Archiv den Loop nicht blockieren.
+
+Usage:
+  tile_server.py [--host 127.0.0.1] [--port 8081] [--tiles-dir /srv/tiles]
+"""
+import argparse
+import asyncio
+import bisect
+import gzip
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import unquote, urlsplit
+
+from pmtiles_reader import (
+    PMTilesError,
+    archive_key,
+    map_archive,
+    read_directory,
+    read_metadata,
+    zxy_to_tileid,
+)
+
+TILES_DIR = Path(os.environ.get("TILES_DIR", "/srv/tiles"))
+HOST = os.environ.get("TILE_SERVER_HOST", "127.0.0.1")
+PORT = int(os.environ.get("TILE_SERVER_PORT", "8081"))
+# Öffentliche Basis-URL für TileJSON (ohne: aus dem Host-Header)
+PUBLIC_URL = os.environ.get("TILE_SERVER_URL", "").rstrip("/")
+LEAF_CACHE_SIZE = int(os.environ.get("TILE_SERVER_LEAF_CACHE", "128"))
+TILE_CACHE_MB = float(os.environ.get("TILE_SERVER_CACHE_MB", "64"))
+THREADS = int(os.environ.get("TILE_SERVER_THREADS", "4"))
+RECHECK_SECONDS = float(os.environ.get("TILE_SERVER_RECHECK", "5"))
+MAX_AGE = int(os.environ.get("TILE_SERVER_MAX_AGE", "3600"))
+KEEPALIVE_SECONDS = 30
+MAX_DIRECTORY_DEPTH = 4
+# Tile-IDs (uint64) reichen bis Zoom 31
+MAX_ZOOM = 31
+
+TILE_FORMATS = {
+    "mvt": ({"mvt", "pbf"}, "application/vnd.mapbox-vector-tile"),
+    "png": ({"png"}, "image/png"),
+    "jpeg": ({"jpg", "jpeg"}, "image/jpeg"),
+    "webp": ({"webp"}, "image/webp"),
+    "avif": ({"avif"}, "image/avif"),
+}
+CONTENT_ENCODINGS = {"gzip": "gzip", "brotli": "br", "zstd": "zstd"}
+STATUS_TEXT = {200: "OK", 204: "No Content", 400: "Bad Request",
+               404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error"}
+
+
+def log_info(msg):
+    print(f"   ℹ️  {msg}", flush=True)
+
+def log_success(msg):
+    print(f"   ✅ {msg}", flush=True)
+
+def log_warn(msg):
+    print(f"   ⚠️  {msg}", flush=True)
+
+def log_error(msg):
+    print(f"   ❌ {msg}", flush=True)
+
+
+class LRUCache:
+    """Thread-sichere LRU mit Kostenlimit (Anzahl oder Bytes)."""
+
+    def __init__(self, max_cost, cost=lambda value: 1):
+        self.max_cost = max_cost
+        self.cost = cost
+        self.items = OrderedDict()
+        self.total = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value = self.items.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        cost = self.cost(value)
+        if cost > self.max_cost:
+            return
+        with self.lock:
+            old = self.items.pop(key, None)
+            if old is not None:
+                self.total -= self.cost(old)
+            self.items[key] = value
+            self.total += cost
+            while self.total > self.max_cost:
+                _, evicted = self.items.popitem(last=False)
+                self.total -= self.cost(evicted)
+
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.items), "cost": self.total, "hits": self.hits, "misses": self.misses}
+
+
+class Archive:
+    """Ein gemapptes PMTiles-Archiv. Leaf-Directories und Tiles kommen aus den gemeinsamen Caches."""
+
+    def __init__(self, path, tileset, name):
+        self.path = Path(path)
+        self.tileset = tileset
+        self.name = name
+        self.key = archive_key(path)
+        self.mm, self.header = map_archive(path)
+        root = read_directory(self.mm, self.header, self.header["root_offset"], self.header["root_length"])
+        self.root = ([entry[0] for entry in root], root)
+        self.metadata = read_metadata(self.mm, self.header)
+        self.cache_id = (str(self.path), self.key)
+        tile_type = self.header["tile_type"]
+        self.extensions, self.content_type = TILE_FORMATS.get(tile_type, ({tile_type}, "application/octet-stream"))
+
+    def _leaf(self, offset, length, leaf_cache):
+        key = (self.cache_id, offset)
+        leaf = leaf_cache.get(key)
+        if leaf is None:
+            entries = read_directory(self.mm, self.header, self.header["leaf_dirs_offset"] + offset, length)
+            leaf = ([entry[0] for entry in entries], entries)
+            leaf_cache.put(key, leaf)
+        return leaf
+
+    def read_tile(self, tile_id, leaf_cache):
+        """Tile-Bytes (wie gespeichert) oder None."""
+        ids, entries = self.root
+        for _ in range(MAX_DIRECTORY_DEPTH):
+            i = bisect.bisect_right(ids, tile_id) - 1
+            if i < 0:
+                return None
+            entry_id, offset, length, run_length = entries[i]
+            if run_length == 0:
+                ids, entries = self._leaf(offset, length, leaf_cache)
+                continue
+            if tile_id >= entry_id + run_length:
+                return None
+            start = self.header["tile_data_offset"] + offset
+            return self.mm[start:start + length]
+        raise PMTilesError(f"{self.path.name}: Directory-Tiefe > {MAX_DIRECTORY_DEPTH}")
+
+    def tilejson(self, base_url):
+        header = self.header
+        meta = self.metadata
+        ext = "mvt" if header["tile_type"] == "mvt" else sorted(self.extensions)[0]
+        doc = {
+            "tilejson": "3.0.0",
+            "name": meta.get("name") or self.name,
+            "scheme": "xyz",
+            "tiles": [f"{base_url}/{self.tileset}/{self.name}/{{z}}/{{x}}/{{y}}.{ext}"],
+            "minzoom": header["minzoom"],
+            "maxzoom": header["maxzoom"],
+            "bounds": header["bounds"],
+            "center": header["center"],
+        }
+        for field in ("description", "attribution", "version"):
+            if meta.get(field):
+                doc[field] = meta[field]
+        if "vector_layers" in meta:
+            doc["vector_layers"] = meta["vector_layers"]
+        return doc
+
+
+class Registry:
+    """Findet Archive unter TILES_DIR und lädt sie bei Änderung (Release-Flip) neu."""
+
+    def __init__(self, tiles_dir, recheck=RECHECK_SECONDS):
+        self.tiles_dir = Path(tiles_dir)
+        self.recheck = recheck
+        self.archives = {}
+        self.checked = float("-inf")
+        self.lock = threading.Lock()
+
+    def refresh(self):
+        found = {}
+        for path in sorted(self.tiles_dir.glob("*/pmtiles/*.pmtiles")):
+            tileset = path.parent.parent.name
+            if tileset.startswith("."):
+                continue
+            key = (tileset, path.stem)
+            current = self.archives.get(key)
+            try:
+                if current and current.key == archive_key(path):
+                    found[key] = current
+                    continue
+                found[key] = Archive(path, tileset, path.stem)
+                log_info(f"{tileset}/{path.stem}: {'neu geladen' if current else 'geladen'} ({found[key].header['tile_type']}, z{found[key].header['minzoom']}-{found[key].header['maxzoom']})")
+            except (OSError, PMTilesError) as e:
+                log_warn(f"{tileset}/{path.stem}: nicht lesbar ({e})")
+                if current:
+                    found[key] = current
+        # Alte Archive nicht schließen: laufende Lesezugriffe halten ihre Referenz
+        self.archives = found
+        self.checked = time.monotonic()
+
+    def maybe_refresh(self):
+        if time.monotonic() - self.checked > self.recheck:
+            with self.lock:
+                if time.monotonic() - self.checked > self.recheck:
+                    self.refresh()
+
+    def get(self, tileset, name):
+        self.maybe_refresh()
+        return self.archives.get((tileset, name))
+
+
+class TileServer:
+    def __init__(self, tiles_dir=TILES_DIR, cache_mb=TILE_CACHE_MB, leaf_cache=LEAF_CACHE_SIZE, threads=THREADS):
+        self.registry = Registry(tiles_dir)
+        self.leaf_cache = LRUCache(leaf_cache)
+        self.tile_cache = LRUCache(int(cache_mb * 1024 * 1024), cost=len)
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="tiles") if threads > 0 else None
+        self.requests = 0
+        self.status_counts = {}
+        self.decompressed = 0
+        self.started = time.time()
+
+    # --- ROUTING ---
+
+    async def dispatch(self, method, target, headers):
+        if method not in ("GET", "HEAD"):
+            return 405, {}, b""
+        path = unquote(urlsplit(target).path)
+        parts = [p for p in path.split("/") if p]
+
+        if parts in (["index.json"], []):
+            return self.json_response(self.index(headers))
+        if parts == ["stats.json"]:
+            return self.json_response(self.stats())
+        if len(parts) == 2 and parts[1].endswith(".json"):
+            archive = self.registry.get(parts[0], parts[1][:-5])
+            if archive is None:
+                return 404, {}, b""
+            return self.json_response(archive.tilejson(self.base_url(headers)))
+        if len(parts) == 5:
+            return await self.tile(parts, headers)
+        return 404, {}, b""
+
+    async def tile(self, parts, headers):
+        tileset, name, z, x, y_ext = parts
+        y, _, ext = y_ext.partition(".")
+        archive = self.registry.get(tileset, name)
+        if archive is None or ext not in archive.extensions:
+            return 404, {}, b""
+        try:
+            z, x, y = int(z), int(x), int(y)
+        except ValueError:
+            return 400, {}, b""
+        # Zoom vor der Tile-ID prüfen: zxy_to_tileid wächst mit z und läuft im Event-Loop
+        if not archive.header["minzoom"] <= z <= min(archive.header["maxzoom"], MAX_ZOOM):
+            return 404, {}, b""
+        try:
+            tile_id = zxy_to_tileid(z, x, y)
+        except ValueError:
+            return 400, {}, b""
+
+        cache_key = (archive.cache_id, tile_id)
+        data = self.tile_cache.get(cache_key)
+        if data is None:
+            if self.executor is None:
+                data = archive.read_tile(tile_id, self.leaf_cache)
+            else:
+                loop = asyncio.get_running_loop()
+                data = await loop.run_in_executor(self.executor, archive.read_tile, tile_id, self.leaf_cache)
+            if data is None:
+                return 204, {"Cache-Control": f"public, max-age={MAX_AGE}"}, b""
+            self.tile_cache.put(cache_key, data)
+
+        response_headers = {
+            "Content-Type": archive.content_type,
+            "Cache-Control": f"public, max-age={MAX_AGE}",
+        }
+        compression = archive.header["tile_compression"]
+        if compression in CONTENT_ENCODINGS:
+            response_headers["Vary"] = "Accept-Encoding"
+            if compression == "gzip" and "gzip" not in headers.get("accept-encoding", ""):
+                self.decompressed += 1
+                data = gzip.decompress(data)
+            else:
+                response_headers["Content-Encoding"] = CONTENT_ENCODINGS[compression]
+        return 200, response_headers, data
+
+    def base_url(self, headers):
+        if PUBLIC_URL:
+            return PUBLIC_URL
+        return f"http://{headers.get('host') or f'{HOST}:{PORT}'}"
+
+    def index(self, headers):
+        self.registry.maybe_refresh()
+        base = self.base_url(headers)
+        return {
+            "archives": [
+                {"tileset": tileset, "map": name, "tilejson": f"{base}/{tileset}/{name}.json",
+                 "tile_type": archive.header["tile_type"], "tile_compression": archive.header["tile_compression"]}
+                for (tileset, name), archive in sorted(self.registry.archives.items())
+            ]
+        }
+
+    def stats(self):
+        return {
+            "uptime_s": round(time.time() - self.started, 1),
+            "requests": self.requests,
+            "status": {str(k): v for k, v in sorted(self.status_counts.items())},
+            "tile_cache": self.tile_cache.stats(),
+            "leaf_cache": self.leaf_cache.stats(),
+            "decompressed_for_client": self.decompressed,
+            "archives": len(self.registry.archives),
+        }
+
+    @staticmethod
+    def json_response(payload):
+        body = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        return 200, {"Content-Type": "application/json; charset=utf-8", "Cache-Control": "no-cache"}, body
+
+    # --- HTTP/1.1 ---
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    line = await asyncio.wait_for(reader.readline(), KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    break
+                if not line:
+                    break
+                try:
+                    method, target, version = line.decode("latin-1").split()
+                except ValueError:
+                    await self.respond(writer, "HEAD", 400, {}, b"", close=True)
+                    break
+
+                headers = {}
+                while True:
+                    header_line = await reader.readline()
+                    if header_line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = header_line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                connection = headers.get("connection", "").lower()
+                close = connection == "close" or (version == "HTTP/1.0" and connection != "keep-alive")
+                try:
+                    status, response_headers, body = await self.dispatch(method, target, headers)
+                except Exception as e:  # ein kaputtes Archiv darf den Server nicht stoppen
+                    log_error(f"{target}: {e}")
+                    status, response_headers, body = 500, {}, b""
+                await self.respond(writer, method, status, response_headers, body, close)
+                if close:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer, method, status, headers, body, close=False):
+        self.requests += 1
+        self.status_counts[status] = self.status_counts.get(status, 0) + 1
+        lines = [f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}",
+                 f"Content-Length: {len(body)}",
+                 "Access-Control-Allow-Origin: *"]
+        lines.extend(f"{name}: {value}" for name, value in headers.items())
+        if close:
+            lines.append("Connection: close")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        if method != "HEAD" and body:
+            writer.write(body)
+        await writer.drain()
+
+    async def serve(self, host, port, ready=None):
+        self.registry.refresh()
+        server = await asyncio.start_server(self.handle, host, port, reuse_address=True)
+        address = server.sockets[0].getsockname()
+        log_success(f"Tileserver auf http://{address[0]}:{address[1]} ({len(self.registry.archives)} Archive aus {self.registry.tiles_dir})")
+        if ready is not None:
+            ready(address)
+        async with server:
+            await server.serve_forever()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="z/x/y-Tileserver für das deployte PMTiles-Verzeichnis")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--tiles-dir", type=Path, default=TILES_DIR)
+    parser.add_argument("--cache-mb", type=float, default=TILE_CACHE_MB, help="Limit des Hot-Tile-Caches")
+    parser.add_argument("--threads", type=int, default=THREADS, help="Leser-Threads für Cache-Misses (0 = im Event-Loop)")
+    args = parser.parse_args(argv)
+
+    if not args.tiles_dir.is_dir():
+        log_error(f"TILES_DIR nicht gefunden: {args.tiles_dir}")
+        return 1
+    server = TileServer(args.tiles_dir, cache_mb=args.cache_mb, threads=args.threads)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        log_info("Beendet.")
+    except OSError as e:
+        log_error(f"Server konnte nicht starten: {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,22 @@
+#!/bin/bash
+set -euo pipefail
+
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+if [ -f "$SCRIPT_DIR/utils.sh" ]; then
+    source "$SCRIPT_DIR/utils.sh"
+else
+    echo "❌ Fehler: utils.sh nicht gefunden!"
+    exit 1
+fi
+
+log_section "TILESERVER (z/x/y aus PMTiles)"
+
+export TILES_DIR="${TILES_DIR:-/srv/tiles}"
+PYTHON_SCRIPT="$SCRIPT_DIR/tile_server.py"
+
+if [ ! -f "$PYTHON_SCRIPT" ]; then
+    log_error "Python-Skript nicht gefunden: $PYTHON_SCRIPT"
+    exit 1
+fi
+
+exec python3 -u "$PYTHON_SCRIPT" "$@"
@@ -0,0 +1,469 @@
+#!/usr/bin/env python3
+"""
+Getrimmte Sprite-Sheets pro Style.
+
+Die OSM-Styles zeigen auf das komplette temaki-Sheet, obwohl sie nur einen
+Bruchteil der Icons nutzen. Dieses Skript wertet pro deploytem Style die
+Bild-Properties (`icon-image`, `*-pattern`) statisch aus - inklusive der
+Literal-Werte in match/case/step/coalesce und Platzhaltern wie
+`{class}_11` bzw. `concat` mit `get` (werden zu Mustern) - und packt nur
+die tatsächlich referenzierten Icons in ein neues Sheet (1x und @2x).
+
+Ausgabe:
+  SPRITES_DIR/trimmed/<tileset>/<style_id>/sprite{.json,.png,@2x.json,@2x.png}
+  SPRITES_DIR/trimmed/index.json   (Quelle, Icons, Fingerprint pro Style)
+
+`update_stylesheets.py` verweist einen Style auf sein getrimmtes Sheet,
+sobald es im Index steht und zum aktuellen Sprite-Mapping passt. Styles
+mit nicht auflösbaren Ausdrücken (z.B. `["get", "icon"]`) behalten das
+volle Sheet.
+
+Usage:
+  trim_sprites.py [--force] [--workers N]
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import math
+import os
+import re
+import shutil
+import struct
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from update_stylesheets import (
+    SPRITES_DIR,
+    TRIMMED_SPRITES_DIR_NAME,
+    load_sprite_mapping,
+    resolve_sprite_tileset,
+)
+
+TILES_DIR = Path(os.environ.get("TILES_DIR", "/srv/tiles"))
+SPRITE_WORKERS = int(os.environ.get("SPRITE_WORKERS", "0") or 0) or (os.cpu_count() or 1)
+# Abstand zwischen Icons im Sheet (1x-Pixel, wird mit pixelRatio skaliert)
+SPRITE_PADDING = 1
+SHEETS = ("sprite", "sprite@2x")
+
+IMAGE_PROPERTIES = ("icon-image", "fill-pattern", "line-pattern", "background-pattern", "fill-extrusion-pattern")
+# Ausdrücke, deren Ergebnis erst zur Laufzeit feststeht
+DYNAMIC_OPERATORS = {
+    "get", "var", "properties", "feature-state", "at", "id", "geometry-type", "to-string",
+    "downcase", "upcase", "number-format", "slice", "typeof", "resolved-locale",
+}
+MAX_CONCAT_PATTERNS = 1000
+WILDCARD = None
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+class SpriteError(Exception):
+    pass
+
+
+# --- LOGGING HELPER ---
+def log_info(msg):
+    print(f"   ℹ️  {msg}")
+
+def log_success(msg):
+    print(f"   ✅ {msg}")
+
+def log_warn(msg):
+    print(f"   ⚠️  {msg}")
+
+def log_error(msg):
+    print(f"   ❌ {msg}")
+
+
+# --- STATISCHE AUSWERTUNG ---
+
+def _token_pattern(value):
+    """Legacy-Platzhalter: "{class}_11" -> (WILDCARD, "_11")."""
+    parts = []
+    for i, part in enumerate(re.split(r"\{[^}]*\}", value)):
+        if i:
+            parts.append(WILDCARD)
+        if part:
+            parts.append(part)
+    return tuple(parts)
+
+
+def _join(parts):
+    """Benachbarte Literale zusammenfassen, doppelte Wildcards entfernen."""
+    out = []
+    for part in parts:
+        if part is WILDCARD and out and out[-1] is WILDCARD:
+            continue
+        if part is not WILDCARD and out and out[-1] is not WILDCARD:
+            out[-1] += part
+        else:
+            out.append(part)
+    return tuple(out)
+
+
+def image_patterns(node):
+    """Menge möglicher Bildnamen als Muster (Tupel aus Literalen und WILDCARD)."""
+    if isinstance(node, str):
+        return {_token_pattern(node)}
+    if isinstance(node, dict):
+        # Legacy-Funktion {"stops": [[z, "icon"]], "default": ...}
+        if node.get("type") == "identity":
+            return {(WILDCARD,)}
+        patterns = set()
+        for stop in node.get("stops") or []:
+            if isinstance(stop, list) and len(stop) == 2:
+                patterns |= image_patterns(stop[1])
+        if "default" in node:
+            patterns |= image_patterns(node["default"])
+        return patterns
+    if not isinstance(node, list) or not node:
+        return set()
+
+    op = node[0]
+    if not isinstance(op, str):
+        return set().union(*(image_patterns(v) for v in node))
+    if op == "literal":
+        return image_patterns(node[1]) if len(node) > 1 and isinstance(node[1], str) else set()
+    if op in DYNAMIC_OPERATORS:
+        return {(WILDCARD,)}
+    if op == "match":
+        outputs = node[3:-1:2] + node[-1:]
+    elif op == "case":
+        outputs = node[2:-1:2] + node[-1:]
+    elif op == "step":
+        outputs = node[2::2]
+    elif op == "let":
+        outputs = node[-1:]
+    elif op == "concat":
+        combos = [sorted(image_patterns(arg), key=str) or [(WILDCARD,)] for arg in node[1:]]
+        if math.prod(len(c) for c in combos) > MAX_CONCAT_PATTERNS:
+            return {(WILDCARD,)}
+        return {_join(itertools.chain.from_iterable(combo)) for combo in itertools.product(*combos)}
+    else:
+        # coalesce, image und unbekannte Operatoren: alle Argumente (überschätzt, nie zu wenig)
+        outputs = node[1:]
+    return set().union(*(image_patterns(v) for v in outputs)) if outputs else set()
+
+
+def style_patterns(style):
+    patterns = set()
+    for layer in style.get("layers") or []:
+        if not isinstance(layer, dict):
+            continue
+        for section in ("layout", "paint"):
+            props = layer.get(section)
+            if not isinstance(props, dict):
+                continue
+            for key in IMAGE_PROPERTIES:
+                if key in props:
+                    patterns |= image_patterns(props[key])
+    return patterns
+
+
+def resolve_icons(patterns, available):
+    """Rückgabe: Menge der Icons oder None, wenn ein Muster alles treffen kann."""
+    icons = set()
+    for pattern in patterns:
+        if all(part is WILDCARD for part in pattern):
+            if pattern:
+                return None
+            continue
+        if WILDCARD not in pattern:
+            if pattern[0] in available:
+                icons.add(pattern[0])
+            continue
+        regex = re.compile("".join(".*" if part is WILDCARD else re.escape(part) for part in pattern) + r"\Z")
+        icons.update(name for name in available if regex.match(name))
+    return icons
+
+
+# --- PNG (RGBA 8 Bit, ohne Interlacing) ---
+
+def read_png(path, max_rows=None):
+    """PNG -> (width, height, rows) mit rows als RGBA-bytearrays; optional nur die ersten max_rows Zeilen."""
+    data = Path(path).read_bytes()
+    if data[:8] != PNG_SIGNATURE:
+        raise SpriteError(f"{path}: keine PNG-Datei")
+    pos = 8
+    idat = []
+    palette = transparency = None
+    while pos < len(data):
+        length, kind = struct.unpack_from(">I4s", data, pos)
+        chunk = data[pos + 8:pos + 8 + length]
+        pos += 12 + length
+        if kind == b"IHDR":
+            width, height, depth, color, _, _, interlace = struct.unpack(">IIBBBBB", chunk)
+        elif kind == b"PLTE":
+            palette = chunk
+        elif kind == b"tRNS":
+            transparency = chunk
+        elif kind == b"IDAT":
+            idat.append(chunk)
+        elif kind == b"IEND":
+            break
+    channels = {6: 4, 2: 3, 3: 1, 4: 2, 0: 1}.get(color)
+    if depth != 8 or interlace or channels is None:
+        raise SpriteError(f"{path}: PNG-Format nicht unterstützt (Tiefe {depth}, Farbtyp {color}, Interlace {interlace})")
+
+    raw = zlib.decompress(b"".join(idat))
+    bpp = channels
+    stride = width * bpp
+    rows = []
+    prev = bytearray(stride)
+    pos = 0
+    for _ in range(height if max_rows is None else min(height, max_rows)):
+        filter_type = raw[pos]
+        line = bytearray(raw[pos + 1:pos + 1 + stride])
+        pos += 1 + stride
+        if filter_type == 1:
+            for i in range(bpp, stride):
+                line[i] = (line[i] + line[i - bpp]) & 0xFF
+        elif filter_type == 2:
+            line = bytearray((x + b) & 0xFF for x, b in zip(line, prev))
+        elif filter_type == 3:
+            for i in range(stride):
+                left = line[i - bpp] if i >= bpp else 0
+                line[i] = (line[i] + ((left + prev[i]) >> 1)) & 0xFF
+        elif filter_type == 4:
+            for i in range(bpp):
+                line[i] = (line[i] + prev[i]) & 0xFF
+            for i in range(bpp, stride):
+                a, b, c = line[i - bpp], prev[i], prev[i - bpp]
+                pa, pb, pc = abs(b - c), abs(a - c), abs(a + b - 2 * c)
+                line[i] = (line[i] + (a if pa <= pb and pa <= pc else b if pb <= pc else c)) & 0xFF
+        elif filter_type != 0:
+            raise SpriteError(f"{path}: unbekannter PNG-Filter {filter_type}")
+        rows.append(line)
+        prev = line
+
+    if color == 6:
+        return width, height, rows
+    return width, height, [_to_rgba(row, color, palette, transparency) for row in rows]
+
+
+def _to_rgba(row, color, palette, transparency):
+    out = bytearray()
+    if color == 2:
+        for i in range(0, len(row), 3):
+            out += row[i:i + 3] + b"\xff"
+    elif color == 3:
+        for index in row:
+            alpha = transparency[index] if transparency and index < len(transparency) else 255
+            out += palette[index * 3:index * 3 + 3] + bytes([alpha])
+    elif color == 4:
+        for i in range(0, len(row), 2):
+            out += bytes([row[i], row[i], row[i], row[i + 1]])
+    else:
+        for value in row:
+            out += bytes([value, value, value, 255])
+    return out
+
+
+def _png_chunk(kind, payload):
+    return struct.pack(">I", len(payload)) + kind + payload + struct.pack(">I", zlib.crc32(kind + payload))
+
+
+def write_png(path, width, height, rows):
+    raw = b"".join(b"\x00" + bytes(row) for row in rows)
+    data = (
+        PNG_SIGNATURE
+        + _png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0))
+        + _png_chunk(b"IDAT", zlib.compress(raw, 9))
+        + _png_chunk(b"IEND", b"")
+    )
+    tmp = Path(path).with_name(Path(path).name + ".tmp")
+    tmp.write_bytes(data)
+    tmp.replace(path)
+    return len(data)
+
+
+# --- PACKEN ---
+
+def pack(sizes, padding):
+    """Shelf-Packing: {name: (w, h)} -> ({name: (x, y)}, width, height). Deterministisch."""
+    if not sizes:
+        return {}, 1, 1
+    area = sum((w + padding) * (h + padding) for w, h in sizes.values())
+    max_width = max(max(w for w, _ in sizes.values()) + padding, int(area ** 0.5 * 1.1))
+    positions = {}
+    x = y = shelf_height = width = 0
+    for name in sorted(sizes, key=lambda n: (-sizes[n][1], -sizes[n][0], n)):
+        w, h = sizes[name]
+        if x and x + w > max_width:
+            y += shelf_height + padding
+            x = shelf_height = 0
+        positions[name] = (x, y)
+        x += w + padding
+        width = max(width, x - padding)
+        shelf_height = max(shelf_height, h)
+    return positions, width, y + shelf_height
+
+
+def trim_sheet(source_base, target_base, icons):
+    """Worker: schneidet die Icons aus einem Sheet und packt sie neu. Rückgabe: (Icons, PNG-Bytes)."""
+    index = json.loads(Path(f"{source_base}.json").read_text(encoding="utf-8"))
+    entries = {name: index[name] for name in icons if name in index}
+    # Zeilen unterhalb des letzten benötigten Icons müssen nicht dekodiert werden
+    _, _, rows = read_png(f"{source_base}.png", max((e["y"] + e["height"] for e in entries.values()), default=0))
+    ratio = max((entry.get("pixelRatio", 1) for entry in entries.values()), default=1)
+    positions, width, height = pack(
+        {name: (entry["width"], entry["height"]) for name, entry in entries.items()},
+        SPRITE_PADDING * ratio,
+    )
+
+    canvas = [bytearray(width * 4) for _ in range(height)]
+    out_index = {}
+    for name, entry in entries.items():
+        sx, sy, w, h = entry["x"], entry["y"], entry["width"], entry["height"]
+        tx, ty = positions[name]
+        for row in range(h):
+            canvas[ty + row][tx * 4:(tx + w) * 4] = rows[sy + row][sx * 4:(sx + w) * 4]
+        out_index[name] = {**entry, "x": tx, "y": ty}
+
+    png_bytes = write_png(f"{target_base}.png", width, height, canvas)
+    tmp = Path(f"{target_base}.json.tmp")
+    tmp.write_text(json.dumps(dict(sorted(out_index.items())), indent=2) + "\n", encoding="utf-8")
+    tmp.replace(f"{target_base}.json")
+    return len(out_index), png_bytes
+
+
+def _trim_job(source_base, target_base, icons):
+    """Fehler eines Sheets sollen die übrigen Styles nicht aufhalten."""
+    try:
+        return trim_sheet(source_base, target_base, icons), None
+    except (OSError, ValueError, KeyError, SpriteError, zlib.error) as e:
+        return None, f"{e}"
+
+
+# --- KOORDINATION ---
+
+def _source_fingerprint(source_dir):
+    digest = hashlib.sha256()
+    for sheet in SHEETS:
+        for suffix in (".json", ".png"):
+            path = source_dir / f"{sheet}{suffix}"
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            digest.update(f"{path.name}|{st.st_size}|{st.st_mtime_ns}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def load_index(trimmed_dir):
+    try:
+        return json.loads((trimmed_dir / "index.json").read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {"styles": {}}
+
+
+def plan_styles(tiles_dir, sprites_dir, mapping, previous, force=False):
+    """Rückgabe: (Index-Einträge, Jobs). Jobs: (Quelle, Ziel, Icons) pro Sheet."""
+    entries = {}
+    jobs = []
+    icon_names = {}
+    for style_path in sorted(tiles_dir.glob("*/styles/*/style.json")):
+        tileset, style_id = style_path.parents[2].name, style_path.parent.name
+        key = f"{tileset}/{style_id}"
+        sprite_set = resolve_sprite_tileset(mapping, tileset, style_id)
+        source_dir = sprites_dir / sprite_set
+        if not (source_dir / "sprite.json").is_file():
+            log_warn(f"{key}: Sprite-Set '{sprite_set}' nicht gefunden - übersprungen")
+            continue
+        try:
+            style = json.loads(style_path.read_text(encoding="utf-8"))
+            if sprite_set not in icon_names:
+                icon_names[sprite_set] = set(json.loads((source_dir / "sprite.json").read_text(encoding="utf-8")))
+        except (OSError, ValueError) as e:
+            log_warn(f"{key}: {e}")
+            continue
+
+        available = icon_names[sprite_set]
+        icons = resolve_icons(style_patterns(style), available)
+        if icons is None:
+            log_warn(f"{key}: Icon-Ausdruck nicht statisch auflösbar - volles Sheet '{sprite_set}'")
+            continue
+        if len(icons) >= len(available):
+            log_info(f"{key}: nutzt alle {len(available)} Icons - kein Trimmen nötig")
+            continue
+
+        entry = {
+            "source": sprite_set,
+            "source_hash": _source_fingerprint(source_dir),
+            "icons": sorted(icons),
+            "available": len(available),
+        }
+        target_dir = sprites_dir / TRIMMED_SPRITES_DIR_NAME / tileset / style_id
+        old = previous.get(key)
+        if not force and old and all(old.get(k) == entry[k] for k in ("source", "source_hash", "icons")) \
+                and (target_dir / "sprite.json").is_file():
+            entries[key] = old
+            continue
+        entries[key] = entry
+        target_dir.mkdir(parents=True, exist_ok=True)
+        for sheet in SHEETS:
+            if (source_dir / f"{sheet}.json").is_file() and (source_dir / f"{sheet}.png").is_file():
+                jobs.append((key, str(source_dir / sheet), str(target_dir / sheet), entry["icons"]))
+    return entries, jobs
+
+
+def trim_styles(tiles_dir=TILES_DIR, sprites_dir=SPRITES_DIR, workers=SPRITE_WORKERS, force=False):
+    """Rückgabe: (Index, Anzahl neu gebauter Sheets)."""
+    trimmed_dir = sprites_dir / TRIMMED_SPRITES_DIR_NAME
+    previous = load_index(trimmed_dir).get("styles", {})
+    entries, jobs = plan_styles(tiles_dir, sprites_dir, load_sprite_mapping(), previous, force)
+
+    args = [job[1:] for job in jobs]
+    if workers <= 1 or len(jobs) <= 1:
+        results = [_trim_job(*a) for a in args]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as executor:
+            results = list(executor.map(_trim_job, *zip(*args)))
+    for (key, _, target, _), (result, error) in zip(jobs, results):
+        if error is not None:
+            if entries.pop(key, None) is not None:
+                log_warn(f"{key}: Trimmen fehlgeschlagen ({error}) - volles Sheet")
+            continue
+        count, png_bytes = result
+        entries[key].setdefault("sheets", {})[Path(target).name] = {"icons": count, "png_bytes": png_bytes}
+    for key in sorted({job[0] for job in jobs} & set(entries)):
+        entry = entries[key]
+        log_success(f"{key}: {len(entry['icons'])}/{entry['available']} Icons aus '{entry['source']}'")
+
+    # Getrimmte Sheets nicht mehr vorhandener (oder nicht mehr trimmbarer) Styles entfernen
+    for key in sorted((set(previous) | {job[0] for job in jobs}) - set(entries)):
+        stale = trimmed_dir / key
+        if stale.is_dir():
+            shutil.rmtree(stale)
+            log_info(f"{key}: getrimmtes Sheet entfernt")
+
+    index = {"generated_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "styles": dict(sorted(entries.items()))}
+    trimmed_dir.mkdir(parents=True, exist_ok=True)
+    tmp = trimmed_dir / "index.json.tmp"
+    tmp.write_text(json.dumps(index, indent=2) + "\n", encoding="utf-8")
+    tmp.replace(trimmed_dir / "index.json")
+    return index, len(jobs)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Getrimmte Sprite-Sheets pro Style")
+    parser.add_argument("--force", action="store_true", help="Alle Sheets neu bauen")
+    parser.add_argument("--workers", type=int, default=SPRITE_WORKERS)
+    args = parser.parse_args(argv)
+
+    if not SPRITES_DIR.is_dir():
+        log_error(f"Sprite-Verzeichnis nicht gefunden: {SPRITES_DIR}")
+        return 1
+    try:
+        index, rebuilt = trim_styles(workers=max(1, args.workers), force=args.force)
+    except (OSError, ValueError) as e:
+        log_error(f"Sprite-Trimmen fehlgeschlagen: {e}")
+        return 1
+    log_info(f"{len(index['styles'])} getrimmte Styles, {rebuilt} Sheets neu gebaut")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,22 @@
+#!/bin/bash
+set -euo pipefail
+
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+if [ -f "$SCRIPT_DIR/utils.sh" ]; then
+    source "$SCRIPT_DIR/utils.sh"
+else
+    echo "❌ Fehler: utils.sh nicht gefunden!"
+    exit 1
+fi
+
+export TILES_DIR="${TILES_DIR:-/srv/tiles}"
+export SPRITES_DIR="${SPRITES_DIR:-${ASSETS_DIR:-/srv/assets}/sprites}"
+PYTHON_SCRIPT="$SCRIPT_DIR/trim_sprites.py"
+
+if [ ! -f "$PYTHON_SCRIPT" ]; then
+    log_error "Python-Skript nicht gefunden: $PYTHON_SCRIPT"
+    exit 1
+fi
+
+log_info "Trimme Sprite-Sheets auf die genutzten Icons..."
+python3 "$PYTHON_SCRIPT" "$@"
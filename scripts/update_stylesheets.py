@@ -1,15 +1,24 @@
 #!/usr/bin/env python3
+import hashlib
 import json
 import os
+import shutil
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+from inventory_scan import STATE_DIR, compact_json
+
 # --- KONFIGURATION AUS ENV ---
 TILES_DIR = Path(os.environ.get("TILES_DIR", "/srv/tiles"))
 TILES_BASE_URL = os.environ.get("TILES_BASE_URL", "").rstrip("/")
 ASSETS_BASE_URL = os.environ.get("ASSETS_BASE_URL", "").rstrip("/")
 ENDPOINTS_INFO_PATH = Path(os.environ.get("ENDPOINTS_INFO_PATH", "/srv/info/endpoints_info.json"))
 SPRITE_MAPPING_FILE = Path(os.environ.get("SPRITE_MAPPING_FILE", str(Path(__file__).resolve().parent.parent / "conf" / "sprite_mapping.json")))
+SPRITES_DIR = Path(os.environ.get("SPRITES_DIR", str(Path(os.environ.get("ASSETS_DIR", "/srv/assets")) / "sprites")))
+# Getrimmte Sheets aus trim_sprites.py verwenden (SPRITE_TRIMMED=0 -> immer volles Sheet)
+SPRITE_TRIMMED = os.environ.get("SPRITE_TRIMMED", "1") != "0"
+TRIMMED_SPRITES_DIR_NAME = "trimmed"
 
 # Templates
 SPRITE_URL_TEMPLATE = os.environ.get("SPRITE_URL_TEMPLATE", "").strip()
@@ -19,6 +28,12 @@ GLYPHS_URL_TEMPLATE = os.environ.get("GLYPHS_URL_TEMPLATE", "").strip()
 PMTILES_FILE_GLOBAL = os.environ.get("PMTILES_FILE", "").strip()
 PMTILES_FILE_MAP_RAW = os.environ.get("PMTILES_FILE_MAP", "").strip()
 
+# Engine: Cache & Parallelisierung
+STYLE_CACHE_DIR = Path(os.environ.get("STYLE_CACHE_DIR", str(STATE_DIR / "stylesheets")))
+STYLE_WORKERS = int(os.environ.get("STYLE_WORKERS", "0") or 0) or (os.cpu_count() or 1)
+# Ab dieser Anzahl zu bearbeitender Styles lohnt sich der Prozess-Pool
+STYLE_POOL_MIN_JOBS = 3
+
 # --- LOGGING HELPER ---
 def log_info(msg):
     print(f"   ℹ️  {msg}")
@@ -32,41 +47,6 @@ def log_warn(msg):
 def log_error(msg):
     print(f"   ❌ {msg}")
 
-# --- INIT ---
-if not TILES_BASE_URL:
-    log_warn("Keine TILES_BASE_URL gefunden. Links werden evtl. unvollständig sein.")
-
-# Defaults für Templates berechnen, falls leer
-if not SPRITE_URL_TEMPLATE and ASSETS_BASE_URL:
-    SPRITE_URL_TEMPLATE = f"{ASSETS_BASE_URL}/sprites/{{tileset}}/sprite"
-if not GLYPHS_URL_TEMPLATE and ASSETS_BASE_URL:
-    GLYPHS_URL_TEMPLATE = f"{ASSETS_BASE_URL}/fonts/{{fontstack}}/{{range}}.pbf"
-
-# Endpoints Info laden
-tiles_entries = []
-if ENDPOINTS_INFO_PATH.exists():
-    try:
-        info_data = json.loads(ENDPOINTS_INFO_PATH.read_text(encoding="utf-8"))
-        
-        # NEU: Wir unterstützen das neue "datasets" Format und das alte "tiles" Format
-        tiles_entries = info_data.get("datasets", [])
-        if not tiles_entries:
-            tiles_entries = info_data.get("tiles", []) or []
-
-        # Fallback: Falls URL im Env fehlt, nimm die aus der JSON
-        if not TILES_BASE_URL:
-            TILES_BASE_URL = (info_data.get("tiles_base_url") or "").rstrip("/")
-    except Exception as e:
-        log_warn(f"Fehler beim Lesen von endpoints_info.json: {e}")
-
-# Mapping parsen (tileset -> filename)
-pmtiles_map = {}
-if PMTILES_FILE_MAP_RAW:
-    for entry in PMTILES_FILE_MAP_RAW.split():
-        if ":" in entry:
-            parts = entry.split(":", 1)
-            pmtiles_map[parts[0]] = parts[1]
-
 # Font Mapping (für Standardisierung)
 FONT_MAP = {
     "Arial Regular": "Noto Sans Regular",
@@ -85,31 +65,77 @@ BASEMAP_AT_ATTRIBUTION = (
 
 # --- FUNKTIONEN ---
 
-def replace_fonts(node, changed_flag, replacements, parent_key=None):
-    """Rekursive Funktion zum Ersetzen von Font-Namen."""
-    if isinstance(node, dict):
-        for key, value in node.items():
-            node[key] = replace_fonts(value, changed_flag, replacements, key)
-        return node
-    if isinstance(node, list):
-        for idx, value in enumerate(node):
-            node[idx] = replace_fonts(value, changed_flag, replacements, parent_key)
-        return node
-    if isinstance(node, str):
-        replacement = FONT_MAP.get(node, node)
-        if parent_key in {"text-font", "text-fonts"}:
-            normalized = replacement.replace(" ", "-")
-            if normalized != node:
-                changed_flag[0] = True
-                replacements.add((node, normalized))
-                return normalized
-        if replacement != node:
-            changed_flag[0] = True
-            replacements.add((node, replacement))
-            return replacement
-    return node
+def hash_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_json(value):
+    return hash_bytes(json.dumps(value, sort_keys=True, separators=(",", ":")).encode("utf-8"))
+
+
+def parse_pmtiles_map(raw):
+    """Mapping parsen (tileset -> filename)."""
+    pmtiles_map = {}
+    for entry in raw.split():
+        if ":" in entry:
+            parts = entry.split(":", 1)
+            pmtiles_map[parts[0]] = parts[1]
+    return pmtiles_map
 
 
+def load_endpoints():
+    """
+    Lädt die Tiles-Einträge aus endpoints_info.json.
+    Rückgabe: (entries, tiles_base_url_fallback)
+    """
+    if not ENDPOINTS_INFO_PATH.exists():
+        return [], ""
+    try:
+        info_data = json.loads(ENDPOINTS_INFO_PATH.read_text(encoding="utf-8"))
+    except Exception as e:
+        log_warn(f"Fehler beim Lesen von endpoints_info.json: {e}")
+        return [], ""
+
+    # Wir unterstützen das neue "datasets" Format und das alte "tiles" Format
+    entries = info_data.get("datasets", [])
+    if not entries:
+        entries = info_data.get("tiles", []) or []
+
+    base_url = info_data.get("tiles_base_url") or (info_data.get("meta") or {}).get("tiles_base_url") or ""
+    return entries, base_url.rstrip("/")
+
+
+def build_config(tiles_base_url):
+    """Alle Einstellungen, die das Ergebnis eines Styles beeinflussen (für den Cache-Key)."""
+    sprite_template = SPRITE_URL_TEMPLATE
+    glyphs_template = GLYPHS_URL_TEMPLATE
+    # Defaults für Templates berechnen, falls leer
+    if not sprite_template and ASSETS_BASE_URL:
+        sprite_template = f"{ASSETS_BASE_URL}/sprites/{{tileset}}/sprite"
+    if not glyphs_template and ASSETS_BASE_URL:
+        glyphs_template = f"{ASSETS_BASE_URL}/fonts/{{fontstack}}/{{range}}.pbf"
+
+    return {
+        "tiles_base_url": tiles_base_url,
+        "sprite_url_template": sprite_template,
+        "glyphs_url_template": glyphs_template,
+        "font_map": FONT_MAP,
+        "basemap_attribution": BASEMAP_AT_ATTRIBUTION,
+    }
+
+
+def replace_font_value(value, parent_key, replacements):
+    """Ersetzt einen einzelnen Font-String; Rückgabe: neuer Wert."""
+    replacement = FONT_MAP.get(value, value)
+    if parent_key in {"text-font", "text-fonts"}:
+        normalized = replacement.replace(" ", "-")
+        if normalized != value:
+            replacements.add((value, normalized))
+            return normalized
+    if replacement != value:
+        replacements.add((value, replacement))
+    return replacement
+
 
 def load_sprite_mapping():
     mapping = {"default": None, "tilesets": {}, "styles": {}}
@@ -192,44 +218,344 @@ def resolve_sprite_tileset(mapping, tileset, style_id):
     return tileset
 
 
-def normalize_basemap_attribution(data, tileset, style_id, changed_flag, change_log):
-    """Sichert verpflichtende basemap.at Attributionen für Basemap- und Contours-Styles."""
-    sources = data.get("sources")
-    if not isinstance(sources, dict):
-        return
-
-    required_attribution = None
-    if tileset == "basemap-at":
-        required_attribution = BASEMAP_AT_ATTRIBUTION
-    elif tileset == "overlays" and style_id == "basemap-at-contours":
-        required_attribution = BASEMAP_AT_ATTRIBUTION
+def load_trimmed_sprites():
+    """Index von trim_sprites.py: {"tileset/style_id": Quell-Sprite-Set}."""
+    if not SPRITE_TRIMMED:
+        return {}
+    index_path = SPRITES_DIR / TRIMMED_SPRITES_DIR_NAME / "index.json"
+    try:
+        styles = json.loads(index_path.read_text(encoding="utf-8")).get("styles", {})
+    except (OSError, ValueError):
+        return {}
+    return {key: entry.get("source") for key, entry in styles.items() if isinstance(entry, dict)}
 
-    if not required_attribution:
-        return
 
-    for source_name, source in sources.items():
-        if not isinstance(source, dict):
-            continue
+def required_attribution_for(tileset, style_id):
+    """Verpflichtende basemap.at Attribution für Basemap- und Contours-Styles."""
+    if tileset == "basemap-at":
+        return BASEMAP_AT_ATTRIBUTION
+    if tileset == "overlays" and style_id == "basemap-at-contours":
+        return BASEMAP_AT_ATTRIBUTION
+    return None
+
+
+def _entry_pmtiles_url(entry):
+    """URL eines endpoints-Eintrags im pmtiles:// Format (datasets- und tiles-Format)."""
+    url = entry.get("pmtiles_internal") or entry.get("pmtiles_url")
+    if not url and entry.get("url") and not str(entry.get("path", "")).endswith("style.json"):
+        # Altes "tiles" Format: url zeigt direkt auf die PMTiles Datei
+        url = entry.get("url")
+    if not url:
+        return None
+    return url if url.startswith("pmtiles://") else f"pmtiles://{url}"
+
+
+class ResolutionIndex:
+    """
+    Einmal pro Lauf aufgebauter Index für die Style-Auflösung:
+      (tileset, filename) / absoluter Pfad -> PMTiles URL
+      tileset -> vorhandene *.pmtiles (ein scandir pro Tileset)
+      tileset/style -> Sprite-Set
+    Mehrdeutige und fehlende Zuordnungen werden gesammelt und einmal gemeldet.
+    """
+
+    def __init__(self, tiles_dir, tiles_entries, pmtiles_map, sprite_mapping, tiles_base_url):
+        self.tiles_dir = Path(tiles_dir)
+        self.pmtiles_map = pmtiles_map
+        self.sprite_mapping = sprite_mapping
+        self.tiles_base_url = tiles_base_url
+        self.by_file = {}
+        self.by_path = {}
+        self.ambiguous = {}
+        self.missing = []
+        self._pmtiles_files = {}
+        self._sprites = {}
+        self.trimmed_sprites = load_trimmed_sprites()
+
+        for entry in tiles_entries:
+            if not isinstance(entry, dict):
+                continue
+            url = _entry_pmtiles_url(entry)
+            if not url:
+                continue
+            tileset = entry.get("tileset")
+            filename = entry.get("pmtiles_file") or entry.get("filename")
+            if tileset and filename:
+                self._add(self.by_file, (tileset, filename), url, entry)
+            for path_key in ("pmtiles_path", "path"):
+                path = entry.get(path_key)
+                if isinstance(path, str) and path.endswith(".pmtiles"):
+                    self._add(self.by_path, path, url, entry)
+
+    def _add(self, index, key, url, entry):
+        existing = index.get(key)
+        if existing is None:
+            index[key] = (url, entry)
+        elif existing[0] != url:
+            self.ambiguous.setdefault(key, {existing[0]}).add(url)
+
+    def pmtiles_files(self, tileset):
+        files = self._pmtiles_files.get(tileset)
+        if files is None:
+            files = []
+            try:
+                with os.scandir(self.tiles_dir / tileset / "pmtiles") as it:
+                    files = sorted(e.name for e in it if e.name.endswith(".pmtiles") and e.is_file())
+            except OSError:
+                pass
+            self._pmtiles_files[tileset] = files
+        return files
+
+    def resolve_pmtiles_file(self, tileset, style_id):
+        """Bestimmt die passende PMTiles Datei für einen Style."""
+        files = self.pmtiles_files(tileset)
 
-        current = source.get("attribution")
-        if current != required_attribution:
-            source["attribution"] = required_attribution
-            changed_flag[0] = True
-            change_log.append(
-                f"      📝 Attribution '{source_name}': auf '{required_attribution}' gesetzt"
-            )
+        # A) Exakter Match (Priorität!) - Style ID == PMTiles Name
+        if f"{style_id}.pmtiles" in files:
+            return f"{style_id}.pmtiles"
 
-def main():
-    # Suche alle style.json Dateien
-    style_files = sorted(TILES_DIR.glob("*/styles/*/style.json"))
-    if not style_files:
-        log_error(f"Keine style.json Dateien unter {TILES_DIR} gefunden.")
-        # Kein Fehlercode, da vielleicht einfach noch nichts da ist
-        sys.exit(0) 
+        # B) Mapping / Global
+        current_pmtiles = self.pmtiles_map.get(tileset) or PMTILES_FILE_GLOBAL
+        if current_pmtiles:
+            return current_pmtiles
+
+        # C) Ordner-Inhalt (Fallback)
+        if len(files) == 1:
+            return files[0]
+        if len(files) > 1:
+            log_warn(f"Mehrdeutigkeit bei {tileset}/{style_id}: {files}. Erwartete '{style_id}.pmtiles' nicht gefunden.")
+        return None
+
+    def resolve_pmtiles_url(self, tileset, current_pmtiles):
+        """Rückgabe: (pmtiles_url, matched_entry)"""
+        # Versuch 1: URL aus endpoints_info.json (Präzises Matching)
+        hit = self.by_file.get((tileset, current_pmtiles))
+        if hit is None:
+            expected_path = (self.tiles_dir / tileset / "pmtiles" / current_pmtiles).as_posix()
+            hit = self.by_path.get(expected_path)
+        if hit is not None:
+            return hit
+
+        self.missing.append(f"{tileset}/{current_pmtiles}")
+        # Versuch 2: Manuell bauen (Fallback)
+        if self.tiles_base_url:
+            # relative_path wäre z.B. osm/pmtiles/at.pmtiles
+            return f"pmtiles://{self.tiles_base_url}/{tileset}/pmtiles/{current_pmtiles}", None
+        return None, None
+
+    def resolve_sprite(self, tileset, style_id):
+        key = (tileset, style_id)
+        if key not in self._sprites:
+            sprite = resolve_sprite_tileset(self.sprite_mapping, tileset, style_id)
+            # Getrimmtes Sheet nur, wenn es aus dem aktuell gemappten Set gebaut wurde
+            if self.trimmed_sprites.get(f"{tileset}/{style_id}") == sprite:
+                sprite = f"{TRIMMED_SPRITES_DIR_NAME}/{tileset}/{style_id}"
+            self._sprites[key] = sprite
+        return self._sprites[key]
+
+    def report(self):
+        for key, urls in sorted(self.ambiguous.items(), key=lambda item: str(item[0])):
+            label = "/".join(key) if isinstance(key, tuple) else key
+            log_warn(f"Mehrdeutige Endpoints für {label}: {sorted(urls)} (erster Eintrag gewinnt)")
+        if self.missing:
+            log_warn(f"Nicht in endpoints_info.json gefunden (URL gebaut): {', '.join(sorted(set(self.missing)))}")
+
+
+def rewrite_style(data, job, config):
+    """
+    Wendet alle Rewrites in einem Durchlauf an (Fonts, Attribution, Sprite,
+    Glyphs, Sources). Rückgabe: (changed, change_log)
+    """
+    tileset = job["tileset"]
+    style_id = job["style_id"]
+    current_pmtiles = job["pmtiles_file"]
+    pmtiles_url = job["pmtiles_url"]
+    required_attribution = required_attribution_for(tileset, style_id)
+
+    changed = False
+    font_replacements = set()
+    attribution_log = []
+    source_log = []
+
+    def walk(node, parent_key):
+        nonlocal changed
+        if isinstance(node, dict):
+            for key, value in node.items():
+                if isinstance(value, str):
+                    new_value = replace_font_value(value, key, font_replacements)
+                    if new_value != value:
+                        node[key] = new_value
+                        changed = True
+                elif isinstance(value, (dict, list)):
+                    walk(value, key)
+        elif isinstance(node, list):
+            for idx, value in enumerate(node):
+                if isinstance(value, str):
+                    new_value = replace_font_value(value, parent_key, font_replacements)
+                    if new_value != value:
+                        node[idx] = new_value
+                        changed = True
+                elif isinstance(value, (dict, list)):
+                    walk(value, parent_key)
+
+    def rewrite_sources(sources):
+        nonlocal changed
+        for s_key, source in sources.items():
+            if not isinstance(source, dict):
+                continue
 
-    updated_count = 0
-    sprite_mapping = load_sprite_mapping()
+            # Basemap-Attribution prüfen und ggf. auf MapLibre-kompatibles Format korrigieren
+            if required_attribution and source.get("attribution") != required_attribution:
+                source["attribution"] = required_attribution
+                changed = True
+                attribution_log.append(
+                    f"      📝 Attribution '{s_key}': auf '{required_attribution}' gesetzt"
+                )
 
+            # Sources URL (PMTiles) - nur bestimmte Quellen updaten
+            if not pmtiles_url:
+                continue
+            old_url = source.get("url")
+            should_update = (tileset == "osm" and s_key == "openmaptiles") or (
+                source.get("type") == "vector" and "url" in source
+            )
+            if should_update and isinstance(old_url, str) and old_url != pmtiles_url:
+                source_log.append(f"      📝 Source '{s_key}': ... -> \"{current_pmtiles}\"")
+                source["url"] = pmtiles_url
+                changed = True
+
+    # Ein Durchlauf über den Baum; "sources" wird dabei direkt mitbehandelt
+    if isinstance(data, dict):
+        for key, value in data.items():
+            if key == "sources" and isinstance(value, dict):
+                rewrite_sources(value)
+            if isinstance(value, str):
+                new_value = replace_font_value(value, key, font_replacements)
+                if new_value != value:
+                    data[key] = new_value
+                    changed = True
+            elif isinstance(value, (dict, list)):
+                walk(value, key)
+    else:
+        walk(data, None)
+
+    change_log = [f"      📝 Font: \"{old}\" -> \"{new}\"" for old, new in sorted(font_replacements)]
+    change_log.extend(attribution_log)
+
+    # Sprite URL
+    if config["sprite_url_template"]:
+        new_sprite = (
+            config["sprite_url_template"].replace("{tileset}", job["sprite_tileset"])
+            .replace("{style_id}", style_id)
+        )
+        if data.get("sprite") != new_sprite:
+            change_log.append(f"      📝 Sprite: ... -> \"{new_sprite}\"")
+            data["sprite"] = new_sprite
+            changed = True
+
+    # Glyphs URL
+    if config["glyphs_url_template"]:
+        new_glyphs = (
+            config["glyphs_url_template"].replace("{tileset}", tileset)
+            .replace("{style_id}", style_id)
+        )
+        if data.get("glyphs") != new_glyphs:
+            data["glyphs"] = new_glyphs
+            changed = True
+
+    change_log.extend(source_log)
+    return changed, change_log
+
+
+def process_style(job, config):
+    """Worker: liest, rewritet und schreibt einen Style. Läuft im Prozess-Pool."""
+    style_path = Path(job["path"])
+    raw = style_path.read_bytes()
+    try:
+        data = json.loads(raw)
+    except Exception as e:
+        return {"key": job["key"], "error": f"Fehler beim Lesen von {style_path}: {e}"}
+
+    changed, change_log = rewrite_style(data, job, config)
+    # Immer kompakt schreiben - auch ein unverändertes Template wird einmalig verdichtet
+    output = compact_json(data)
+    if output != raw:
+        tmp = style_path.with_name(style_path.name + ".tmp")
+        tmp.write_bytes(output)
+        tmp.replace(style_path)
+
+    return {
+        "key": job["key"],
+        "changed": changed,
+        "change_log": change_log,
+        "input_hash": hash_bytes(raw),
+        "output_hash": hash_bytes(output),
+        "output": output if output != raw else None,
+    }
+
+
+class StyleCache:
+    """
+    Merkt sich pro Style (Input-Hash, Output-Hash, Cache-Key).
+    Outputs werden inhaltsadressiert abgelegt, damit ein frisch kopiertes
+    Template (gleicher Input) ohne Neuberechnung wiederhergestellt werden kann.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = Path(cache_dir)
+        self.index_path = self.cache_dir / "index.json"
+        self.outputs_dir = self.cache_dir / "outputs"
+        self.entries = {}
+        if self.index_path.exists():
+            try:
+                self.entries = json.loads(self.index_path.read_text(encoding="utf-8"))
+            except Exception as e:
+                log_warn(f"Style-Cache unlesbar, wird neu aufgebaut: {e}")
+                self.entries = {}
+
+    def lookup(self, style_key, cache_key, file_hash):
+        """Rückgabe: "current" (nichts zu tun), "restore" (Output kopieren) oder None."""
+        entry = self.entries.get(style_key)
+        if not entry or entry.get("key") != cache_key:
+            return None
+        if file_hash == entry.get("output"):
+            return "current"
+        if file_hash == entry.get("input") and (self.outputs_dir / f"{entry['output']}.json").exists():
+            return "restore"
+        return None
+
+    def restore(self, style_key, style_path):
+        source = self.outputs_dir / f"{self.entries[style_key]['output']}.json"
+        tmp = Path(style_path).with_name(Path(style_path).name + ".tmp")
+        shutil.copyfile(source, tmp)
+        tmp.replace(style_path)
+
+    def store(self, style_key, cache_key, input_hash, output_hash, output=None):
+        self.entries[style_key] = {"key": cache_key, "input": input_hash, "output": output_hash}
+        target = self.outputs_dir / f"{output_hash}.json"
+        if output is not None and not target.exists():
+            self.outputs_dir.mkdir(parents=True, exist_ok=True)
+            target.write_bytes(output)
+
+    def save(self, active_keys):
+        self.entries = {k: v for k, v in self.entries.items() if k in active_keys}
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp = self.index_path.with_name("index.json.tmp")
+        tmp.write_text(json.dumps(self.entries, indent=2), encoding="utf-8")
+        tmp.replace(self.index_path)
+
+        # Verwaiste Outputs entfernen
+        referenced = {f"{v['output']}.json" for v in self.entries.values()}
+        if self.outputs_dir.exists():
+            for path in self.outputs_dir.iterdir():
+                if path.name not in referenced:
+                    path.unlink(missing_ok=True)
+
+
+def plan_styles(style_files, config, index):
+    """Erzeugt die Jobs inkl. Cache-Key (Config-, Sprite- und Endpoint-Hash)."""
+    config_hash = hash_json(config)
+    jobs = []
     for style_path in style_files:
         # Pfad-Struktur: .../tiles/{tileset}/styles/{style_id}/style.json
         try:
@@ -239,129 +565,110 @@ def main():
             log_warn(f"Überspringe Datei mit unerwarteter Struktur: {style_path}")
             continue
 
-        # 1. Bestimme die passende PMTiles Datei
-        current_pmtiles = None
-        
-        # A) Exakter Match (Priorität!) - Style ID == PMTiles Name
-        candidate_exact = TILES_DIR / tileset / "pmtiles" / f"{style_id}.pmtiles"
-        if candidate_exact.exists():
-            current_pmtiles = candidate_exact.name
-        
-        # B) Mapping / Global
-        if not current_pmtiles:
-            current_pmtiles = pmtiles_map.get(tileset) or PMTILES_FILE_GLOBAL
-        
-        # C) Ordner Scan (Fallback)
-        if not current_pmtiles:
-            pmtiles_dir = TILES_DIR / tileset / "pmtiles"
-            if pmtiles_dir.exists():
-                pmtiles_files = sorted(p.name for p in pmtiles_dir.glob("*.pmtiles"))
-                if len(pmtiles_files) == 1:
-                    current_pmtiles = pmtiles_files[0]
-                elif len(pmtiles_files) > 1:
-                    log_warn(f"Mehrdeutigkeit bei {tileset}/{style_id}: {pmtiles_files}. Erwartete '{style_id}.pmtiles' nicht gefunden.")
-
-        # Style laden
+        current_pmtiles = index.resolve_pmtiles_file(tileset, style_id)
+        pmtiles_url, entry = (None, None)
+        if current_pmtiles:
+            pmtiles_url, entry = index.resolve_pmtiles_url(tileset, current_pmtiles)
+        sprite_tileset = index.resolve_sprite(tileset, style_id)
+
+        jobs.append({
+            "key": f"{tileset}/{style_id}",
+            "path": style_path.as_posix(),
+            "tileset": tileset,
+            "style_id": style_id,
+            "pmtiles_file": current_pmtiles,
+            "pmtiles_url": pmtiles_url,
+            "sprite_tileset": sprite_tileset,
+            "cache_key": [
+                config_hash,
+                hash_json(sprite_tileset),
+                hash_json([current_pmtiles, pmtiles_url, entry]),
+            ],
+        })
+    return jobs
+
+
+def run_jobs(jobs, config, workers=STYLE_WORKERS):
+    if len(jobs) >= STYLE_POOL_MIN_JOBS and workers > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+            yield from pool.map(process_style, jobs, [config] * len(jobs))
+    else:
+        for job in jobs:
+            yield process_style(job, config)
+
+
+def update_stylesheets(tiles_dir=None, use_cache=True):
+    """Engine-Einstieg. Rückgabe: Anzahl aktualisierter Stylesheets oder None."""
+    tiles_dir = Path(tiles_dir) if tiles_dir else TILES_DIR
+    # Suche alle style.json Dateien
+    style_files = sorted(tiles_dir.glob("*/styles/*/style.json"))
+    if not style_files:
+        log_error(f"Keine style.json Dateien unter {tiles_dir} gefunden.")
+        return None
+
+    tiles_entries, endpoints_base_url = load_endpoints()
+    # Fallback: Falls URL im Env fehlt, nimm die aus der JSON
+    tiles_base_url = TILES_BASE_URL or endpoints_base_url
+    if not tiles_base_url:
+        log_warn("Keine TILES_BASE_URL gefunden. Links werden evtl. unvollständig sein.")
+
+    config = build_config(tiles_base_url)
+    index = ResolutionIndex(
+        tiles_dir, tiles_entries, parse_pmtiles_map(PMTILES_FILE_MAP_RAW), load_sprite_mapping(), tiles_base_url
+    )
+    jobs = plan_styles(style_files, config, index)
+    index.report()
+
+    cache = StyleCache(STYLE_CACHE_DIR)
+    pending = []
+    updated_count = 0
+    for job in jobs:
+        if not use_cache:
+            pending.append(job)
+            continue
         try:
-            data = json.loads(style_path.read_text(encoding="utf-8"))
-        except Exception as e:
-            log_error(f"Fehler beim Lesen von {style_path}: {e}")
+            file_hash = hash_bytes(Path(job["path"]).read_bytes())
+        except OSError as e:
+            log_error(f"Fehler beim Lesen von {job['path']}: {e}")
             continue
+        state = cache.lookup(job["key"], job["cache_key"], file_hash)
+        if state == "current":
+            log_info(f"Keine Änderungen: {job['key']} (Cache)")
+        elif state == "restore":
+            cache.restore(job["key"], job["path"])
+            updated_count += 1
+            log_success(f"Aktualisiert: {job['key']} (PMTiles: {job['pmtiles_file']}, aus Cache)")
+        else:
+            pending.append(job)
 
-        changed = [False]
-        change_log = []
-        font_replacements = set()
-
-        # Fonts ersetzen
-        data = replace_fonts(data, changed, font_replacements)
-        for old, new in sorted(font_replacements):
-            change_log.append(f"      📝 Font: \"{old}\" -> \"{new}\"")
+    jobs_by_key = {job["key"]: job for job in jobs}
+    for result in run_jobs(pending, config):
+        job = jobs_by_key[result["key"]]
+        if "error" in result:
+            log_error(result["error"])
+            continue
+        cache.store(job["key"], job["cache_key"], result["input_hash"], result["output_hash"], result["output"])
+        if result["changed"]:
+            updated_count += 1
+            log_success(f"Aktualisiert: {job['key']} (PMTiles: {job['pmtiles_file']})")
+            if result["change_log"]:
+                print("\n".join(result["change_log"]))
+        else:
+            log_info(f"Keine Änderungen: {job['key']}")
 
-        # Basemap-Attribution prüfen und ggf. auf MapLibre-kompatibles Format korrigieren
-        normalize_basemap_attribution(data, tileset, style_id, changed, change_log)
+    try:
+        cache.save({job["key"] for job in jobs})
+    except OSError as e:
+        log_warn(f"Style-Cache konnte nicht gespeichert werden: {e}")
 
-        # Sprite URL
-        if SPRITE_URL_TEMPLATE:
-            sprite_tileset = resolve_sprite_tileset(sprite_mapping, tileset, style_id)
-            new_sprite = (
-                SPRITE_URL_TEMPLATE.replace("{tileset}", sprite_tileset)
-                .replace("{style_id}", style_id)
-            )
-            if data.get("sprite") != new_sprite:
-                change_log.append(f"      📝 Sprite: ... -> \"{new_sprite}\"")
-                data["sprite"] = new_sprite
-                changed[0] = True
-
-        # Glyphs URL
-        if GLYPHS_URL_TEMPLATE:
-            new_glyphs = (
-                GLYPHS_URL_TEMPLATE.replace("{tileset}", tileset)
-                .replace("{style_id}", style_id)
-                .replace("{fontstack}", "{fontstack}")
-                .replace("{range}", "{range}")
-            )
-            if data.get("glyphs") != new_glyphs:
-                data["glyphs"] = new_glyphs
-                changed[0] = True
+    return updated_count
 
-        # Sources URL (PMTiles)
-        if current_pmtiles:
-            pmtiles_url = None
-            
-            # Versuch 1: URL aus endpoints_info.json (Präzises Matching)
-            for entry in tiles_entries:
-                # Neues Format Check (datasets): Match über Dateiname + Tileset
-                if entry.get("filename") == current_pmtiles and entry.get("tileset") == tileset:
-                    pmtiles_url = entry.get("pmtiles_internal") or entry.get("pmtiles_url")
-                    if pmtiles_url: break
-                
-                # Altes Format Check (tiles) - Pfad-basiert
-                expected_path = (TILES_DIR / tileset / "pmtiles" / current_pmtiles).as_posix()
-                if entry.get("path") == expected_path:
-                    entry_url = entry.get("url")
-                    if entry_url:
-                        pmtiles_url = (
-                            entry_url if entry_url.startswith("pmtiles://") 
-                            else f"pmtiles://{entry_url}"
-                        )
-                    break
-            
-            # Versuch 2: Manuell bauen (Fallback)
-            if not pmtiles_url and TILES_BASE_URL:
-                # relative_path wäre z.B. osm/pmtiles/at.pmtiles
-                pmtiles_url = f"pmtiles://{TILES_BASE_URL}/{tileset}/pmtiles/{current_pmtiles}"
-            
-            if pmtiles_url:
-                sources = data.get("sources", {})
-                if isinstance(sources, dict):
-                    for s_key, source in sources.items():
-                        if not isinstance(source, dict): continue
-                        
-                        old_url = source.get("url")
-                        should_update = False
-                        
-                        # Nur bestimmte Quellen updaten
-                        if tileset == "osm" and s_key == "openmaptiles":
-                            should_update = True
-                        elif source.get("type") == "vector" and "url" in source:
-                            should_update = True
-                        
-                        if should_update and isinstance(old_url, str):
-                            if old_url != pmtiles_url:
-                                change_log.append(f"      📝 Source '{s_key}': ... -> \"{current_pmtiles}\"")
-                                source["url"] = pmtiles_url
-                                changed[0] = True
-
-        # Speichern
-        if changed[0]:
-            style_path.write_text(json.dumps(data, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
-            updated_count += 1
-            log_success(f"Aktualisiert: {tileset}/{style_id} (PMTiles: {current_pmtiles})")
-            if change_log:
-                print("\n".join(change_log))
-        else:
-            log_info(f"Keine Änderungen: {tileset}/{style_id}")
 
+def main():
+    updated_count = update_stylesheets(use_cache=os.environ.get("STYLE_CACHE", "1") != "0")
+    if updated_count is None:
+        # Kein Fehlercode, da vielleicht einfach noch nichts da ist
+        sys.exit(0)
     print(f"✅ Fertig. {updated_count} Stylesheets aktualisiert.")
 
 if __name__ == "__main__":
@@ -40,3 +40,21 @@ log_info() {
 log_warn() {
     echo -e "${YELLOW}   ⚠️  $1${NC}"
 }
+
+# 4. Ressourcen-Ledger (resource_ledger.py)
+# Ein Lauf = alle Skripte, die von hier aus gestartet werden. Das erste
+# Skript legt die Lauf-ID fest, verschachtelte Skripte übernehmen sie.
+export LEDGER_RUN_ID="${LEDGER_RUN_ID:-$(date +%Y-%m-%d_%H%M%S)}"
+LEDGER_SCRIPT="$SCRIPT_DIR/resource_ledger.py"
+
+# Schritt messen: ledger_step <name> befehl args...
+# Wall/CPU/IO/RSS/Plattenplatz landen im Ledger, der Exit-Code bleibt erhalten.
+ledger_step() {
+    local name="$1"
+    shift
+    if [ "${RESOURCE_LEDGER:-1}" = "0" ] || [ ! -f "$LEDGER_SCRIPT" ]; then
+        "$@"
+        return
+    fi
+    python3 "$LEDGER_SCRIPT" run "$name" -- "$@"
+}
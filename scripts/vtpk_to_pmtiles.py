@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+VTPK (Esri Vector Tile Package) direkt nach PMTiles.
+
+Ersetzt die Kette unzip -> vtpk2mbtiles -> pmtiles convert, die das
+mehrere GB große Paket dreimal auf die Platte schreibt. Gelesen wird
+direkt aus dem ZIP:
+
+  p12/root.json                          VectorTileServer-Beschreibung (tileInfo, Extent, Copyright)
+  p12/tile/L<zz>/R<rrrr>C<cccc>.bundle   Compact Cache V2: je 128x128 Tiles, Index ab Byte 64
+  p12/resources/styles/root.json         Style (wird nebenbei abgelegt)
+  p12/resources/sprites/sprite*.{json,png}
+
+Unkomprimiert gespeicherte ZIP-Einträge (der Normalfall bei VTPK) werden
+per mmap gelesen, ohne etwas zu entpacken. Die Tile-Zeilen im Bundle
+zählen wie bei XYZ von oben; die TMS-Umkehr aus dem MBTiles-Umweg entfällt.
+
+Ein Bundle deckt einen ausgerichteten 128x128-Block ab, also einen
+zusammenhängenden Bereich auf der Hilbert-Kurve: Bundles werden nach
+diesem Bereich sortiert, die Tiles innerhalb eines Bundles nach Tile-ID,
+und dann direkt in den PMTiles-Writer gestreamt.
+
+Usage:
+  vtpk_to_pmtiles.py paket.vtpk ziel.pmtiles [--styles-dir DIR] [--sprites-dir DIR] [--name NAME] [--attribution TEXT]
+"""
+import argparse
+import gzip
+import json
+import math
+import mmap
+import os
+import re
+import shutil
+import struct
+import sys
+import tempfile
+import time
+import traceback
+import zipfile
+from array import array
+from pathlib import Path
+
+from pmtiles_reader import PMTilesError, zoom_first_id, zxy_to_tileid
+from pmtiles_stats import mvt_layer_sizes
+from pmtiles_writer import PMTilesWriter
+from resource_ledger import ledger_step
+
+BUNDLE_DIM = 128
+BUNDLE_INDEX_OFFSET = 64
+BUNDLE_INDEX_SIZE = BUNDLE_DIM * BUNDLE_DIM * 8
+OFFSET_MASK = (1 << 40) - 1
+BUNDLE_RE = re.compile(r"(?:^|/)tile/L(\d+)/R([0-9a-fA-F]+)C([0-9a-fA-F]+)\.bundle$")
+LOCAL_HEADER = struct.Struct("<IHHHHHIIIHH")
+WEB_MERCATOR_HALF = 20037508.342789244
+WEB_MERCATOR_WKIDS = {3857, 102100, 102113, 900913}
+# Für vector_layers in den Metadaten: Layer-Namen aus so vielen Tiles je Zoomstufe
+LAYER_SAMPLE_PER_ZOOM = 500
+PROGRESS_SECONDS = 30
+
+
+class VTPKError(Exception):
+    pass
+
+
+# --- ZIP-ZUGRIFF ---
+
+class PackageReader:
+    """ZIP-Einträge als Puffer: STORED direkt aus der mmap, sonst einzeln in scratch entpackt."""
+
+    def __init__(self, path, scratch_dir):
+        self.path = path
+        self.zip = zipfile.ZipFile(path)
+        self._file = open(path, "rb")
+        self.mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.scratch_dir = scratch_dir
+        self.extracted = 0
+
+    def find(self, suffix):
+        """Erster Eintrag, dessen Pfad auf `suffix` endet (Präfix p12/ ist nicht garantiert)."""
+        for info in self.zip.infolist():
+            if info.filename == suffix or info.filename.endswith("/" + suffix):
+                return info
+        return None
+
+    def read_small(self, info):
+        return self.zip.read(info)
+
+    def buffer(self, info):
+        """Rückgabe: (memoryview, cleanup)."""
+        if info.compress_type == zipfile.ZIP_STORED:
+            fields = LOCAL_HEADER.unpack_from(self.mm, info.header_offset)
+            if fields[0] != 0x04034B50:
+                raise VTPKError(f"Ungültiger ZIP-Header bei {info.filename}")
+            start = info.header_offset + LOCAL_HEADER.size + fields[9] + fields[10]
+            return memoryview(self.mm)[start:start + info.file_size], None
+
+        # Komprimierter Eintrag: nur dieses eine Bundle entpacken
+        fd, tmp_path = tempfile.mkstemp(suffix=".bundle", dir=self.scratch_dir)
+        with os.fdopen(fd, "wb") as out, self.zip.open(info) as src:
+            shutil.copyfileobj(src, out, 8 * 1024 * 1024)
+        self.extracted += 1
+        with open(tmp_path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if info.file_size else None
+        os.unlink(tmp_path)
+        if mm is None:
+            return memoryview(b""), None
+        return memoryview(mm), mm.close
+
+    def close(self):
+        self.mm.close()
+        self._file.close()
+        self.zip.close()
+
+
+# --- TILING-SCHEMA ---
+
+def read_tile_info(package):
+    """Level -> Zoom aus p12/root.json; prüft Web-Mercator-Ursprung oben links."""
+    # resources/styles/root.json ist der Style, gesucht ist die Server-Beschreibung
+    candidates = [i for i in package.zip.infolist() if i.filename.endswith("root.json") and "/resources/" not in i.filename]
+    if not candidates:
+        raise VTPKError("root.json (VectorTileServer) fehlt im Paket")
+    info = min(candidates, key=lambda i: i.filename.count("/"))
+    server = json.loads(package.read_small(info))
+    tile_info = server.get("tileInfo") or {}
+
+    wkid = (tile_info.get("spatialReference") or {}).get("latestWkid") or (tile_info.get("spatialReference") or {}).get("wkid")
+    if wkid and wkid not in WEB_MERCATOR_WKIDS:
+        raise VTPKError(f"Nur Web Mercator unterstützt (wkid {wkid})")
+    origin = tile_info.get("origin") or {}
+    if origin and (abs(origin.get("x", -WEB_MERCATOR_HALF) + WEB_MERCATOR_HALF) > 1
+                   or abs(origin.get("y", WEB_MERCATOR_HALF) - WEB_MERCATOR_HALF) > 1):
+        raise VTPKError(f"Unerwarteter Tile-Ursprung: {origin}")
+
+    tile_px = tile_info.get("rows") or 512
+    levels = {}
+    for lod in tile_info.get("lods", []):
+        zoom = math.log2(2 * WEB_MERCATOR_HALF / (lod["resolution"] * tile_px))
+        if abs(zoom - round(zoom)) > 0.01:
+            raise VTPKError(f"Level {lod['level']} passt auf keine Web-Mercator-Zoomstufe")
+        levels[lod["level"]] = round(zoom)
+    return server, levels
+
+
+def list_bundles(package, levels):
+    """Rückgabe: [(sortkey, z, row0, col0, info)] in Hilbert-Reihenfolge."""
+    bundles = []
+    for info in package.zip.infolist():
+        match = BUNDLE_RE.search(info.filename)
+        if not match:
+            continue
+        level = int(match.group(1))
+        z = levels.get(level, level)
+        row0, col0 = int(match.group(2), 16), int(match.group(3), 16)
+        n = 1 << z
+        if row0 >= n or col0 >= n:
+            raise VTPKError(f"Bundle außerhalb von Zoom {z}: {info.filename}")
+        # Ausgerichteter 128er-Block = zusammenhängender Hilbert-Bereich
+        block = (zxy_to_tileid(z, col0, row0) - zoom_first_id(z)) // (BUNDLE_DIM * BUNDLE_DIM)
+        bundles.append(((z, block), z, row0, col0, info))
+    bundles.sort(key=lambda b: b[0])
+    return bundles
+
+
+def bundle_tiles(buf, z, row0, col0):
+    """Tiles eines Bundles: [(tile_id, x, y, offset, size)] nach Tile-ID sortiert."""
+    if len(buf) < BUNDLE_INDEX_OFFSET + BUNDLE_INDEX_SIZE:
+        raise VTPKError("Bundle zu klein für den Index")
+    version = struct.unpack_from("<I", buf, 0)[0]
+    if version != 3:
+        raise VTPKError(f"Nicht unterstützte Bundle-Version {version} (erwartet Compact Cache V2)")
+    index = array("Q")
+    index.frombytes(buf[BUNDLE_INDEX_OFFSET:BUNDLE_INDEX_OFFSET + BUNDLE_INDEX_SIZE])
+    if sys.byteorder != "little":
+        index.byteswap()
+
+    n = 1 << z
+    tiles = []
+    for position, value in enumerate(index):
+        size = value >> 40
+        if not size:
+            continue
+        y = row0 + position // BUNDLE_DIM
+        x = col0 + position % BUNDLE_DIM
+        if x >= n or y >= n:
+            continue
+        offset = value & OFFSET_MASK
+        if offset + size > len(buf):
+            raise VTPKError(f"Tile {z}/{x}/{y} liegt außerhalb des Bundles")
+        tiles.append((zxy_to_tileid(z, x, y), x, y, offset, size))
+    tiles.sort()
+    return tiles
+
+
+# --- KONVERTIERUNG ---
+
+def _close_quietly(close):
+    """mmap schließen; noch referenzierte Views dürfen einen echten Fehler nicht verdecken."""
+    try:
+        close()
+    except BufferError as e:
+        print(f"⚠️  mmap noch in Benutzung, wird später freigegeben ({e})", file=sys.stderr)
+
+
+def extract_side_files(package, styles_dir=None, sprites_dir=None):
+    written = []
+    if styles_dir:
+        info = package.find("resources/styles/root.json")
+        if info:
+            Path(styles_dir).mkdir(parents=True, exist_ok=True)
+            target = Path(styles_dir) / "root.json"
+            target.write_bytes(package.read_small(info))
+            written.append(str(target))
+    if sprites_dir:
+        for name in ("sprite.json", "sprite.png", "sprite@2x.json", "sprite@2x.png"):
+            info = package.find(f"resources/sprites/{name}")
+            if info:
+                Path(sprites_dir).mkdir(parents=True, exist_ok=True)
+                target = Path(sprites_dir) / name
+                target.write_bytes(package.read_small(info))
+                written.append(str(target))
+    return written
+
+
+def _lonlat(x, y):
+    lon = x / WEB_MERCATOR_HALF * 180.0
+    lat = math.degrees(2 * math.atan(math.exp(y / WEB_MERCATOR_HALF * math.pi)) - math.pi / 2)
+    return lon, lat
+
+
+def convert(vtpk_path, out_path, name=None, attribution=None, styles_dir=None, sprites_dir=None, scratch_dir=None):
+    scratch_dir = scratch_dir or str(Path(out_path).parent)
+    package = PackageReader(vtpk_path, scratch_dir)
+    started = time.monotonic()
+    try:
+        with ledger_step("vtpk:index"):
+            server, levels = read_tile_info(package)
+            side_files = extract_side_files(package, styles_dir, sprites_dir)
+            bundles = list_bundles(package, levels)
+        if not bundles:
+            raise VTPKError("Keine .bundle-Dateien im Paket gefunden")
+
+        compression = None
+        layers = {}
+        sampled = {}
+        tiles_done = 0
+        last_progress = started
+
+        with PMTilesWriter(out_path, tile_type="mvt", tile_compression="gzip") as writer:
+            with ledger_step("vtpk:tiles"):
+                for index, (_, z, row0, col0, info) in enumerate(bundles, 1):
+                    buf, cleanup = package.buffer(info)
+                    try:
+                        for tile_id, x, y, offset, size in bundle_tiles(buf, z, row0, col0):
+                            data = bytes(buf[offset:offset + size])
+                            is_gzip = data[:2] == b"\x1f\x8b"
+                            if compression is None:
+                                compression = "gzip" if is_gzip else "none"
+                                writer.tile_compression = compression
+                            elif (compression == "gzip") != is_gzip:
+                                data = gzip.compress(data, mtime=0) if compression == "gzip" else gzip.decompress(data)
+
+                            if sampled.get(z, 0) < LAYER_SAMPLE_PER_ZOOM:
+                                sampled[z] = sampled.get(z, 0) + 1
+                                try:
+                                    raw = gzip.decompress(data) if compression == "gzip" else data
+                                    for layer in mvt_layer_sizes(raw):
+                                        zooms = layers.setdefault(layer, [z, z])
+                                        zooms[0], zooms[1] = min(zooms[0], z), max(zooms[1], z)
+                                except (PMTilesError, OSError, EOFError, IndexError):
+                                    pass
+
+                            writer.add_tile(tile_id, data, (z, x, y))
+                            tiles_done += 1
+                    except BaseException as e:
+                        # Frames im Traceback (bundle_tiles) halten sonst Views auf die
+                        # mmap, mm.close() würde den eigentlichen Fehler mit BufferError ersetzen
+                        traceback.clear_frames(e.__traceback__)
+                        raise
+                    finally:
+                        del buf
+                        if cleanup:
+                            _close_quietly(cleanup)
+
+                    now = time.monotonic()
+                    if now - last_progress >= PROGRESS_SECONDS:
+                        last_progress = now
+                        print(f"   ⏳ Bundle {index}/{len(bundles)} (Zoom {z}), {tiles_done} Tiles, {now - started:.0f}s", flush=True)
+
+            extent = server.get("fullExtent") or {}
+            bounds = None
+            if all(k in extent for k in ("xmin", "ymin", "xmax", "ymax")):
+                west, south = _lonlat(extent["xmin"], extent["ymin"])
+                east, north = _lonlat(extent["xmax"], extent["ymax"])
+                bounds = [round(west, 6), round(south, 6), round(east, 6), round(north, 6)]
+
+            metadata = {
+                "name": name or server.get("name") or Path(vtpk_path).stem,
+                "format": "pbf",
+                "attribution": attribution or server.get("copyrightText") or "",
+                "description": server.get("description") or "",
+                "source": Path(vtpk_path).name,
+                "vector_layers": [
+                    {"id": layer, "fields": {}, "minzoom": zooms[0], "maxzoom": zooms[1]}
+                    for layer, zooms in sorted(layers.items())
+                ],
+            }
+            with ledger_step("vtpk:finish"):
+                stats = writer.finish(metadata, bounds=bounds)
+    finally:
+        _close_quietly(package.close)
+
+    stats["bundles"] = len(bundles)
+    stats["extracted_bundles"] = package.extracted
+    stats["side_files"] = side_files
+    stats["seconds"] = round(time.monotonic() - started, 1)
+    return stats
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="VTPK -> PMTiles (ohne Entpacken)")
+    parser.add_argument("vtpk")
+    parser.add_argument("output")
+    parser.add_argument("--styles-dir", help="p12/resources/styles/root.json hier ablegen")
+    parser.add_argument("--sprites-dir", help="Sprites aus p12/resources/sprites hier ablegen")
+    parser.add_argument("--scratch-dir", help="Nur für komprimierte ZIP-Einträge (Standard: Zielverzeichnis)")
+    parser.add_argument("--name")
+    parser.add_argument("--attribution")
+    args = parser.parse_args(argv)
+
+    try:
+        stats = convert(
+            args.vtpk, args.output, args.name, args.attribution,
+            args.styles_dir, args.sprites_dir, args.scratch_dir,
+        )
+    except (OSError, zipfile.BadZipFile, ValueError, VTPKError, PMTilesError) as e:
+        print(f"❌ {args.vtpk}: {e}", file=sys.stderr)
+        return 1
+
+    print(
+        f"✅ {Path(args.output).name}: {stats['addressed_tiles']} Tiles "
+        f"({stats['tile_contents']} eindeutig) aus {stats['bundles']} Bundles, "
+        f"Zoom {stats['minzoom']}-{stats['maxzoom']}, {stats['tile_data_bytes'] / 1e6:.1f} MB, {stats['seconds']}s"
+    )
+    if stats["extracted_bundles"]:
+        print(f"   ℹ️  {stats['extracted_bundles']} komprimierte Bundles einzeln entpackt.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
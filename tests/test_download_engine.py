@@ -0,0 +1,124 @@
+"""Download-Engine gegen einen lokalen http.server: 304, Range-Resume, MD5-Check."""
+import asyncio
+import hashlib
+import json
+import sys
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+import download_engine  # noqa: E402
+from download_engine import DownloadError, Downloader  # noqa: E402
+
+BODY = bytes(range(256)) * 4096  # 1 MiB
+ETAG = '"v1"'
+LAST_MODIFIED = "Sat, 17 Oct 2026 20:00:00 GMT"
+
+
+class Handler(BaseHTTPRequestHandler):
+    """Minimaler Geofabrik-Ersatz: ETag, Range/If-Range und <datei>.md5."""
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append((self.path, dict(self.headers)))
+        if self.path.endswith(".md5"):
+            if server.md5 is None:
+                return self._reply(404, b"")
+            return self._reply(200, f"{server.md5}  at-latest.osm.pbf\n".encode())
+        if self.headers.get("If-None-Match") == ETAG:
+            return self._reply(304, b"")
+        range_header = self.headers.get("Range")
+        if range_header and self.headers.get("If-Range") == ETAG:
+            start = int(range_header.removeprefix("bytes=").rstrip("-"))
+            return self._reply(206, BODY[start:], {"Content-Range": f"bytes {start}-{len(BODY) - 1}/{len(BODY)}"})
+        return self._reply(200, BODY)
+
+    def _reply(self, status, body, headers=None):
+        self.send_response(status)
+        self.send_header("ETag", ETAG)
+        self.send_header("Last-Modified", LAST_MODIFIED)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        if status != 304:
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if status != 304:
+            self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class DownloadEngineTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.requests = []
+        self.server.md5 = hashlib.md5(BODY).hexdigest()
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dest = Path(tmp.name)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/europe/at-latest.osm.pbf"
+        self.target = self.dest / download_engine.filename_for(self.url)
+
+    def fetch(self):
+        async def run():
+            return await Downloader(self.dest, max_connections=2).fetch(self.url)
+        return asyncio.run(run())
+
+    def body_requests(self):
+        return [headers for path, headers in self.server.requests if not path.endswith(".md5")]
+
+    def test_download_then_conditional_get_unchanged(self):
+        result = self.fetch()
+        self.assertEqual(result["status"], "downloaded")
+        self.assertEqual(result["md5"], hashlib.md5(BODY).hexdigest())
+        self.assertEqual(self.target.read_bytes(), BODY)
+
+        self.server.requests.clear()
+        result = self.fetch()
+        self.assertEqual(result["status"], "unchanged")
+        self.assertEqual(self.body_requests()[0].get("If-None-Match"), ETAG)
+        self.assertEqual(self.target.read_bytes(), BODY)
+
+    def test_resume_partial_download_with_range(self):
+        half = len(BODY) // 2
+        name = self.target.name
+        (self.dest / f"{name}.part").write_bytes(BODY[:half])
+        (self.dest / f".{name}.download.json").write_text(json.dumps({
+            "final_url": self.url, "partial_validator": ETAG, "complete": False,
+        }), encoding="utf-8")
+
+        result = self.fetch()
+        self.assertEqual(result["status"], "downloaded")
+        headers = self.body_requests()[0]
+        self.assertEqual(headers.get("Range"), f"bytes={half}-")
+        self.assertEqual(headers.get("If-Range"), ETAG)
+        # MD5 über den fortgesetzten Stream muss die ganze Datei abdecken
+        self.assertEqual(result["md5"], hashlib.md5(BODY).hexdigest())
+        self.assertEqual(self.target.read_bytes(), BODY)
+
+    def test_md5_mismatch_rejected(self):
+        self.server.md5 = "0" * 32
+        with self.assertRaises(DownloadError):
+            self.fetch()
+        self.assertFalse(self.target.exists())
+        self.assertFalse((self.dest / f"{self.target.name}.part").exists())
+
+    def test_missing_md5_skips_check(self):
+        self.server.md5 = None
+        result = self.fetch()
+        self.assertEqual(result["status"], "downloaded")
+        self.assertEqual(self.target.read_bytes(), BODY)
+
+
+if __name__ == "__main__":
+    unittest.main()
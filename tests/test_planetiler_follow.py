@@ -0,0 +1,60 @@
+"""Kennzahlen aus einem Planetiler-Log (Phasenzeilen + eingerückte Prozess-Statistik)."""
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+from planetiler_follow import Follower  # noqa: E402
+
+# Auszug aus einem Planetiler-Lauf (0.7.x, Österreich): heap/postGC stehen
+# in der eingerückten Zeile unter der Phasenzeile, ohne "INF [phase]".
+LOG_EXCERPT = """\
+0:00:00 INF - Building OpenMapTilesProfile profile into file:///out/at.pmtiles in these phases:
+0:00:01 INF [osm_pass1] - Pass 1: Reading nodes, ways, and relations...
+0:00:11 INF [osm_pass1] -  nodes: [  23M 2.3M/s ] 1.8G  ways: [ 1.2M 124k/s ] rels: [  12k 1.2k/s ] blocks: [ 3.3k 338/s ]
+    cpu: 7.6 gc:  1% heap: 1.4G/4.2G direct: 54M postGC: 1G
+    read( 2%) ->    (0/5) -> process(70% 71% 71% 71%)
+0:00:14 INF [osm_pass1] -  nodes: [  31M 2.5M/s ] 2.4G  ways: [ 2.8M 530k/s ] rels: [  41k 9.6k/s ] blocks: [ 4.5k 400/s ]
+    cpu: 6.8 gc:  3% heap: 2.1G/4.2G direct: 54M postGC: 1.6G
+    read( 0%) ->    (0/5) -> process(86% 84% 85% 86%)
+0:00:14 INF [osm_pass1] - Finished in 13s cpu:1m29s gc:0.4s avg:6.8
+0:03:02 INF [archive] -  features: [  78M  56% 430k/s ] 2.6G  tiles: [ 2.3M  16k/s ] 1G
+    cpu: 7.9 gc:  7% heap: 2.8G/4.2G direct: 20M postGC: 2.1G
+    read( 2%) -> (187/219) -> encode(60% 60% 61%) -> (1k/1k) -> write( 6%)
+    last tile: 13/4384/2865 (z13 35%) https://onthegomap.github.io/planetiler-demo/#13.5/45.22479/12.65625
+"""
+
+
+class FollowerMetricsTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.log_path = os.path.join(tmp.name, "at_build.log")
+        Path(self.log_path).write_text(LOG_EXCERPT, encoding="utf-8")
+
+    def follow(self):
+        follower = Follower(self.log_path, os.getpid())
+        self.addCleanup(follower.close)
+        follower.pump([])
+        follower.flush([])
+        return follower.metrics.phases
+
+    def test_heap_and_postgc_from_continuation_lines(self):
+        phases = self.follow()
+        self.assertEqual(phases["osm_pass1"]["heap_max_bytes"], 2.1e9)
+        self.assertEqual(phases["osm_pass1"]["postgc_max_bytes"], 1.6e9)
+        self.assertEqual(phases["archive"]["heap_max_bytes"], 2.8e9)
+        self.assertEqual(phases["archive"]["postgc_max_bytes"], 2.1e9)
+
+    def test_continuation_lines_are_not_progress_samples(self):
+        phases = self.follow()
+        self.assertEqual(phases["osm_pass1"]["samples"], 4)
+        self.assertEqual(phases["osm_pass1"]["wall_s"], 13)
+        self.assertEqual(phases["archive"]["features_per_s"], 430e3)
+
+
+if __name__ == "__main__":
+    unittest.main()
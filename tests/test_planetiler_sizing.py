@@ -0,0 +1,45 @@
+"""Planetiler-Sizing: -Xmx bleibt innerhalb des geprüften RAM."""
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+import planetiler_sizing as sizing  # noqa: E402
+from planetiler_sizing import GIB, SizingError, size_build  # noqa: E402
+
+
+def host(mem_available):
+    return {"cores": 8, "mem_available": mem_available, "scratch_free": 500 * GIB}
+
+
+def heap_bytes(result):
+    return int(result["heap"].removesuffix("g")) * GIB
+
+
+def usable_heap(mem_available):
+    return (mem_available - sizing.HOST_RESERVE) / (1 + sizing.JVM_OVERHEAD)
+
+
+class SizeBuildTest(unittest.TestCase):
+    def test_heap_rounded_up_when_room(self):
+        result = size_build(int(1.3 * GIB), host(64 * GIB))
+        self.assertEqual(result["storage"], "ram")
+        self.assertEqual(result["heap"], "4g")  # 2 GiB + 1.5 * 1.3 GiB = 3.95 GiB
+
+    def test_heap_never_exceeds_checked_ram(self):
+        pbf = int(1.3 * GIB)
+        needed = sizing.BASE_HEAP + sizing.RAM_HEAP_FACTOR * pbf
+        # Gerade genug für den ungerundeten Heap, aber nicht für 4 GiB
+        available = int(needed * (1 + sizing.JVM_OVERHEAD) + sizing.HOST_RESERVE) + 1024
+        result = size_build(pbf, host(available))
+        self.assertEqual(result["storage"], "ram")
+        self.assertLessEqual(heap_bytes(result), usable_heap(available))
+
+    def test_too_little_ram_fails(self):
+        with self.assertRaises(SizingError):
+            size_build(10 * GIB, host(4 * GIB))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+"""PMTiles-Optimierer: Ausgabe Tile für Tile gleich, verify_equivalent erkennt Abweichungen."""
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+from pmtiles_optimize import optimize, verify_equivalent  # noqa: E402
+from pmtiles_reader import iter_entries, map_archive, read_metadata  # noqa: E402
+from pmtiles_writer import PMTilesWriter  # noqa: E402
+
+METADATA = {"name": "test", "vector_layers": [{"id": "water", "fields": {}}]}
+TILE_COUNT = 5461  # z0 bis z6
+
+
+def tile_data(tile_id):
+    # Viele Wiederholungen, aber nicht direkt hintereinander (Dedup) plus ein
+    # Block identischer Tiles (Run-Length)
+    if 1000 <= tile_id < 1500:
+        return b"sea"
+    return f"tile-{tile_id % 7}".encode() * (1 + tile_id % 3)
+
+
+def write_archive(path, data_for=tile_data, skip=()):
+    # dedup_max_bytes=0: Quelle ohne Deduplizierung, wie ein naiver Writer
+    with PMTilesWriter(path, tile_type="mvt", tile_compression="none", dedup_max_bytes=0) as writer:
+        for tile_id in range(TILE_COUNT):
+            if tile_id not in skip:
+                writer.add_tile(tile_id, data_for(tile_id))
+        writer.finish(METADATA)
+
+
+def read_tiles(path):
+    mm, header = map_archive(path)
+    try:
+        tiles = {}
+        for tile_id, offset, length, run_length in iter_entries(mm, header):
+            for i in range(run_length):
+                tiles[tile_id + i] = bytes(mm[offset:offset + length])
+        return tiles, read_metadata(mm, header)
+    finally:
+        mm.close()
+
+
+class OptimizeTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+        self.src = self.dir / "src.pmtiles"
+        write_archive(self.src)
+
+    def test_output_equivalent_and_smaller(self):
+        dst = self.dir / "dst.pmtiles"
+        report = optimize(self.src, dst, workers=1, leaf_size=256)
+        self.assertTrue(report["verify"]["ok"], report["verify"]["problems"])
+        self.assertLess(report["tile_contents"], report["source_contents"])
+        self.assertLess(report["output_bytes"], report["source_bytes"])
+        self.assertEqual(read_tiles(dst), read_tiles(self.src))
+
+    def test_changed_tile_detected(self):
+        other = self.dir / "other.pmtiles"
+        # Tile-ID 4242 = 6/57/46
+        write_archive(other, lambda tile_id: b"changed" if tile_id == 4242 else tile_data(tile_id))
+        result = verify_equivalent(self.src, other, workers=1)
+        self.assertFalse(result["ok"])
+        self.assertEqual(result["problems"], ["Tile-Inhalt weicht ab ab 6/57/46"])
+
+    def test_missing_tile_detected(self):
+        other = self.dir / "other.pmtiles"
+        write_archive(other, skip={TILE_COUNT - 1})
+        result = verify_equivalent(self.src, other, workers=1)
+        self.assertFalse(result["ok"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+"""pmtiles_reader: Läufe an Bereichsgrenzen beschneiden (Worker-Aufteilung)."""
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+from pmtiles_reader import iter_runs, map_archive  # noqa: E402
+from pmtiles_writer import PMTilesWriter  # noqa: E402
+
+
+class IterRunsTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path = Path(tmp.name) / "runs.pmtiles"
+        with PMTilesWriter(path, tile_type="mvt", tile_compression="none") as writer:
+            writer.add_tile(0, b"a")
+            writer.add_tile(1, b"sea", run_length=20)  # 1..20
+            writer.add_tile(30, b"b")
+            writer.finish({"name": "runs"})
+        self.mm, self.header = map_archive(path)
+        self.addCleanup(self.mm.close)
+
+    def spans(self, lo=0, hi=None):
+        return [(start, end) for start, end, _, _ in iter_runs(self.mm, self.header, lo, hi)]
+
+    def test_whole_archive(self):
+        self.assertEqual(self.spans(), [(0, 1), (1, 21), (30, 31)])
+
+    def test_run_clipped_to_range(self):
+        self.assertEqual(self.spans(5, 10), [(5, 10)])
+        self.assertEqual(self.spans(10, None), [(10, 21), (30, 31)])
+        self.assertEqual(self.spans(21, 30), [])
+
+    def test_adjacent_ranges_cover_each_tile_once(self):
+        edges = [0, 7, 15, 30, None]
+        covered = [span for lo, hi in zip(edges[:-1], edges[1:]) for span in self.spans(lo, hi)]
+        self.assertEqual(sum(end - start for start, end in covered), 22)
+
+
+if __name__ == "__main__":
+    unittest.main()
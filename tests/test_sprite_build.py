@@ -0,0 +1,94 @@
+"""Sprite-Build aus einer lokalen Quelle (offline, ohne git/Netz) mit Fake-spreet."""
+import json
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+import sprite_build  # noqa: E402
+
+# Ersatz für spreet: schreibt <sheet>.json mit einem Eintrag pro SVG und ein leeres PNG
+FAKE_SPREET = """\
+#!{python}
+import json, pathlib, sys
+args = [a for a in sys.argv[1:] if a != "--version"]
+if len(args) < len(sys.argv[1:]):
+    print("spreet 0.0-test")
+    raise SystemExit(0)
+args = [a for a in args if a != "--retina"]
+src, out = pathlib.Path(args[0]), pathlib.Path(args[1])
+icons = {{p.stem: {{"x": 0, "y": 0}} for p in sorted(src.glob("*.svg"))}}
+out.with_suffix(".json").write_text(json.dumps(icons))
+out.with_suffix(".png").write_bytes(b"")
+"""
+
+
+class OfflineSourceTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        root = Path(tmp.name)
+        spreet = root / "spreet"
+        spreet.write_text(FAKE_SPREET.format(python=sys.executable), encoding="utf-8")
+        spreet.chmod(0o755)
+
+        self.sprites_dir = root / "sprites"
+        for name, value in {
+            "SPRITES_DIR": self.sprites_dir,
+            "SPRITE_SRC_DIR": root / "src",
+            "STATE_FILE": root / "state" / "sprite_build.json",
+            "SPREET_BIN": str(spreet),
+        }.items():
+            patcher = mock.patch.object(sprite_build, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        # Lokale Quelle darf weder klonen noch ls-remote aufrufen
+        patcher = mock.patch.object(sprite_build, "_git", side_effect=sprite_build.SpriteBuildError("offline"))
+        self.git = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.source = root / "temaki"
+        (self.source / "icons" / "sport").mkdir(parents=True)
+        (self.source / "icons" / "bench.svg").write_text("<svg/>", encoding="utf-8")
+        (self.source / "icons" / "sport" / "ski.svg").write_text("<svg/>", encoding="utf-8")
+        (self.source / "LICENSE").write_text("CC0", encoding="utf-8")
+
+    def build(self, *extra):
+        return sprite_build.main(["--set", "temaki", "--source", f"temaki={self.source}", "--jobs", "1", *extra])
+
+    def test_build_from_local_source(self):
+        self.assertEqual(self.build(), 0)
+        published = self.sprites_dir / "temaki"
+        self.assertTrue(published.is_symlink())
+        sheet = json.loads((published / "sprite@2x.json").read_text(encoding="utf-8"))
+        self.assertEqual(sorted(sheet), ["bench", "sport_ski"])
+        self.assertTrue((published / "LICENSE").is_file())
+
+        state = json.loads(sprite_build.STATE_FILE.read_text(encoding="utf-8"))["temaki"]
+        self.assertEqual(state["source"], str(self.source))
+        self.assertIsNone(state["commit"])
+        # nur rev-parse der lokalen Quelle, kein ls-remote/clone
+        self.assertEqual([call.args[0] for call in self.git.call_args_list], ["rev-parse"])
+
+    def test_unchanged_source_is_skipped(self):
+        self.assertEqual(self.build(), 0)
+        first = os.readlink(self.sprites_dir / "temaki")
+        self.assertEqual(self.build(), 0)
+        self.assertEqual(os.readlink(self.sprites_dir / "temaki"), first)
+
+        (self.source / "icons" / "bench.svg").write_text("<svg><g/></svg>", encoding="utf-8")
+        self.assertEqual(self.build(), 0)
+        self.assertNotEqual(os.readlink(self.sprites_dir / "temaki"), first)
+
+    def test_missing_local_source_fails(self):
+        self.source = self.source.with_name("fehlt")
+        self.assertEqual(self.build(), 1)
+        self.assertFalse((self.sprites_dir / "temaki").exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+"""Tile-Server: Routing von z/x/y auf ein lokales Archiv, ungültige Zoomstufen."""
+import asyncio
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+from pmtiles_reader import zxy_to_tileid  # noqa: E402
+from pmtiles_writer import PMTilesWriter  # noqa: E402
+from tile_server import TileServer  # noqa: E402
+
+
+class TileRouteTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        archive_dir = Path(tmp.name) / "osm" / "pmtiles"
+        archive_dir.mkdir(parents=True)
+        with PMTilesWriter(archive_dir / "at.pmtiles", tile_type="mvt", tile_compression="none") as writer:
+            for z in range(3):
+                writer.add_tile(zxy_to_tileid(z, 0, 0), f"tile {z}".encode())
+            writer.finish({"name": "at"})
+        self.server = TileServer(tiles_dir=tmp.name, threads=0)
+
+    def get(self, path):
+        return asyncio.run(self.server.dispatch("GET", path, {"accept-encoding": "gzip"}))
+
+    def test_tile_served(self):
+        status, headers, body = self.get("/osm/at/2/0/0.mvt")
+        self.assertEqual(status, 200)
+        self.assertEqual(body, b"tile 2")
+        self.assertEqual(self.get("/osm/at/2/1/1.mvt")[0], 204)
+
+    def test_invalid_coordinates(self):
+        self.assertEqual(self.get("/osm/at/2/4/0.mvt")[0], 400)
+        self.assertEqual(self.get("/osm/at/x/0/0.mvt")[0], 400)
+        self.assertEqual(self.get("/osm/at/-1/0/0.mvt")[0], 404)
+
+    def test_huge_zoom_rejected_without_tile_id(self):
+        started = time.monotonic()
+        self.assertEqual(self.get("/osm/at/200000/0/0.mvt")[0], 404)
+        self.assertEqual(self.get("/osm/at/3/0/0.mvt")[0], 404)
+        self.assertLess(time.monotonic() - started, 1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()